@@ -1,29 +1,91 @@
 # /app/affective_system/emotional_response_generator.py
 # title: 感情応答生成エージェント
-# role: AIの最終的な回答に、現在の感情状態に基づいた適切なトーンや表現を加える。
+# role: AIの最終的な回答に、現在の感情状態に基づいた適切なトーンや表現を加える。感情の強さに応じて、調整なし・定型文による前後の調整・LLMによる書き換えを選ぶ。
 
 from __future__ import annotations
+import logging
+import threading
+import time
 # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↓修正開始◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
-from typing import Any, Dict, TYPE_CHECKING, Optional
+from typing import Any, Dict, TYPE_CHECKING, Optional, Tuple
 # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↑修正終わり◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import Runnable
+from pydantic import BaseModel
 
 from app.agents.base import AIAgent
-from .affective_state import AffectiveState
+from .affective_state import AffectiveState, Emotion
 
 if TYPE_CHECKING:
     from langchain_ollama import OllamaLLM
     from langchain_core.output_parsers import StrOutputParser
 
+logger = logging.getLogger(__name__)
+
+SKIP = "skip"
+ADJUST = "adjust"
+REWRITE = "rewrite"
+
+# 定型文による調整で回答の前後に添える文(前置き, 結び)
+EMOTION_ADJUSTMENTS: Dict[Emotion, Tuple[str, str]] = {
+    Emotion.EMPATHETIC: (
+        "お話しくださりありがとうございます。大変な状況の中で、少しでもお役に立てればと思います。",
+        "一人で抱え込まず、必要なときはいつでも声をかけてください。",
+    ),
+    Emotion.ANXIOUS: (
+        "",
+        "なお、この回答には不確かな点が含まれている可能性があります。重要な判断の前には、他の情報源でもご確認ください。",
+    ),
+    Emotion.FRUSTRATED: (
+        "",
+        "現在、内部の知識に整合性の問題が検出されているため、回答の一部が不正確な可能性があります。",
+    ),
+    Emotion.FOCUSED_ON_FAILURE: (
+        "",
+        "以前の失敗を踏まえ、慎重に検討した上でお答えしています。",
+    ),
+}
+
+
+class EmotionalResponse(BaseModel):
+    """
+    感情を反映した応答と、その生成方法の記録。
+    estimated_seconds_savedは、LLMによる書き換えを行わなかったことで節約できた生成時間の推定値。
+    """
+    text: str
+    mode: str
+    elapsed_seconds: float
+    estimated_seconds_saved: float = 0.0
+
+
 class EmotionalResponseGenerator(AIAgent):
     """
     最終回答に感情的なニュアンスを付加するエージェント。
+
+    回答全体をLLMで書き換えると、回答と同じ長さの生成がもう一度必要になる。そのため、感情がニュートラルか
+    強度がmin_intensity未満の場合は書き換えを行わず、rewrite_intensity未満の場合は感情に応じた定型文を前後に添えるだけにし、
+    LLMによる書き換えは感情が強い場合に限る。書き換えを省略した場合の節約時間は、実際の書き換えにかかった時間
+    (まだない場合はfallback_chars_per_secondによる推定)から見積もり、get_stats()で累計を確認できる。
     """
-    def __init__(self, llm: "OllamaLLM", output_parser: "StrOutputParser", prompt_template: ChatPromptTemplate):
+    def __init__(
+        self,
+        llm: "OllamaLLM",
+        output_parser: "StrOutputParser",
+        prompt_template: ChatPromptTemplate,
+        min_intensity: float = 0.3,
+        rewrite_intensity: float = 0.8,
+        fallback_chars_per_second: float = 30.0,
+    ):
         self.llm = llm
         self.output_parser = output_parser
         self.prompt_template = prompt_template
+        self.min_intensity = min_intensity
+        self.rewrite_intensity = rewrite_intensity
+        self.fallback_chars_per_second = fallback_chars_per_second
+        self._lock = threading.Lock()
+        # LLMによる書き換えの、回答1文字あたりの所要時間の指数移動平均
+        self._seconds_per_char: Optional[float] = None
+        self._stats: Dict[str, float] = {SKIP: 0, ADJUST: 0, REWRITE: 0, "estimated_seconds_saved": 0.0}
         super().__init__()
 
     def build_chain(self) -> Runnable:
@@ -32,10 +94,41 @@ class EmotionalResponseGenerator(AIAgent):
         """
         return self.prompt_template | self.llm | self.output_parser
 
-    def invoke(self, input_data: Dict[str, Any] | str) -> str:
-        """
-        最終回答と感情状態を受け取り、トーンを調整した応答を生成します。
-        """
+    def decide(self, affective_state: Optional[AffectiveState]) -> str:
+        """感情状態から、調整なし(skip)・定型文による調整(adjust)・LLMによる書き換え(rewrite)のいずれかを選ぶ。"""
+        if not affective_state or affective_state.is_neutral() or affective_state.intensity < self.min_intensity:
+            return SKIP
+        if affective_state.intensity < self.rewrite_intensity:
+            return ADJUST
+        return REWRITE
+
+    @staticmethod
+    def adjust(final_answer: str, emotion: Emotion) -> str:
+        """感情に応じた定型文を回答の前後に添える。"""
+        prefix, suffix = EMOTION_ADJUSTMENTS.get(emotion, ("", ""))
+        return "\n\n".join(part for part in (prefix, final_answer, suffix) if part)
+
+    def _estimate_rewrite_seconds(self, final_answer: str) -> float:
+        with self._lock:
+            seconds_per_char = self._seconds_per_char
+        if seconds_per_char is None:
+            seconds_per_char = 1.0 / self.fallback_chars_per_second
+        return len(final_answer) * seconds_per_char
+
+    def _record(self, mode: str, final_answer: str, started: float) -> Tuple[float, float]:
+        elapsed = time.perf_counter() - started
+        saved = 0.0 if mode == REWRITE else max(self._estimate_rewrite_seconds(final_answer) - elapsed, 0.0)
+        with self._lock:
+            self._stats[mode] += 1
+            self._stats["estimated_seconds_saved"] += saved
+            if mode == REWRITE and final_answer:
+                observed = elapsed / len(final_answer)
+                self._seconds_per_char = observed if self._seconds_per_char is None else 0.8 * self._seconds_per_char + 0.2 * observed
+        if mode != REWRITE:
+            logger.info(f"感情応答の書き換えを省略しました (方法: {mode}, 推定節約時間: {saved:.2f}秒)")
+        return elapsed, saved
+
+    def _prepare(self, input_data: Dict[str, Any] | str) -> Tuple[str, str, Optional[AffectiveState]]:
         if not isinstance(input_data, dict):
             raise TypeError("EmotionalResponseGenerator expects a dictionary as input.")
 
@@ -43,13 +136,48 @@ class EmotionalResponseGenerator(AIAgent):
         affective_state_val = input_data.get("affective_state")
         affective_state: Optional[AffectiveState] = affective_state_val if isinstance(affective_state_val, AffectiveState) else None
         # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↑修正終わり◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
-        
-        # 感情がニュートラルな場合は、元の回答をそのまま返す
-        if not affective_state or affective_state.is_neutral():
-            return input_data.get("final_answer", "")
-
-        if self._chain is None:
+        final_answer = input_data.get("final_answer", "")
+        mode = self.decide(affective_state)
+        if mode == REWRITE and self._chain is None:
             raise RuntimeError("EmotionalResponseGenerator's chain is not initialized.")
-            
-        result: str = self._chain.invoke(input_data)
-        return result
\ No newline at end of file
+        return final_answer, mode, affective_state
+
+    def generate(self, input_data: Dict[str, Any] | str) -> EmotionalResponse:
+        """最終回答と感情状態を受け取り、感情の強さに応じた方法でトーンを調整した応答を生成します。"""
+        started = time.perf_counter()
+        final_answer, mode, affective_state = self._prepare(input_data)
+        if mode == SKIP:
+            text = final_answer
+        elif mode == ADJUST:
+            text = self.adjust(final_answer, affective_state.emotion)
+        else:
+            text = self._chain.invoke(input_data)
+        elapsed, saved = self._record(mode, final_answer, started)
+        return EmotionalResponse(text=text, mode=mode, elapsed_seconds=elapsed, estimated_seconds_saved=saved)
+
+    async def agenerate(self, input_data: Dict[str, Any] | str) -> EmotionalResponse:
+        """generateの非同期版。LLMによる書き換えの間もイベントループを塞がない。"""
+        started = time.perf_counter()
+        final_answer, mode, affective_state = self._prepare(input_data)
+        if mode == SKIP:
+            text = final_answer
+        elif mode == ADJUST:
+            text = self.adjust(final_answer, affective_state.emotion)
+        else:
+            text = await self._chain.ainvoke(input_data)
+        elapsed, saved = self._record(mode, final_answer, started)
+        return EmotionalResponse(text=text, mode=mode, elapsed_seconds=elapsed, estimated_seconds_saved=saved)
+
+    def invoke(self, input_data: Dict[str, Any] | str) -> str:
+        """
+        最終回答と感情状態を受け取り、トーンを調整した応答を生成します。
+        """
+        return self.generate(input_data).text
+
+    async def ainvoke(self, input_data: Dict[str, Any] | str) -> str:
+        return (await self.agenerate(input_data)).text
+
+    def get_stats(self) -> Dict[str, float]:
+        """方法ごとの実行回数と、書き換えの省略による推定節約時間の累計(秒)を返す。"""
+        with self._lock:
+            return dict(self._stats)
@@ -5,7 +5,7 @@
 import logging
 import re
 import asyncio
-from typing import Any, List, Dict, Set
+from typing import Any, Awaitable, Callable, List, Dict, Optional, Set, Tuple
 
 from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
@@ -18,12 +18,14 @@ from app.agents.retrieval_evaluator_agent import RetrievalEvaluatorAgent
 from app.knowledge_graph.persistent_knowledge_graph import PersistentKnowledgeGraph
 from app.rag.retriever import Retriever
 from app.tools.tool_belt import ToolBelt
+from app.tools.base import Tool
 from app.agents.tool_using_agent import ToolUsingAgent
 from app.memory.memory_consolidator import MemoryConsolidator
 from app.conceptual_reasoning.sensory_processing_unit import SensoryProcessingUnit
 from app.conceptual_reasoning.conceptual_memory import ConceptualMemory
 from app.conceptual_reasoning.imagination_engine import ImaginationEngine
 from app.config import settings
+from app.constants import ToolNames
 # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↓修正開始◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
 from app.reasoning.symbolic_verifier import SymbolicVerifier
 from app.agents.deductive_reasoner_agent import DeductiveReasonerAgent
@@ -31,9 +33,17 @@ from app.agents.deductive_reasoner_agent import DeductiveReasonerAgent
 
 logger = logging.getLogger(__name__)
 
+RETRIEVAL_MODES = ("iterative", "fanout")
+RAG_SOURCE = "rag"
+
 class CognitiveLoopAgent(AIAgent):
     """
     情報収集、評価、改善、概念操作を反復的に行い、知識を構造化する認知ループを実行するエージェント。
+
+    情報検索の方法はretrieval_modeで選ぶ。"iterative"は検索・評価・ツール選択・クエリ改善を順に繰り返す。
+    "fanout"はRAG検索と有望な外部ツール(Web検索、Wikipedia、質問のトピックに合う専門家マイクロLLM)を最初から並行して実行し、
+    ソースごとの締め切り(source_deadlines、指定のないソースはdefault_source_deadline_seconds)までに得られた情報をまとめて一度だけ評価し、
+    不十分と評価された場合は改善したクエリでRAG検索を1回だけやり直す。
     """
     def __init__(
         self,
@@ -55,7 +65,13 @@ class CognitiveLoopAgent(AIAgent):
         symbolic_verifier: SymbolicVerifier,
         deductive_reasoner_agent: DeductiveReasonerAgent,
         # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↑修正終わり◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
+        retrieval_mode: str = "iterative",
+        max_fanout_tools: int = 3,
+        default_source_deadline_seconds: float = 10.0,
+        source_deadlines: Optional[Dict[str, float]] = None,
     ):
+        if retrieval_mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval_mode: {retrieval_mode}")
         self.llm = llm
         self.output_parser = output_parser
         self.prompt_template = prompt_template
@@ -74,6 +90,10 @@ class CognitiveLoopAgent(AIAgent):
         self.symbolic_verifier = symbolic_verifier
         self.deductive_reasoner_agent = deductive_reasoner_agent
         # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↑修正終わり◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
+        self.retrieval_mode = retrieval_mode
+        self.max_fanout_tools = max_fanout_tools
+        self.default_source_deadline_seconds = default_source_deadline_seconds
+        self.source_deadlines = source_deadlines or {}
         self.summarizer_prompt = ChatPromptTemplate.from_template(
             """以下のウェブページの内容を、ユーザーの質問に答える形で要約してください。
 
@@ -151,10 +171,21 @@ class CognitiveLoopAgent(AIAgent):
         return reasoning_trace
     # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↑修正終わり◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
 
-    async def _iterative_retrieval(self, query: str) -> str:
+    async def _retrieve(self, query: str) -> str:
+        """
+        クエリにURLが含まれている場合はそのページの内容を要約し、それ以外はretrieval_modeに応じた方法で情報を検索します。
+        """
+        url_summary = await self._summarize_url(query)
+        if url_summary is not None:
+            return url_summary
+        if self.retrieval_mode == "fanout":
+            return await self._fanout_retrieval(query)
+        return await self._iterative_retrieval(query)
+
+    async def _summarize_url(self, query: str) -> Optional[str]:
         """
-        検索、評価、クエリ改善を繰り返して情報の質を高める反復的検索を非同期で実行します。
         クエリにURLが含まれている場合、Playwrightツールを使用し、その内容を要約します。
+        URLがない場合や、ツールが利用できない場合はNoneを返します。
         """
         url_pattern = re.compile(r'https?://\S+')
         match = url_pattern.search(query)
@@ -187,7 +218,87 @@ class CognitiveLoopAgent(AIAgent):
                 return summary
             else:
                 logger.warning("DynamicWebBrowserツールが見つからないか、非同期メソッドをサポートしていません。")
-        
+        return None
+
+    def _fanout_tools(self, query: str) -> List[Tool]:
+        """
+        並行して実行する外部ツールを、Web検索、Wikipedia、質問のトピックに合う専門家マイクロLLMの順に最大max_fanout_tools個選ぶ。
+        """
+        tools: List[Tool] = [
+            tool for tool in (self.tool_belt.get_tool(ToolNames.SEARCH), self.tool_belt.get_tool("WikipediaSearch")) if tool
+        ]
+        lowered_query = query.lower()
+        for tool in self.tool_belt.get_tools():
+            topic = getattr(tool, "topic", None)
+            if topic and topic.lower() in lowered_query and tool not in tools:
+                tools.append(tool)
+        return tools[:self.max_fanout_tools]
+
+    async def _gather_source(self, name: str, fetch: Callable[[], Awaitable[str]]) -> Tuple[str, Optional[str]]:
+        """1つのソースから締め切りまでに情報を取得する。締め切りを過ぎた場合や失敗した場合はNoneを返す。"""
+        deadline = self.source_deadlines.get(name, self.default_source_deadline_seconds)
+        try:
+            return name, await asyncio.wait_for(fetch(), timeout=deadline)
+        except asyncio.TimeoutError:
+            logger.warning(f"情報源 '{name}' が締め切り({deadline}秒)までに応答しなかったため、結果を使いません。")
+        except Exception as e:
+            logger.error(f"情報源 '{name}' からの情報取得中にエラーが発生しました: {e}", exc_info=True)
+        return name, None
+
+    def _retrieve_documents(self, query: str) -> str:
+        docs: List[Document] = self.retriever.invoke(query)
+        return "\n\n".join([doc.page_content for doc in docs])
+
+    async def _fanout_retrieval(self, query: str) -> str:
+        """
+        RAG検索と外部ツールを並行して実行し、締め切りまでに集まった情報をまとめて一度だけ評価します。
+        同期的なツールは別スレッドで実行するため、締め切りを過ぎたツールの処理は結果を捨てた上でバックグラウンドで完了します。
+        """
+        def fetch_tool(tool: Tool) -> Callable[[], Awaitable[str]]:
+            if hasattr(tool, 'use_async'):
+                return lambda: tool.use_async(query)
+            return lambda: asyncio.to_thread(tool.use, query)
+
+        tools = self._fanout_tools(query)
+        logger.info(f"情報源を並行して検索します: {[RAG_SOURCE] + [tool.name for tool in tools]}")
+        results = await asyncio.gather(
+            self._gather_source(RAG_SOURCE, lambda: asyncio.to_thread(self._retrieve_documents, query)),
+            *(self._gather_source(tool.name, fetch_tool(tool)) for tool in tools),
+        )
+
+        sections = []
+        for name, result in results:
+            if not result:
+                continue
+            if name == RAG_SOURCE:
+                sections.append(result)
+            else:
+                sections.append(f"--- 外部ツール ({name}) からの情報 ---\n{result}")
+        merged_info = "\n\n".join(sections)
+
+        evaluation = await asyncio.to_thread(
+            self.retrieval_evaluator_agent.invoke, {"query": query, "retrieved_info": merged_info}
+        )
+        logger.info(f"並行検索で集めた情報の評価: {evaluation}")
+        if evaluation.get("relevance_score", 0) > 8 and evaluation.get("completeness_score", 0) > 8:
+            return merged_info
+
+        # 情報が不十分な場合は、評価をもとに改善したクエリでRAG検索を1回だけやり直して補う
+        logger.info("並行検索で集めた情報が不十分なため、クエリを改善して再検索します。")
+        refined_query = await asyncio.to_thread(
+            self.query_refinement_agent.invoke,
+            {"query": query, "evaluation_summary": evaluation.get("summary", ""), "suggestions": evaluation.get("suggestions", "")},
+        )
+        logger.info(f"改善されたクエリ: '{refined_query}'")
+        _, refined_info = await self._gather_source(RAG_SOURCE, lambda: asyncio.to_thread(self._retrieve_documents, refined_query))
+        if refined_info:
+            merged_info = "\n\n".join(part for part in (merged_info, refined_info) if part)
+        return merged_info
+
+    async def _iterative_retrieval(self, query: str) -> str:
+        """
+        検索、評価、クエリ改善を繰り返して情報の質を高める反復的検索を非同期で実行します。
+        """
         max_iterations = settings.PIPELINE_SETTINGS["cognitive_loop"]["max_iterations"]
         current_query = query
         final_info = ""
@@ -322,7 +433,7 @@ class CognitiveLoopAgent(AIAgent):
                 final_retrieved_info = "概念操作を実行しましたが、有効な結果が得られませんでした。"
         else:
             # 通常の情報検索ループ
-            final_retrieved_info = await self._iterative_retrieval(query)
+            final_retrieved_info = await self._retrieve(query)
         # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↑修正終わり◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
         
         knowledge_graph_summary = "知識グラフの生成に失敗しました。"
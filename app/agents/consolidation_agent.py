@@ -5,7 +5,8 @@
 import os
 import json
 import logging
-from typing import Any, List, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Dict, Optional, Tuple
 
 from langchain_core.documents import Document
 from langchain_core.prompts import ChatPromptTemplate
@@ -15,6 +16,7 @@ from app.agents.base import AIAgent
 from app.agents.knowledge_graph_agent import KnowledgeGraphAgent
 from app.knowledge_graph.persistent_knowledge_graph import PersistentKnowledgeGraph
 from app.memory.memory_consolidator import MemoryConsolidator
+from app.memory.consolidation_manifest import ConsolidationManifest
 from app.rag.knowledge_base import KnowledgeBase
 from app.knowledge_graph.models import KnowledgeGraph
 from app.prompts.manager import PromptManager
@@ -35,6 +37,10 @@ class ConsolidationAgent(AIAgent):
         memory_consolidator: MemoryConsolidator,
         persistent_knowledge_graph: PersistentKnowledgeGraph,
         prompt_manager: PromptManager,
+        session_manifest: Optional[ConsolidationManifest] = None,
+        max_sessions_per_cycle: int = 32,
+        max_concurrency: int = 4,
+        max_batch_chars: int = 6000,
     ):
         self.llm = llm
         self.output_parser = output_parser
@@ -43,7 +49,12 @@ class ConsolidationAgent(AIAgent):
         self.knowledge_graph_agent = knowledge_graph_agent
         self.memory_consolidator = memory_consolidator
         self.persistent_knowledge_graph = persistent_knowledge_graph
-        self.processed_sessions_log = "memory/processed_sessions.log"
+        self.session_manifest = session_manifest or ConsolidationManifest(legacy_log_path="memory/processed_sessions.log")
+        self.worker_id = f"{os.getpid()}-{id(self):x}"
+        self._session_dir_imported = False
+        self.max_sessions_per_cycle = max_sessions_per_cycle
+        self.max_concurrency = max_concurrency
+        self.max_batch_chars = max_batch_chars
         self.wisdom_synthesis_chain = prompt_manager.get_prompt("WISDOM_SYNTHESIS_PROMPT") | self.llm | self.output_parser
         super().__init__()
 
@@ -53,103 +64,170 @@ class ConsolidationAgent(AIAgent):
         """
         return self.prompt_template | self.llm | self.output_parser
 
-    def _get_unprocessed_sessions(self) -> List[str]:
+    def _claim_unprocessed_sessions(self) -> List[str]:
         """
-        未処理のワーキングメモリセッションファイルのリストを取得します。
+        未処理のワーキングメモリセッションを最大max_sessions_per_cycle件、マニフェストから取得します。
+        初回だけ、マニフェストに登録されていないセッションファイルをディレクトリから取り込みます。
         """
-        session_dir = self.memory_consolidator.working_memory_log_dir
-        if not os.path.exists(session_dir):
-            return []
-            
-        processed_sessions = set()
-        if os.path.exists(self.processed_sessions_log):
-            with open(self.processed_sessions_log, "r", encoding="utf-8") as f:
-                processed_sessions = set(line.strip() for line in f)
+        if not self._session_dir_imported:
+            self.session_manifest.import_directory(self.memory_consolidator.working_memory_log_dir)
+            self._session_dir_imported = True
+        claimed = self.session_manifest.claim(self.max_sessions_per_cycle, self.worker_id)
+        logger.info(f"{len(claimed)}件の未処理セッションを取得しました。")
+        return claimed
+
+    def _finish_sessions(self, session_files: List[str]) -> None:
+        """
+        統合が完了したセッションをマニフェストに記録し、セッションファイルを削除します。
+        """
+        if not session_files:
+            return
+        self.session_manifest.mark_done(session_files)
+        for session_file in session_files:
+            session_path = os.path.join(self.memory_consolidator.working_memory_log_dir, session_file)
+            if os.path.exists(session_path):
+                os.remove(session_path)
+
+    def _load_session(self, session_file: str) -> Optional[Dict[str, Any]]:
+        session_path = os.path.join(self.memory_consolidator.working_memory_log_dir, session_file)
+        try:
+            with open(session_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (IOError, json.JSONDecodeError) as e:
+            logger.error(f"セッションファイル {session_path} の読み込みに失敗しました: {e}")
+            return None
 
-        all_sessions = set(f for f in os.listdir(session_dir) if f.endswith(".json"))
-        unprocessed = list(all_sessions - processed_sessions)
-        logger.info(f"{len(unprocessed)}件の未処理セッションが見つかりました。")
-        return unprocessed
+    def _build_batches(self, sessions: List[Tuple[str, Dict[str, Any]]]) -> List[List[Tuple[str, Dict[str, Any]]]]:
+        """
+        複数セッションの予測誤差を、直列化した長さがmax_batch_charsに収まる範囲で1回のLLM呼び出しにまとめます。
+        単独で上限を超えるセッションはそれだけで1つのバッチとします。
+        """
+        batches: List[List[Tuple[str, Dict[str, Any]]]] = []
+        current: List[Tuple[str, Dict[str, Any]]] = []
+        current_chars = 0
+        for session_file, session_data in sessions:
+            size = len(json.dumps(session_data.get("prediction_errors", []), ensure_ascii=False))
+            if current and current_chars + size > self.max_batch_chars:
+                batches.append(current)
+                current, current_chars = [], 0
+            current.append((session_file, session_data))
+            current_chars += size
+        if current:
+            batches.append(current)
+        return batches
 
-    def _mark_session_as_processed(self, session_file: str) -> None:
+    def _synthesize_batch(self, batch: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, Any]:
         """
-        処理済みのセッションをログに記録します。
+        バッチ内の全セッションの予測誤差から知識を統合し、知識グラフを生成します。永続化は行いません。
         """
-        os.makedirs(os.path.dirname(self.processed_sessions_log), exist_ok=True)
-        with open(self.processed_sessions_log, "a", encoding="utf-8") as f:
-            f.write(session_file + "\n")
+        session_ids = [session_data.get("session_id", "unknown_session") for _, session_data in batch]
+        logger.info(f"セッション {', '.join(session_ids)} の内容を統合中...")
+        prediction_errors = [error for _, session_data in batch for error in session_data.get("prediction_errors", [])]
+        synthesized_knowledge = self.invoke({"prediction_errors": json.dumps(prediction_errors, ensure_ascii=False, indent=2)})
+
+        knowledge_graph = None
+        if synthesized_knowledge and synthesized_knowledge.strip():
+            logger.info("統合された知識から知識グラフを生成しています...")
+            knowledge_graph = self.knowledge_graph_agent.invoke({"text_chunk": synthesized_knowledge})
+        return {
+            "session_files": [session_file for session_file, _ in batch],
+            "session_ids": session_ids,
+            "synthesized_knowledge": synthesized_knowledge,
+            "knowledge_graph": knowledge_graph,
+        }
 
     def run_consolidation_cycle(self) -> None:
         """
         記憶の統合サイクルを1回実行します。
+        未処理のセッションを最大max_sessions_per_cycle件取り出し、予測誤差をバッチにまとめて最大max_concurrency件ずつ並行に統合します。
+        生成された知識グラフとドキュメントは、サイクルの最後に1回の保存・追加でまとめて永続化します。
         """
         logger.info("--- 記憶統合サイクル開始 (オフライン) ---")
-        unprocessed_files = self._get_unprocessed_sessions()
+        unprocessed_files = self._claim_unprocessed_sessions()
 
         if not unprocessed_files:
             logger.info("統合すべき新しいセッション記憶はありません。")
             logger.info("--- 記憶統合サイクル完了 ---")
             return
 
-        session_file = unprocessed_files[0]
-        session_path = os.path.join(self.memory_consolidator.working_memory_log_dir, session_file)
-        
-        try:
-            with open(session_path, "r", encoding="utf-8") as f:
-                session_data = json.load(f)
-        except (IOError, json.JSONDecodeError) as e:
-            logger.error(f"セッションファイル {session_path} の読み込みに失敗しました: {e}")
-            self._mark_session_as_processed(session_file)
-            return
+        finished_files: List[str] = []
+        sessions: List[Tuple[str, Dict[str, Any]]] = []
+        for session_file in unprocessed_files:
+            session_data = self._load_session(session_file)
+            if session_data is None:
+                self.session_manifest.mark_failed([session_file], "セッションファイルを読み込めません", retry=False)
+            elif not session_data.get("prediction_errors"):
+                logger.warning(f"セッション {session_file} に統合すべき予測誤差がありません。")
+                finished_files.append(session_file)
+            else:
+                sessions.append((session_file, session_data))
 
-        session_id = session_data.get('session_id', 'unknown_session')
-        logger.info(f"セッション {session_id} の内容を統合中...")
-        prediction_errors_str = json.dumps(session_data.get("prediction_errors", []), ensure_ascii=False, indent=2)
-        
-        if not prediction_errors_str or prediction_errors_str == '[]':
-            logger.warning("セッションに統合すべき予測誤差がありません。")
-            self._mark_session_as_processed(session_file)
-            os.remove(session_path)
-            return
+        batches = self._build_batches(sessions)
+        results: List[Dict[str, Any]] = []
+        if batches:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(batches))) as executor:
+                futures = [executor.submit(self._synthesize_batch, batch) for batch in batches]
+                for batch, future in zip(batches, futures):
+                    try:
+                        results.append(future.result())
+                    except Exception as e:
+                        # 失敗したバッチのセッションは、試行回数の上限まで次回以降のサイクルで再試行する
+                        logger.error(f"セッション {[f for f, _ in batch]} の統合中にエラーが発生しました: {e}", exc_info=True)
+                        self.session_manifest.mark_failed([f for f, _ in batch], str(e))
 
-        synthesis_input = {"prediction_errors": prediction_errors_str}
-        synthesized_knowledge = self.invoke(synthesis_input)
-        
-        if not synthesized_knowledge or not synthesized_knowledge.strip():
-            logger.warning("統合の結果、新しい知識は生成されませんでした。")
-            self._mark_session_as_processed(session_file)
-            os.remove(session_path)
-            return
+        merged_graphs = 0
+        new_documents: List[Document] = []
+        for result in results:
+            synthesized_knowledge = result["synthesized_knowledge"]
+            if not synthesized_knowledge or not synthesized_knowledge.strip():
+                logger.warning("統合の結果、新しい知識は生成されませんでした。")
+                finished_files.extend(result["session_files"])
+                continue
 
-        logger.info("統合された知識から知識グラフを生成しています...")
-        kg_input = {"text_chunk": synthesized_knowledge}
-        new_knowledge_graph = self.knowledge_graph_agent.invoke(kg_input)
-        
-        if isinstance(new_knowledge_graph, KnowledgeGraph):
-            self.persistent_knowledge_graph.merge(new_knowledge_graph)
-            self.persistent_knowledge_graph.save()
-            kg_string = new_knowledge_graph.to_string()
-        else:
-            kg_string = "知識グラフの生成に失敗しました。"
-            logger.error(f"KnowledgeGraphAgent did not return a KnowledgeGraph object, but {type(new_knowledge_graph)}")
+            knowledge_graph = result["knowledge_graph"]
+            if isinstance(knowledge_graph, KnowledgeGraph):
+                try:
+                    self.persistent_knowledge_graph.merge(knowledge_graph)
+                except Exception as e:
+                    # マージは全体が反映されるか何も反映されないかのどちらかなので、再試行しても重みは二重に加算されない
+                    logger.error(f"セッション {result['session_files']} の知識グラフのマージに失敗しました: {e}", exc_info=True)
+                    self.session_manifest.mark_failed(result["session_files"], str(e))
+                    continue
+                merged_graphs += 1
+                kg_string = knowledge_graph.to_string()
+            else:
+                kg_string = "知識グラフの生成に失敗しました。"
+                logger.error(f"KnowledgeGraphAgent did not return a KnowledgeGraph object, but {type(knowledge_graph)}")
+            finished_files.extend(result["session_files"])
 
+            source = ",".join(result["session_ids"])
+            new_documents.extend(
+                Document(page_content=fact, metadata={"source": f"consolidated_from_{source}"})
+                for fact in synthesized_knowledge.strip().split('\n') if fact.strip()
+            )
+            self.memory_consolidator.log_autonomous_thought(
+                topic=f"consolidation_of_{source}",
+                synthesized_knowledge=f"【統合された知識】\n{synthesized_knowledge}\n\n【生成された知識グラフ】\n{kg_string}"
+            )
 
-        new_documents = [
-            Document(page_content=fact, metadata={"source": f"consolidated_from_{session_id}"}) 
-            for fact in synthesized_knowledge.strip().split('\n') if fact.strip()
-        ]
-        if new_documents:
-            self.knowledge_base.add_documents(new_documents)
-            logger.info(f"{len(new_documents)}個の新しいドキュメントをFAISSナレッジベースに追加しました。")
+        if merged_graphs:
+            try:
+                self.persistent_knowledge_graph.save()
+            except Exception as e:
+                # マージ済みの内容はメモリ上のグラフに残り、次回の保存で永続化される
+                logger.error(f"知識グラフの保存に失敗しました: {e}", exc_info=True)
 
-        self.memory_consolidator.log_autonomous_thought(
-            topic=f"consolidation_of_{session_id}",
-            synthesized_knowledge=f"【統合された知識】\n{synthesized_knowledge}\n\n【生成された知識グラフ】\n{kg_string}"
-        )
+        # マージを反映したセッションはここで完了とする。以降の失敗で再処理すると、エッジの重みが二重に加算されるため
+        self._finish_sessions(finished_files)
+        if new_documents:
+            try:
+                self.knowledge_base.add_documents(new_documents)
+                logger.info(f"{len(new_documents)}個の新しいドキュメントをFAISSナレッジベースに追加しました。")
+            except Exception as e:
+                logger.error(f"統合した知識のナレッジベースへの追加に失敗しました: {e}", exc_info=True)
 
-        self._mark_session_as_processed(session_file)
-        os.remove(session_path)
-        logger.info(f"セッション {session_file} の統合が完了し、ファイルが削除されました。")
+        self.session_manifest.prune_done()
+        logger.info(f"{len(finished_files)}件のセッションの統合が完了し、ファイルが削除されました ({len(batches)}バッチ)。")
         logger.info("--- 記憶統合サイクル完了 ---")
 
     def synthesize_deep_wisdom(self) -> None: # New method
@@ -157,7 +235,7 @@ class ConsolidationAgent(AIAgent):
         長期知識グラフ全体からより深い知恵を合成し、ログに記録する。
         """
         logger.info("--- 知恵合成サイクル開始 (オフライン) ---")
-        graph_summary = self.persistent_knowledge_graph.get_graph().to_string()
+        graph_summary = self.persistent_knowledge_graph.get_graph_string()
         
         if "知識グラフは空です" in graph_summary:
             logger.info("知識グラフが空のため、知恵合成をスキップします。")
@@ -180,6 +258,30 @@ class ConsolidationAgent(AIAgent):
         
         logger.info("--- 知恵合成サイクル完了 ---")
 
+    def run_graph_compaction(self) -> None:
+        """
+        長期知識グラフ全体の重複エンティティを統合し、結果を保存する。
+        """
+        logger.info("--- 知識グラフ・コンパクション開始 (オフライン) ---")
+        removed = self.persistent_knowledge_graph.compact()
+        if removed:
+            self.persistent_knowledge_graph.save()
+            self.memory_consolidator.log_event("knowledge_graph_compacted", {"merged_nodes": removed})
+        else:
+            logger.info("統合すべき重複エンティティはありませんでした。")
+        logger.info("--- 知識グラフ・コンパクション完了 ---")
+
+    def run_graph_maintenance(self) -> None:
+        """
+        長期知識グラフのエッジ重みを減衰させ、サイズ上限を超えた低頻度アクセスの知識を退避して保存する。
+        """
+        logger.info("--- 知識グラフ・メンテナンス開始 (オフライン) ---")
+        stats = self.persistent_knowledge_graph.run_maintenance()
+        self.persistent_knowledge_graph.save()
+        if stats["evicted_nodes"] or stats["evicted_edges"]:
+            self.memory_consolidator.log_event("knowledge_graph_evicted", stats)
+        logger.info("--- 知識グラフ・メンテナンス完了 ---")
+
     def invoke(self, input_data: Dict[str, Any] | str) -> str:
         if not isinstance(input_data, dict):
             raise TypeError("ConsolidationAgent expects a dictionary as input.")
@@ -11,6 +11,7 @@ from langchain_core.output_parsers import JsonOutputParser
 
 from app.agents.base import AIAgent
 from app.memory.memory_consolidator import MemoryConsolidator
+from app.memory.episodic_memory import EpisodicMemory
 from app.knowledge_graph.persistent_knowledge_graph import PersistentKnowledgeGraph
 
 logger = logging.getLogger(__name__)
@@ -25,13 +26,15 @@ class KnowledgeGapAnalyzerAgent(AIAgent):
         output_parser: JsonOutputParser,
         prompt_template: ChatPromptTemplate,
         memory_consolidator: MemoryConsolidator,
-        knowledge_graph: PersistentKnowledgeGraph
+        knowledge_graph: PersistentKnowledgeGraph,
+        episodic_memory: Optional[EpisodicMemory] = None,
     ):
         self.llm = llm
         self.output_parser = output_parser
         self.prompt_template = prompt_template
         self.memory_consolidator = memory_consolidator
         self.knowledge_graph = knowledge_graph
+        self.episodic_memory = episodic_memory
         super().__init__()
 
     def build_chain(self) -> Runnable:
@@ -40,6 +43,24 @@ class KnowledgeGapAnalyzerAgent(AIAgent):
         """
         return self.prompt_template | self.llm | self.output_parser
 
+    def _get_recent_query_clusters(self) -> List[str]:
+        """
+        エピソード記憶がある場合は、最近の質問を埋め込みでクラスタリングし、各クラスタの代表的な質問を件数の多い順に返す。
+        ない場合は、記憶ログの最近のイベントから質問を取り出す。
+        """
+        if self.episodic_memory:
+            clusters = self.episodic_memory.cluster("interaction", limit=200, num_clusters=8)
+            if clusters:
+                return [
+                    f"{cluster['representative'].get('query', '')} (類似の質問 {cluster['size']}件)"
+                    for cluster in clusters
+                ]
+        recent_interactions = self.memory_consolidator.get_recent_events(limit=20)
+        return [
+            event["query"] for event in recent_interactions
+            if "type" in event and event["type"] == "interaction" and "query" in event
+        ]
+
     def analyze_for_gaps(self) -> Optional[str]:
         """
         知識のギャップを分析し、強化すべきトピックを一つ返す。
@@ -50,11 +71,7 @@ class KnowledgeGapAnalyzerAgent(AIAgent):
         logger.info("知識ギャップの分析を開始します...")
 
         # 1. 最近の対話履歴からクエリを取得
-        recent_interactions = self.memory_consolidator.get_recent_events(limit=20)
-        recent_queries = [
-            event["query"] for event in recent_interactions
-            if "type" in event and event["type"] == "interaction" and "query" in event
-        ]
+        recent_queries = self._get_recent_query_clusters()
 
         if not recent_queries:
             logger.info("分析対象の対話履歴がありません。")
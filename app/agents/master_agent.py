@@ -2,7 +2,7 @@
 # path: app/agents/master_agent.py
 
 import logging
-from typing import Any, Dict, List, TYPE_CHECKING
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
 import asyncio
 
 from langchain_core.prompts import ChatPromptTemplate
@@ -11,7 +11,8 @@ from langchain_core.runnables import Runnable
 from app.agents.base import AIAgent
 from app.memory.memory_consolidator import MemoryConsolidator
 from app.cognitive_modeling.predictive_coding_engine import PredictiveCodingEngine
-from app.memory.working_memory import WorkingMemory
+from app.memory.session_store import SessionStore, current_session_id
+from app.memory.episodic_memory import EpisodicMemory
 from app.affective_system.affective_engine import AffectiveEngine
 from app.affective_system.emotional_response_generator import EmotionalResponseGenerator
 
@@ -37,12 +38,13 @@ class MasterAgent(AIAgent):
         memory_consolidator: MemoryConsolidator,
         ethical_motivation_engine: 'EthicalMotivationEngine',
         predictive_coding_engine: PredictiveCodingEngine,
-        working_memory: WorkingMemory,
+        session_store: SessionStore,
         value_evaluator: 'ValueEvaluator',
         orchestration_agent: 'OrchestrationAgent',
         affective_engine: AffectiveEngine,
         emotional_response_generator: EmotionalResponseGenerator,
         analytics_collector: 'AnalyticsCollector',
+        episodic_memory: Optional[EpisodicMemory] = None,
     ):
         self.llm = llm
         self.output_parser = output_parser
@@ -50,13 +52,13 @@ class MasterAgent(AIAgent):
         self.memory_consolidator = memory_consolidator
         self.ethical_motivation_engine = ethical_motivation_engine
         self.predictive_coding_engine = predictive_coding_engine
-        self.working_memory = working_memory
-        self.dialogue_history: List[str] = []
+        self.session_store = session_store
         self.value_evaluator = value_evaluator
         self.orchestration_agent = orchestration_agent
         self.affective_engine = affective_engine
         self.emotional_response_generator = emotional_response_generator
         self.analytics_collector = analytics_collector
+        self.episodic_memory = episodic_memory
         super().__init__()
 
     def build_chain(self) -> Runnable:
@@ -90,7 +92,7 @@ class MasterAgent(AIAgent):
         if not physical_insights:
             physical_insights = "特筆すべき物理シミュレーションからの洞察はありません。"
 
-        recent_autonomous_thoughts_logs = self.memory_consolidator.get_recent_insights("autonomous_thought", limit=1)
+        recent_autonomous_thoughts_logs = await self._get_relevant_autonomous_thoughts(query)
         recent_autonomous_thoughts = "\n".join([log.get("synthesized_knowledge", "") for log in recent_autonomous_thoughts_logs])
         if not recent_autonomous_thoughts:
             recent_autonomous_thoughts = "特筆すべき自律学習からの洞察はありません。"
@@ -122,33 +124,49 @@ class MasterAgent(AIAgent):
             "intensity": affective_state.intensity,
             "reason": affective_state.reason
         }
-        final_answer_with_emotion = self.emotional_response_generator.invoke(emotional_response_input)
+        emotional_response = await self.emotional_response_generator.agenerate(emotional_response_input)
+        await self.analytics_collector.log_event("emotional_response", emotional_response.model_dump(exclude={"text"}))
 
-        return final_answer_with_emotion
+        return emotional_response.text
 
-    async def run_internal_maintenance_async(self, query: str, final_answer: str):
+    async def _get_relevant_autonomous_thoughts(self, query: str) -> List[Dict[str, Any]]:
+        """
+        エピソード記憶から質問に類似した自律思考を時間予算内で検索する。
+        エピソード記憶がない場合や該当するものがない場合は、最近の自律学習の洞察を使う。
+        """
+        if self.episodic_memory:
+            episodes = await self.episodic_memory.asearch(query, k=1, types=["autonomous_thought"])
+            if episodes:
+                return [episode["record"] for episode in episodes]
+        return self.memory_consolidator.get_recent_insights("autonomous_thought", limit=1)
+
+    async def run_internal_maintenance_async(self, query: str, final_answer: str, session_id: Optional[str] = None):
         """
         応答生成後に実行される、AIの内部状態を維持するための非同期バックグラウンドプロセス。
+        session_idを省略した場合は、リクエストの処理中に設定されたセッションを対象とする。
         """
         logger.info("--- AIの内部メンテナンス（ホメオスタシス）プロセスを開始 ---")
+        session_id = session_id or current_session_id.get()
         try:
             # 倫理的動機付けの評価
             motivation = await self.ethical_motivation_engine.assess_and_generate_motivation(final_answer)
             logger.info(f"倫理的動機付け: {motivation}")
 
-            # 予測符号化による学習
-            prediction_error = self.predictive_coding_engine.process_input(query, self.dialogue_history)
+            # 予測符号化による学習（予測誤差はセッションのワーキングメモリに格納される）
+            # 処理の途中でセッションが退避されると予測誤差が失われるため、終わるまで退避させない
+            with self.session_store.pinned(session_id) as session:
+                prediction_error = self.predictive_coding_engine.process_input(
+                    query, session.context_lines(), working_memory=session.working_memory
+                )
             if prediction_error:
                 logger.info(f"予測誤差が検出されました: {prediction_error}")
-                self.working_memory.add_prediction_error(prediction_error)
 
             # 価値観の評価と更新
             await self.value_evaluator.assess_and_update_values(final_answer)
 
             # 対話履歴の記録
             self.memory_consolidator.log_interaction(query, final_answer)
-            self.dialogue_history.append(f"User: {query}")
-            self.dialogue_history.append(f"AI: {final_answer}")
+            self.session_store.record_turn(session_id, query, final_answer)
             logger.info("--- AIの内部メンテナンスプロセスが完了 ---")
         except Exception as e:
             logger.error(f"内部メンテナンスプロセス中にエラーが発生しました: {e}", exc_info=True)
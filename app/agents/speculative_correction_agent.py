@@ -32,4 +32,14 @@ class SpeculativeCorrectionAgent(AIAgent):
             raise RuntimeError("SpeculativeCorrectionAgent's chain is not initialized.")
         
         result: str = self._chain.invoke(input_data)
+        return result
+
+    async def ainvoke(self, input_data: Dict[str, Any]) -> str:
+        if not isinstance(input_data, dict):
+            raise TypeError("SpeculativeCorrectionAgent expects a dictionary as input.")
+
+        if self._chain is None:
+            raise RuntimeError("SpeculativeCorrectionAgent's chain is not initialized.")
+
+        result: str = await self._chain.ainvoke(input_data)
         return result
\ No newline at end of file
@@ -1,22 +1,38 @@
 # /app/agents/thought_evaluator_agent.py
 # title: 思考評価AIエージェント
-# role: Tree of Thoughtsの各思考ステップの有望性を評価し、探索をガイドするためのスコアを生成する。
+# role: Tree of Thoughtsの各思考ステップの有望性を評価し、探索をガイドするためのスコアを生成する。複数の候補を1回の呼び出しでまとめて評価することもできる。
 
+import asyncio
+import logging
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import Runnable
 from langchain_core.output_parsers import JsonOutputParser
-from typing import Any, Dict
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple, TypeVar
 
 from app.agents.base import AIAgent
 
+logger = logging.getLogger(__name__)
+
+_T = TypeVar("_T")
+
 class ThoughtEvaluatorAgent(AIAgent):
     """
     思考の有望性を評価するAIエージェント。
+    listwise_prompt_templateを指定した場合、aevaluate_batch()は複数の候補を1回のLLM呼び出しで比較して採点する。
     """
-    def __init__(self, llm: Any, output_parser: JsonOutputParser, prompt_template: ChatPromptTemplate):
+    def __init__(
+        self,
+        llm: Any,
+        output_parser: JsonOutputParser,
+        prompt_template: ChatPromptTemplate,
+        listwise_prompt_template: Optional[ChatPromptTemplate] = None,
+    ):
         self.llm = llm
         self.output_parser = output_parser
         self.prompt_template = prompt_template
+        self.listwise_chain: Optional[Runnable] = (
+            listwise_prompt_template | self.llm | self.output_parser if listwise_prompt_template is not None else None
+        )
         super().__init__()
 
     def build_chain(self) -> Runnable:
@@ -36,4 +52,88 @@ class ThoughtEvaluatorAgent(AIAgent):
             raise RuntimeError("ThoughtEvaluatorAgent's chain is not initialized.")
         
         result: Dict[str, Any] = self._chain.invoke(input_data)
-        return result
\ No newline at end of file
+        return result
+
+    async def ainvoke(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        if not isinstance(input_data, dict):
+            raise TypeError("ThoughtEvaluatorAgent expects a dictionary as input.")
+
+        if self._chain is None:
+            raise RuntimeError("ThoughtEvaluatorAgent's chain is not initialized.")
+
+        result: Dict[str, Any] = await self._chain.ainvoke(input_data)
+        return result
+
+    @staticmethod
+    def _parse_listwise(result: Any, count: int) -> Optional[List[float]]:
+        """一括評価の結果から、候補の番号順のスコアを取り出す。候補の一部でも欠けていればNoneを返す。"""
+        evaluations = result.get("evaluations") if isinstance(result, dict) else None
+        if not isinstance(evaluations, list):
+            return None
+        scores: Dict[int, float] = {}
+        for position, evaluation in enumerate(evaluations, start=1):
+            if not isinstance(evaluation, dict):
+                continue
+            try:
+                scores[int(evaluation.get("index", position))] = float(evaluation.get("score", 0.0))
+            except (TypeError, ValueError):
+                continue
+        if any(index not in scores for index in range(1, count + 1)):
+            return None
+        return [scores[index] for index in range(1, count + 1)]
+
+    @staticmethod
+    async def _call(
+        semaphore: Optional[asyncio.Semaphore], call: Callable[[], Awaitable[_T]], on_call: Optional[Callable[[], None]] = None,
+    ) -> _T:
+        async def run() -> _T:
+            try:
+                return await call()
+            finally:
+                # 失敗や取り消しで終わった呼び出しも、行った呼び出しとして数える
+                if on_call is not None:
+                    on_call()
+
+        if semaphore is None:
+            return await run()
+        async with semaphore:
+            return await run()
+
+    async def aevaluate_batch(
+        self, query: str, thought_paths: List[str], semaphore: Optional[asyncio.Semaphore] = None,
+    ) -> List[float]:
+        """
+        複数の思考の経路を評価し、入力と同じ順のスコアのリストを返します。
+        一括評価のプロンプトがない場合や、一括評価の結果が候補と対応しない場合は、候補ごとに評価します。
+        semaphoreを指定した場合は、LLMの呼び出しを1回ずつその枠の中で行います(候補ごとの評価も同時実行数の上限を守ります)。
+        """
+        scores, _ = await self.aevaluate_batch_with_calls(query, thought_paths, semaphore)
+        return scores
+
+    async def aevaluate_batch_with_calls(
+        self, query: str, thought_paths: List[str], semaphore: Optional[asyncio.Semaphore] = None,
+        on_call: Optional[Callable[[], None]] = None,
+    ) -> Tuple[List[float], int]:
+        """
+        aevaluate_batch()と同じ評価を行い、スコアのリストと実際に行ったLLMの呼び出し回数を返します。
+        on_callを指定した場合は、LLMの呼び出しが1回終わるごとに呼び出します(評価の途中で取り消されても、それまでの呼び出しを数えられます)。
+        """
+        if not thought_paths:
+            return [], 0
+        calls = 0
+        if self.listwise_chain is not None and len(thought_paths) > 1:
+            listwise_chain = self.listwise_chain
+            candidates = "\n\n".join(f"候補{i}:\n{path}" for i, path in enumerate(thought_paths, start=1))
+            calls += 1
+            try:
+                result = await self._call(semaphore, lambda: listwise_chain.ainvoke({"query": query, "candidates": candidates}), on_call)
+                scores = self._parse_listwise(result, len(thought_paths))
+                if scores is not None:
+                    return scores, calls
+                logger.warning("一括評価の結果が候補と対応しないため、候補ごとに評価します。")
+            except Exception as e:
+                logger.warning(f"一括評価に失敗したため、候補ごとに評価します: {e}")
+        evaluations = await asyncio.gather(*(
+            self._call(semaphore, lambda path=path: self.ainvoke({"query": query, "thought_path": path}), on_call) for path in thought_paths
+        ))
+        return [float(evaluation.get("score", 0.0)) for evaluation in evaluations], calls + len(thought_paths)
@@ -2,8 +2,11 @@
 # title: Tree of Thoughts (ToT) AIエージェント
 # role: 思考の木を生成、拡張、探索し、複雑な問題に対する最適な解決策を見つけ出す。
 
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional
+import math
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import Runnable
@@ -12,23 +15,52 @@ from langchain_core.output_parsers import StrOutputParser
 from app.agents.base import AIAgent
 from app.agents.thought_evaluator_agent import ThoughtEvaluatorAgent
 from app.reasoning.thought import Thought
+from app.reasoning.tot_search import BeamSearch, EmbedFunction, SearchBudget, SearchStrategy, TranspositionTable
 
 logger = logging.getLogger(__name__)
 
+_T = TypeVar("_T")
+
+
+@dataclass
+class SearchOutcome:
+    """探索の結果。bestは生成された思考のうち最もスコアの高いもの(なければNone)で、llm_callsは生成と評価で実際に行った呼び出し回数の合計。"""
+    best: Optional[Thought]
+    strategy: str
+    stop_reason: str
+    llm_calls: int
+    elapsed_seconds: float
+    thoughts: int
+    merged_duplicates: int
+
+
 class TreeOfThoughtsAgent(AIAgent):
     """
     思考の木を構築し、探索するエージェント。
+
+    次のステップの生成と候補の評価はLLMを非同期に呼び出し、同時に実行する呼び出しの数をmax_concurrencyに制限する。
+    候補の評価はevaluation_batch_size個ずつまとめて1回の呼び出しで採点する。
+    木の育て方は探索戦略(app.reasoning.tot_search)に任せ、生成された思考のうち既出の思考と重複するもの
+    (embed_fnを指定した場合は埋め込みの類似度がduplicate_similarity_threshold以上のものを含む)は評価せずに捨てる。
     """
     def __init__(
         self,
         llm: Any,
         thought_evaluator: ThoughtEvaluatorAgent,
         prompt_template: ChatPromptTemplate,
+        max_concurrency: int = 4,
+        evaluation_batch_size: int = 4,
+        embed_fn: Optional[EmbedFunction] = None,
+        duplicate_similarity_threshold: float = 0.95,
     ):
         self.llm = llm
         self.output_parser = StrOutputParser()
         self.prompt_template = prompt_template
         self.thought_evaluator = thought_evaluator
+        self.max_concurrency = max_concurrency
+        self.evaluation_batch_size = evaluation_batch_size
+        self.embed_fn = embed_fn
+        self.duplicate_similarity_threshold = duplicate_similarity_threshold
         super().__init__()
 
     def build_chain(self) -> Runnable:
@@ -46,71 +78,146 @@ class TreeOfThoughtsAgent(AIAgent):
         ]
         return initial_thoughts
 
-    def _generate_next_steps(self, thought: Thought, n: int) -> List[str]:
-        """ある思考から、次のステップの候補をn個生成する。"""
+    async def _bounded(self, semaphore: asyncio.Semaphore, call: Callable[[], Awaitable[_T]], budget: SearchBudget) -> _T:
+        """同時実行数の枠の中で呼び出しを行い、終わった時点で(失敗や取り消しでも)予算に計上する。"""
+        async with semaphore:
+            try:
+                return await call()
+            finally:
+                budget.charge(1)
+
+    async def _generate_next_steps(self, thought: Thought, n: int, semaphore: asyncio.Semaphore, budget: SearchBudget) -> List[str]:
+        """ある思考から、次のステップの候補をn個並行して生成する。"""
+        if self._chain is None:
+            raise RuntimeError("TreeOfThoughtsAgent's chain is not initialized.")
+        chain = self._chain
         # この実装では簡略化のため、同じプロンプトを複数回実行する
-        next_steps = [
-            self.invoke({"query": "", "context": f"現在の思考: '{thought.state}'\nこの思考を発展させる次のステップを考えてください。"})
-            for _ in range(n)
-        ]
-        return next_steps
+        input_data = {"query": "", "context": f"現在の思考: '{thought.state}'\nこの思考を発展させる次のステップを考えてください。"}
+        return list(await asyncio.gather(*(self._bounded(semaphore, lambda: chain.ainvoke(input_data), budget) for _ in range(n))))
+
+    @staticmethod
+    def _thought_path(thought: Thought) -> str:
+        if thought.parent:
+            return f"親の思考: {thought.parent.state}\n現在の思考: {thought.state}"
+        return f"初期思考: {thought.state}"
+
+    async def _evaluate_thoughts(self, query: str, thoughts: List[Thought], semaphore: asyncio.Semaphore, budget: SearchBudget) -> None:
+        """
+        思考のリストをevaluation_batch_size個ずつまとめて並行して評価し、各思考のスコアを更新する。
+        評価の呼び出しは終わるごとに予算に計上する(候補ごとの評価に切り替えたバッチは一括評価の1回と候補の数の合計になる)。
+        """
+        batches = [thoughts[i:i + self.evaluation_batch_size] for i in range(0, len(thoughts), self.evaluation_batch_size)]
+        batch_results = await asyncio.gather(*(
+            self.thought_evaluator.aevaluate_batch_with_calls(
+                query, [self._thought_path(t) for t in batch], semaphore=semaphore, on_call=lambda: budget.charge(1),
+            )
+            for batch in batches
+        ))
+        for batch, (scores, _) in zip(batches, batch_results):
+            for thought, score in zip(batch, scores):
+                thought.evaluation_score = score
+                logger.info(f"思考 '{thought.state[:30]}...' を評価しました。スコア: {thought.evaluation_score}")
 
-    def _evaluate_thoughts(self, query: str, thoughts: List[Thought]) -> None:
-        """思考のリストを評価し、各思考のスコアを更新する。"""
+    def _affordable_generations(self, wanted: int, budget: SearchBudget) -> int:
+        """残りの呼び出し回数の予算内で、生成とその評価を行える思考の数を返す。"""
+        remaining = budget.remaining_calls()
+        if remaining is None:
+            return wanted
+        generations = wanted
+        while generations > 0 and generations + math.ceil(generations / self.evaluation_batch_size) > remaining:
+            generations -= 1
+        return generations
+
+    async def _expand(
+        self, query: str, thoughts: List[Thought], n: int,
+        budget: SearchBudget, table: TranspositionTable, semaphore: asyncio.Semaphore,
+    ) -> List[Thought]:
+        """
+        各思考から子の候補を最大n個生成し、置換表で既出の思考と重複するものを除いてから評価し、木に加える。
+        予算が足りない場合は、先頭の思考から順に生成できる分だけ生成する。
+        """
+        remaining = self._affordable_generations(len(thoughts) * n, budget)
+        plan = []
         for thought in thoughts:
-            if thought.parent:
-                context = f"親の思考: {thought.parent.state}\n現在の思考: {thought.state}"
-            else:
-                context = f"初期思考: {thought.state}"
-            
-            evaluation = self.thought_evaluator.invoke({
-                "query": query,
-                "thought_path": context
-            })
-            thought.evaluation_score = evaluation.get("score", 0.0)
-            logger.info(f"思考 '{thought.state[:30]}...' を評価しました。スコア: {thought.evaluation_score}")
+            count = min(n, remaining)
+            if count <= 0:
+                break
+            plan.append((thought, count))
+            remaining -= count
+        if not plan:
+            return []
+        all_next_steps = await asyncio.gather(*(self._generate_next_steps(thought, count, semaphore, budget) for thought, count in plan))
+        candidates = [
+            Thought(step_text, parent=thought)
+            for (thought, _), next_steps in zip(plan, all_next_steps)
+            for step_text in next_steps
+        ]
+        children = await table.aadd_unique(candidates)
+        if not children:
+            return []
+        await self._evaluate_thoughts(query, children, semaphore, budget)
+        for child in children:
+            child.parent.children.append(child)
+        return children
 
     def search(self, query: str, k: int, T: int, b: int) -> Optional[Thought]:
+        """
+        幅k・深さT・ビーム幅bのビームサーチを同期的に実行し、最良の思考を返す。イベントループの外から呼び出す。
+        """
+        return asyncio.run(self.asearch(query, BeamSearch(branching=k, max_depth=T, beam_width=b))).best
+
+    async def asearch(
+        self, query: str, strategy: Optional[SearchStrategy] = None, budget: Optional[SearchBudget] = None,
+    ) -> SearchOutcome:
         """
         Tree of Thoughts探索を実行する。
-        k: 初期思考の数, T: 探索の深さ（ステップ数）, b: 各ステップで保持する最良の思考の数
+        strategyを省略した場合は幅3・深さ3・ビーム幅2のビームサーチ、budgetを省略した場合は予算の制限なしで探索する。
         """
+        strategy = strategy or BeamSearch()
+        budget = budget or SearchBudget()
         root = Thought(state=query)
-        
-        # BFS (幅優先探索) スタイルの探索
-        current_thoughts = [root]
-        for step in range(T):
-            logger.info(f"--- ToT探索: ステップ {step + 1}/{T} ---")
-            
-            # 各思考から次のステップ候補を生成
-            next_step_candidates: List[Thought] = []
-            for thought in current_thoughts:
-                next_steps = self._generate_next_steps(thought, k)
-                for step_text in next_steps:
-                    next_step_candidates.append(thought.add_child(step_text))
-
-            if not next_step_candidates:
-                logger.warning("次の思考ステップを生成できませんでした。探索を終了します。")
-                break
+        table = TranspositionTable(self.embed_fn, self.duplicate_similarity_threshold)
+        table.add(root)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def expand(thoughts: List[Thought], n: int) -> List[Thought]:
+            remaining_seconds = budget.remaining_seconds()
+            if remaining_seconds is None:
+                return await self._expand(query, thoughts, n, budget, table, semaphore)
+            # 展開の途中でも時間の予算を使い切った時点で打ち切る。評価の終わっていない子は木に加えないが、
+            # それまでに行った呼び出しは終わるごとに予算に計上済みになっている
+            try:
+                return await asyncio.wait_for(self._expand(query, thoughts, n, budget, table, semaphore), timeout=remaining_seconds)
+            except asyncio.TimeoutError:
+                logger.warning(f"ToT探索の時間の予算({budget.max_seconds}秒)を使い切ったため、展開を打ち切りました。")
+                return []
 
-            # 生成された候補を評価
-            self._evaluate_thoughts(query, next_step_candidates)
-            
-            # スコアの高いb個の思考を次の探索対象として選択
-            next_step_candidates.sort(key=lambda t: t.evaluation_score, reverse=True)
-            current_thoughts = next_step_candidates[:b]
-            
-            logger.info(f"ステップ {step + 1} の最良の思考 ({b}個): {[t.state for t in current_thoughts]}")
+        stop_reason = await strategy.run(root, expand, budget)
 
-        # 最終的に最もスコアの高い思考を返す
+        # 最終的に最もスコアの高い思考を返す。根は問題そのもので評価されていないため、候補に含めない
         all_thoughts = self._collect_all_thoughts(root)
-        if not all_thoughts:
-            return None
-        return max(all_thoughts, key=lambda t: t.evaluation_score)
+        generated = [thought for thought in all_thoughts if thought is not root]
+        outcome = SearchOutcome(
+            best=max(generated, key=lambda t: t.evaluation_score) if generated else None,
+            strategy=strategy.name,
+            stop_reason=stop_reason,
+            llm_calls=budget.llm_calls,
+            elapsed_seconds=budget.elapsed_seconds,
+            thoughts=len(all_thoughts),
+            merged_duplicates=table.merged,
+        )
+        logger.info(
+            f"ToT探索が終了しました (戦略: {outcome.strategy}, 終了理由: {outcome.stop_reason}, LLM呼び出し: {outcome.llm_calls}回, "
+            f"思考: {outcome.thoughts}個, 統合した重複: {outcome.merged_duplicates}個, {outcome.elapsed_seconds:.2f}秒)"
+        )
+        return outcome
 
     def _collect_all_thoughts(self, thought: Thought) -> List[Thought]:
-        """ツリー内のすべての思考を再帰的に収集する。"""
-        thoughts = [thought]
-        for child in thought.children:
-            thoughts.extend(self._collect_all_thoughts(child))
-        return thoughts
\ No newline at end of file
+        """ツリー内のすべての思考を収集する。"""
+        thoughts = []
+        stack = [thought]
+        while stack:
+            current = stack.pop()
+            thoughts.append(current)
+            stack.extend(current.children)
+        return thoughts
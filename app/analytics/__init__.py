@@ -2,4 +2,5 @@
 # title: アナリティクスパッケージ
 # role: このディレクトリをPythonパッケージとして定義し、主要なクラスを公開する。
 
-from .collector import AnalyticsCollector
\ No newline at end of file
+from .collector import AnalyticsCollector
+from .feedback_store import DeferredFeedbackStore
@@ -0,0 +1,49 @@
+# /app/analytics/feedback_store.py
+# title: 遅延配信フィードバックストア
+# role: 応答を先に返した後にバックグラウンドで生成される自己批判・潜在的な問題を、フィードバックIDごとに保持し、後から取得できるようにする。
+
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+
+class DeferredFeedbackStore:
+    """
+    遅延配信するフィードバック(自己批判と潜在的な問題)の保管場所。
+    create()で発行したIDに対してバックグラウンドの処理が結果を書き込み、クライアントはget()で後から取得する。
+    保持する件数はmax_entriesまでとし、超えた場合は古いものから捨てる。
+    """
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def create(self) -> str:
+        """新しいフィードバックIDを発行し、生成待ちとして登録する。"""
+        feedback_id = str(uuid.uuid4())
+        with self._lock:
+            self._entries[feedback_id] = {"status": PENDING, "self_criticism": None, "potential_problems": None}
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return feedback_id
+
+    def complete(self, feedback_id: str, self_criticism: str, potential_problems: str) -> None:
+        with self._lock:
+            if feedback_id in self._entries:
+                self._entries[feedback_id] = {"status": READY, "self_criticism": self_criticism, "potential_problems": potential_problems}
+
+    def fail(self, feedback_id: str, error: str) -> None:
+        with self._lock:
+            if feedback_id in self._entries:
+                self._entries[feedback_id] = {"status": FAILED, "self_criticism": None, "potential_problems": None, "error": error}
+
+    def get(self, feedback_id: str) -> Optional[Dict[str, Any]]:
+        """フィードバックの状態と内容を返す。未知のIDや捨てられたIDにはNoneを返す。"""
+        with self._lock:
+            entry = self._entries.get(feedback_id)
+            return dict(entry, feedback_id=feedback_id) if entry is not None else None
@@ -5,11 +5,13 @@
 from fastapi import APIRouter, Depends, HTTPException
 from dependency_injector.wiring import inject, Provide
 import logging
+import uuid
 
 from app.containers import Container
 from app.engine import MetaIntelligenceEngine
-from app.models import ChatRequest, ChatResponse, OrchestrationDecision
+from app.models import ChatRequest, ChatResponse, FeedbackResponse, OrchestrationDecision
 from app.agents import OrchestrationAgent
+from app.analytics.feedback_store import DeferredFeedbackStore
 
 logger = logging.getLogger(__name__)
 
@@ -24,18 +26,39 @@ async def chat(
 ):
     """
     ユーザーからのクエリを受け取り、AIエンジンで処理して応答を返す。
+    session_idが指定されていない場合は新しいセッションを開始し、そのIDを応答で返す。
     """
+    session_id = request.session_id or str(uuid.uuid4())
     try:
         input_data = {"query": request.query, "affective_state": None}
         orchestration_decision = await orchestration_agent.arun(input_data)
+        if request.test_code:
+            # クライアントが与えたテストは、修正候補をサンドボックスで検証するパイプラインに渡す
+            orchestration_decision.parameters = {**orchestration_decision.parameters, "test_code": request.test_code}
 
-        response_data = await engine.arun(request.query, orchestration_decision)
+        response_data = await engine.arun(request.query, orchestration_decision, session_id=session_id)
         
-        return ChatResponse(**response_data.model_dump())
+        return ChatResponse(**response_data.model_dump(), session_id=session_id)
 
     except Exception as e:
         logger.error(f"チャットリクエストの処理中にエラーが発生しました: {e}", exc_info=True)
         raise HTTPException(
             status_code=500,
             detail=f"内部サーバーエラー: {str(e)}"
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/chat/feedback/{feedback_id}", response_model=FeedbackResponse)
+@inject
+async def get_feedback(
+    feedback_id: str,
+    feedback_store: DeferredFeedbackStore = Depends(Provide[Container.feedback_store]),
+):
+    """
+    遅延配信モードで応答の後に生成された自己批判と潜在的な問題を返す。
+    生成中の場合はstatusが"pending"となるため、クライアントは時間を置いて再度問い合わせる。
+    """
+    feedback = feedback_store.get(feedback_id)
+    if feedback is None:
+        raise HTTPException(status_code=404, detail="指定されたフィードバックは存在しません。")
+    return FeedbackResponse(**feedback)
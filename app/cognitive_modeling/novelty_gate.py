@@ -0,0 +1,140 @@
+# /app/cognitive_modeling/novelty_gate.py
+# title: 新規性ゲート
+# role: 新しい入力の埋め込みをセッションの直近の文脈と知識グラフの既知のエンティティと比較して新規性を見積もり、新規性が低い入力ではLLMによる予測符号化を省略させる。
+
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.knowledge_graph.persistent_knowledge_graph import PersistentKnowledgeGraph
+
+logger = logging.getLogger(__name__)
+
+EmbedFunction = Callable[[List[str]], Any]
+
+
+class NoveltyGate:
+    """
+    入力の新規性を、埋め込みのコサイン類似度から安価に見積もるゲート。
+
+    新規性は、直近の文脈に対しては 1 - 類似度の最大値、既知のエンティティに対しては (1 - 類似度の最大値) を
+    entity_thresholdの位置がthresholdに重なるよう伸縮した値で、両者の小さい方がthreshold以上ならLLMによる処理に進ませる。
+    エンティティは名前だけの短いテキストのため、言及しただけで新規性がないとみなさないよう、文脈より厳しいentity_thresholdを
+    超えて似ている場合にだけ省略させる。エンティティの埋め込みは知識グラフのバージョンが
+    変わったときに、まだ埋め込んでいないノードの分だけ計算する。文脈の各行の埋め込みは最大cache_size件まで再利用する。
+    埋め込みに失敗した場合は判定せずにLLMによる処理に進ませる。
+    """
+    def __init__(
+        self,
+        embed_fn: EmbedFunction,
+        knowledge_graph: Optional[PersistentKnowledgeGraph] = None,
+        threshold: float = 0.15,
+        entity_threshold: float = 0.9,
+        max_context_lines: int = 6,
+        max_entities: int = 2000,
+        max_text_chars: int = 512,
+        cache_size: int = 256,
+    ):
+        self.embed_fn = embed_fn
+        self.knowledge_graph = knowledge_graph
+        self.threshold = threshold
+        if not 0.0 <= entity_threshold < 1.0:
+            raise ValueError(f"entity_threshold must be in [0, 1): {entity_threshold}")
+        self.entity_threshold = entity_threshold
+        self.max_context_lines = max_context_lines
+        self.max_entities = max_entities
+        self.max_text_chars = max_text_chars
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._text_vectors: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._entity_vectors: Dict[str, np.ndarray] = {}
+        self._entity_matrix: Optional[np.ndarray] = None
+        self._entity_version = -1
+        self.checked = 0
+        self.skipped = 0
+        self.errors = 0
+        self.last_score: Optional[float] = None
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self.embed_fn([text[:self.max_text_chars] for text in texts]), dtype="float32")
+        if vectors.ndim != 2 or len(vectors) != len(texts):
+            raise ValueError(f"埋め込みの形状が不正です: {vectors.shape}")
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def _text_matrix(self, texts: List[str]) -> np.ndarray:
+        """テキストの埋め込みを、キャッシュにないものだけ計算して返す。"""
+        missing = [text for text in dict.fromkeys(texts) if text not in self._text_vectors]
+        if missing:
+            for text, vector in zip(missing, self._embed(missing)):
+                self._text_vectors[text] = vector
+        for text in texts:
+            self._text_vectors.move_to_end(text)
+        matrix = np.vstack([self._text_vectors[text] for text in texts])
+        while len(self._text_vectors) > self.cache_size:
+            self._text_vectors.popitem(last=False)
+        return matrix
+
+    def _entities(self) -> Optional[np.ndarray]:
+        """既知のエンティティの埋め込み。グラフが更新されていれば、新しいノードの分だけ埋め込む。"""
+        if self.knowledge_graph is None:
+            return None
+        version = self.knowledge_graph.version
+        if version == self._entity_version:
+            return self._entity_matrix
+        nodes = self.knowledge_graph.graph.nodes[-self.max_entities:]
+        texts = {node.id: f"{node.id} ({node.label})" for node in nodes}
+        missing = [node_id for node_id in texts if node_id not in self._entity_vectors]
+        if missing:
+            for node_id, vector in zip(missing, self._embed([texts[node_id] for node_id in missing])):
+                self._entity_vectors[node_id] = vector
+        self._entity_vectors = {node_id: self._entity_vectors[node_id] for node_id in texts}
+        self._entity_matrix = np.vstack(list(self._entity_vectors.values())) if self._entity_vectors else None
+        self._entity_version = version
+        return self._entity_matrix
+
+    def score(self, text: str, context: List[str]) -> float:
+        """入力の新規性(0〜1程度、大きいほど新しい)を返す。比較対象がない場合は1.0。"""
+        lines = [line for line in context[-self.max_context_lines:] if line.strip()]
+        matrix = self._text_matrix([text] + lines)
+        query, context_vectors = matrix[0], matrix[1:]
+        novelty = 1.0 - float(np.max(context_vectors @ query)) if len(context_vectors) else 1.0
+        entities = self._entities()
+        if entities is not None and len(entities):
+            # 類似度がentity_thresholdのときにちょうどthresholdになるよう伸縮し、文脈の新規性と同じ閾値で判定できるようにする
+            entity_novelty = (1.0 - float(np.max(entities @ query))) / (1.0 - self.entity_threshold) * self.threshold
+            novelty = min(novelty, entity_novelty)
+        return novelty
+
+    def should_process(self, text: str, context: List[str]) -> bool:
+        """入力がLLMによる処理に値するほど新しいかを判定し、統計に記録する。"""
+        with self._lock:
+            self.checked += 1
+            try:
+                novelty = self.score(text, context)
+            except Exception as e:
+                self.errors += 1
+                self.last_score = None
+                logger.warning(f"新規性の判定に失敗したため、LLMによる処理を行います: {e}")
+                return True
+            self.last_score = novelty
+            passed = novelty >= self.threshold
+            if not passed:
+                self.skipped += 1
+            hit_rate = self.skipped / self.checked
+        logger.info(f"入力の新規性: {novelty:.3f} (閾値: {self.threshold}, {'LLMで処理' if passed else '省略'}, 省略率: {hit_rate:.1%})")
+        return passed
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "checked": self.checked,
+                "skipped": self.skipped,
+                "processed": self.checked - self.skipped,
+                "errors": self.errors,
+                "hit_rate": self.skipped / self.checked if self.checked else 0.0,
+                "last_score": self.last_score,
+            }
@@ -3,39 +3,53 @@
 # role: 内部のワールドモデルから次の入力を予測し、実際の入力との「予測誤差」を算出することで、学習のトリガーを生成する。
 
 import logging
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from app.agents.base import AIAgent
 from app.cognitive_modeling.world_model_agent import WorldModelAgent
 from app.memory.working_memory import WorkingMemory
 from app.knowledge_graph.persistent_knowledge_graph import PersistentKnowledgeGraph
 from app.agents.knowledge_graph_agent import KnowledgeGraphAgent
+from app.cognitive_modeling.novelty_gate import NoveltyGate
 
 logger = logging.getLogger(__name__)
 
 class PredictiveCodingEngine:
     """
     予測符号化理論に基づき、予測と観測の差分（予測誤差）を計算するエンジン。
+    novelty_gateを指定した場合、新規性が閾値に満たない入力ではLLMによる予測・誤差計算・モデル更新を省略する。
     """
-    def __init__(self, world_model_agent: WorldModelAgent, working_memory: WorkingMemory, knowledge_graph_agent: KnowledgeGraphAgent, persistent_knowledge_graph: PersistentKnowledgeGraph):
+    def __init__(self, world_model_agent: WorldModelAgent, working_memory: WorkingMemory, knowledge_graph_agent: KnowledgeGraphAgent, persistent_knowledge_graph: PersistentKnowledgeGraph, novelty_gate: Optional[NoveltyGate] = None):
         self.world_model_agent = world_model_agent
         self.working_memory = working_memory
         self.knowledge_graph_agent = knowledge_graph_agent
         self.persistent_knowledge_graph = persistent_knowledge_graph
+        self.novelty_gate = novelty_gate
 
-    def process_input(self, user_input: str, dialogue_history: list[str]) -> Dict[str, Any]:
+    def process_input(self, user_input: str, dialogue_history: list[str], working_memory: Optional[WorkingMemory] = None) -> Dict[str, Any]:
         """
         ユーザー入力を処理し、予測誤差を計算してワーキングメモリに格納する。
 
         Args:
             user_input (str): ユーザーからの最新の入力。
             dialogue_history (list[str]): これまでの対話履歴。
+            working_memory (Optional[WorkingMemory]): 予測誤差の格納先。省略時はコンストラクタで渡されたものを使う。
 
         Returns:
             Dict[str, Any]: 計算された予測誤差、または新規情報がなかったことを示す辞書。
         """
         logger.info("--- 予測符号化エンジン起動 ---")
-        
+
+        # 0. 新規性の低い入力はLLMを呼ばずに「新規情報なし」とする
+        if self.novelty_gate is not None and not self.novelty_gate.should_process(user_input, dialogue_history):
+            logger.info("入力の新規性が低いため、予測符号化を省略しました（学習の必要なし）。")
+            return {
+                "error_type": "新規情報なし",
+                "summary": "直近の文脈と既知の知識から新しい情報は検出されませんでした。",
+                "key_info": [],
+                "novelty_score": self.novelty_gate.last_score,
+            }
+
         # 1. ワールドモデルに基づき、次の入力を予測する
         prediction_input = {
             "dialogue_history": "\n".join(dialogue_history)
@@ -53,7 +67,7 @@ class PredictiveCodingEngine:
         
         # 3. 予測誤差（新規情報）をワーキングメモリに格納
         if "error_type" in prediction_error and prediction_error["error_type"] != "新規情報なし" and "key_info" in prediction_error and prediction_error["key_info"]:
-            self.working_memory.add_prediction_error(prediction_error)
+            (working_memory or self.working_memory).add_prediction_error(prediction_error)
             logger.info(f"予測誤差をワーキングメモリに追加しました: {prediction_error['summary']}")
             
             # ワールドモデルの更新をトリガーし、知識グラフに統合
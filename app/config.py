@@ -41,12 +41,108 @@ class Config:
         "n_batch": 512,
         "n_gpu_layers": -1,
     }
+    # llama.cppバックエンドの投機的デコーディングの設定。ドラフトモデルのパスを指定しない場合はプロンプト参照(prompt lookup)で提案する
+    SPECULATIVE_DECODING_SETTINGS: Dict[str, Any] = {
+        "enabled": os.getenv("LAMA_CPP_SPECULATIVE_DECODING", "false").lower() == "true",
+        "draft_model_path": os.getenv("LAMA_CPP_DRAFT_MODEL_PATH", ""), # 本体と同じ語彙を持つ小さなGGUFモデル
+        "num_pred_tokens": 10, # 1回に提案するトークン数
+        "max_ngram_size": 2, # プロンプト参照で照合するn-gramの長さの上限
+        "draft_n_ctx": None, # ドラフトモデルのコンテキスト長。Noneの場合は本体のモデルのn_ctxに合わせる
+        "draft_n_gpu_layers": -1, # ドラフトモデルをGPUにオフロードする層の数
+    }
     EMBEDDING_MODEL_NAME: str = "nomic-embed-text"
 
     # ファイルパス関連: 環境変数からの読み込みを可能にする
     KNOWLEDGE_BASE_SOURCE: str = os.getenv("KNOWLEDGE_BASE_SOURCE", "data/documents/initial_facts.txt")
-    KNOWLEDGE_GRAPH_STORAGE_PATH: str = os.getenv("KNOWLEDGE_GRAPH_STORAGE_PATH", "memory/knowledge_graph.json")
+    KNOWLEDGE_GRAPH_STORAGE_PATH: str = os.getenv("KNOWLEDGE_GRAPH_STORAGE_PATH", "memory/knowledge_graph.kgs") # .jsonを指定すると旧形式のJSONで保存する
+    KNOWLEDGE_GRAPH_LEGACY_JSON_PATH: str = os.getenv("KNOWLEDGE_GRAPH_LEGACY_JSON_PATH", "memory/knowledge_graph.json") # スナップショットがない場合に変換元とする旧形式のファイル
+    KNOWLEDGE_GRAPH_COMPRESSION: str = os.getenv("KNOWLEDGE_GRAPH_COMPRESSION", "zstd") # 'zstd' または 'none'
+    KNOWLEDGE_GRAPH_COLUMNAR: bool = os.getenv("KNOWLEDGE_GRAPH_COLUMNAR", "false").lower() == "true" # 大きなグラフを列指向ストアで保持してメモリ使用量を抑える
     MEMORY_LOG_FILE_PATH: str = os.getenv("MEMORY_LOG_FILE_PATH", "memory/session_memory.jsonl")
+    # 記憶ログ・サンドボックス活動ログのバックグラウンド書き込みの設定
+    LOG_WRITER_SETTINGS: Dict[str, Any] = {
+        "max_queue_size": 10000, # 書き込み待ちのレコード数の上限
+        "batch_size": 256, # 一度の書き込みでまとめるレコード数の上限
+        "flush_interval_seconds": 0.2, # レコードを待つ最大時間
+        "fsync": "interval", # 'never', 'batch' または 'interval'
+        "fsync_interval_seconds": 1.0, # 'interval'の場合のfsyncの間隔
+        "block_timeout_seconds": 0.05, # キューが満杯の場合に待つ最大時間。超えたレコードは破棄する
+    }
+    # 記憶ログのセグメント（ローテーション・圧縮・保持期間）の設定
+    MEMORY_LOG_SETTINGS: Dict[str, Any] = {
+        "enabled": True,
+        "max_segment_bytes": 8 * 1024 * 1024, # アクティブなログがこのサイズに達したら封印する
+        "max_segment_seconds": 24 * 3600, # アクティブなログの先頭レコードからこの時間が経過したら封印する
+        "compression": "zstd", # 'zstd', 'gzip' または 'none'
+        "retention_seconds": { # レコード種類ごとの保持期間（Noneは無期限、'default'は未指定の種類に適用）
+            "default": None,
+            "event": 180 * 24 * 3600,
+            "word_learning": 365 * 24 * 3600,
+        },
+    }
+    # 過去の対話と自律思考を埋め込みで検索するエピソード記憶の設定
+    EPISODIC_MEMORY_SETTINGS: Dict[str, Any] = {
+        "enabled": True,
+        "index_path": os.getenv("EPISODIC_MEMORY_INDEX_PATH", "memory/episodic_memory.faiss"),
+        "hnsw_m": 32, # HNSWの各ノードの近傍数
+        "ef_search": 64, # 検索時の探索幅（大きいほど正確で遅い）
+        "max_text_chars": 512, # 埋め込むテキストの最大文字数
+        "max_queue_size": 1000, # 埋め込み待ちのレコード数の上限
+        "batch_size": 32, # 一度に埋め込むレコード数
+        "search_timeout_seconds": 0.2, # 応答生成時の検索の時間予算。超えた場合は検索結果を使わない
+    }
+    # 予測符号化の前段の新規性ゲートの設定
+    NOVELTY_GATE_SETTINGS: Dict[str, Any] = {
+        "enabled": True,
+        "threshold": 0.15, # 新規性(1 - 類似度)がこれ未満の入力では、LLMによる予測符号化を省略する
+        "entity_threshold": 0.9, # 既知のエンティティとの類似度がこれを超える入力も省略する（言及しただけで新規性なしとしないよう、文脈より厳しくする）
+        "max_context_lines": 6, # 比較に使うセッションの直近の文脈の行数
+        "max_entities": 2000, # 比較に使う知識グラフのエンティティの数の上限（新しいものから）
+        "max_text_chars": 512, # 埋め込むテキストの最大文字数
+        "cache_size": 256, # 再利用する文脈の埋め込みの数
+    }
+    # セッションごとのワーキングメモリと対話履歴の設定
+    SESSION_STORE_SETTINGS: Dict[str, Any] = {
+        "storage_dir": os.getenv("SESSION_STORAGE_DIR", "memory/sessions"), # 使われていないセッションの退避先
+        "history_window": 20, # プロンプトに渡す直近の対話履歴の行数（1往復で2行）
+        "max_summary_chars": 2000, # 窓からはみ出した履歴を畳み込むローリング要約の最大文字数
+        "max_active_sessions": 256, # メモリ上に置くセッション数の上限。超えた場合は最も長く使われていないものから退避する
+        "idle_timeout_seconds": 1800, # この時間使われていないセッションは退避する
+        "spill_ttl_seconds": 7 * 24 * 3600, # 退避したセッションがこの時間読み戻されなければファイルを削除する
+    }
+
+    # 知識グラフのエンティティ解決（重複ノード統合）の設定
+    ENTITY_RESOLUTION_SETTINGS: Dict[str, Any] = {
+        "enabled": True,
+        "similarity_threshold": 0.92, # 埋め込みのコサイン類似度がこの値以上なら同一エンティティとみなす
+        "num_tables": 4, # LSHのハッシュテーブル数
+        "num_bits": 12, # LSHの1テーブルあたりの超平面の数
+        "max_bucket_size": 64, # これより大きいバケットは比較対象から外し、二乗時間の比較を防ぐ
+        "aliases": {}, # 明示的な別名辞書（例: {"cat": "猫"}）
+    }
+
+    # 知識グラフの保持ポリシー（重みの減衰と、上限を超えた要素の退避）の設定
+    KNOWLEDGE_GRAPH_RETENTION_SETTINGS: Dict[str, Any] = {
+        "enabled": True,
+        "max_nodes": 50000, # ノード数の上限
+        "max_edges": 200000, # エッジ数の上限
+        "low_watermark": 0.9, # 上限を超えた場合、上限のこの割合まで退避する
+        "half_life_seconds": 30 * 24 * 3600, # エッジ重みが半減するまでの時間（LTD）
+        "min_edge_weight": 0.05, # 減衰によりこの重みを下回ったエッジは退避する
+        "archive_path": os.getenv("KNOWLEDGE_GRAPH_ARCHIVE_PATH", "memory/knowledge_graph_archive.kgs"), # 退避ごとに<パス>.<連番>のセグメントを追加する。空文字にすると退避した要素を破棄する
+    }
+
+    # 記憶統合サイクル（ワーキングメモリのセッションを長期記憶へ統合する処理）の設定
+    CONSOLIDATION_SETTINGS: Dict[str, Any] = {
+        "max_sessions_per_cycle": 32, # 1回のサイクルで処理するセッション数の上限
+        "max_concurrency": 4, # 並行して実行するLLM呼び出しの数
+        "max_batch_chars": 6000, # 1回のLLM呼び出しにまとめる予測誤差の最大文字数（トークン予算の目安）
+        "manifest_path": os.getenv("CONSOLIDATION_MANIFEST_PATH", "memory/consolidation_sessions.sqlite3"), # セッションの統合状態を記録するマニフェスト
+        "legacy_processed_log_path": "memory/processed_sessions.log", # マニフェストの初回作成時に取り込む旧形式の処理済みログ
+        "claim_timeout_seconds": 3600, # この時間を過ぎても処理中のままのセッションは再び取得の対象にする
+        "max_attempts": 3, # 統合に失敗したセッションを再試行する回数の上限
+        "done_retention_seconds": 30 * 24 * 3600, # 完了したセッションの記録を残す期間
+    }
 
     # パイプラインごとの設定
     PIPELINE_SETTINGS: Dict[str, Dict[str, int]] = {
@@ -64,11 +160,80 @@ class Config:
         }
     }
 
+    # 反復的修正パイプラインの設定
+    ITERATIVE_CORRECTION_SETTINGS: Dict[str, Any] = {
+        "mode": "auto", # "serial"(LLMによる逐次検証), "parallel"(サンドボックスでの並列検証), "auto"(テストコードがあればparallel)
+        "num_candidates": 3, # parallel: 並行して生成する修正候補の数
+        "max_parallel": 3, # parallel: 同時に実行する検証用コンテナの数の上限
+        "timeout_seconds": 60, # parallel: 1つの候補の検証の制限時間
+        "test_command": "python -m pytest -q -x test_solution.py", # テストコードがある場合の検証コマンド
+        "smoke_command": "python -m py_compile solution.py && python solution.py", # テストコードがない場合の検証コマンド
+    }
+
+    # 自己発見パイプラインの設定
+    SELF_DISCOVER_SETTINGS: Dict[str, Any] = {
+        "max_concurrency": 4, # 依存しない思考モジュールを同時に実行する数の上限
+    }
+
+    # 内省的対話の設定
+    INTERNAL_DIALOGUE_SETTINGS: Dict[str, Any] = {
+        "max_concurrency": 5, # 1つのラウンドで同時に生成する発言の数の上限
+        "max_history_chars": 6000, # プロンプトに渡す議論(要約と直近の発言)の文字数の上限
+        "keep_recent_turns": 6, # 要約せずにそのまま渡す直近の発言の数
+        "max_summary_chars": 1500, # 古い発言の要約の文字数の上限
+        "convergence_threshold": 0.9, # ラウンドの発言どうしの埋め込みの類似度の平均がこれ以上なら、調停者を呼ばずに対話を終える
+    }
+
+    # Tree of Thoughts探索の設定
+    TREE_OF_THOUGHTS_SETTINGS: Dict[str, Any] = {
+        "max_concurrency": 4, # 同時に実行する思考の生成・評価のLLM呼び出しの数の上限
+        "evaluation_batch_size": 4, # 1回の評価の呼び出しでまとめて採点する候補の数
+        "strategy": "beam", # 探索戦略: "beam"(ビームサーチ), "best_first"(最良優先探索), "mcts"(UCTによるモンテカルロ木探索)
+        "strategy_options": {
+            "branching": 3, # 1つの思考から生成する子の数
+            "max_depth": 3, # 探索の深さの上限
+            "beam_width": 2, # beam: 各深さで残す思考の数
+            "max_expansions": 8, # best_first: 展開する思考の数の上限
+            "iterations": 12, # mcts: 反復回数の上限
+            "exploration": 1.4, # mcts: UCTの探索係数
+            "score_threshold": 0.9, # この評価以上の思考が得られた時点で探索を打ち切る
+        },
+        "max_llm_calls": 40, # 1回の探索で使うLLM呼び出し(生成と評価)の回数の上限
+        "max_seconds": 120.0, # 1回の探索の経過時間の上限
+        "duplicate_similarity_threshold": 0.95, # 埋め込みの類似度がこれ以上の思考を重複として統合する
+    }
+
+    # CognitiveLoopAgentの情報収集の方法
+    EVIDENCE_GATHERING_SETTINGS: Dict[str, Any] = {
+        "mode": "fanout", # "fanout": RAGと外部ツールを並行して実行し一度だけ評価する / "iterative": 検索・評価・改善を順に繰り返す
+        "max_fanout_tools": 3, # 並行して実行する外部ツールの数の上限
+        "default_deadline_seconds": 10.0, # 締め切りを個別に指定していない情報源の締め切り
+        "source_deadlines": {"rag": 5.0, "WikipediaSearch": 8.0, "WebSearch": 10.0}, # 情報源ごとの締め切り（秒）
+    }
+
+    # 感情応答の調整方法の選択
+    EMOTIONAL_RESPONSE_SETTINGS: Dict[str, Any] = {
+        "min_intensity": 0.3, # これ未満の強度の感情では回答を調整しない
+        "rewrite_intensity": 0.8, # これ以上の強度の感情ではLLMで回答全体を書き換え、未満では定型文を前後に添える
+        "fallback_chars_per_second": 30.0, # 書き換えの実測がない場合に節約時間の推定に使う生成速度
+    }
+
+    # FullPipelineの自己批判・潜在的な問題の配信方法
+    FEEDBACK_DELIVERY_SETTINGS: Dict[str, Any] = {
+        "mode": "inline", # "inline": 応答に含めて返す / "deferred": 応答を先に返し、後からアナリティクスと/chat/feedbackで配信する
+        "max_entries": 1024, # 遅延配信のために保持するフィードバックの件数の上限
+    }
+
     # アイドル時間と自律思考の実行間隔（秒）
     IDLE_EVOLUTION_TRIGGER_SECONDS: int = 30
     AUTONOMOUS_CYCLE_INTERVAL_SECONDS: int = 60
     CONSOLIDATION_CYCLE_INTERVAL_SECONDS: int = 300
     WISDOM_SYNTHESIS_INTERVAL_SECONDS: int = 600
+    GRAPH_COMPACTION_INTERVAL_SECONDS: int = 3600
+    GRAPH_MAINTENANCE_INTERVAL_SECONDS: int = 1800
+    MEMORY_LOG_MAINTENANCE_INTERVAL_SECONDS: int = 3600
+    INTEGRITY_CHECK_INTERVAL_SECONDS: int = 60 # 知的健全性ステータスが古くなっていないかを確認する間隔
+    INTEGRITY_STATUS_TTL_SECONDS: int = 600 # 知識グラフが変わらない場合に知的健全性ステータスを再チェックするまでの時間
     SIMULATION_CYCLE_INTERVAL_SECONDS: int = 600
     MICRO_LLM_CREATION_INTERVAL_SECONDS: int = 7200
     BENCHMARK_INTERVAL_SECONDS: int = 3600 # 1時間に1回ベンチマークを実行
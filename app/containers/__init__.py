@@ -6,7 +6,7 @@ from __future__ import annotations
 import os
 import logging
 from dependency_injector import containers, providers
-from typing import Any, Iterator, cast
+from typing import Any, Callable, Iterator, List, cast
 from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
 from langchain_ollama.llms import OllamaLLM
 from langchain_community.llms import LlamaCpp
@@ -14,15 +14,24 @@ from langchain_community.llms import LlamaCpp
 # --- Config and Utils ---
 from app.config import settings
 from app.llm_providers import LLMProvider, OllamaProvider, LlamaCppProvider
+from app.llm_providers.speculative_decoding import attach_throughput_tracker, build_draft_model, decoding_mode
 
 # --- Core Components ---
 from app.prompts.manager import PromptManager
 from app.analytics.collector import AnalyticsCollector
+from app.analytics.feedback_store import DeferredFeedbackStore
 from app.rag.knowledge_base import KnowledgeBase
 from app.knowledge_graph.persistent_knowledge_graph import PersistentKnowledgeGraph
+from app.knowledge_graph.entity_resolution import EntityResolver
+from app.knowledge_graph.retention import ColdStorageArchive, GraphRetentionPolicy
 from app.rag.retriever import Retriever
 from app.memory.memory_consolidator import MemoryConsolidator
+from app.memory.log_segments import LogSegmentStore
+from app.utils.log_writer import BufferedLogWriter
 from app.memory.working_memory import WorkingMemory
+from app.memory.session_store import SessionStore
+from app.memory.consolidation_manifest import ConsolidationManifest
+from app.memory.episodic_memory import EpisodicMemory
 from app.conceptual_reasoning import SensoryProcessingUnit, ConceptualMemory, ImaginationEngine
 
 # --- Agents ---
@@ -47,6 +56,7 @@ from app.agents.thought_evaluator_agent import ThoughtEvaluatorAgent
 from app.agents.tree_of_thoughts_agent import TreeOfThoughtsAgent
 from app.agents.process_reward_agent import ProcessRewardAgent
 from app.cognitive_modeling.predictive_coding_engine import PredictiveCodingEngine
+from app.cognitive_modeling.novelty_gate import NoveltyGate
 from app.cognitive_modeling.world_model_agent import WorldModelAgent
 from app.integrated_information_processing.integrated_information_agent import IntegratedInformationAgent
 from app.internal_dialogue import DialogueParticipantAgent, MediatorAgent, ConsciousnessStagingArea
@@ -63,6 +73,7 @@ from app.tools.tool_belt import ToolBelt
 # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↓修正開始◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
 # サンドボックス関連の機能をインポート
 from app.sandbox.sandbox_manager import SandboxManager
+from app.sandbox.candidate_verifier import SandboxCandidateVerifier
 from app.tools.sandbox_command_tool import SandboxCommandTool
 from app.tools.sandbox_log_viewer_tool import SandboxLogViewerTool
 # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↑修正終わり◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
@@ -117,10 +128,88 @@ def _select_llm_provider(backend: str, llm_settings: dict, llama_cpp_path: str)
             n_ctx=llm_settings["n_ctx"],
             n_batch=llm_settings["n_batch"],
             temperature=llm_settings["temperature"],
+            speculative_decoding=settings.SPECULATIVE_DECODING_SETTINGS,
         )
     else:
         raise ValueError(f"不明なLLM_BACKEND設定 '{backend}' です。")
 
+def _entity_resolver_provider(embed_fn: Callable[[List[str]], Any], resolution_settings: dict) -> EntityResolver | None:
+    if not resolution_settings.get("enabled", False):
+        return None
+    return EntityResolver(
+        embed_fn=embed_fn,
+        similarity_threshold=resolution_settings["similarity_threshold"],
+        num_tables=resolution_settings["num_tables"],
+        num_bits=resolution_settings["num_bits"],
+        max_bucket_size=resolution_settings["max_bucket_size"],
+        aliases=resolution_settings.get("aliases"),
+    )
+
+def _episodic_memory_provider(embed_fn: Callable[[List[str]], Any], episodic_settings: dict) -> EpisodicMemory | None:
+    if not episodic_settings.get("enabled", False):
+        return None
+    return EpisodicMemory(
+        embed_fn=embed_fn,
+        index_path=episodic_settings["index_path"],
+        hnsw_m=episodic_settings["hnsw_m"],
+        ef_search=episodic_settings["ef_search"],
+        max_text_chars=episodic_settings["max_text_chars"],
+        max_queue_size=episodic_settings["max_queue_size"],
+        batch_size=episodic_settings["batch_size"],
+        search_timeout_seconds=episodic_settings["search_timeout_seconds"],
+    )
+
+def _novelty_gate_provider(embed_fn: Callable[[List[str]], Any], knowledge_graph: PersistentKnowledgeGraph, gate_settings: dict) -> NoveltyGate | None:
+    if not gate_settings.get("enabled", False):
+        return None
+    return NoveltyGate(
+        embed_fn=embed_fn,
+        knowledge_graph=knowledge_graph,
+        threshold=gate_settings["threshold"],
+        entity_threshold=gate_settings["entity_threshold"],
+        max_context_lines=gate_settings["max_context_lines"],
+        max_entities=gate_settings["max_entities"],
+        max_text_chars=gate_settings["max_text_chars"],
+        cache_size=gate_settings["cache_size"],
+    )
+
+def _graph_retention_policy_provider(retention_settings: dict) -> GraphRetentionPolicy | None:
+    if not retention_settings.get("enabled", False):
+        return None
+    return GraphRetentionPolicy(
+        max_nodes=retention_settings["max_nodes"],
+        max_edges=retention_settings["max_edges"],
+        low_watermark=retention_settings["low_watermark"],
+        half_life_seconds=retention_settings["half_life_seconds"],
+        min_edge_weight=retention_settings["min_edge_weight"],
+    )
+
+def _cold_storage_archive_provider(retention_settings: dict, compression: str) -> ColdStorageArchive | None:
+    if not retention_settings.get("enabled", False) or not retention_settings.get("archive_path"):
+        return None
+    return ColdStorageArchive(storage_path=retention_settings["archive_path"], compression=compression)
+
+def _log_segment_store_provider(log_file_path: str, log_settings: dict) -> LogSegmentStore | None:
+    if not log_settings.get("enabled", False):
+        return None
+    return LogSegmentStore(
+        log_file_path=log_file_path,
+        max_segment_bytes=log_settings["max_segment_bytes"],
+        max_segment_seconds=log_settings["max_segment_seconds"],
+        compression=log_settings["compression"],
+        retention_seconds=log_settings.get("retention_seconds"),
+    )
+
+def _log_writer_provider(writer_settings: dict) -> BufferedLogWriter:
+    return BufferedLogWriter(
+        max_queue_size=writer_settings["max_queue_size"],
+        batch_size=writer_settings["batch_size"],
+        flush_interval=writer_settings["flush_interval_seconds"],
+        fsync_policy=writer_settings["fsync"],
+        fsync_interval=writer_settings["fsync_interval_seconds"],
+        block_timeout=writer_settings["block_timeout_seconds"],
+    )
+
 def _get_llm_instance(llm_settings: dict) -> Any:
     if settings.LLM_BACKEND == "ollama":
         return OllamaLLM(
@@ -129,14 +218,20 @@ def _get_llm_instance(llm_settings: dict) -> Any:
             base_url=settings.OLLAMA_HOST,
         )
     elif settings.LLM_BACKEND == "llama_cpp":
-        return LlamaCpp(
+        draft_model = build_draft_model(
+            settings.SPECULATIVE_DECODING_SETTINGS, n_ctx=llm_settings["n_ctx"], main_model_path=settings.LAMA_CPP_MODEL_PATH
+        )
+        llm = LlamaCpp(
             model_path=settings.LAMA_CPP_MODEL_PATH,
             n_ctx=llm_settings["n_ctx"],
             n_batch=llm_settings["n_batch"],
             temperature=llm_settings["temperature"],
             n_gpu_layers=llm_settings.get("n_gpu_layers", 0),
             verbose=False,
+            model_kwargs={"draft_model": draft_model} if draft_model is not None else {},
         )
+        attach_throughput_tracker(llm, decoding_mode(settings.SPECULATIVE_DECODING_SETTINGS))
+        return llm
     raise ValueError(f"Unknown LLM_BACKEND: {settings.LLM_BACKEND}")
 
 
@@ -155,6 +250,7 @@ class Container(containers.DeclarativeContainer):
 
     # --- Core Providers ---
     analytics_collector: providers.Singleton[AnalyticsCollector] = providers.Singleton(AnalyticsCollector)
+    feedback_store: providers.Singleton[DeferredFeedbackStore] = providers.Singleton(DeferredFeedbackStore, max_entries=settings.FEEDBACK_DELIVERY_SETTINGS["max_entries"])
     prompt_manager: providers.Singleton[PromptManager] = providers.Singleton(PromptManager, file_path="data/prompts/prompts.json")
     llm_provider: providers.Singleton[LLMProvider] = providers.Singleton(
         _select_llm_provider,
@@ -168,11 +264,34 @@ class Container(containers.DeclarativeContainer):
     output_parser: providers.Singleton[StrOutputParser] = providers.Singleton(StrOutputParser)
     json_output_parser: providers.Singleton[JsonOutputParser] = providers.Singleton(JsonOutputParser)
     knowledge_base: providers.Resource[KnowledgeBase] = providers.Resource(_knowledge_base_provider, source_file_path=settings.KNOWLEDGE_BASE_SOURCE)
-    persistent_knowledge_graph: providers.Singleton[PersistentKnowledgeGraph] = providers.Singleton(PersistentKnowledgeGraph, storage_path=settings.KNOWLEDGE_GRAPH_STORAGE_PATH)
+    sensory_processing_unit: providers.Singleton[SensoryProcessingUnit] = providers.Singleton(SensoryProcessingUnit, model_name='clip-ViT-B-32')
+    entity_resolver: providers.Singleton[EntityResolver | None] = providers.Singleton(_entity_resolver_provider, embed_fn=sensory_processing_unit.provided.encode_texts, resolution_settings=settings.ENTITY_RESOLUTION_SETTINGS)
+    graph_retention_policy: providers.Singleton[GraphRetentionPolicy | None] = providers.Singleton(_graph_retention_policy_provider, retention_settings=settings.KNOWLEDGE_GRAPH_RETENTION_SETTINGS)
+    graph_archive: providers.Singleton[ColdStorageArchive | None] = providers.Singleton(_cold_storage_archive_provider, retention_settings=settings.KNOWLEDGE_GRAPH_RETENTION_SETTINGS, compression=settings.KNOWLEDGE_GRAPH_COMPRESSION)
+    persistent_knowledge_graph: providers.Singleton[PersistentKnowledgeGraph] = providers.Singleton(PersistentKnowledgeGraph, storage_path=settings.KNOWLEDGE_GRAPH_STORAGE_PATH, entity_resolver=entity_resolver, compression=settings.KNOWLEDGE_GRAPH_COMPRESSION, legacy_json_path=settings.KNOWLEDGE_GRAPH_LEGACY_JSON_PATH, retention_policy=graph_retention_policy, archive=graph_archive, columnar=settings.KNOWLEDGE_GRAPH_COLUMNAR)
     retriever: providers.Singleton[Retriever] = providers.Singleton(Retriever, knowledge_base=knowledge_base, persistent_knowledge_graph=persistent_knowledge_graph)
-    memory_consolidator: providers.Singleton[MemoryConsolidator] = providers.Singleton(MemoryConsolidator, log_file_path=settings.MEMORY_LOG_FILE_PATH)
+    log_writer: providers.Singleton[BufferedLogWriter] = providers.Singleton(_log_writer_provider, writer_settings=settings.LOG_WRITER_SETTINGS)
+    memory_log_segments: providers.Singleton[LogSegmentStore | None] = providers.Singleton(_log_segment_store_provider, log_file_path=settings.MEMORY_LOG_FILE_PATH, log_settings=settings.MEMORY_LOG_SETTINGS)
+    consolidation_manifest: providers.Singleton[ConsolidationManifest] = providers.Singleton(
+        ConsolidationManifest,
+        db_path=settings.CONSOLIDATION_SETTINGS["manifest_path"],
+        legacy_log_path=settings.CONSOLIDATION_SETTINGS["legacy_processed_log_path"],
+        claim_timeout_seconds=settings.CONSOLIDATION_SETTINGS["claim_timeout_seconds"],
+        max_attempts=settings.CONSOLIDATION_SETTINGS["max_attempts"],
+        done_retention_seconds=settings.CONSOLIDATION_SETTINGS["done_retention_seconds"],
+    )
+    episodic_memory: providers.Singleton[EpisodicMemory | None] = providers.Singleton(_episodic_memory_provider, embed_fn=sensory_processing_unit.provided.encode_texts, episodic_settings=settings.EPISODIC_MEMORY_SETTINGS)
+    memory_consolidator: providers.Singleton[MemoryConsolidator] = providers.Singleton(MemoryConsolidator, log_file_path=settings.MEMORY_LOG_FILE_PATH, segment_store=memory_log_segments, log_writer=log_writer, session_manifest=consolidation_manifest, episodic_memory=episodic_memory)
     working_memory: providers.Singleton[WorkingMemory] = providers.Singleton(WorkingMemory)
-    sensory_processing_unit: providers.Singleton[SensoryProcessingUnit] = providers.Singleton(SensoryProcessingUnit, model_name='clip-ViT-B-32')
+    session_store: providers.Singleton[SessionStore] = providers.Singleton(
+        SessionStore,
+        storage_dir=settings.SESSION_STORE_SETTINGS["storage_dir"],
+        history_window=settings.SESSION_STORE_SETTINGS["history_window"],
+        max_summary_chars=settings.SESSION_STORE_SETTINGS["max_summary_chars"],
+        max_active_sessions=settings.SESSION_STORE_SETTINGS["max_active_sessions"],
+        idle_timeout_seconds=settings.SESSION_STORE_SETTINGS["idle_timeout_seconds"],
+        spill_ttl_seconds=settings.SESSION_STORE_SETTINGS["spill_ttl_seconds"],
+    )
     conceptual_memory: providers.Singleton[ConceptualMemory] = providers.Singleton(ConceptualMemory, dimension=providers.Factory(lambda spu: spu.get_embedding_dimension(), spu=sensory_processing_unit))
     imagination_engine: providers.Factory[ImaginationEngine] = providers.Factory(ImaginationEngine)
     symbolic_verifier: providers.Singleton[SymbolicVerifier] = providers.Singleton(SymbolicVerifier)
@@ -182,7 +301,8 @@ class Container(containers.DeclarativeContainer):
     sandbox_manager: providers.Singleton[SandboxManager] = providers.Singleton(
         SandboxManager,
         image_name="luca5-sandbox:latest",
-        shared_dir_host_path=config.shared_dir
+        shared_dir_host_path=config.shared_dir,
+        log_writer=log_writer
     )
     sandbox_command_tool: providers.Factory[SandboxCommandTool] = providers.Factory(
         SandboxCommandTool,
@@ -209,10 +329,10 @@ class Container(containers.DeclarativeContainer):
 
     # --- System Providers ---
     energy_manager: providers.Singleton[CognitiveEnergyManager] = providers.Singleton(CognitiveEnergyManager)
-    integrity_monitor: providers.Factory[IntegrityMonitor] = providers.Factory(IntegrityMonitor, llm=verifier_llm_instance, knowledge_graph=persistent_knowledge_graph, analytics_collector=analytics_collector)
+    integrity_monitor: providers.Singleton[IntegrityMonitor] = providers.Singleton(IntegrityMonitor, llm=verifier_llm_instance, knowledge_graph=persistent_knowledge_graph, analytics_collector=analytics_collector, status_ttl_seconds=settings.INTEGRITY_STATUS_TTL_SECONDS)
     value_evaluator: providers.Singleton[ValueEvaluator] = providers.Singleton(ValueEvaluator, llm=verifier_llm_instance, output_parser=json_output_parser, analytics_collector=analytics_collector)
     affective_engine: providers.Singleton[AffectiveEngine] = providers.Singleton(AffectiveEngine, integrity_monitor=integrity_monitor, value_evaluator=value_evaluator)
-    emotional_response_generator: providers.Factory[EmotionalResponseGenerator] = providers.Factory(EmotionalResponseGenerator, llm=llm_instance, output_parser=output_parser, prompt_template=providers.Factory(lambda pm: pm.get_prompt("EMOTIONAL_RESPONSE_PROMPT"), pm=prompt_manager))
+    emotional_response_generator: providers.Factory[EmotionalResponseGenerator] = providers.Factory(EmotionalResponseGenerator, llm=llm_instance, output_parser=output_parser, prompt_template=providers.Factory(lambda pm: pm.get_prompt("EMOTIONAL_RESPONSE_PROMPT"), pm=prompt_manager), min_intensity=settings.EMOTIONAL_RESPONSE_SETTINGS["min_intensity"], rewrite_intensity=settings.EMOTIONAL_RESPONSE_SETTINGS["rewrite_intensity"], fallback_chars_per_second=settings.EMOTIONAL_RESPONSE_SETTINGS["fallback_chars_per_second"])
     ethical_motivation_engine: providers.Factory[EthicalMotivationEngine] = providers.Factory(EthicalMotivationEngine, integrity_monitor=integrity_monitor, value_evaluator=value_evaluator)
 
     # --- Agent Providers ---
@@ -227,17 +347,18 @@ class Container(containers.DeclarativeContainer):
     integrated_information_agent: providers.Factory[IntegratedInformationAgent] = providers.Factory(IntegratedInformationAgent, llm=llm_instance, output_parser=output_parser)
     dialogue_participant_agent: providers.Factory[DialogueParticipantAgent] = providers.Factory(DialogueParticipantAgent, llm=llm_instance)
     mediator_agent: providers.Factory[MediatorAgent] = providers.Factory(MediatorAgent, llm=llm_instance)
-    consciousness_staging_area: providers.Factory[ConsciousnessStagingArea] = providers.Factory(ConsciousnessStagingArea, llm=llm_instance, mediator_agent=mediator_agent)
+    consciousness_staging_area: providers.Factory[ConsciousnessStagingArea] = providers.Factory(ConsciousnessStagingArea, llm=llm_instance, mediator_agent=mediator_agent, embed_fn=sensory_processing_unit.provided.encode_texts, convergence_threshold=settings.INTERNAL_DIALOGUE_SETTINGS["convergence_threshold"], max_concurrency=settings.INTERNAL_DIALOGUE_SETTINGS["max_concurrency"], max_history_chars=settings.INTERNAL_DIALOGUE_SETTINGS["max_history_chars"], keep_recent_turns=settings.INTERNAL_DIALOGUE_SETTINGS["keep_recent_turns"], max_summary_chars=settings.INTERNAL_DIALOGUE_SETTINGS["max_summary_chars"])
     world_model_agent: providers.Factory[WorldModelAgent] = providers.Factory(WorldModelAgent, llm=llm_instance, knowledge_graph_agent=knowledge_graph_agent, persistent_knowledge_graph=persistent_knowledge_graph)
-    predictive_coding_engine: providers.Factory[PredictiveCodingEngine] = providers.Factory(PredictiveCodingEngine, world_model_agent=world_model_agent, working_memory=working_memory, knowledge_graph_agent=knowledge_graph_agent, persistent_knowledge_graph=persistent_knowledge_graph)
+    novelty_gate: providers.Singleton[NoveltyGate | None] = providers.Singleton(_novelty_gate_provider, embed_fn=sensory_processing_unit.provided.encode_texts, knowledge_graph=persistent_knowledge_graph, gate_settings=settings.NOVELTY_GATE_SETTINGS)
+    predictive_coding_engine: providers.Factory[PredictiveCodingEngine] = providers.Factory(PredictiveCodingEngine, world_model_agent=world_model_agent, working_memory=working_memory, knowledge_graph_agent=knowledge_graph_agent, persistent_knowledge_graph=persistent_knowledge_graph, novelty_gate=novelty_gate)
     self_critic_agent: providers.Factory[SelfCriticAgent] = providers.Factory(SelfCriticAgent, llm=verifier_llm_instance, output_parser=output_parser, prompt_template=providers.Factory(lambda pm: pm.get_prompt("SELF_CRITIC_AGENT_PROMPT"), pm=prompt_manager))
     meta_cognitive_engine: providers.Factory[MetaCognitiveEngine] = providers.Factory(MetaCognitiveEngine, self_critic_agent=self_critic_agent)
     problem_discovery_agent: providers.Factory[ProblemDiscoveryAgent] = providers.Factory(ProblemDiscoveryAgent, llm=llm_instance, output_parser=json_output_parser, prompt_template=providers.Factory(lambda pm: pm.get_prompt("PROBLEM_DISCOVERY_AGENT_PROMPT"), pm=prompt_manager))
     self_improvement_agent: providers.Factory[SelfImprovementAgent] = providers.Factory(SelfImprovementAgent, llm=llm_instance, output_parser=json_output_parser, prompt_template=providers.Factory(lambda pm: pm.get_prompt("SELF_IMPROVEMENT_AGENT_PROMPT"), pm=prompt_manager))
     self_correction_agent: providers.Factory[SelfCorrectionAgent] = providers.Factory(SelfCorrectionAgent, llm=llm_instance, memory_consolidator=memory_consolidator, micro_llm_manager=micro_llm_manager, prompt_manager=prompt_manager)
     autonomous_agent: providers.Factory[AutonomousAgent] = providers.Factory(AutonomousAgent, llm=llm_instance, output_parser=output_parser, memory_consolidator=memory_consolidator, knowledge_base=knowledge_base, tool_belt=tool_belt)
-    consolidation_agent: providers.Factory[ConsolidationAgent] = providers.Factory(ConsolidationAgent, llm=llm_instance, output_parser=output_parser, knowledge_base=knowledge_base, knowledge_graph_agent=knowledge_graph_agent, memory_consolidator=memory_consolidator, persistent_knowledge_graph=persistent_knowledge_graph, prompt_manager=prompt_manager)
-    knowledge_gap_analyzer: providers.Factory[KnowledgeGapAnalyzerAgent] = providers.Factory(KnowledgeGapAnalyzerAgent, llm=llm_instance, output_parser=json_output_parser, prompt_template=providers.Factory(lambda pm: pm.get_prompt("KNOWLEDGE_GAP_ANALYZER_PROMPT"), pm=prompt_manager), memory_consolidator=memory_consolidator, knowledge_graph=persistent_knowledge_graph)
+    consolidation_agent: providers.Factory[ConsolidationAgent] = providers.Factory(ConsolidationAgent, llm=llm_instance, output_parser=output_parser, knowledge_base=knowledge_base, knowledge_graph_agent=knowledge_graph_agent, memory_consolidator=memory_consolidator, persistent_knowledge_graph=persistent_knowledge_graph, prompt_manager=prompt_manager, session_manifest=consolidation_manifest, max_sessions_per_cycle=settings.CONSOLIDATION_SETTINGS["max_sessions_per_cycle"], max_concurrency=settings.CONSOLIDATION_SETTINGS["max_concurrency"], max_batch_chars=settings.CONSOLIDATION_SETTINGS["max_batch_chars"])
+    knowledge_gap_analyzer: providers.Factory[KnowledgeGapAnalyzerAgent] = providers.Factory(KnowledgeGapAnalyzerAgent, llm=llm_instance, output_parser=json_output_parser, prompt_template=providers.Factory(lambda pm: pm.get_prompt("KNOWLEDGE_GAP_ANALYZER_PROMPT"), pm=prompt_manager), memory_consolidator=memory_consolidator, knowledge_graph=persistent_knowledge_graph, episodic_memory=episodic_memory)
     capability_mapper_agent: providers.Factory[CapabilityMapperAgent] = providers.Factory(CapabilityMapperAgent, llm=llm_instance, prompt_template=providers.Factory(lambda pm: pm.get_prompt("CAPABILITY_MAPPER_PROMPT"), pm=prompt_manager))
     complexity_analyzer: providers.Factory[ComplexityAnalyzer] = providers.Factory(ComplexityAnalyzer, llm=llm_instance)
     orchestration_agent: providers.Factory[OrchestrationAgent] = providers.Factory(OrchestrationAgent, llm_provider=llm_provider, output_parser=json_output_parser, prompt_template=providers.Factory(lambda pm: pm.get_prompt("ORCHESTRATION_PROMPT"), pm=prompt_manager), complexity_analyzer=complexity_analyzer, tool_belt=tool_belt)
@@ -253,7 +374,8 @@ class Container(containers.DeclarativeContainer):
         memory_consolidator=memory_consolidator,
         ethical_motivation_engine=ethical_motivation_engine,
         predictive_coding_engine=predictive_coding_engine,
-        working_memory=working_memory,
+        session_store=session_store,
+        episodic_memory=episodic_memory,
         value_evaluator=value_evaluator,
         affective_engine=affective_engine,
         emotional_response_generator=emotional_response_generator,
@@ -261,9 +383,9 @@ class Container(containers.DeclarativeContainer):
         orchestration_agent=orchestration_agent,
     )
     performance_benchmark_agent: providers.Factory[PerformanceBenchmarkAgent] = providers.Factory(PerformanceBenchmarkAgent, orchestration_agent=orchestration_agent)
-    thought_evaluator_agent: providers.Factory[ThoughtEvaluatorAgent] = providers.Factory(ThoughtEvaluatorAgent, llm=verifier_llm_instance, output_parser=json_output_parser, prompt_template=providers.Factory(lambda pm: pm.get_prompt("THOUGHT_EVALUATOR_PROMPT"), pm=prompt_manager))
-    tree_of_thoughts_agent: providers.Factory[TreeOfThoughtsAgent] = providers.Factory(TreeOfThoughtsAgent, llm=llm_instance, thought_evaluator=thought_evaluator_agent, prompt_template=providers.Factory(lambda pm: pm.get_prompt("THOUGHT_GENERATOR_PROMPT"), pm=prompt_manager))
-    cognitive_loop_agent: providers.Factory[CognitiveLoopAgent] = providers.Factory(CognitiveLoopAgent, llm=llm_instance, output_parser=output_parser, prompt_template=providers.Factory(lambda pm: pm.get_prompt("COGNITIVE_LOOP_AGENT_PROMPT"), pm=prompt_manager), retriever=retriever, retrieval_evaluator_agent=retrieval_evaluator_agent, query_refinement_agent=query_refinement_agent, knowledge_graph_agent=knowledge_graph_agent, persistent_knowledge_graph=persistent_knowledge_graph, tool_using_agent=tool_using_agent, tool_belt=tool_belt, memory_consolidator=memory_consolidator, sensory_processing_unit=sensory_processing_unit, conceptual_memory=conceptual_memory, imagination_engine=imagination_engine, symbolic_verifier=symbolic_verifier, deductive_reasoner_agent=deductive_reasoner_agent)
+    thought_evaluator_agent: providers.Factory[ThoughtEvaluatorAgent] = providers.Factory(ThoughtEvaluatorAgent, llm=verifier_llm_instance, output_parser=json_output_parser, prompt_template=providers.Factory(lambda pm: pm.get_prompt("THOUGHT_EVALUATOR_PROMPT"), pm=prompt_manager), listwise_prompt_template=providers.Factory(lambda pm: pm.get_prompt("THOUGHT_LISTWISE_EVALUATOR_PROMPT"), pm=prompt_manager))
+    tree_of_thoughts_agent: providers.Factory[TreeOfThoughtsAgent] = providers.Factory(TreeOfThoughtsAgent, llm=llm_instance, thought_evaluator=thought_evaluator_agent, prompt_template=providers.Factory(lambda pm: pm.get_prompt("THOUGHT_GENERATOR_PROMPT"), pm=prompt_manager), max_concurrency=settings.TREE_OF_THOUGHTS_SETTINGS["max_concurrency"], evaluation_batch_size=settings.TREE_OF_THOUGHTS_SETTINGS["evaluation_batch_size"], embed_fn=sensory_processing_unit.provided.encode_texts, duplicate_similarity_threshold=settings.TREE_OF_THOUGHTS_SETTINGS["duplicate_similarity_threshold"])
+    cognitive_loop_agent: providers.Factory[CognitiveLoopAgent] = providers.Factory(CognitiveLoopAgent, llm=llm_instance, output_parser=output_parser, prompt_template=providers.Factory(lambda pm: pm.get_prompt("COGNITIVE_LOOP_AGENT_PROMPT"), pm=prompt_manager), retriever=retriever, retrieval_evaluator_agent=retrieval_evaluator_agent, query_refinement_agent=query_refinement_agent, knowledge_graph_agent=knowledge_graph_agent, persistent_knowledge_graph=persistent_knowledge_graph, tool_using_agent=tool_using_agent, tool_belt=tool_belt, memory_consolidator=memory_consolidator, sensory_processing_unit=sensory_processing_unit, conceptual_memory=conceptual_memory, imagination_engine=imagination_engine, symbolic_verifier=symbolic_verifier, deductive_reasoner_agent=deductive_reasoner_agent, retrieval_mode=settings.EVIDENCE_GATHERING_SETTINGS["mode"], max_fanout_tools=settings.EVIDENCE_GATHERING_SETTINGS["max_fanout_tools"], default_source_deadline_seconds=settings.EVIDENCE_GATHERING_SETTINGS["default_deadline_seconds"], source_deadlines=settings.EVIDENCE_GATHERING_SETTINGS["source_deadlines"])
 
     # --- Simulation Providers ---
     simulation_env: providers.Factory[BlockStackingEnv] = providers.Factory(BlockStackingEnv)
@@ -278,16 +400,17 @@ class Container(containers.DeclarativeContainer):
     
     # --- Pipeline Providers ---
     simple_pipeline: providers.Factory[SimplePipeline] = providers.Factory(SimplePipeline, llm=llm_instance, output_parser=output_parser, retriever=retriever, prompt_manager=prompt_manager)
-    full_pipeline: providers.Factory[FullPipeline] = providers.Factory(FullPipeline, master_agent=master_agent, planning_agent=planning_agent, cognitive_loop_agent=cognitive_loop_agent, meta_cognitive_engine=meta_cognitive_engine, problem_discovery_agent=problem_discovery_agent, memory_consolidator=memory_consolidator, analytics_collector=analytics_collector)
+    full_pipeline: providers.Factory[FullPipeline] = providers.Factory(FullPipeline, master_agent=master_agent, planning_agent=planning_agent, cognitive_loop_agent=cognitive_loop_agent, meta_cognitive_engine=meta_cognitive_engine, problem_discovery_agent=problem_discovery_agent, memory_consolidator=memory_consolidator, analytics_collector=analytics_collector, feedback_delivery=settings.FEEDBACK_DELIVERY_SETTINGS["mode"], feedback_store=feedback_store)
     parallel_pipeline: providers.Factory[ParallelPipeline] = providers.Factory(ParallelPipeline, llm=llm_instance, output_parser=output_parser, cognitive_loop_agent_factory=cognitive_loop_agent.provider)
     quantum_inspired_pipeline: providers.Factory[QuantumInspiredPipeline] = providers.Factory(QuantumInspiredPipeline, llm=llm_instance, output_parser=output_parser, integrated_information_agent=integrated_information_agent)
     speculative_pipeline: providers.Factory[SpeculativePipeline] = providers.Factory(SpeculativePipeline, drafter_llm=llm_instance, verifier_llm=verifier_llm_instance, output_parser=output_parser)
-    self_discover_pipeline: providers.Factory[SelfDiscoverPipeline] = providers.Factory(SelfDiscoverPipeline, planning_agent=planning_agent, decompose_agent=decompose_agent, critique_agent=critique_agent, synthesize_agent=synthesize_agent, cognitive_loop_agent=cognitive_loop_agent)
+    self_discover_pipeline: providers.Factory[SelfDiscoverPipeline] = providers.Factory(SelfDiscoverPipeline, planning_agent=planning_agent, decompose_agent=decompose_agent, critique_agent=critique_agent, synthesize_agent=synthesize_agent, cognitive_loop_agent=cognitive_loop_agent, max_concurrency=settings.SELF_DISCOVER_SETTINGS["max_concurrency"])
     internal_dialogue_pipeline: providers.Factory[InternalDialoguePipeline] = providers.Factory(InternalDialoguePipeline, dialogue_participant_agent=dialogue_participant_agent, consciousness_staging_area=consciousness_staging_area, integrated_information_agent=integrated_information_agent)
     micro_llm_expert_pipeline: providers.Factory[MicroLLMExpertPipeline] = providers.Factory(MicroLLMExpertPipeline, llm_provider=llm_provider, tool_using_agent=tool_using_agent, tool_belt=tool_belt)
     conceptual_reasoning_pipeline: providers.Factory[ConceptualReasoningPipeline] = providers.Factory(ConceptualReasoningPipeline, planning_agent=planning_agent, cognitive_loop_agent=cognitive_loop_agent, master_agent=master_agent)
-    tree_of_thoughts_pipeline: providers.Factory[TreeOfThoughtsPipeline] = providers.Factory(TreeOfThoughtsPipeline, tree_of_thoughts_agent=tree_of_thoughts_agent)
-    iterative_correction_pipeline: providers.Factory[IterativeCorrectionPipeline] = providers.Factory(IterativeCorrectionPipeline, speculative_correction_agent=speculative_correction_agent, step_by_step_verifier_agent=step_by_step_verifier_agent)
+    tree_of_thoughts_pipeline: providers.Factory[TreeOfThoughtsPipeline] = providers.Factory(TreeOfThoughtsPipeline, tree_of_thoughts_agent=tree_of_thoughts_agent, strategy=settings.TREE_OF_THOUGHTS_SETTINGS["strategy"], strategy_options=settings.TREE_OF_THOUGHTS_SETTINGS["strategy_options"], max_llm_calls=settings.TREE_OF_THOUGHTS_SETTINGS["max_llm_calls"], max_seconds=settings.TREE_OF_THOUGHTS_SETTINGS["max_seconds"])
+    sandbox_candidate_verifier: providers.Factory[SandboxCandidateVerifier] = providers.Factory(SandboxCandidateVerifier, sandbox_manager=sandbox_manager, test_command=settings.ITERATIVE_CORRECTION_SETTINGS["test_command"], smoke_command=settings.ITERATIVE_CORRECTION_SETTINGS["smoke_command"], timeout_seconds=settings.ITERATIVE_CORRECTION_SETTINGS["timeout_seconds"], max_parallel=settings.ITERATIVE_CORRECTION_SETTINGS["max_parallel"])
+    iterative_correction_pipeline: providers.Factory[IterativeCorrectionPipeline] = providers.Factory(IterativeCorrectionPipeline, speculative_correction_agent=speculative_correction_agent, step_by_step_verifier_agent=step_by_step_verifier_agent, candidate_verifier=sandbox_candidate_verifier, mode=settings.ITERATIVE_CORRECTION_SETTINGS["mode"], num_candidates=settings.ITERATIVE_CORRECTION_SETTINGS["num_candidates"])
 
     # --- Top-Level System Providers ---
     self_evolving_system: providers.Factory[SelfEvolvingSystem] = providers.Factory(
@@ -330,6 +453,7 @@ class Container(containers.DeclarativeContainer):
         knowledge_gap_analyzer=knowledge_gap_analyzer,
         micro_llm_manager=micro_llm_manager,
         performance_benchmark_agent=performance_benchmark_agent,
+        integrity_monitor=integrity_monitor,
         emergent_network=providers.Factory(EmergentIntelligenceNetwork, provider=llm_provider),
         value_system=providers.Factory(EvolvingValueSystem, provider=llm_provider),
     )
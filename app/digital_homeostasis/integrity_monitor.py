@@ -2,9 +2,11 @@
 # title: 整合性モニター
 # role: AIの知識ベース（知識グラフ）の論理的整合性や情報鮮度を継続的に監視し、知的健全性の状態を評価する。
 
+import asyncio
 import logging
+import threading
 import time
-from typing import Dict, Any, List, TYPE_CHECKING
+from typing import Dict, Any, List, Optional, TYPE_CHECKING
 
 from app.knowledge_graph.persistent_knowledge_graph import PersistentKnowledgeGraph
 from langchain_core.prompts import ChatPromptTemplate
@@ -18,11 +20,22 @@ logger = logging.getLogger(__name__)
 class IntegrityMonitor:
     """
     AIの知識ベースの健全性を監視するクラス。
+
+    LLMによる整合性チェックはrefresh_health_status()でのみ実行し、結果をキャッシュする。
+    応答生成の経路から呼ばれるget_health_status()はキャッシュを返すだけで、LLMの呼び出しを待たない。
+    キャッシュはstatus_ttl_seconds経過するか知識グラフのバージョンが変わると古いとみなし、
+    System Governorの定期タスク、またはget_health_status()が起動するバックグラウンドのタスクで更新する。
     """
-    def __init__(self, llm: Any, knowledge_graph: PersistentKnowledgeGraph, analytics_collector: "AnalyticsCollector"):
+    def __init__(self, llm: Any, knowledge_graph: PersistentKnowledgeGraph, analytics_collector: "AnalyticsCollector", status_ttl_seconds: float = 600):
         self.llm = llm
         self.knowledge_graph = knowledge_graph
         self.analytics_collector = analytics_collector
+        self.status_ttl_seconds = status_ttl_seconds
+        self._status: Optional[Dict[str, Any]] = None
+        self._status_graph_version: Optional[int] = None
+        self._refreshing = False
+        self._refresh_task: Optional["asyncio.Task[Optional[Dict[str, Any]]]"] = None
+        self._state_lock = threading.Lock()
         self.consistency_check_prompt = ChatPromptTemplate.from_template(
             """あなたは論理分析の専門家です。以下の知識グラフの断片に、論理的な矛盾や不整合がないかを確認してください。
             矛盾を発見した場合は、その内容を具体的に指摘してください。問題がなければ「問題なし」と回答してください。
@@ -39,7 +52,7 @@ class IntegrityMonitor:
         知識グラフ全体の論理的整合性を非同期でチェックする。
         """
         logger.info("知識グラフの論理的整合性チェックを開始します...")
-        graph_string = self.knowledge_graph.get_graph().to_string()
+        graph_string = self.knowledge_graph.get_graph_string()
         
         graph_snippet = graph_string[:4000] if len(graph_string) > 4000 else graph_string
 
@@ -58,21 +71,62 @@ class IntegrityMonitor:
             logger.warning(f"論理的な不整合の可能性が検出されました: {result}")
             return [result]
 
-    async def get_health_status(self) -> Dict[str, Any]:
+    def needs_refresh(self) -> bool:
+        """キャッシュされたステータスがない、TTLを過ぎた、または知識グラフのバージョンが変わった場合にTrueを返す。"""
+        with self._state_lock:
+            if self._status is None:
+                return True
+            if time.time() - self._status["last_checked"] >= self.status_ttl_seconds:
+                return True
+            return self._status_graph_version != self.knowledge_graph.version
+
+    async def refresh_health_status(self) -> Dict[str, Any]:
         """
-        現在の知的健全性の全体的なステータスを非同期で返し、アナリティクスに送信する。
+        整合性チェックを実行してステータスを更新し、アナリティクスに送信する。
         """
-        # 修正: 非同期メソッドの呼び出し
+        graph_version = self.knowledge_graph.version
         inconsistencies = await self.check_logical_consistency()
-        
+
         status = {
             "is_healthy": not inconsistencies,
             "inconsistencies": inconsistencies,
             "last_checked": time.time()
         }
+        with self._state_lock:
+            self._status = status
+            self._status_graph_version = graph_version
         logger.info(f"現在の知的健全性ステータス: {'健全' if status['is_healthy'] else '要注意'}")
-        
-        # 修正: アナリティクスへの送信を非同期に
+
         await self.analytics_collector.log_event("integrity_status", status)
-        
-        return status
\ No newline at end of file
+        return status
+
+    async def refresh_if_needed(self) -> Optional[Dict[str, Any]]:
+        """
+        キャッシュが古い場合にだけステータスを更新する。他の更新が実行中の場合は何もしない。
+        """
+        if not self.needs_refresh():
+            return None
+        with self._state_lock:
+            if self._refreshing:
+                return None
+            self._refreshing = True
+        try:
+            return await self.refresh_health_status()
+        except Exception as e:
+            logger.error(f"知的健全性ステータスの更新中にエラーが発生しました: {e}", exc_info=True)
+            return None
+        finally:
+            with self._state_lock:
+                self._refreshing = False
+
+    async def get_health_status(self) -> Dict[str, Any]:
+        """
+        キャッシュされている知的健全性のステータスを返す。LLMの呼び出しは待たない。
+        キャッシュが古い場合は、バックグラウンドで更新を開始する。まだ一度もチェックしていない場合は健全とみなす。
+        """
+        if self.needs_refresh():
+            self._refresh_task = asyncio.get_running_loop().create_task(self.refresh_if_needed())
+        with self._state_lock:
+            if self._status is None:
+                return {"is_healthy": True, "inconsistencies": [], "last_checked": None}
+            return dict(self._status)
@@ -5,7 +5,9 @@
 from __future__ import annotations
 import logging
 import asyncio
-from typing import Dict, TYPE_CHECKING
+from typing import Dict, Optional, TYPE_CHECKING
+
+from app.memory.session_store import current_session_id
 
 if TYPE_CHECKING:
     from app.pipelines.base import BasePipeline
@@ -22,15 +24,16 @@ class MetaIntelligenceEngine:
         self.pipelines = pipelines
         self.resource_arbiter = resource_arbiter
 
-    def run(self, query: str, orchestration_decision: 'OrchestrationDecision') -> 'MasterAgentResponse':
+    def run(self, query: str, orchestration_decision: 'OrchestrationDecision', session_id: Optional[str] = None) -> 'MasterAgentResponse':
         """
         同期的なコンテキストからエンジンを実行するためのラッパーメソッド。
         """
-        return asyncio.run(self.arun(query, orchestration_decision))
+        return asyncio.run(self.arun(query, orchestration_decision, session_id))
 
-    async def arun(self, query: str, orchestration_decision: 'OrchestrationDecision') -> 'MasterAgentResponse':
+    async def arun(self, query: str, orchestration_decision: 'OrchestrationDecision', session_id: Optional[str] = None) -> 'MasterAgentResponse':
         """
         指定されたモードで適切なパイプラインを非同期で実行する。
+        session_idを指定すると、パイプライン内の処理（バックグラウンドの内部メンテナンスを含む）はそのセッションの状態を使う。
         """
         final_decision = self.resource_arbiter.arbitrate(orchestration_decision)
         
@@ -41,6 +44,7 @@ class MetaIntelligenceEngine:
             logger.warning(f"無効な実行モード '{chosen_mode}' が指定されました。'simple' モードにフォールバックします。")
             current_pipeline = self.pipelines["simple"]
         
+        token = current_session_id.set(session_id) if session_id else None
         try:
             logger.info(f"メインパイプライン '{chosen_mode}' で実行中...")
             response = await current_pipeline.arun(query, final_decision)
@@ -52,4 +56,7 @@ class MetaIntelligenceEngine:
                 self_criticism="致命的なエラーにより、自己評価は実行できませんでした。",
                 potential_problems="システムログを確認してください。",
                 retrieved_info=""
-            )
\ No newline at end of file
+            )
+        finally:
+            if token is not None:
+                current_session_id.reset(token)
\ No newline at end of file
@@ -2,8 +2,11 @@
 # title: 意識のステージングエリア
 # role: 内的対話が行われる「場」を提供し、調停者の指示に従って対話の進行を管理する。
 
+import asyncio
 import logging
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import Runnable
 from langchain_core.output_parsers import StrOutputParser
@@ -12,84 +15,206 @@ from app.internal_dialogue.mediator_agent import MediatorAgent
 
 logger = logging.getLogger(__name__)
 
+EmbedFunction = Callable[[List[str]], Any]
+
+# 調停者の発言にこれらの語が含まれていれば、結論を促したとみなして対話を終える
+CONCLUSION_KEYWORDS = ("結論", "統合", "まとめ")
+
+
 class ConsciousnessStagingArea:
     """
     多様な思考エージェントが対話を行う仮想的なステージ。
+
+    1つのラウンドで発言するエージェントは同じ時点の議論を見て意見を述べるため、全員の発言を並行して生成する
+    (同時に実行するLLM呼び出しはmax_concurrencyまで)。プロンプトに渡す議論は、直近のkeep_recent_turns件の発言と
+    それより古い発言の要約からなり、合計がmax_history_chars文字を超えるたびに古い発言を要約に畳み込むため、
+    対話が長くなってもプロンプトの大きさは一定に収まる。embed_fnを指定した場合、ラウンドの発言どうしの
+    埋め込みのコサイン類似度の平均がconvergence_threshold以上なら議論は収束したとみなし、調停者を呼ばずに対話を終える。
     """
-    def __init__(self, llm: Any, mediator_agent: MediatorAgent):
+    def __init__(
+        self,
+        llm: Any,
+        mediator_agent: MediatorAgent,
+        embed_fn: Optional[EmbedFunction] = None,
+        convergence_threshold: float = 0.9,
+        max_concurrency: int = 5,
+        max_history_chars: int = 6000,
+        keep_recent_turns: int = 6,
+        max_summary_chars: int = 1500,
+    ):
         self.llm = llm
         self.mediator_agent = mediator_agent
+        self.embed_fn = embed_fn
+        self.convergence_threshold = convergence_threshold
+        self.max_concurrency = max_concurrency
+        self.max_history_chars = max_history_chars
+        self.keep_recent_turns = keep_recent_turns
+        self.max_summary_chars = max_summary_chars
         self.output_parser = StrOutputParser()
-        self.dialogue_history: List[str] = []
-
-    def _run_single_turn(self, query: str, participant: Dict[str, str], current_history: str) -> str:
-        """個々の思考エージェントの意見を生成する。"""
-        prompt = ChatPromptTemplate.from_template(
+        self.turn_prompt = ChatPromptTemplate.from_template(
             """あなたは {persona}
             以下の元の要求とこれまでの議論を踏まえ、あなたの視点から意見を述べてください。
 
             元の要求: {query}
-            
+
             これまでの議論:
             {history}
             ---
             あなたの意見 (@{name}):
             """
         )
-        chain = prompt | self.llm | self.output_parser
-        response = chain.invoke({
-            "name": participant["name"],
-            "persona": participant["persona"],
-            "query": query,
-            "history": current_history
-        })
+        self.summary_prompt = ChatPromptTemplate.from_template(
+            """以下は、ある要求について複数の思考エージェントが行っている議論の、これまでの要約と続きの発言です。
+            誰がどのような主張をし、どこで合意し、どこが対立しているかが分かるように、全体を{max_chars}文字以内の1つの要約にまとめてください。
+
+            元の要求: {query}
+
+            これまでの要約:
+            {summary}
+
+            続きの発言:
+            {turns}
+            ---
+            新しい要約:
+            """
+        )
+        self.dialogue_history: List[str] = []
+        self._summary = ""
+        self._recent_turns: List[str] = []
+        self.last_stats: Dict[str, Any] = {}
+
+    def _build_turn_chain(self) -> Runnable:
+        return self.turn_prompt | self.llm | self.output_parser
+
+    def _history_for_prompt(self) -> str:
+        """プロンプトに渡す議論(古い発言の要約と直近の発言)。"""
+        parts = []
+        if self._summary:
+            parts.append(f"(これまでの議論の要約)\n{self._summary}")
+        parts.extend(self._recent_turns)
+        history = "\n".join(parts)
+        # 直近の発言だけで上限を超える場合は、新しい側を残して切り詰める
+        return history[-self.max_history_chars:]
+
+    def _append(self, statements: List[str]) -> None:
+        for statement in statements:
+            self.dialogue_history.append(statement)
+            self._recent_turns.append(statement)
+            logger.info(statement)
+
+    async def _compact_history(self, query: str) -> None:
+        """議論が上限を超えていれば、直近の発言を残して古い発言を要約に畳み込む。"""
+        history_chars = len(self._summary) + sum(len(turn) for turn in self._recent_turns)
+        if history_chars <= self.max_history_chars or len(self._recent_turns) <= self.keep_recent_turns:
+            return
+        cut = len(self._recent_turns) - self.keep_recent_turns
+        evicted, self._recent_turns = self._recent_turns[:cut], self._recent_turns[cut:]
+        turns = "\n".join(evicted)
+        chain = self.summary_prompt | self.llm | self.output_parser
+        try:
+            summary = await chain.ainvoke({
+                "query": query,
+                "summary": self._summary or "(なし)",
+                "turns": turns,
+                "max_chars": self.max_summary_chars,
+            })
+        except Exception as e:
+            logger.warning(f"議論の要約に失敗したため、古い発言を切り詰めて残します: {e}")
+            summary = f"{self._summary}\n{turns}".strip()
+        self._summary = summary.strip()[:self.max_summary_chars]
+        self.last_stats["summarized_turns"] = self.last_stats.get("summarized_turns", 0) + len(evicted)
+        logger.info(f"議論のうち古い{len(evicted)}件の発言を要約に畳み込みました。")
+
+    async def _run_single_turn(self, query: str, participant: Dict[str, str], history: str, semaphore: asyncio.Semaphore) -> str:
+        """個々の思考エージェントの意見を生成する。"""
+        async with semaphore:
+            response = await self._build_turn_chain().ainvoke({
+                "name": participant["name"],
+                "persona": participant["persona"],
+                "query": query,
+                "history": history,
+            })
         return f"@{participant['name']}: {response}"
 
-    def run_dialogue(self, query: str, participants: List[Dict[str, str]], max_turns: int = 5) -> str:
+    async def _run_round(self, query: str, speakers: List[Dict[str, str]], semaphore: asyncio.Semaphore) -> List[str]:
+        """同じ時点の議論を見せて、発言者全員の意見を並行して生成する。発言は発言者の順に並べて返す。"""
+        history = self._history_for_prompt()
+        statements = await asyncio.gather(*(self._run_single_turn(query, p, history, semaphore) for p in speakers))
+        self._append(list(statements))
+        self.last_stats["rounds"] = self.last_stats.get("rounds", 0) + 1
+        await self._compact_history(query)
+        return list(statements)
+
+    def _agreement(self, statements: List[str]) -> Optional[float]:
+        """発言どうしの埋め込みのコサイン類似度の平均。判定できない場合はNoneを返す。"""
+        if self.embed_fn is None or len(statements) < 2:
+            return None
+        texts = [statement.split(": ", 1)[-1] for statement in statements]
+        try:
+            vectors = np.asarray(self.embed_fn(texts), dtype="float32")
+        except Exception as e:
+            logger.warning(f"発言の埋め込みに失敗したため、収束の判定を行いません: {e}")
+            return None
+        if vectors.ndim != 2 or len(vectors) != len(texts):
+            return None
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.where(norms == 0, 1, norms)
+        similarities = vectors @ vectors.T
+        n = len(texts)
+        return float((similarities.sum() - np.trace(similarities)) / (n * (n - 1)))
+
+    async def _converged(self, statements: List[str]) -> bool:
+        agreement = await asyncio.to_thread(self._agreement, statements) if self.embed_fn else None
+        if agreement is None:
+            return False
+        logger.info(f"ラウンドの発言の一致度: {agreement:.3f} (閾値: {self.convergence_threshold})")
+        return agreement >= self.convergence_threshold
+
+    async def arun_dialogue(self, query: str, participants: List[Dict[str, str]], max_turns: int = 5) -> str:
         """
-        内省的な対話の全プロセスを実行する。
+        内省的な対話の全プロセスを実行し、統合に使う議論(古い発言の要約と直近の発言)を返す。
+        全発言の記録はdialogue_historyに残る。
         """
         self.dialogue_history = []
+        self._summary = ""
+        self._recent_turns = []
+        self.last_stats = {"rounds": 0, "mediator_calls": 0, "mediator_skipped": 0, "summarized_turns": 0, "converged": False}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
         logger.info(f"--- 内的対話開始 --- 要求: '{query}'")
         logger.info(f"参加エージェント: {[p['name'] for p in participants]}")
 
+        # 最初のラウンドでは全員に一度ずつ発言させる
+        statements = await self._run_round(query, participants, semaphore)
+
         for turn in range(max_turns):
             logger.info(f"--- 対話ターン {turn + 1}/{max_turns} ---")
-            
-            # 全員に一度ずつ発言させる
-            if turn == 0:
-                for p in participants:
-                    statement = self._run_single_turn(query, p, "\n".join(self.dialogue_history))
-                    self.dialogue_history.append(statement)
-                    logger.info(statement)
-            
+
+            if await self._converged(statements):
+                logger.info("発言が十分に一致したため、調停者の呼び出しを省略して対話を終了します。")
+                self.last_stats["mediator_skipped"] += 1
+                self.last_stats["converged"] = True
+                break
+
             # 調停者が介入
-            mediator_input = {
+            mediator_action = await self.mediator_agent.ainvoke({
                 "query": query,
-                "dialogue_history": "\n".join(self.dialogue_history)
-            }
-            mediator_action = self.mediator_agent.invoke(mediator_input)
-            self.dialogue_history.append(f"@調停者: {mediator_action}")
-            logger.info(f"@調停者: {mediator_action}")
+                "dialogue_history": self._history_for_prompt(),
+            })
+            self.last_stats["mediator_calls"] += 1
+            self._append([f"@調停者: {mediator_action}"])
 
             # 結論を出すように指示されたら終了
-            if "結論" in mediator_action or "統合" in mediator_action or "まとめ" in mediator_action:
+            if any(keyword in mediator_action for keyword in CONCLUSION_KEYWORDS):
                 logger.info("調停者が結論を促したため、対話を終了します。")
                 break
-                
-            # 特定のエージェントが指名された場合、そのエージェントに発言させる
+
+            # 特定のエージェントが指名された場合はそのエージェントに、指名がない場合は全員に再度発言させる
             mentioned_agents = [p for p in participants if f"@{p['name']}" in mediator_action]
-            if mentioned_agents:
-                for p in mentioned_agents:
-                     statement = self._run_single_turn(query, p, "\n".join(self.dialogue_history))
-                     self.dialogue_history.append(statement)
-                     logger.info(statement)
-            else: # 指名がない場合は全員に再度発言させる
-                 for p in participants:
-                    statement = self._run_single_turn(query, p, "\n".join(self.dialogue_history))
-                    self.dialogue_history.append(statement)
-                    logger.info(statement)
-
-        final_summary = "\n".join(self.dialogue_history)
-        logger.info("--- 内的対話終了 ---")
-        return final_summary
\ No newline at end of file
+            statements = await self._run_round(query, mentioned_agents or participants, semaphore)
+
+        logger.info(f"--- 内的対話終了 --- {self.last_stats}")
+        return self._history_for_prompt()
+
+    def run_dialogue(self, query: str, participants: List[Dict[str, str]], max_turns: int = 5) -> str:
+        """arun_dialogueの同期版。"""
+        return asyncio.run(self.arun_dialogue(query, participants, max_turns=max_turns))
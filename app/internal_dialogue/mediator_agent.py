@@ -48,4 +48,13 @@ class MediatorAgent(AIAgent):
 
         if self._chain is None:
             raise RuntimeError("MediatorAgent's chain is not initialized.")
-        return self._chain.invoke(input_data)
\ No newline at end of file
+        return self._chain.invoke(input_data)
+
+    async def ainvoke(self, input_data: Dict[str, Any]) -> str:
+        if not isinstance(input_data, dict):
+            raise TypeError("MediatorAgent expects a dictionary as input.")
+
+        if self._chain is None:
+            raise RuntimeError("MediatorAgent's chain is not initialized.")
+        result: str = await self._chain.ainvoke(input_data)
+        return result
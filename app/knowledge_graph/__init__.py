@@ -3,4 +3,7 @@
 # role: このディレクトリをPythonのパッケージとして定義する。
 
 from .models import Node, Edge, KnowledgeGraph
+from .entity_resolution import EntityResolver
+from .retention import GraphRetentionPolicy, ColdStorageArchive
+from .columnar import ColumnarGraphStore
 from .persistent_knowledge_graph import PersistentKnowledgeGraph
\ No newline at end of file
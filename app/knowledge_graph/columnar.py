@@ -0,0 +1,334 @@
+# /app/knowledge_graph/columnar.py
+# title: 列指向の知識グラフストア
+# role: ノードとエッジを文字列のインターンと配列ベースの列で保持し、大規模なグラフのメモリ使用量を抑える。Pydanticモデルは参照時にのみ生成する。
+
+from array import array
+from datetime import datetime, timezone
+import math
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .models import Edge, KnowledgeGraph, LazyModelList, Node
+
+_TIMESTAMP_KEYS = ("created_at", "last_accessed")
+
+
+def _timestamp_to_float(value: Any) -> Optional[float]:
+    """ISO形式(タイムゾーンなしはUTCとみなす)の日時文字列をUNIX時刻に変換する。変換できない場合はNoneを返す。"""
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        # タイムゾーン付きの値は文字列に戻したときに同じ表記にならないため、列には格納しない
+        return None
+    return parsed.replace(tzinfo=timezone.utc).timestamp()
+
+
+def _float_to_timestamp(value: float) -> str:
+    return datetime.fromtimestamp(value, timezone.utc).replace(tzinfo=None).isoformat()
+
+
+class StringInterner:
+    """文字列に連番の整数IDを割り当て、同じ文字列を一つのオブジェクトで共有する。"""
+    def __init__(self) -> None:
+        self._strings: List[str] = []
+        self._ids: Dict[str, int] = {}
+
+    def intern(self, value: str) -> int:
+        string_id = self._ids.get(value)
+        if string_id is None:
+            string_id = len(self._strings)
+            self._strings.append(value)
+            self._ids[value] = string_id
+        return string_id
+
+    def lookup(self, value: str) -> Optional[int]:
+        return self._ids.get(value)
+
+    def __getitem__(self, string_id: int) -> str:
+        return self._strings[string_id]
+
+    def __len__(self) -> int:
+        return len(self._strings)
+
+
+class _ColumnView(LazyModelList):
+    """行番号を生データとして保持し、参照時に列からモデルを組み立てる遅延リスト。"""
+    def __init__(self, size: int, converter: Any, peek_fn: Any):
+        super().__init__(range(size), converter)
+        self._peek_fn = peek_fn
+
+    def peek(self, index: int, field: str) -> Any:
+        item = list.__getitem__(self, index)
+        if isinstance(item, int):
+            return self._peek_fn(item, field)
+        return getattr(item, field)
+
+    def clone(self) -> LazyModelList:
+        return self.derive(self.iter_raw())
+
+    def derive(self, raw_items: Iterable[Any]) -> LazyModelList:
+        view = _ColumnView(0, self._converter, self._peek_fn)
+        view.extend(raw_items)
+        return view
+
+    def replace_field(self, index: int, field: str, value: Any) -> Any:
+        item = list.__getitem__(self, index)
+        if isinstance(item, int):
+            item = self._converter(item)
+        return item.model_copy(update={field: value})
+
+
+def _peek(items: List[Any], index: int, field: str) -> Any:
+    if isinstance(items, LazyModelList):
+        return items.peek(index, field)
+    return getattr(items[index], field)
+
+
+def _weight(value: Any) -> float:
+    # 旧形式の行には重みがないことがある(Edgeの既定値は1.0)
+    return 1.0 if value is None else float(value)
+
+
+class ColumnarGraphStore:
+    """
+    知識グラフを列指向で保持するストア。
+
+    - ノードIDとラベル、エッジのラベルはインターンされ、列には整数IDだけを格納する。
+    - エッジは始点・終点のノードID(インターンされた整数ID)、ラベルID、重みの配列(array)として保持する。
+      既存の知識グラフと同様に、端点のノードが存在しないエッジも保持できる。
+    - 作成日時と最終アクセス日時はUNIX時刻の浮動小数点数で保持する(未設定はNaN)。
+    - 空でないプロパティと、日時以外のメタデータだけを疎な辞書で保持する。
+    NodeやEdgeのPydanticモデルは、get_node/node_at/edge_atやto_knowledge_graphのビューを参照したときにのみ生成される。
+    PersistentKnowledgeGraphが保持に使う場合、ビューを公開した後のストアは変更せず、書き込みはビューの側で行う。
+    """
+    def __init__(self) -> None:
+        self.strings = StringInterner()
+        self._node_index: Dict[str, int] = {}
+        self._node_ids = array("i")
+        self._node_labels = array("i")
+        self._created_at = array("d")
+        self._last_accessed = array("d")
+        self._node_properties: Dict[int, Dict[str, Any]] = {}
+        self._node_metadata: Dict[int, Dict[str, Any]] = {}
+
+        self._edge_index: Dict[int, int] = {}
+        self._edge_sources = array("i")
+        self._edge_targets = array("i")
+        self._edge_labels = array("i")
+        self._edge_weights = array("d")
+        self._edge_properties: Dict[int, Dict[str, Any]] = {}
+
+    # --- 構築 ---
+    @classmethod
+    def from_graph(cls, graph: KnowledgeGraph) -> "ColumnarGraphStore":
+        """
+        KnowledgeGraphから列指向ストアを構築する。
+        遅延検証リスト(スナップショットから読み込んだグラフや列指向ストアのビュー)の要素は検証せずに値だけを取り出す。
+        """
+        store = cls()
+        nodes, edges = graph.nodes, graph.edges
+        for i in range(len(nodes)):
+            store._add_node_values(
+                _peek(nodes, i, "id"), _peek(nodes, i, "label"), _peek(nodes, i, "properties") or {}, _peek(nodes, i, "metadata")
+            )
+        for i in range(len(edges)):
+            store._add_edge_values(
+                _peek(edges, i, "source"), _peek(edges, i, "target"), _peek(edges, i, "label"),
+                _weight(_peek(edges, i, "weight")), _peek(edges, i, "properties") or {},
+            )
+        return store
+
+    @classmethod
+    def from_raw(cls, raw_nodes: Iterable[Dict[str, Any]], raw_edges: Iterable[Dict[str, Any]]) -> "ColumnarGraphStore":
+        """
+        JSONやスナップショットから読み込んだ辞書のままのノードとエッジから、モデルを経由せずにストアを構築する。
+        """
+        store = cls()
+        for raw in raw_nodes:
+            store._add_node_values(raw["id"], raw["label"], raw.get("properties") or {}, raw.get("metadata"))
+        for raw in raw_edges:
+            store._add_edge_values(
+                raw["source"], raw["target"], raw["label"], _weight(raw.get("weight")), raw.get("properties") or {}
+            )
+        return store
+
+    def _add_node_values(self, node_id: str, label: str, properties: Dict[str, Any], metadata: Optional[Dict[str, Any]]) -> int:
+        index = self._node_index.get(node_id)
+        if index is not None:
+            return index
+        index = len(self._node_ids)
+        id_sid = self.strings.intern(node_id)
+        self._node_index[self.strings[id_sid]] = index
+        self._node_ids.append(id_sid)
+        self._node_labels.append(self.strings.intern(label))
+        if metadata is None:
+            now = datetime.utcnow().replace(tzinfo=timezone.utc).timestamp()
+            timestamps, extra = (now, now), {}
+        else:
+            extra = dict(metadata)
+            timestamps = []
+            for key in _TIMESTAMP_KEYS:
+                value = _timestamp_to_float(extra.get(key))
+                if value is None:
+                    timestamps.append(math.nan)
+                else:
+                    timestamps.append(value)
+                    del extra[key]
+        self._created_at.append(timestamps[0])
+        self._last_accessed.append(timestamps[1])
+        if properties:
+            self._node_properties[index] = properties
+        if extra:
+            self._node_metadata[index] = extra
+        return index
+
+    def _edge_key(self, source: int, target: int, label: int) -> int:
+        return (source << 64) | (target << 32) | label
+
+    def _add_edge_values(self, source: str, target: str, label: str, weight: float, properties: Dict[str, Any]) -> int:
+        source_sid = self.strings.intern(source)
+        target_sid = self.strings.intern(target)
+        label_sid = self.strings.intern(label)
+        key = self._edge_key(source_sid, target_sid, label_sid)
+        index = self._edge_index.get(key)
+        if index is not None:
+            # 既存のエッジは重みを合算する(LTP)
+            self._edge_weights[index] += weight
+            return index
+        index = len(self._edge_sources)
+        self._edge_index[key] = index
+        self._edge_sources.append(source_sid)
+        self._edge_targets.append(target_sid)
+        self._edge_labels.append(label_sid)
+        self._edge_weights.append(weight)
+        if properties:
+            self._edge_properties[index] = properties
+        return index
+
+    def add_node(self, node: Node) -> int:
+        """ノードを追加し、その行番号を返す。同じIDのノードが既にあれば既存の行番号を返す。"""
+        return self._add_node_values(node.id, node.label, node.properties, node.metadata)
+
+    def add_edge(self, edge: Edge) -> int:
+        """エッジを追加し、その行番号を返す。始点・ラベル・終点が同じエッジが既にあれば重みを合算する。"""
+        return self._add_edge_values(edge.source, edge.target, edge.label, edge.weight, edge.properties)
+
+    # --- 参照 ---
+    @property
+    def num_nodes(self) -> int:
+        return len(self._node_ids)
+
+    @property
+    def num_edges(self) -> int:
+        return len(self._edge_sources)
+
+    def node_index(self, node_id: str) -> Optional[int]:
+        return self._node_index.get(node_id)
+
+    def _node_metadata_at(self, index: int) -> Dict[str, Any]:
+        metadata = dict(self._node_metadata.get(index, {}))
+        for key, column in zip(_TIMESTAMP_KEYS, (self._created_at, self._last_accessed)):
+            if not math.isnan(column[index]):
+                metadata[key] = _float_to_timestamp(column[index])
+        return metadata
+
+    def node_at(self, index: int) -> Node:
+        """行番号のノードをPydanticモデルとして生成する。"""
+        return Node.model_construct(
+            id=self.strings[self._node_ids[index]],
+            label=self.strings[self._node_labels[index]],
+            properties=dict(self._node_properties.get(index, {})),
+            metadata=self._node_metadata_at(index),
+        )
+
+    def get_node(self, node_id: str) -> Optional[Node]:
+        index = self._node_index.get(node_id)
+        return self.node_at(index) if index is not None else None
+
+    def edge_at(self, index: int) -> Edge:
+        """行番号のエッジをPydanticモデルとして生成する。"""
+        return Edge.model_construct(
+            source=self.strings[self._edge_sources[index]],
+            target=self.strings[self._edge_targets[index]],
+            label=self.strings[self._edge_labels[index]],
+            properties=dict(self._edge_properties.get(index, {})),
+            weight=self._edge_weights[index],
+        )
+
+    def iter_edges_of(self, node_id: str) -> Iterator[Edge]:
+        """指定したノードを始点または終点とするエッジを返す。"""
+        sid = self.strings.lookup(node_id)
+        if sid is None:
+            return
+        sources = np.frombuffer(self._edge_sources, dtype=np.int32)
+        targets = np.frombuffer(self._edge_targets, dtype=np.int32)
+        matches = np.flatnonzero((sources == sid) | (targets == sid))
+        del sources, targets
+        for edge_index in matches:
+            yield self.edge_at(int(edge_index))
+
+    def label_counts(self) -> Dict[str, int]:
+        """ラベルごとのノード数を返す。"""
+        counts = np.bincount(np.frombuffer(self._node_labels, dtype=np.int32).copy(), minlength=len(self.strings))
+        return {self.strings[sid]: int(count) for sid, count in enumerate(counts) if count}
+
+    def _peek_node(self, index: int, field: str) -> Any:
+        if field == "id":
+            return self.strings[self._node_ids[index]]
+        if field == "label":
+            return self.strings[self._node_labels[index]]
+        if field == "properties":
+            return self._node_properties.get(index, {})
+        return self._node_metadata_at(index)
+
+    def _peek_edge(self, index: int, field: str) -> Any:
+        if field == "source":
+            return self.strings[self._edge_sources[index]]
+        if field == "target":
+            return self.strings[self._edge_targets[index]]
+        if field == "label":
+            return self.strings[self._edge_labels[index]]
+        if field == "weight":
+            return self._edge_weights[index]
+        return self._edge_properties.get(index, {})
+
+    # --- 更新 ---
+    def touch(self, node_id: str, timestamp: Optional[float] = None) -> None:
+        """ノードの最終アクセス日時を更新する。"""
+        index = self._node_index.get(node_id)
+        if index is not None:
+            self._last_accessed[index] = timestamp if timestamp is not None else datetime.now(timezone.utc).timestamp()
+
+    def scale_weights(self, factor: float) -> None:
+        """全エッジの重みを一括で定数倍する(重みの減衰に使う)。"""
+        weights = np.frombuffer(self._edge_weights, dtype=np.float64)
+        weights *= factor
+        # numpyのビューが残っていると配列への追加ができないため、ここで解放する
+        del weights
+
+    # --- 境界での変換 ---
+    def to_knowledge_graph(self) -> KnowledgeGraph:
+        """
+        ストアの内容をKnowledgeGraphとして返す。ノードとエッジは参照時に列から生成される。
+        返されたグラフはその時点のストアの行を参照するため、ストアへの追加後は作り直すこと。
+        """
+        return KnowledgeGraph.model_construct(
+            nodes=_ColumnView(self.num_nodes, self.node_at, self._peek_node),
+            edges=_ColumnView(self.num_edges, self.edge_at, self._peek_edge),
+        )
+
+    def memory_usage(self) -> Dict[str, int]:
+        """列と索引のおおよそのメモリ使用量(バイト)を返す。疎な辞書に保持したプロパティの中身は含まない。"""
+        columns = sum(
+            column.buffer_info()[1] * column.itemsize
+            for column in (
+                self._node_ids, self._node_labels, self._created_at, self._last_accessed,
+                self._edge_sources, self._edge_targets, self._edge_labels, self._edge_weights,
+            )
+        )
+        return {"columns": columns, "num_strings": len(self.strings)}
@@ -0,0 +1,375 @@
+# /app/knowledge_graph/entity_resolution.py
+# title: エンティティ解決
+# role: 表記揺れや言語違いによる重複ノードを正規化ルールと埋め込み類似度で検出し、エッジを付け替えて統合する。
+
+import logging
+import re
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import AbstractSet, Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .models import Edge, KnowledgeGraph, Node, iter_transient
+
+logger = logging.getLogger(__name__)
+
+EmbedFunction = Callable[[List[str]], np.ndarray]
+
+_PARENTHESIS_PATTERN = re.compile(r"[\(（\[［【].*?[\)）\]］】]")
+_SEPARATOR_PATTERN = re.compile(r"[\s_\-‐・･/,、。.]+")
+
+
+def normalize_entity_name(name: str) -> str:
+    """
+    エンティティ名を比較用のキーに正規化する。
+    全角/半角の統一(NFKC)、大文字小文字の統一、ひらがなのカタカナ化、括弧書きと区切り文字の除去を行う。
+    """
+    text = unicodedata.normalize("NFKC", name or "").casefold()
+    without_parenthesis = _PARENTHESIS_PATTERN.sub("", text)
+    # 括弧書きのみの名前の場合は括弧を除去した結果が空になるため、元の文字列を使う
+    if without_parenthesis.strip():
+        text = without_parenthesis
+    text = "".join(chr(ord(c) + 0x60) if "ぁ" <= c <= "ゖ" else c for c in text)
+    return _SEPARATOR_PATTERN.sub("", text)
+
+
+class _UnionFind:
+    """重複候補のクラスタリングに使う素集合データ構造。"""
+    def __init__(self) -> None:
+        self.parent: Dict[str, str] = {}
+
+    def find(self, item: str) -> str:
+        self.parent.setdefault(item, item)
+        root = item
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[item] != root:
+            self.parent[item], item = root, self.parent[item]
+        return root
+
+    def union(self, a: str, b: str) -> None:
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+
+@dataclass
+class IncomingMatch:
+    """
+    match_incomingの結果。mappingは{新規ID: 正規ID}。
+    インデックスに追加するキーと埋め込みは、マージが公開された後にEntityResolver.commit()で反映する。
+    """
+    mapping: Dict[str, str]
+    new_keys: Dict[str, str] = field(default_factory=dict)
+    new_vectors: List[Tuple[str, np.ndarray]] = field(default_factory=list)
+
+
+class EntityResolver:
+    """
+    知識グラフのノード重複を解決するクラス。
+    正規化キーの完全一致と、埋め込みベクトルのLSH(ランダム超平面)ブロッキングによる
+    近傍候補のコサイン類似度比較を組み合わせ、全ノード対の比較を避ける。
+    """
+    def __init__(
+        self,
+        embed_fn: Optional[EmbedFunction] = None,
+        similarity_threshold: float = 0.92,
+        num_tables: int = 4,
+        num_bits: int = 12,
+        max_bucket_size: int = 64,
+        aliases: Optional[Dict[str, str]] = None,
+        seed: int = 42,
+    ):
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self.num_tables = num_tables
+        self.num_bits = num_bits
+        self.max_bucket_size = max_bucket_size
+        self.aliases = {normalize_entity_name(k): normalize_entity_name(v) for k, v in (aliases or {}).items()}
+        self._rng = np.random.default_rng(seed)
+        self._hyperplanes: Optional[np.ndarray] = None
+
+        # 増分マージ用のインデックス
+        self._key_index: Dict[str, str] = {}
+        self._vectors: Dict[str, np.ndarray] = {}
+        self._buckets: Dict[Tuple[int, int], Set[str]] = defaultdict(set)
+        # index_graph()で登録したが、まだ埋め込みを計算していない既存ノード
+        self._unembedded: List[str] = []
+
+    # --- 正規化と埋め込み ---
+    def normalize(self, name: str) -> str:
+        """正規化キーを返す。エイリアス辞書に登録があれば正規形に置き換える。"""
+        key = normalize_entity_name(name)
+        return self.aliases.get(key, key)
+
+    def _node_keys(self, node: Node) -> List[str]:
+        """ノードIDと既知の別名から正規化キーの一覧を作る。"""
+        names = [node.id] + [a for a in node.properties.get("aliases", []) if isinstance(a, str)]
+        return [key for key in dict.fromkeys(self.normalize(name) for name in names) if key]
+
+    def _embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        """埋め込み関数で正規化済みベクトルを計算する。利用できない場合はNoneを返す。"""
+        if self.embed_fn is None or not texts:
+            return None
+        try:
+            vectors = np.asarray(self.embed_fn(texts), dtype="float32")
+        except Exception as e:
+            logger.error(f"エンティティ名の埋め込み計算に失敗しました: {e}", exc_info=True)
+            return None
+        if vectors.ndim != 2 or vectors.shape[0] != len(texts):
+            logger.warning("埋め込み関数から予期しない形状の結果が返されたため、埋め込み比較をスキップします。")
+            return None
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def _signatures(self, vectors: np.ndarray) -> np.ndarray:
+        """各テーブルのLSHシグネチャ(ビット列を整数化したもの)を計算する。形状は(N, num_tables)。"""
+        if self._hyperplanes is None or self._hyperplanes.shape[2] != vectors.shape[1]:
+            self._hyperplanes = self._rng.standard_normal((self.num_tables, self.num_bits, vectors.shape[1])).astype("float32")
+            self._buckets.clear()
+            self._vectors.clear()
+        bits = np.einsum("tbd,nd->ntb", self._hyperplanes, vectors) > 0
+        weights = 1 << np.arange(self.num_bits)
+        return (bits * weights).sum(axis=2)
+
+    # --- インデックス管理 ---
+    def index_graph(self, graph: KnowledgeGraph) -> None:
+        """
+        既存グラフの正規化キーインデックスを構築する。
+        埋め込みがまだないノードは記録しておき、最初のmatch_incoming()でまとめて計算する。
+        """
+        self._key_index = {}
+        for node in iter_transient(graph.nodes):
+            for key in self._node_keys(node):
+                self._key_index.setdefault(key, node.id)
+        self._unembedded = [node_id for node_id in dict.fromkeys(self._key_index.values()) if node_id not in self._vectors]
+
+    def _embed_unembedded(self) -> None:
+        """既存ノードのうち埋め込みがないものを埋め込み、LSHインデックスに登録する。"""
+        if not self._unembedded or self.embed_fn is None:
+            return
+        node_ids, self._unembedded = self._unembedded, []
+        vectors = self._embed(node_ids)
+        if vectors is not None:
+            self._index_vectors(node_ids, vectors)
+            logger.info(f"既存の{len(node_ids)}個のノードの埋め込みをエンティティ解決のインデックスに登録しました。")
+
+    def _index_vectors(self, node_ids: List[str], vectors: np.ndarray) -> None:
+        signatures = self._signatures(vectors)
+        for node_id, vector, signature in zip(node_ids, vectors, signatures):
+            self._vectors[node_id] = vector
+            for table, bucket in enumerate(signature):
+                self._buckets[(table, int(bucket))].add(node_id)
+
+    def forget(self, node_ids: Iterable[str]) -> None:
+        """統合や削除で消えたノードをインデックスから取り除く。"""
+        removed = set(node_ids)
+        if not removed:
+            return
+        self._key_index = {k: v for k, v in self._key_index.items() if v not in removed}
+        self._unembedded = [node_id for node_id in self._unembedded if node_id not in removed]
+        for node_id in removed:
+            self._vectors.pop(node_id, None)
+        for bucket in self._buckets.values():
+            bucket.difference_update(removed)
+
+    def _nearest_indexed(self, vector: np.ndarray, signature: np.ndarray, exclude: str) -> Optional[str]:
+        """同じLSHバケットに入った既存ノードの中から、閾値を超える最も類似したノードを返す。"""
+        candidates: Set[str] = set()
+        for table, bucket in enumerate(signature):
+            members = self._buckets.get((table, int(bucket)))
+            if members and len(members) <= self.max_bucket_size:
+                candidates.update(members)
+        candidates.discard(exclude)
+        best_id, best_score = None, self.similarity_threshold
+        for candidate in candidates:
+            score = float(np.dot(vector, self._vectors[candidate]))
+            if score >= best_score:
+                best_id, best_score = candidate, score
+        return best_id
+
+    # --- 増分マージ ---
+    def match_incoming(self, nodes: List[Node], existing_ids: AbstractSet[str]) -> IncomingMatch:
+        """
+        新規ノードを既存ノードに対応付ける。対応先が見つからないノードは自分自身を正規IDとする。
+        インデックスは変更せず、追加分はcommit()で反映する(マージが失敗した場合に古い項目が残らないようにするため)。
+        """
+        self._embed_unembedded()
+        match = IncomingMatch(mapping={})
+
+        def lookup(node: Node) -> Optional[str]:
+            for key in self._node_keys(node):
+                canonical = match.new_keys.get(key) or self._key_index.get(key)
+                if canonical is not None:
+                    return canonical
+            return None
+
+        unmatched: List[Node] = []
+        for node in nodes:
+            if node.id in existing_ids:
+                match.mapping[node.id] = node.id
+                continue
+            canonical = lookup(node)
+            if canonical is not None:
+                match.mapping[node.id] = canonical
+            else:
+                unmatched.append(node)
+
+        vectors = self._embed([n.id for n in unmatched])
+        signatures = self._signatures(vectors) if vectors is not None else None
+        for i, node in enumerate(unmatched):
+            # 同じバッチ内の先行ノードと正規化キーが一致する場合はそちらに寄せる
+            canonical = lookup(node)
+            if canonical is None and vectors is not None and signatures is not None:
+                canonical = self._nearest_indexed(vectors[i], signatures[i], exclude=node.id)
+                if canonical is None:
+                    canonical = self._nearest_staged(vectors[i], match.new_vectors)
+            if canonical is None:
+                canonical = node.id
+                if vectors is not None:
+                    match.new_vectors.append((node.id, vectors[i]))
+            match.mapping[node.id] = canonical
+            for key in self._node_keys(node):
+                if key not in self._key_index:
+                    match.new_keys.setdefault(key, canonical)
+
+        merged = {k: v for k, v in match.mapping.items() if k != v}
+        if merged:
+            logger.info(f"エンティティ解決により {len(merged)}個の新規ノードを既存ノードに統合します: {merged}")
+        return match
+
+    def _nearest_staged(self, vector: np.ndarray, staged: List[Tuple[str, np.ndarray]]) -> Optional[str]:
+        """同じバッチで新規に登録されるノードの中から、閾値を超える最も類似したノードを返す。"""
+        best_id, best_score = None, self.similarity_threshold
+        for node_id, staged_vector in staged:
+            score = float(np.dot(vector, staged_vector))
+            if score >= best_score:
+                best_id, best_score = node_id, score
+        return best_id
+
+    def commit(self, match: IncomingMatch) -> None:
+        """公開されたマージの正規化キーと埋め込みをインデックスに反映する。"""
+        for key, canonical in match.new_keys.items():
+            self._key_index.setdefault(key, canonical)
+        if match.new_vectors:
+            self._index_vectors([node_id for node_id, _ in match.new_vectors], np.stack([v for _, v in match.new_vectors]))
+
+    # --- バッチコンパクション ---
+    def find_duplicate_clusters(self, graph: KnowledgeGraph) -> List[List[str]]:
+        """グラフ全体から重複ノードのクラスタ(2ノード以上)を抽出する。"""
+        union_find = _UnionFind()
+        first_by_key: Dict[str, str] = {}
+        node_ids: List[str] = []
+        for node in iter_transient(graph.nodes):
+            node_ids.append(node.id)
+            union_find.find(node.id)
+            for key in self._node_keys(node):
+                if key in first_by_key:
+                    union_find.union(first_by_key[key], node.id)
+                else:
+                    first_by_key[key] = node.id
+
+        vectors = self._embed(node_ids)
+        if vectors is not None:
+            self._buckets.clear()
+            self._vectors.clear()
+            self._index_vectors(node_ids, vectors)
+            for members in self._buckets.values():
+                if len(members) < 2 or len(members) > self.max_bucket_size:
+                    continue
+                ordered = sorted(members)
+                matrix = np.stack([self._vectors[m] for m in ordered])
+                scores = matrix @ matrix.T
+                rows, cols = np.nonzero(np.triu(scores >= self.similarity_threshold, k=1))
+                for r, c in zip(rows, cols):
+                    union_find.union(ordered[r], ordered[c])
+
+        clusters: Dict[str, List[str]] = defaultdict(list)
+        for node_id in node_ids:
+            clusters[union_find.find(node_id)].append(node_id)
+        return [members for members in clusters.values() if len(members) > 1]
+
+    def compact(self, graph: KnowledgeGraph) -> Tuple[KnowledgeGraph, int]:
+        """
+        重複ノードを統合したグラフを新たに構築して返す。
+        戻り値は (統合後のグラフ, 統合により削除されたノード数)。
+        """
+        clusters = self.find_duplicate_clusters(graph)
+        if not clusters:
+            self.index_graph(graph)
+            return graph, 0
+
+        degree: Dict[str, int] = defaultdict(int)
+        for edge in graph.edges:
+            degree[edge.source] += 1
+            degree[edge.target] += 1
+        nodes_by_id = {node.id: node for node in graph.nodes}
+
+        mapping: Dict[str, str] = {}
+        merged_nodes: Dict[str, Node] = {}
+        for members in clusters:
+            ordered = sorted(
+                members,
+                key=lambda m: (-degree[m], nodes_by_id[m].metadata.get("created_at", ""), len(m)),
+            )
+            canonical = ordered[0]
+            merged_nodes[canonical] = merge_nodes(nodes_by_id[canonical], [nodes_by_id[m] for m in ordered[1:]])
+            for member in ordered:
+                mapping[member] = canonical
+
+        new_nodes = [
+            merged_nodes.get(node.id, node) for node in graph.nodes
+            if mapping.get(node.id, node.id) == node.id
+        ]
+        compacted = KnowledgeGraph(nodes=new_nodes, edges=repoint_edges(graph.edges, mapping))
+        removed = len(graph.nodes) - len(new_nodes)
+        self.forget(m for m, c in mapping.items() if m != c)
+        self.index_graph(compacted)
+        logger.info(f"エンティティ解決コンパクション: {len(clusters)}個のクラスタから {removed}個の重複ノードを統合しました。")
+        return compacted, removed
+
+
+def merge_nodes(canonical: Node, duplicates: List[Node]) -> Node:
+    """
+    正規ノードに重複ノードの属性を統合した新しいノードを返す。
+    プロパティは正規ノードの値を優先し、重複ノードのIDは別名として保持する。
+    """
+    properties: Dict[str, Any] = {}
+    metadata: Dict[str, Any] = dict(canonical.metadata)
+    aliases: List[str] = list(canonical.properties.get("aliases", []))
+    for duplicate in duplicates:
+        for key, value in duplicate.properties.items():
+            if key != "aliases":
+                properties.setdefault(key, value)
+        aliases.extend([duplicate.id] + list(duplicate.properties.get("aliases", [])))
+        for key, pick in (("created_at", min), ("last_accessed", max)):
+            values = [v for v in (metadata.get(key), duplicate.metadata.get(key)) if v]
+            if values:
+                metadata[key] = pick(values)
+    properties.update({k: v for k, v in canonical.properties.items() if k != "aliases"})
+    properties["aliases"] = [a for a in dict.fromkeys(aliases) if a != canonical.id]
+    metadata["merged_at"] = datetime.utcnow().isoformat()
+    return Node(id=canonical.id, label=canonical.label, properties=properties, metadata=metadata)
+
+
+def repoint_edges(edges: List[Edge], mapping: Dict[str, str]) -> List[Edge]:
+    """
+    エッジの始点・終点を正規IDに付け替える。
+    付け替えで重複したエッジは重みを合算して1本にまとめ、統合で生じた自己ループは除去する。
+    """
+    merged: Dict[str, Edge] = {}
+    for edge in edges:
+        source = mapping.get(edge.source, edge.source)
+        target = mapping.get(edge.target, edge.target)
+        if source == target and (edge.source != edge.target):
+            continue
+        key = f"{source}-{edge.label}-{target}"
+        if key in merged:
+            merged[key].weight += edge.weight
+        else:
+            merged[key] = edge.model_copy(update={"source": source, "target": target})
+    return list(merged.values())
@@ -2,8 +2,8 @@
 # title: 知識グラフデータモデル
 # role: 知識グラフを構成するNode, Edge, KnowledgeGraphのデータ構造を定義する。
 
-from typing import List, Dict, Any
-from pydantic import BaseModel, Field
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Tuple
+from pydantic import BaseModel, Field, field_serializer
 from datetime import datetime
 
 class Node(BaseModel):
@@ -28,6 +28,83 @@ class Edge(BaseModel):
     properties: Dict[str, Any] = Field(default_factory=dict, description="関係の属性")
     weight: float = Field(default=1.0, description="関係の強度や確信度。")
 
+class LazyModelList(list):
+    """
+    ファイルから読み込んだ生データを保持し、要素へのアクセス時に初めてPydanticモデルとして検証するリスト。
+    大きなグラフのロード時に全要素を一度に検証するコストを避けるために使用する。
+    """
+    def __init__(self, raw_items: Iterable[Any], converter: Callable[[Any], BaseModel], fields: Tuple[str, ...] = ()):
+        super().__init__(raw_items)
+        self._converter = converter
+        self._fields = fields
+
+    def _materialize_at(self, index: int) -> Any:
+        item = list.__getitem__(self, index)
+        if not isinstance(item, BaseModel):
+            item = self._converter(item)
+            list.__setitem__(self, index, item)
+        return item
+
+    def __getitem__(self, index: Any) -> Any:
+        if isinstance(index, slice):
+            return [self._materialize_at(i) for i in range(*index.indices(len(self)))]
+        return self._materialize_at(index)
+
+    def __iter__(self) -> Iterator[Any]:
+        i = 0
+        while i < len(self):
+            yield self._materialize_at(i)
+            i += 1
+
+    def __reversed__(self) -> Iterator[Any]:
+        for i in range(len(self) - 1, -1, -1):
+            yield self._materialize_at(i)
+
+    def iter_raw(self) -> Iterator[Any]:
+        """検証を行わずに格納されている要素（生データまたは検証済みモデル）をそのまま返す。"""
+        return list.__iter__(self)
+
+    def peek(self, index: int, field: str) -> Any:
+        """要素を検証せずに、指定したフィールドの値だけを取り出す。"""
+        item = list.__getitem__(self, index)
+        if isinstance(item, BaseModel):
+            return getattr(item, field)
+        if isinstance(item, dict):
+            return item.get(field)
+        return item[self._fields.index(field)]
+
+    def clone(self) -> "LazyModelList":
+        """未検証の要素を未検証のまま保った浅いコピーを返す。"""
+        return LazyModelList(self.iter_raw(), self._converter, self._fields)
+
+    def derive(self, raw_items: Iterable[Any]) -> "LazyModelList":
+        """同じ変換方法で、別の要素(生データまたは検証済みモデル)を持つリストを作る。"""
+        return LazyModelList(raw_items, self._converter, self._fields)
+
+    def raw_at(self, index: int) -> Any:
+        """要素を検証せずにそのまま返す。"""
+        return list.__getitem__(self, index)
+
+    def transient(self, index: int) -> Any:
+        """要素をモデルとして返すが、未検証の要素はリストに格納しない(一度だけ全要素を走査する処理でメモリを増やさないため)。"""
+        item = list.__getitem__(self, index)
+        return item if isinstance(item, BaseModel) else self._converter(item)
+
+    def replace_field(self, index: int, field: str, value: Any) -> Any:
+        """要素を検証せずに、指定したフィールドだけを置き換えた新しい要素を返す。リスト自体は変更しない。"""
+        item = list.__getitem__(self, index)
+        if isinstance(item, BaseModel):
+            return item.model_copy(update={field: value})
+        if isinstance(item, dict):
+            return {**item, field: value}
+        row = list(item)
+        row[self._fields.index(field)] = value
+        return row
+
+    def copy(self) -> List[Any]:  # type: ignore[override]
+        return list(self)
+
+
 class KnowledgeGraph(BaseModel):
     """
     ノードとエッジのコレクションとして知識グラフを表現するクラス。
@@ -35,14 +112,44 @@ class KnowledgeGraph(BaseModel):
     nodes: List[Node] = Field(default_factory=list, description="グラフ内のノードのリスト")
     edges: List[Edge] = Field(default_factory=list, description="グラフ内のエッジのリスト")
 
+    @field_serializer("nodes", "edges", mode="wrap")
+    def _serialize_items(self, value: List[Any], handler: Any) -> Any:
+        # 遅延検証リストの場合は、シリアライズ前に全要素をモデル化する
+        return handler(list(value) if isinstance(value, LazyModelList) else value)
+
     def to_string(self) -> str:
         """
         知識グラフの内容を人間が読める文字列形式に変換する。
         """
-        if not self.nodes and not self.edges:
-            return "知識グラフは空です。"
+        return render_graph_text(
+            [format_node_line(n) for n in self.nodes],
+            [format_edge_line(e) for e in self.edges],
+        )
+
+
+def iter_transient(items: List[Any]) -> Iterator[Any]:
+    """要素を順にモデルとして返す。遅延検証リストの未検証の要素は、リストに格納せずに一時的に変換する。"""
+    if isinstance(items, LazyModelList):
+        return (items.transient(i) for i in range(len(items)))
+    return iter(items)
+
+
+def format_node_line(node: Node) -> str:
+    """to_stringにおけるノード1件分の行を返す。"""
+    return f"- ノード: {node.id} (ラベル: {node.label}, プロパティ: {node.properties})"
+
+
+def format_edge_line(edge: Edge) -> str:
+    """to_stringにおけるエッジ1件分の行を返す。"""
+    return f"- 関係: ({edge.source})-[{edge.label} (信頼度: {edge.weight:.2f})]->({edge.target})"
+
+
+def render_graph_text(node_lines: List[str], edge_lines: List[str]) -> str:
+    """ノードとエッジの行から知識グラフの文字列表現を組み立てる。"""
+    if not node_lines and not edge_lines:
+        return "知識グラフは空です。"
 
-        node_str = "\n".join([f"- ノード: {n.id} (ラベル: {n.label}, プロパティ: {n.properties})" for n in self.nodes])
-        edge_str = "\n".join([f"- 関係: ({e.source})-[{e.label} (信頼度: {e.weight:.2f})]->({e.target})" for e in self.edges])
+    node_str = "\n".join(node_lines)
+    edge_str = "\n".join(edge_lines)
 
-        return f"--- 知識グラフ ---\n[ノード]\n{node_str}\n\n[関係]\n{edge_str}\n----------------"
\ No newline at end of file
+    return f"--- 知識グラフ ---\n[ノード]\n{node_str}\n\n[関係]\n{edge_str}\n----------------"
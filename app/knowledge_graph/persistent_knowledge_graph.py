@@ -2,45 +2,201 @@
 # title: 永続的知識グラフ管理
 # role: 知識グラフをファイルに保存し、ロードし、マージする機能を提供する。
 
-import json
 import logging
 import os
-from typing import Set, Dict
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
 from datetime import datetime
 
-from .models import KnowledgeGraph, Node, Edge
+from app.exceptions import KnowledgeGraphError
+from .columnar import ColumnarGraphStore
+from .models import KnowledgeGraph, LazyModelList, format_edge_line, format_node_line, iter_transient, render_graph_text
+from .retention import ColdStorageArchive, GraphRetentionPolicy
+from .entity_resolution import EntityResolver
+from .serialization import load_knowledge_graph, save_knowledge_graph, convert_json_to_snapshot
 
 logger = logging.getLogger(__name__)
 
+class _PublishedGraph(NamedTuple):
+    """公開されたグラフと、そのバージョンおよび書き込み時に差分更新した集計値の組。"""
+    graph: KnowledgeGraph
+    version: int
+    label_counts: Dict[str, int]
+
 class PersistentKnowledgeGraph:
     """
     ファイルベースで知識グラフを永続化し、更新を管理するクラス。
+
+    並行性モデル: 書き込み(マージ、コンパクション、メンテナンス)は単一の書き込みロックで直列化し、
+    変更は現在のグラフを直接書き換えずに新しいリストと要素のコピーで行ってから、完成したグラフを公開する(コピーオンライト)。
+    読み出し側は公開済みのグラフ(スナップショット)を参照するだけなのでロックを取らず、書き込みを妨げることも、
+    書き込み途中の状態を観測することもない。get_graph()が返すグラフは変更してはならない。
+
+    公開のたびに単調増加するバージョン(version)が振られる。要約(get_summary)と文字列表現(get_graph_string)は
+    バージョンごとにキャッシュされ、ラベル別のノード数や各要素の表示行は書き込み時に差分で更新される。
+    グラフから派生した値をキャッシュする他のコンポーネントも、このバージョンをキーにできる。
+    検索時のアクセス記録(access_nodes)は内容の変更ではないためグラフを公開せず(バージョンも変えず)、
+    最終アクセス日時の更新として保留しておき、メンテナンス(run_maintenance)の際にまとめて反映する。
+
+    columnar=Trueの場合、ロードしたグラフを列指向ストア(ColumnarGraphStore)に詰め直して保持する。
+    その後のマージで追加・変更された要素はモデルとして保持され、メンテナンスとコンパクションのたびに列指向ストアへ詰め直される。
     """
-    def __init__(self, storage_path: str):
+    def __init__(
+        self,
+        storage_path: str,
+        entity_resolver: Optional[EntityResolver] = None,
+        compression: Optional[str] = "zstd",
+        legacy_json_path: Optional[str] = None,
+        retention_policy: Optional[GraphRetentionPolicy] = None,
+        archive: Optional[ColdStorageArchive] = None,
+        columnar: bool = False,
+    ):
         self.storage_path = storage_path
-        self.graph = self._load()
+        self.entity_resolver = entity_resolver
+        self.compression = compression
+        self.legacy_json_path = legacy_json_path
+        self.retention_policy = retention_policy
+        self.archive = archive
+        self.columnar = columnar
+        # 重みの減衰はプロセス内の経過時間で適用する(停止中の時間は減衰させない)
+        self._last_decay_at = time.time()
+        self._write_lock = threading.RLock()
+        self._save_lock = threading.Lock()
+        loaded = self._pack(self._load())
+        self._published = _PublishedGraph(loaded, 0, {})
+        self._node_index: Dict[str, int] = {}
+        self._edge_index: Dict[str, int] = {}
+        self._label_counts: Dict[str, int] = {}
+        # テキスト中で言及されたノードを探すための、ノードIDの先頭2文字(小文字)からIDへのインデックス
+        self._mention_index: Dict[str, List[str]] = {}
+        # 反映を保留しているアクセス記録(ノードIDから最終アクセス日時)
+        self._pending_access: Dict[str, str] = {}
+        self._access_lock = threading.Lock()
+        # 文字列表現の各行。初めて文字列表現が要求されるまでは作らず、作成後は書き込み時に差分で更新する
+        self._node_lines: Optional[List[str]] = None
+        self._edge_lines: Optional[List[str]] = None
+        self._summary_cache: Tuple[int, str] = (-1, "")
+        self._string_cache: Tuple[int, str] = (-1, "")
+        self._rebuild_indexes()
+        self._published = _PublishedGraph(loaded, 0, dict(self._label_counts))
+        if self.entity_resolver:
+            self.entity_resolver.index_graph(loaded)
+
+    @property
+    def _graph(self) -> KnowledgeGraph:
+        return self._published.graph
+
+    @property
+    def graph(self) -> KnowledgeGraph:
+        """現在公開されている読み取り専用のグラフスナップショット。"""
+        return self._published.graph
+
+    @property
+    def version(self) -> int:
+        """グラフが公開されるたびに増加するバージョン番号。"""
+        return self._published.version
 
     def _load(self) -> KnowledgeGraph:
-        """ストレージから知識グラフをロードする。"""
-        if os.path.exists(self.storage_path):
-            try:
-                with open(self.storage_path, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    return KnowledgeGraph.model_validate(data)
-            except (IOError, json.JSONDecodeError) as e:
-                logger.error(f"永続的知識グラフのロードに失敗しました: {e}. 新しいグラフを作成します。")
+        """
+        ストレージから知識グラフをロードする。
+        スナップショットが存在せず旧形式のJSONファイルがある場合は、スナップショットに変換してからロードする。
+        """
+        try:
+            if os.path.exists(self.storage_path):
+                return load_knowledge_graph(self.storage_path)
+            if self.legacy_json_path and os.path.exists(self.legacy_json_path):
+                logger.info(f"旧形式の知識グラフ {self.legacy_json_path} をスナップショット {self.storage_path} に変換します。")
+                return convert_json_to_snapshot(self.legacy_json_path, self.storage_path, compression=self.compression)
+        except (IOError, ValueError, KnowledgeGraphError) as e:
+            logger.error(f"永続的知識グラフのロードに失敗しました: {e}. 新しいグラフを作成します。")
         return KnowledgeGraph()
 
+    def _pack(self, graph: KnowledgeGraph) -> KnowledgeGraph:
+        """列指向の保持が有効なら、グラフを新しい列指向ストアに詰め直したビューを返す。"""
+        if not self.columnar:
+            return graph
+        store = ColumnarGraphStore.from_graph(graph)
+        logger.info(f"知識グラフを列指向ストアに格納しました。ノード数: {store.num_nodes}, エッジ数: {store.num_edges}, 列: {store.memory_usage()}")
+        return store.to_knowledge_graph()
+
     def save(self) -> None:
-        """現在の知識グラフをストレージに保存する。"""
+        """
+        現在のグラフスナップショットをストレージに保存する。
+        書き込みロックは取らないため、保存中もマージは継続できる。
+        """
+        graph = self._graph
         try:
-            os.makedirs(os.path.dirname(self.storage_path), exist_ok=True)
-            with open(self.storage_path, 'w', encoding='utf-8') as f:
-                f.write(self.graph.model_dump_json(indent=4))
+            with self._save_lock:
+                save_knowledge_graph(graph, self.storage_path, compression=self.compression)
             logger.info(f"知識グラフが {self.storage_path} に保存されました。")
-        except IOError as e:
+        except (IOError, KnowledgeGraphError) as e:
             logger.error(f"知識グラフの保存に失敗しました: {e}")
 
+    # --- コピーオンライトのための内部ヘルパー ---
+    @staticmethod
+    def _clone_items(items: List[Any]) -> List[Any]:
+        """公開済みのリストを変更せずに済むよう、要素を共有した浅いコピーを作る。"""
+        return items.clone() if isinstance(items, LazyModelList) else list(items)
+
+    @staticmethod
+    def _peek(items: List[Any], index: int, field: str) -> Any:
+        if isinstance(items, LazyModelList):
+            return items.peek(index, field)
+        return getattr(items[index], field)
+
+    def _rebuild_indexes(self, graph: Optional[KnowledgeGraph] = None) -> None:
+        """
+        ノードIDと、エッジキーから位置へのインデックス、およびラベル別のノード数を再構築する。要素の検証は行わない。
+        文字列表現の行は破棄し、次に要求されたときに作り直す。
+        """
+        graph = graph if graph is not None else self._graph
+        nodes, edges = graph.nodes, graph.edges
+        self._node_index = {self._peek(nodes, i, "id"): i for i in range(len(nodes))}
+        self._edge_index = {
+            f"{self._peek(edges, i, 'source')}-{self._peek(edges, i, 'label')}-{self._peek(edges, i, 'target')}": i
+            for i in range(len(edges))
+        }
+        self._label_counts = {}
+        for i in range(len(nodes)):
+            label = self._peek(nodes, i, "label")
+            self._label_counts[label] = self._label_counts.get(label, 0) + 1
+        mention_index: Dict[str, List[str]] = {}
+        for node_id in self._node_index:
+            self._index_mention(mention_index, node_id)
+        self._mention_index = mention_index
+        self._node_lines = None
+        self._edge_lines = None
+
+    @staticmethod
+    def _index_mention(mention_index: Dict[str, List[str]], node_id: str) -> None:
+        # 1文字のIDはほとんどのテキストに含まれてしまうため対象外とする
+        if len(node_id) > 1:
+            mention_index.setdefault(node_id[:2].lower(), []).append(node_id)
+
+    @staticmethod
+    def _set_line(lines: Optional[List[str]], index: int, line: str) -> None:
+        if lines is None:
+            return
+        if index == len(lines):
+            lines.append(line)
+        else:
+            lines[index] = line
+
+    def _touch(self, nodes: List[Any], index: int, timestamp: str) -> None:
+        node = nodes[index]
+        if "last_accessed" in node.metadata and node.metadata["last_accessed"] != timestamp:
+            # 最終アクセス日時は文字列表現に含まれないため、表示行は更新しない
+            nodes[index] = node.model_copy(update={"metadata": {**node.metadata, "last_accessed": timestamp}})
+
+    def _publish(self, nodes: List[Any], edges: List[Any]) -> None:
+        """書き込みで作った新しいリストをグラフとして公開する。参照の差し替えはアトミックに行われる。"""
+        self._published = _PublishedGraph(
+            KnowledgeGraph.model_construct(nodes=nodes, edges=edges),
+            self._published.version + 1,
+            dict(self._label_counts),
+        )
+
     def merge(self, new_graph: KnowledgeGraph) -> None:
         """
         新しいグラフを既存のグラフにマージする。
@@ -49,49 +205,240 @@ class PersistentKnowledgeGraph:
             logger.warning("マージ対象の知識グラフが無効です。")
             return
 
-        existing_node_ids: Set[str] = {node.id for node in self.graph.nodes}
-        for new_node in new_graph.nodes:
-            if new_node.id not in existing_node_ids:
-                self.graph.nodes.append(new_node)
-                existing_node_ids.add(new_node.id)
+        with self._write_lock:
+            try:
+                self._merge_locked(new_graph)
+            except Exception:
+                # 公開されなかった変更がインデックスに残らないよう、公開済みのグラフから作り直す
+                self._rebuild_indexes()
+                raise
+            if self.archive:
+                # 退避済みのエンティティに再び言及された場合は、退避したエッジごと復元する
+                archived = self.archive.archived_node_ids(node.id for node in new_graph.nodes)
+                if archived:
+                    self.restore_nodes(archived)
 
-        edge_map: Dict[str, Edge] = {
-            f"{edge.source}-{edge.label}-{edge.target}": edge for edge in self.graph.edges
-        }
+    def _merge_locked(self, new_graph: KnowledgeGraph) -> None:
+        nodes = self._clone_items(self._graph.nodes)
+        edges = self._clone_items(self._graph.edges)
+
+        # エンティティ解決: 表記揺れのある新規ノードを既存ノードのIDに寄せる
+        id_mapping: Dict[str, str] = {}
+        match = None
+        if self.entity_resolver:
+            match = self.entity_resolver.match_incoming(new_graph.nodes, self._node_index.keys())
+            id_mapping = match.mapping
+
+        now = datetime.utcnow().isoformat()
+        for new_node in new_graph.nodes:
+            canonical_id = id_mapping.get(new_node.id, new_node.id)
+            if canonical_id in self._node_index:
+                # 既存の知識に再び触れたことをアクセスとして記録し、退避の対象から遠ざける
+                self._touch(nodes, self._node_index[canonical_id], now)
+            elif canonical_id == new_node.id:
+                self._node_index[new_node.id] = len(nodes)
+                self._index_mention(self._mention_index, new_node.id)
+                self._label_counts[new_node.label] = self._label_counts.get(new_node.label, 0) + 1
+                self._set_line(self._node_lines, len(nodes), format_node_line(new_node))
+                nodes.append(new_node)
+        self._record_aliases(nodes, id_mapping)
 
         for new_edge in new_graph.edges:
+            if id_mapping:
+                source = id_mapping.get(new_edge.source, new_edge.source)
+                target = id_mapping.get(new_edge.target, new_edge.target)
+                if source == target and new_edge.source != new_edge.target:
+                    continue
+                new_edge = new_edge.model_copy(update={"source": source, "target": target})
             edge_key = f"{new_edge.source}-{new_edge.label}-{new_edge.target}"
-            if edge_key in edge_map:
-                existing_edge = edge_map[edge_key]
-                existing_edge.weight += new_edge.weight
-                logger.info(f"Edge weight updated (LTP): {edge_key}, new weight: {existing_edge.weight}")
+            if edge_key in self._edge_index:
+                index = self._edge_index[edge_key]
+                existing_edge = edges[index]
+                edges[index] = existing_edge.model_copy(update={"weight": existing_edge.weight + new_edge.weight})
+                self._set_line(self._edge_lines, index, format_edge_line(edges[index]))
+                logger.info(f"Edge weight updated (LTP): {edge_key}, new weight: {edges[index].weight}")
             else:
-                self.graph.edges.append(new_edge)
-                edge_map[edge_key] = new_edge
-        
-        logger.info(f"知識グラフをマージしました。現在のノード数: {len(self.graph.nodes)}, エッジ数: {len(self.graph.edges)}")
+                self._edge_index[edge_key] = len(edges)
+                self._set_line(self._edge_lines, len(edges), format_edge_line(new_edge))
+                edges.append(new_edge)
+
+        self._publish(nodes, edges)
+        if match is not None:
+            self.entity_resolver.commit(match)
+        logger.info(f"知識グラフをマージしました。現在のノード数: {len(nodes)}, エッジ数: {len(edges)}")
+
+    def _record_aliases(self, nodes: List[Any], id_mapping: Dict[str, str]) -> None:
+        """既存ノードに統合された新規ノードのIDを、統合先ノードの別名として記録する。"""
+        aliases_by_canonical: Dict[str, List[str]] = {}
+        for new_id, canonical_id in id_mapping.items():
+            if new_id != canonical_id:
+                aliases_by_canonical.setdefault(canonical_id, []).append(new_id)
+        for canonical_id, new_aliases in aliases_by_canonical.items():
+            index = self._node_index.get(canonical_id)
+            if index is None:
+                continue
+            node = nodes[index]
+            aliases = list(node.properties.get("aliases", []))
+            aliases.extend(a for a in new_aliases if a not in aliases)
+            nodes[index] = node.model_copy(update={"properties": {**node.properties, "aliases": aliases}})
+            self._set_line(self._node_lines, index, format_node_line(nodes[index]))
+
+    def compact(self) -> int:
+        """
+        グラフ全体に対してエンティティ解決を実行し、重複ノードを統合する。
+        統合により削除されたノード数を返す。
+        """
+        if not self.entity_resolver:
+            logger.info("エンティティリゾルバーが設定されていないため、コンパクションをスキップします。")
+            return 0
+        with self._write_lock:
+            compacted, removed = self.entity_resolver.compact(self._graph)
+            if removed:
+                compacted = self._pack(compacted)
+                self._rebuild_indexes(compacted)
+                self._publish(compacted.nodes, compacted.edges)
+                logger.info(f"知識グラフをコンパクションしました。現在のノード数: {len(compacted.nodes)}, エッジ数: {len(compacted.edges)}")
+        return removed
 
     def get_graph(self) -> KnowledgeGraph:
-        """現在のグラフオブジェクトを返す。"""
-        return self.graph
+        """現在のグラフスナップショットを返す。返されたグラフは変更しないこと。"""
+        return self._graph
 
     def get_summary(self) -> str:
-        """知識グラフの概要を返す。"""
-        if not self.graph.nodes and not self.graph.edges:
-            return "知識グラフは空です。"
-        
-        num_nodes = len(self.graph.nodes)
-        num_edges = len(self.graph.edges)
-        
-        sample_labels = list(set(node.label for node in self.graph.nodes[:5]))
-        
-        return (f"知識グラフには {num_nodes}個のノードと {num_edges}個のエッジが含まれています。"
-                f"主なエンティティカテゴリ: {sample_labels}")
+        """知識グラフの概要を返す。バージョンが変わらない限りキャッシュした結果を返す。"""
+        published = self._published
+        cached_version, cached_summary = self._summary_cache
+        if cached_version == published.version:
+            return cached_summary
+
+        num_nodes = len(published.graph.nodes)
+        num_edges = len(published.graph.edges)
+        if not num_nodes and not num_edges:
+            summary = "知識グラフは空です。"
+        else:
+            # 書き込み時に差分更新したラベル別ノード数から、ノード数の多いカテゴリを挙げる
+            top_labels = sorted(published.label_counts.items(), key=lambda item: item[1], reverse=True)[:5]
+            summary = (f"知識グラフには {num_nodes}個のノードと {num_edges}個のエッジが含まれています。"
+                       f"主なエンティティカテゴリ: {[label for label, _ in top_labels]}")
+        self._summary_cache = (published.version, summary)
+        return summary
+
+    def get_graph_string(self) -> str:
+        """
+        知識グラフの文字列表現(KnowledgeGraph.to_stringと同じ内容)を返す。
+        バージョンが変わらない限りキャッシュした結果を返し、変わった場合も書き込み時に差分更新した行を結合するだけで済む。
+        書き込みロックは行のリストの写しを取る間だけ保持し、整形と結合はロックの外で行う。
+        """
+        cached_version, cached_string = self._string_cache
+        if cached_version == self._published.version:
+            return cached_string
+        # 表示行は書き込み側の状態なので、公開済みのグラフと一致する写しを書き込みロックの下で取る
+        with self._write_lock:
+            published = self._published
+            node_lines = list(self._node_lines) if self._node_lines is not None else None
+            edge_lines = list(self._edge_lines) if self._edge_lines is not None else None
+        if node_lines is None or edge_lines is None:
+            # 遅延検証された要素をグラフに格納したままにしないよう、一時的に変換して整形する
+            node_lines = [format_node_line(n) for n in iter_transient(published.graph.nodes)]
+            edge_lines = [format_edge_line(e) for e in iter_transient(published.graph.edges)]
+            with self._write_lock:
+                # 整形している間に書き込みがなければ、以後の差分更新に使えるよう行を登録する
+                if self._published is published and self._node_lines is None:
+                    self._node_lines, self._edge_lines = list(node_lines), list(edge_lines)
+        text = render_graph_text(node_lines, edge_lines)
+        if published.version >= self._string_cache[0]:
+            self._string_cache = (published.version, text)
+        return text
 
     def access_node(self, node_id: str) -> None:
-        """ノードへのアクセスを記録し、最終アクセス日時を更新する。"""
-        for node in self.graph.nodes:
-            if node.id == node_id:
-                if "last_accessed" in node.metadata:
-                    node.metadata["last_accessed"] = datetime.utcnow().isoformat()
-                break
\ No newline at end of file
+        """ノードへのアクセスを記録する。最終アクセス日時は次のメンテナンスで更新される。"""
+        self.access_nodes([node_id])
+
+    def access_nodes(self, node_ids: List[str]) -> None:
+        """
+        複数のノードへのアクセスを記録する。グラフは公開せず、最終アクセス日時の更新は次のメンテナンスで反映する。
+        """
+        now = datetime.utcnow().isoformat()
+        with self._access_lock:
+            for node_id in node_ids:
+                self._pending_access[node_id] = now
+
+    def _apply_pending_access_locked(self, graph: KnowledgeGraph) -> KnowledgeGraph:
+        """保留しているアクセス記録をノードの最終アクセス日時に反映したグラフを返す。書き込みロックを保持して呼び出す。"""
+        with self._access_lock:
+            pending, self._pending_access = self._pending_access, {}
+        indexes = [(self._node_index[node_id], at) for node_id, at in pending.items() if node_id in self._node_index]
+        if not indexes:
+            return graph
+        nodes = self._clone_items(graph.nodes)
+        for index, at in indexes:
+            self._touch(nodes, index, at)
+        return KnowledgeGraph.model_construct(nodes=nodes, edges=graph.edges)
+
+    def find_mentioned_nodes(self, text: str, limit: int = 50) -> List[str]:
+        """テキストにIDがそのまま含まれているノードを、最大limit件返す。テキストの各位置から始まるIDだけを照合する。"""
+        if not text:
+            return []
+        lowered = text.lower()
+        mention_index = self._mention_index
+        mentioned: Dict[str, None] = {}
+        for start in range(len(lowered) - 1):
+            for node_id in tuple(mention_index.get(lowered[start:start + 2], ())):
+                if node_id not in mentioned and lowered.startswith(node_id.lower(), start):
+                    mentioned[node_id] = None
+                    if len(mentioned) >= limit:
+                        return list(mentioned)
+        return list(mentioned)
+
+    def run_maintenance(self) -> Dict[str, int]:
+        """
+        保留しているアクセス記録を反映してから、保持ポリシーに従ってエッジ重みを減衰させ、サイズ上限を超えた分の低頻度アクセス・低重みの要素を退避する。
+        アーカイブが設定されていれば退避した要素をコールドストレージに保存する。
+        退避したノード数とエッジ数を返す。
+        """
+        if not self.retention_policy:
+            with self._write_lock:
+                graph = self._apply_pending_access_locked(self._graph)
+                if graph is not self._graph:
+                    self._publish(graph.nodes, graph.edges)
+            return {"evicted_nodes": 0, "evicted_edges": 0}
+        with self._write_lock:
+            now = time.time()
+            graph = self._apply_pending_access_locked(self._graph)
+            kept, evicted = self.retention_policy.apply(graph, now - self._last_decay_at)
+            if self.archive:
+                # アーカイブに失敗した場合は要素を失わないよう、グラフを変更せずに例外を伝える
+                self.archive.archive(evicted)
+            self._last_decay_at = now
+            kept = self._pack(kept)
+            self._rebuild_indexes(kept)
+            self._publish(kept.nodes, kept.edges)
+            if self.entity_resolver and evicted.nodes:
+                self.entity_resolver.forget(node.id for node in evicted.nodes)
+        stats = {"evicted_nodes": len(evicted.nodes), "evicted_edges": len(evicted.edges)}
+        logger.info(f"知識グラフのメンテナンスが完了しました。退避: {stats}, 現在のノード数: {len(kept.nodes)}, エッジ数: {len(kept.edges)}")
+        return stats
+
+    def restore_nodes(self, node_ids: List[str]) -> int:
+        """
+        コールドストレージに退避されたノードと、それらに接続するエッジを復元する。
+        復元はアクセスとみなし、最終アクセス日時を更新してエッジの重みを初期値(1.0)以上に戻す。
+        復元したノード数を返す。
+        """
+        if not self.archive:
+            return 0
+        with self._write_lock:
+            restored = self.archive.restore(node_ids, self._node_index.keys())
+            if not restored.nodes and not restored.edges:
+                return 0
+            now = datetime.utcnow().isoformat()
+            restored_graph = KnowledgeGraph.model_construct(
+                nodes=[
+                    node.model_copy(update={"metadata": {**node.metadata, "last_accessed": now}})
+                    for node in restored.nodes
+                ],
+                edges=[edge.model_copy(update={"weight": max(edge.weight, 1.0)}) for edge in restored.edges],
+            )
+            self.merge(restored_graph)
+        logger.info(f"コールドストレージから{len(restored.nodes)}個のノードを復元しました。")
+        return len(restored.nodes)
@@ -0,0 +1,243 @@
+# /app/knowledge_graph/retention.py
+# title: 知識グラフの保持ポリシー
+# role: エッジ重みの時間減衰(LTD)と、サイズ上限を超えた際の低頻度アクセス・低重みのノード/エッジの退避、およびコールドストレージへのアーカイブを扱う。
+
+import logging
+import os
+import re
+import threading
+from typing import AbstractSet, Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .models import Edge, KnowledgeGraph, LazyModelList, Node
+from .serialization import load_knowledge_graph, save_knowledge_graph
+
+logger = logging.getLogger(__name__)
+
+
+def _peek(items: List[Any], index: int, field: str) -> Any:
+    if isinstance(items, LazyModelList):
+        return items.peek(index, field)
+    return getattr(items[index], field)
+
+
+def _raw_at(items: List[Any], index: int) -> Any:
+    return items.raw_at(index) if isinstance(items, LazyModelList) else items[index]
+
+
+def _replace_field(items: List[Any], index: int, field: str, value: Any) -> Any:
+    if isinstance(items, LazyModelList):
+        return items.replace_field(index, field, value)
+    return items[index].model_copy(update={field: value})
+
+
+def _derive(items: List[Any], raw_items: List[Any]) -> List[Any]:
+    """元のリストが遅延検証リストなら、未検証の要素を未検証のまま持つ同じ種類のリストにする。"""
+    return items.derive(raw_items) if isinstance(items, LazyModelList) else raw_items
+
+
+def _edge_weight(edges: List[Any], index: int) -> float:
+    weight = _peek(edges, index, "weight")
+    # 旧形式の行には重みがないことがある(検証時の既定値は1.0)
+    return 1.0 if weight is None else float(weight)
+
+
+def _edge_key(edge: Edge) -> str:
+    return f"{edge.source}-{edge.label}-{edge.target}"
+
+
+class GraphRetentionPolicy:
+    """
+    知識グラフのサイズを上限内に保つための保持ポリシー。
+
+    1. 全エッジの重みを経過時間に応じて半減期で減衰させる(LTD)。
+    2. 重みが min_edge_weight を下回ったエッジを退避する。
+    3. ノード数が max_nodes を超えた場合、最終アクセス日時が古く、接続エッジの重みの合計が小さいノードから
+       max_nodes * low_watermark まで退避し、それらに接続するエッジも退避する。
+    4. エッジ数が max_edges を超えた場合、重みの小さいエッジから max_edges * low_watermark まで退避する。
+    低水位線まで削ることで、上限付近で毎回少しずつ退避が起きることを防ぐ。
+    """
+    def __init__(
+        self,
+        max_nodes: int = 50000,
+        max_edges: int = 200000,
+        low_watermark: float = 0.9,
+        half_life_seconds: float = 30 * 24 * 3600,
+        min_edge_weight: float = 0.05,
+    ):
+        self.max_nodes = max_nodes
+        self.max_edges = max_edges
+        self.low_watermark = low_watermark
+        self.half_life_seconds = half_life_seconds
+        self.min_edge_weight = min_edge_weight
+
+    def decay_factor(self, elapsed_seconds: float) -> float:
+        """経過時間に対する重みの減衰率を返す。"""
+        if self.half_life_seconds <= 0 or elapsed_seconds <= 0:
+            return 1.0
+        return 0.5 ** (elapsed_seconds / self.half_life_seconds)
+
+    def apply(self, graph: KnowledgeGraph, elapsed_seconds: float) -> Tuple[KnowledgeGraph, KnowledgeGraph]:
+        """
+        グラフに減衰と退避を適用し、(保持するグラフ, 退避したグラフ)を返す。
+        入力のグラフは変更しない。要素は検証せずに必要なフィールドだけを覗き見て扱い、
+        コピーするのは重みが変わるエッジだけにする(遅延検証されたグラフの未検証の要素は未検証のまま残る)。
+        """
+        factor = self.decay_factor(elapsed_seconds)
+        source_edges = graph.edges
+        kept_edges: List[int] = []
+        evicted_edges: List[int] = []
+        weights: Dict[int, float] = {}
+        for i in range(len(source_edges)):
+            weights[i] = _edge_weight(source_edges, i) * factor
+            (kept_edges if weights[i] >= self.min_edge_weight else evicted_edges).append(i)
+
+        nodes = graph.nodes
+        kept_nodes = list(range(len(nodes)))
+        evicted_nodes: List[int] = []
+        if len(nodes) > self.max_nodes:
+            strength: Dict[str, float] = {}
+            for i in kept_edges:
+                for end in ("source", "target"):
+                    node_id = _peek(source_edges, i, end)
+                    strength[node_id] = strength.get(node_id, 0.0) + weights[i]
+            order = sorted(
+                range(len(nodes)),
+                key=lambda i: (
+                    str((_peek(nodes, i, "metadata") or {}).get("last_accessed", "")),
+                    strength.get(_peek(nodes, i, "id"), 0.0),
+                ),
+            )
+            num_evict = len(nodes) - int(self.max_nodes * self.low_watermark)
+            evict_positions = set(order[:num_evict])
+            evicted_nodes = sorted(evict_positions)
+            kept_nodes = [i for i in kept_nodes if i not in evict_positions]
+            evicted_ids = {_peek(nodes, i, "id") for i in evicted_nodes}
+            still_kept: List[int] = []
+            for i in kept_edges:
+                touches = _peek(source_edges, i, "source") in evicted_ids or _peek(source_edges, i, "target") in evicted_ids
+                (evicted_edges if touches else still_kept).append(i)
+            kept_edges = still_kept
+
+        if len(kept_edges) > self.max_edges:
+            num_keep = int(self.max_edges * self.low_watermark)
+            keep_positions = set(sorted(kept_edges, key=lambda i: weights[i], reverse=True)[:num_keep])
+            evicted_edges.extend(i for i in kept_edges if i not in keep_positions)
+            kept_edges = [i for i in kept_edges if i in keep_positions]
+
+        def edge_items(positions: List[int]) -> List[Any]:
+            if factor >= 1.0:
+                return _derive(source_edges, [_raw_at(source_edges, i) for i in positions])
+            return _derive(source_edges, [_replace_field(source_edges, i, "weight", weights[i]) for i in positions])
+
+        kept_graph = KnowledgeGraph.model_construct(
+            nodes=_derive(nodes, [_raw_at(nodes, i) for i in kept_nodes]), edges=edge_items(kept_edges)
+        )
+        evicted_graph = KnowledgeGraph.model_construct(
+            nodes=_derive(nodes, [_raw_at(nodes, i) for i in evicted_nodes]), edges=edge_items(sorted(evicted_edges))
+        )
+        return kept_graph, evicted_graph
+
+
+class ColdStorageArchive:
+    """
+    退避されたノードとエッジを保存し、後から復元できるようにするコールドストレージ。
+    退避のたびにスナップショット形式のセグメント(<storage_path>.<連番>)を1つ追加するため、退避のコストはアーカイブ全体の
+    大きさによらない。storage_path自体にファイルがあれば(以前の単一ファイル形式)、最も古いセグメントとして扱う。
+    同じIDのノードとエッジは新しいセグメントのものが優先される。
+    アーカイブされているノードIDは初回の問い合わせ時にセグメントから読み込み、以後はメモリ上で管理する。
+    """
+    def __init__(self, storage_path: str, compression: Optional[str] = "zstd"):
+        self.storage_path = storage_path
+        self.compression = compression
+        self._lock = threading.Lock()
+        self._archived_ids: Optional[Set[str]] = None
+
+    def _numbered_segments(self) -> List[Tuple[int, str]]:
+        directory = os.path.dirname(self.storage_path) or "."
+        if not os.path.isdir(directory):
+            return []
+        pattern = re.compile(re.escape(os.path.basename(self.storage_path)) + r"\.(\d+)$")
+        numbered = []
+        for name in os.listdir(directory):
+            match = pattern.match(name)
+            if match:
+                numbered.append((int(match.group(1)), os.path.join(directory, name)))
+        return sorted(numbered)
+
+    def _segment_paths(self) -> List[str]:
+        """古い順のセグメントのパス。"""
+        paths = [path for _, path in self._numbered_segments()]
+        if os.path.exists(self.storage_path):
+            paths.insert(0, self.storage_path)
+        return paths
+
+    def _node_ids_locked(self) -> Set[str]:
+        if self._archived_ids is None:
+            ids: Set[str] = set()
+            for path in self._segment_paths():
+                nodes = load_knowledge_graph(path).nodes
+                ids.update(_peek(nodes, i, "id") for i in range(len(nodes)))
+            self._archived_ids = ids
+        return self._archived_ids
+
+    def archived_node_ids(self, node_ids: Iterable[str]) -> List[str]:
+        """指定したノードIDのうち、アーカイブに退避されているものを返す。"""
+        with self._lock:
+            archived = self._node_ids_locked()
+            return [node_id for node_id in node_ids if node_id in archived]
+
+    def archive(self, evicted: KnowledgeGraph) -> None:
+        """退避されたノードとエッジを新しいセグメントとしてアーカイブに追加する。"""
+        if not evicted.nodes and not evicted.edges:
+            return
+        with self._lock:
+            numbered = self._numbered_segments()
+            next_number = numbered[-1][0] + 1 if numbered else 1
+            save_knowledge_graph(evicted, f"{self.storage_path}.{next_number:06d}", compression=self.compression)
+            if self._archived_ids is not None:
+                nodes = evicted.nodes
+                self._archived_ids.update(_peek(nodes, i, "id") for i in range(len(nodes)))
+        logger.info(f"{len(evicted.nodes)}個のノードと{len(evicted.edges)}個のエッジをコールドストレージに退避しました。")
+
+    def restore(self, node_ids: Iterable[str], resident_ids: AbstractSet[str]) -> KnowledgeGraph:
+        """
+        指定したノードと、両端が復元後のグラフに存在することになるエッジをアーカイブから取り出す。
+        取り出した要素はアーカイブから削除され、それらを含んでいたセグメントだけが書き直される。
+        """
+        requested = set(node_ids)
+        with self._lock:
+            requested &= self._node_ids_locked()
+            if not requested:
+                return KnowledgeGraph()
+            segments = [(path, load_knowledge_graph(path)) for path in self._segment_paths()]
+            restored_nodes: Dict[str, Node] = {}
+            for _, stored in segments:
+                for i in range(len(stored.nodes)):
+                    if _peek(stored.nodes, i, "id") in requested:
+                        restored_nodes[_peek(stored.nodes, i, "id")] = stored.nodes[i]
+            available = set(restored_nodes) | set(resident_ids)
+            restored_edges: Dict[str, Edge] = {}
+            for path, stored in segments:
+                edges = stored.edges
+                remaining_edges: List[Any] = []
+                for i in range(len(edges)):
+                    source, target = _peek(edges, i, "source"), _peek(edges, i, "target")
+                    touches = source in requested or target in requested
+                    if touches and source in available and target in available:
+                        restored_edges[_edge_key(edges[i])] = edges[i]
+                    else:
+                        remaining_edges.append(_raw_at(edges, i))
+                nodes = stored.nodes
+                remaining_nodes = [_raw_at(nodes, i) for i in range(len(nodes)) if _peek(nodes, i, "id") not in requested]
+                if len(remaining_nodes) == len(nodes) and len(remaining_edges) == len(edges):
+                    continue
+                if remaining_nodes or remaining_edges:
+                    save_knowledge_graph(
+                        KnowledgeGraph.model_construct(nodes=_derive(nodes, remaining_nodes), edges=_derive(edges, remaining_edges)),
+                        path,
+                        compression=self.compression,
+                    )
+                else:
+                    os.remove(path)
+            self._archived_ids -= requested
+        return KnowledgeGraph.model_construct(nodes=list(restored_nodes.values()), edges=list(restored_edges.values()))
@@ -0,0 +1,271 @@
+# /app/knowledge_graph/serialization.py
+# title: 知識グラフのシリアライズ
+# role: 知識グラフをコンパクトなバイナリスナップショット(msgpack + zstd)で保存・ロードし、既存のJSONファイルを変換する。
+
+import argparse
+import io
+import json
+import logging
+import os
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional
+
+from pydantic import BaseModel
+
+from app.exceptions import KnowledgeGraphError
+from .models import Edge, KnowledgeGraph, LazyModelList, Node
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - 任意依存
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - 任意依存
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 任意依存
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"LKGS"
+SNAPSHOT_VERSION = 1
+CODEC_MSGPACK = 1
+CODEC_JSONL = 2
+COMPRESSION_NONE = 0
+COMPRESSION_ZSTD = 1
+
+NODE_FIELDS = ("id", "label", "properties", "metadata")
+EDGE_FIELDS = ("source", "target", "label", "weight", "properties")
+
+
+# --- 行形式との変換 ---
+def _to_row(item: Any, fields: tuple) -> List[Any]:
+    """モデル、辞書、行(リスト)のいずれかを行形式に変換する。未検証の生データは検証せずにそのまま使う。"""
+    if isinstance(item, list):
+        return item
+    if isinstance(item, dict):
+        return [item.get(f) for f in fields]
+    return [getattr(item, f) for f in fields]
+
+
+def _to_dict(item: Any, fields: tuple) -> Dict[str, Any]:
+    if isinstance(item, dict):
+        return item
+    if isinstance(item, list):
+        return {f: v for f, v in zip(fields, item) if v is not None}
+    return item.model_dump()
+
+
+def _node_from_raw(raw: Any) -> Node:
+    return Node.model_validate(_to_dict(raw, NODE_FIELDS))
+
+
+def _edge_from_raw(raw: Any) -> Edge:
+    return Edge.model_validate(_to_dict(raw, EDGE_FIELDS))
+
+
+def _iter_rows(items: List[Any], fields: tuple) -> Iterator[Any]:
+    """
+    要素を検証せずに、モデル・辞書・行のいずれかとして順に返す。
+    列指向ストアのビューのように生データが行番号の場合は、フィールドの値を覗き見て行を組み立てる。
+    """
+    if not isinstance(items, LazyModelList):
+        yield from items
+        return
+    for i, item in enumerate(items.iter_raw()):
+        yield item if isinstance(item, (list, dict, BaseModel)) else [items.peek(i, f) for f in fields]
+
+
+def lazy_graph(raw_nodes: List[Any], raw_edges: List[Any]) -> KnowledgeGraph:
+    """生データから、要素アクセス時に検証される知識グラフを構築する。"""
+    return KnowledgeGraph.model_construct(
+        nodes=LazyModelList(raw_nodes, _node_from_raw, NODE_FIELDS),
+        edges=LazyModelList(raw_edges, _edge_from_raw, EDGE_FIELDS),
+    )
+
+
+# --- JSON ---
+def _json_dumps(value: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _json_loads(data: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _write_json(graph: KnowledgeGraph, f: BinaryIO) -> None:
+    """既存形式と互換のJSONを、グラフ全体を一つの文字列にせず要素ごとに書き出す。"""
+    for key, items, fields in (("nodes", graph.nodes, NODE_FIELDS), ("edges", graph.edges, EDGE_FIELDS)):
+        f.write(b'{"nodes":[' if key == "nodes" else b'],"edges":[')
+        for i, item in enumerate(_iter_rows(items, fields)):
+            if i:
+                f.write(b",")
+            f.write(_json_dumps(_to_dict(item, fields)))
+    f.write(b"]}")
+
+
+# --- スナップショット ---
+def _resolve_codec() -> int:
+    return CODEC_MSGPACK if msgpack is not None else CODEC_JSONL
+
+
+def _resolve_compression(compression: Optional[str]) -> int:
+    if compression in (None, "", "none"):
+        return COMPRESSION_NONE
+    if compression != "zstd":
+        raise KnowledgeGraphError(f"未対応の圧縮方式です: {compression}")
+    if zstandard is None:
+        logger.warning("zstandardがインストールされていないため、圧縮せずにスナップショットを保存します。")
+        return COMPRESSION_NONE
+    return COMPRESSION_ZSTD
+
+
+def _write_snapshot(graph: KnowledgeGraph, f: BinaryIO, compression: Optional[str]) -> None:
+    codec = _resolve_codec()
+    compression_id = _resolve_compression(compression)
+    f.write(SNAPSHOT_MAGIC + bytes([SNAPSHOT_VERSION, codec, compression_id]))
+
+    compressor = None
+    out: BinaryIO = f
+    if compression_id == COMPRESSION_ZSTD:
+        compressor = zstandard.ZstdCompressor(level=3).stream_writer(f, closefd=False)
+        out = compressor
+
+    if codec == CODEC_MSGPACK:
+        packer = msgpack.Packer(use_bin_type=True)
+        encode = packer.pack
+    else:
+        encode = lambda value: _json_dumps(value) + b"\n"
+
+    out.write(encode({"nodes": len(graph.nodes), "edges": len(graph.edges)}))
+    for item in _iter_rows(graph.nodes, NODE_FIELDS):
+        out.write(encode(_to_row(item, NODE_FIELDS)))
+    for item in _iter_rows(graph.edges, EDGE_FIELDS):
+        out.write(encode(_to_row(item, EDGE_FIELDS)))
+
+    if compressor is not None:
+        compressor.close()
+
+
+def _record_errors() -> tuple:
+    """スナップショットが途中で切れている、または壊れている場合にレコードの読み込みで送出される例外。"""
+    errors: List[type] = [StopIteration, IndexError, KeyError, TypeError, ValueError]
+    if zstandard is not None:
+        errors.append(zstandard.ZstdError)
+    if msgpack is not None:
+        errors.append(msgpack.exceptions.UnpackException)
+    return tuple(errors)
+
+
+def _next_record(records: Iterator[Any]) -> Any:
+    """次のレコードを読み込む。ファイルが途中で切れている場合や壊れている場合はKnowledgeGraphErrorを送出する。"""
+    try:
+        return next(records)
+    except _record_errors() as e:
+        raise KnowledgeGraphError(f"スナップショットが途中で切れているか、壊れています: {e!r}") from e
+
+
+def _read_snapshot(f: BinaryIO) -> KnowledgeGraph:
+    header = f.read(len(SNAPSHOT_MAGIC) + 3)
+    if len(header) != len(SNAPSHOT_MAGIC) + 3:
+        raise KnowledgeGraphError(f"スナップショットのヘッダーが途中で切れています ({len(header)}バイト)。")
+    version, codec, compression_id = header[-3], header[-2], header[-1]
+    if version != SNAPSHOT_VERSION:
+        raise KnowledgeGraphError(f"未対応のスナップショットバージョンです: {version}")
+
+    stream: BinaryIO = f
+    if compression_id == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise KnowledgeGraphError("zstd圧縮されたスナップショットの読み込みにはzstandardが必要です。")
+        stream = zstandard.ZstdDecompressor().stream_reader(f, closefd=False)
+    elif compression_id != COMPRESSION_NONE:
+        raise KnowledgeGraphError(f"未対応の圧縮方式IDです: {compression_id}")
+
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise KnowledgeGraphError("msgpack形式のスナップショットの読み込みにはmsgpackが必要です。")
+        records: Iterator[Any] = iter(msgpack.Unpacker(stream, raw=False))
+    elif codec == CODEC_JSONL:
+        lines = io.BufferedReader(stream) if compression_id == COMPRESSION_ZSTD else stream
+        records = (_json_loads(line) for line in lines if line.strip())
+    else:
+        raise KnowledgeGraphError(f"未対応のコーデックIDです: {codec}")
+
+    counts = _next_record(records)
+    try:
+        num_nodes, num_edges = int(counts["nodes"]), int(counts["edges"])
+    except _record_errors() as e:
+        raise KnowledgeGraphError(f"スナップショットの件数レコードが不正です: {counts!r}") from e
+    raw_nodes = [_next_record(records) for _ in range(num_nodes)]
+    raw_edges = [_next_record(records) for _ in range(num_edges)]
+    return lazy_graph(raw_nodes, raw_edges)
+
+
+# --- 公開API ---
+def load_knowledge_graph(path: str) -> KnowledgeGraph:
+    """
+    ファイルから知識グラフをロードする。形式(スナップショット/JSON)はファイル内容から判定する。
+    ノードとエッジの検証はアクセス時まで遅延される。
+    """
+    with open(path, "rb") as f:
+        if f.read(len(SNAPSHOT_MAGIC)) == SNAPSHOT_MAGIC:
+            f.seek(0)
+            return _read_snapshot(f)
+        f.seek(0)
+        data = _json_loads(f.read())
+    if not isinstance(data, dict):
+        raise KnowledgeGraphError(f"知識グラフのJSON形式が不正です: {path}")
+    return lazy_graph(data.get("nodes", []), data.get("edges", []))
+
+
+def save_knowledge_graph(graph: KnowledgeGraph, path: str, compression: Optional[str] = "zstd") -> None:
+    """
+    知識グラフをファイルに保存する。拡張子が.jsonの場合は既存形式のJSON、それ以外はバイナリスナップショットで保存する。
+    一時ファイルに書き出してから置き換えるため、保存中にクラッシュしても既存のファイルは壊れない。
+    """
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        if path.endswith(".json"):
+            _write_json(graph, f)
+        else:
+            _write_snapshot(graph, f, compression)
+        # 置き換えた後にクラッシュしても中身が失われないよう、置き換える前に一時ファイルをディスクに書き出す
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def convert_json_to_snapshot(json_path: str, snapshot_path: str, compression: Optional[str] = "zstd") -> KnowledgeGraph:
+    """既存のJSON形式の知識グラフをバイナリスナップショットに変換し、ロードしたグラフを返す。"""
+    graph = load_knowledge_graph(json_path)
+    save_knowledge_graph(graph, snapshot_path, compression=compression)
+    logger.info(f"知識グラフを変換しました: {json_path} -> {snapshot_path} (ノード: {len(graph.nodes)}, エッジ: {len(graph.edges)})")
+    return graph
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="知識グラフのJSONファイルとスナップショットを相互変換する。")
+    parser.add_argument("source", help="変換元のファイル(JSONまたはスナップショット)")
+    parser.add_argument("destination", help="変換先のファイル(.jsonならJSON、それ以外はスナップショット)")
+    parser.add_argument("--compression", default="zstd", choices=["zstd", "none"], help="スナップショットの圧縮方式")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    graph = load_knowledge_graph(args.source)
+    save_knowledge_graph(graph, args.destination, compression=args.compression)
+    logger.info(f"{args.source} -> {args.destination} に変換しました。")
+
+
+if __name__ == "__main__":
+    main()
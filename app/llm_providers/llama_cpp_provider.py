@@ -7,6 +7,7 @@ from typing import Any, Dict, Optional, List
 
 from langchain_community.llms import LlamaCpp
 from app.llm_providers.base import LLMProvider
+from app.llm_providers.speculative_decoding import attach_throughput_tracker, build_draft_model, decoding_mode
 
 logger = logging.getLogger(__name__)
 
@@ -14,16 +15,18 @@ class LlamaCppProvider(LLMProvider):
     """
     llama.cppをLLM実行環境として利用するためのプロバイダークラス。
     """
-    def __init__(self, model_path: str, n_ctx: int = 2048, n_batch: int = 512, **kwargs):
+    def __init__(self, model_path: str, n_ctx: int = 2048, n_batch: int = 512, speculative_decoding: Optional[Dict[str, Any]] = None, **kwargs):
         """
         Args:
             model_path (str): ロードするGGUFモデルのフルパス。
             n_ctx (int): コンテキストの最大長。
             n_batch (int): バッチサイズ。
+            speculative_decoding (Optional[Dict[str, Any]]): 投機的デコーディングの設定(Config.SPECULATIVE_DECODING_SETTINGSの形式)。
         """
         self.model_path = model_path
         self.n_ctx = n_ctx
         self.n_batch = n_batch
+        self.speculative_decoding = speculative_decoding
         self.client_kwargs = kwargs
         logger.info(f"LlamaCppProvider initialized with model: {self.model_path}")
 
@@ -37,14 +40,19 @@ class LlamaCppProvider(LLMProvider):
         
         # kwargsをself.client_kwargsにマージし、個別の呼び出しでオーバーライドできるようにする
         instance_kwargs = {**self.client_kwargs, **kwargs}
-        
-        return LlamaCpp(
+        draft_model = build_draft_model(self.speculative_decoding, n_ctx=self.n_ctx, main_model_path=self.model_path)
+        if draft_model is not None:
+            instance_kwargs["model_kwargs"] = {**instance_kwargs.get("model_kwargs", {}), "draft_model": draft_model}
+
+        llm = LlamaCpp(
             model_path=self.model_path,
             n_ctx=self.n_ctx,
             n_batch=self.n_batch,
             verbose=False, # LangChainのLlamaCppはデフォルトで詳細ログを出すため、通常はFalseに設定
             **instance_kwargs
         )
+        attach_throughput_tracker(llm, decoding_mode(self.speculative_decoding))
+        return llm
 
     def invoke(self, model_instance: Any, prompt: str, **kwargs) -> str:
         """
@@ -0,0 +1,183 @@
+# /app/llm_providers/speculative_decoding.py
+# title: llama.cppの投機的デコーディング
+# role: llama.cppバックエンドで、小さなドラフトモデル(GGUF)またはプロンプト参照(prompt lookup)が提案したトークンを本体のモデルがまとめて検証する投機的デコーディングを構成し、生成速度(tokens/s)を計測する。
+
+import logging
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+from uuid import UUID
+
+import numpy as np
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+try:
+    from llama_cpp import Llama
+    from llama_cpp.llama_speculative import LlamaDraftModel, LlamaPromptLookupDecoding
+except ImportError:  # pragma: no cover - llama_cppバックエンドでのみ必要
+    Llama = None
+    LlamaDraftModel = object
+    LlamaPromptLookupDecoding = None
+
+logger = logging.getLogger(__name__)
+
+PLAIN = "plain"
+PROMPT_LOOKUP = "prompt_lookup"
+DRAFT_MODEL = "draft_model"
+
+
+class GGUFDraftModel(LlamaDraftModel):
+    """
+    小さなGGUFモデルで次のnum_pred_tokens個のトークンを貪欲法で提案するドラフトモデル。
+    本体のモデルは提案されたトークンを1回のバッチで評価し、自身の予測と一致した先頭部分だけを採用するため、出力は通常のデコードと変わらない。
+    ドラフトモデルは本体と同じ語彙(トークナイザ)を持つ必要がある。
+    1つのドラフトモデルを同じ本体のモデルの複数のLLMインスタンスで共有するため、コンテキストの利用はロックで直列化する。
+    """
+    def __init__(self, llama: Any, num_pred_tokens: int = 10):
+        self.llama = llama
+        self.num_pred_tokens = num_pred_tokens
+        self._lock = threading.Lock()
+        self._overflow_logged = False
+
+    def __call__(self, input_ids: np.ndarray, /, **kwargs: Any) -> np.ndarray:
+        tokens = [int(token) for token in input_ids]
+        with self._lock:
+            if len(tokens) + self.num_pred_tokens > self.llama.n_ctx():
+                if not self._overflow_logged:
+                    self._overflow_logged = True
+                    logger.warning(
+                        f"入力({len(tokens)}トークン)がドラフトモデルのコンテキスト長({self.llama.n_ctx()})を超えるため、"
+                        "これより長い入力では投機的デコーディングを行わずに通常のデコードを行います。"
+                    )
+                return np.array([], dtype=np.intc)
+            eos = self.llama.token_eos()
+            draft = []
+            # generate()は前回の入力と共通する先頭部分のKVキャッシュを再利用するため、評価するのは増えたトークンだけで済む
+            for token in self.llama.generate(tokens, top_k=1, temp=0.0):
+                if token == eos:
+                    break
+                draft.append(token)
+                if len(draft) >= self.num_pred_tokens:
+                    break
+        return np.array(draft, dtype=np.intc)
+
+
+# 本体のモデルごとに1つだけロードしたドラフトモデル。LLMインスタンスを作るたびにGGUFを読み込み直さないようにプロセス内で共有する
+_draft_models: Dict[Tuple[Any, ...], GGUFDraftModel] = {}
+_draft_models_lock = threading.Lock()
+
+
+def decoding_mode(speculative_settings: Optional[Dict[str, Any]]) -> str:
+    """設定から使うデコード方式を決める。ドラフトモデルのパスがなければプロンプト参照を使う。"""
+    if not speculative_settings or not speculative_settings.get("enabled", False):
+        return PLAIN
+    return DRAFT_MODEL if speculative_settings.get("draft_model_path") else PROMPT_LOOKUP
+
+
+def build_draft_model(
+    speculative_settings: Optional[Dict[str, Any]], n_ctx: Optional[int] = None, main_model_path: str = "",
+) -> Optional[Any]:
+    """
+    LlamaCppのmodel_kwargsのdraft_modelに渡すドラフトモデルを作る。投機的デコーディングを使わない場合はNoneを返す。
+    ドラフトモデル(GGUF)は本体のモデル(main_model_path)ごとにプロセス内で1回だけロードし、以降の呼び出しでは同じものを返す。
+    draft_n_ctxを指定しない場合、ドラフトモデルのコンテキスト長は本体のコンテキスト長(n_ctx)に合わせる。
+    """
+    mode = decoding_mode(speculative_settings)
+    if mode == PLAIN:
+        return None
+    assert speculative_settings is not None
+    if LlamaPromptLookupDecoding is None:
+        raise ImportError("投機的デコーディングにはllama-cpp-pythonが必要です。")
+    num_pred_tokens = speculative_settings.get("num_pred_tokens", 10)
+    if mode == PROMPT_LOOKUP:
+        logger.info(f"投機的デコーディング: プロンプト参照 (提案トークン数: {num_pred_tokens})")
+        return LlamaPromptLookupDecoding(
+            num_pred_tokens=num_pred_tokens,
+            max_ngram_size=speculative_settings.get("max_ngram_size", 2),
+        )
+    draft_model_path = speculative_settings["draft_model_path"]
+    draft_n_ctx = speculative_settings.get("draft_n_ctx") or n_ctx or 2048
+    n_gpu_layers = speculative_settings.get("draft_n_gpu_layers", 0)
+    key = (main_model_path, draft_model_path, draft_n_ctx, n_gpu_layers, num_pred_tokens)
+    with _draft_models_lock:
+        draft_model = _draft_models.get(key)
+        if draft_model is not None:
+            return draft_model
+        logger.info(
+            f"投機的デコーディング: ドラフトモデル {draft_model_path} (提案トークン数: {num_pred_tokens}, コンテキスト長: {draft_n_ctx})"
+        )
+        if n_ctx and draft_n_ctx < n_ctx:
+            logger.warning(
+                f"ドラフトモデルのコンテキスト長({draft_n_ctx})が本体({n_ctx})より短いため、"
+                f"{draft_n_ctx}トークンを超える入力では投機的デコーディングを行いません。"
+            )
+        llama = Llama(model_path=draft_model_path, n_ctx=draft_n_ctx, n_gpu_layers=n_gpu_layers, verbose=False)
+        draft_model = GGUFDraftModel(llama, num_pred_tokens=num_pred_tokens)
+        _draft_models[key] = draft_model
+        return draft_model
+
+
+class DecodingThroughputTracker(BaseCallbackHandler):
+    """
+    LLMの呼び出しごとに生成したトークン数と所要時間を記録し、生成速度(tokens/s)を求めるコールバック。
+    count_tokensには生成テキストのトークン数を数える関数(LlamaCppではget_num_tokens)を渡す。
+    """
+    def __init__(self, mode: str = PLAIN, count_tokens: Optional[Callable[[str], int]] = None):
+        self.mode = mode
+        self.count_tokens = count_tokens
+        self._lock = threading.Lock()
+        self._started: Dict[UUID, float] = {}
+        self.calls = 0
+        self.completion_tokens = 0
+        self.seconds = 0.0
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._started[run_id] = time.perf_counter()
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        with self._lock:
+            self._started.pop(run_id, None)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        finished = time.perf_counter()
+        with self._lock:
+            started = self._started.pop(run_id, None)
+        if started is None or self.count_tokens is None:
+            return
+        text = "".join(generation.text for generations in response.generations for generation in generations)
+        tokens = self.count_tokens(text) if text else 0
+        seconds = finished - started
+        with self._lock:
+            self.calls += 1
+            self.completion_tokens += tokens
+            self.seconds += seconds
+            average = self.completion_tokens / self.seconds if self.seconds > 0 else 0.0
+        rate = tokens / seconds if seconds > 0 else 0.0
+        logger.info(f"生成速度: {tokens} tokens / {seconds:.2f}秒 = {rate:.1f} tokens/s (デコード方式: {self.mode}, 累計平均: {average:.1f} tokens/s)")
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "calls": self.calls,
+                "completion_tokens": self.completion_tokens,
+                "seconds": self.seconds,
+                "tokens_per_second": self.completion_tokens / self.seconds if self.seconds > 0 else 0.0,
+            }
+
+
+def attach_throughput_tracker(llm: Any, mode: str) -> DecodingThroughputTracker:
+    """LLMのインスタンスに生成速度の計測を追加する。"""
+    tracker = DecodingThroughputTracker(mode=mode, count_tokens=llm.get_num_tokens)
+    llm.callbacks = [*(llm.callbacks or []), tracker]
+    return tracker
+
+
+def find_throughput_tracker(llm: Any) -> Optional[DecodingThroughputTracker]:
+    """attach_throughput_trackerで追加した計測を返す。"""
+    for callback in getattr(llm, "callbacks", None) or []:
+        if isinstance(callback, DecodingThroughputTracker):
+            return callback
+    return None
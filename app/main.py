@@ -14,6 +14,9 @@ from app.api import router as api_router
 from app.analytics.router import router as analytics_router
 from app.containers import Container, wire_circular_dependencies
 from app.sandbox.sandbox_manager import SandboxManager
+from app.utils.log_writer import BufferedLogWriter
+from app.memory.session_store import SessionStore
+from app.memory.episodic_memory import EpisodicMemory
 
 logger = logging.getLogger(__name__)
 
@@ -21,7 +24,10 @@ logger = logging.getLogger(__name__)
 @inject
 async def lifespan(
     app: FastAPI, 
-    sandbox_manager: SandboxManager = Provide[Container.sandbox_manager]
+    sandbox_manager: SandboxManager = Provide[Container.sandbox_manager],
+    log_writer: BufferedLogWriter = Provide[Container.log_writer],
+    session_store: SessionStore = Provide[Container.session_store],
+    episodic_memory: EpisodicMemory | None = Provide[Container.episodic_memory]
 ):
     """
     FastAPIアプリケーションのライフサイクルを管理する。
@@ -49,6 +55,16 @@ async def lifespan(
     except Exception as e:
         logger.error(f"Failed to stop sandbox environment during shutdown: {e}", exc_info=True)
 
+    # メモリ上のセッションを退避し、次回の起動後も対話を継続できるようにする
+    session_store.close()
+
+    # 埋め込み待ちのエピソードを索引に追加し、保存する
+    if episodic_memory:
+        episodic_memory.close()
+
+    # 書き込み待ちの記憶ログ・活動ログを書き切ってから終了する
+    log_writer.close()
+
 
 # DIコンテナのセットアップ
 container = Container()
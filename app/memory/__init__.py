@@ -3,4 +3,7 @@
 # role: 記憶に関連するクラスをインポートし、パッケージとして利用可能にする。
 
 from .memory_consolidator import MemoryConsolidator
-from .working_memory import WorkingMemory
\ No newline at end of file
+from .working_memory import WorkingMemory
+from .session_store import SessionStore
+from .consolidation_manifest import ConsolidationManifest
+from .episodic_memory import EpisodicMemory
@@ -0,0 +1,174 @@
+# /app/memory/consolidation_manifest.py
+# title: 記憶統合セッションのマニフェスト
+# role: オフライン統合の対象となるワーキングメモリのセッションファイルの状態(pending/processing/done/failed)と時刻をSQLiteで管理し、複数のワーカーが安全にセッションを取得(claim)できるようにする。
+
+import logging
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+PENDING = "pending"
+PROCESSING = "processing"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_file TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    claimed_by TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_by_state ON sessions (state, created_at);
+"""
+
+
+class ConsolidationManifest:
+    """
+    統合待ちのセッションファイルの状態を記録するマニフェスト。
+
+    セッションファイルは書き込み時にregister()でpendingとして登録され、claim()で古い順に取得されてprocessingになる。
+    claim()は書き込みロックを取った1つのトランザクションで選択と更新を行うため、同時に呼び出した複数のワーカー
+    (別プロセスを含む)が同じセッションを取得することはない。claim_timeout_seconds以上processingのままのセッションは、
+    ワーカーが異常終了したものとみなして再び取得の対象にする。失敗したセッションはmax_attempts回まで再試行し、
+    それを超えるとfailedとして残す。完了の記録はdone_retention_seconds経過後にprune_done()で削除する。
+    未処理のセッションの検索は(state, created_at)の索引を使うため、処理済みのセッションの数によらず取得する件数に比例したコストで済む。
+    """
+    def __init__(
+        self,
+        db_path: str = "memory/consolidation_sessions.sqlite3",
+        legacy_log_path: Optional[str] = None,
+        claim_timeout_seconds: float = 3600,
+        max_attempts: int = 3,
+        done_retention_seconds: Optional[float] = 30 * 24 * 3600,
+    ):
+        self.db_path = db_path
+        self.claim_timeout_seconds = claim_timeout_seconds
+        self.max_attempts = max_attempts
+        self.done_retention_seconds = done_retention_seconds
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        is_new = not os.path.exists(db_path)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+        if is_new and legacy_log_path and os.path.exists(legacy_log_path):
+            self._import_legacy_log(legacy_log_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        # トランザクションは明示的に開始する(BEGIN IMMEDIATEで書き込みロックを先に取るため)
+        return sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+
+    def _import_legacy_log(self, legacy_log_path: str) -> None:
+        """旧形式の処理済みセッションのログを、doneのセッションとして取り込む。"""
+        with open(legacy_log_path, "r", encoding="utf-8") as f:
+            session_files = [line.strip() for line in f if line.strip()]
+        self._insert(session_files, DONE)
+        logger.info(f"処理済みセッションのログ {legacy_log_path} から{len(session_files)}件をマニフェストに取り込みました。")
+
+    def _insert(self, session_files: Iterable[str], state: str) -> int:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.executemany(
+                "INSERT OR IGNORE INTO sessions (session_file, state, created_at, updated_at) VALUES (?, ?, ?, ?)",
+                [(session_file, state, now, now) for session_file in session_files],
+            )
+            conn.execute("COMMIT")
+            return cursor.rowcount
+
+    def register(self, session_file: str) -> None:
+        """
+        書き込まれたセッションファイルを統合待ちとして登録する。
+        同じファイル名で統合済み(done/failed)の記録があれば、新しい内容として統合待ちに戻す。
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO sessions (session_file, state, created_at, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (session_file) DO UPDATE SET state = excluded.state, created_at = excluded.created_at, "
+                "updated_at = excluded.updated_at, attempts = 0, claimed_by = NULL, error = NULL "
+                "WHERE sessions.state IN (?, ?)",
+                (session_file, PENDING, now, now, DONE, FAILED),
+            )
+            conn.execute("COMMIT")
+
+    def import_directory(self, session_dir: str) -> int:
+        """
+        マニフェストに登録されていないセッションファイル(マニフェスト導入前のものや、登録せずに書かれたもの)を
+        統合待ちとして登録し、登録した件数を返す。ディレクトリ全体を走査するため、起動時に一度だけ呼び出す。
+        """
+        if not os.path.exists(session_dir):
+            return 0
+        added = self._insert(sorted(f for f in os.listdir(session_dir) if f.endswith(".json")), PENDING)
+        if added:
+            logger.info(f"{added}件のセッションファイルを統合待ちとしてマニフェストに登録しました。")
+        return added
+
+    def claim(self, limit: int, worker_id: str) -> List[str]:
+        """統合待ちのセッションを古い順に最大limit件取得してprocessingにし、そのファイル名を返す。"""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT session_file FROM sessions WHERE state = ? OR (state = ? AND updated_at < ?) "
+                "ORDER BY created_at LIMIT ?",
+                (PENDING, PROCESSING, now - self.claim_timeout_seconds, limit),
+            ).fetchall()
+            session_files = [row[0] for row in rows]
+            conn.executemany(
+                "UPDATE sessions SET state = ?, claimed_by = ?, updated_at = ?, attempts = attempts + 1 WHERE session_file = ?",
+                [(PROCESSING, worker_id, now, session_file) for session_file in session_files],
+            )
+            conn.execute("COMMIT")
+        return session_files
+
+    def mark_done(self, session_files: Iterable[str]) -> None:
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "UPDATE sessions SET state = ?, updated_at = ?, error = NULL WHERE session_file = ?",
+                [(DONE, now, session_file) for session_file in session_files],
+            )
+            conn.execute("COMMIT")
+
+    def mark_failed(self, session_files: Iterable[str], error: str, retry: bool = True) -> None:
+        """
+        セッションの統合の失敗を記録する。retryがTrueで試行回数がmax_attempts未満なら統合待ちに戻し、
+        それ以外はfailedにする。
+        """
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "UPDATE sessions SET state = CASE WHEN ? AND attempts < ? THEN ? ELSE ? END, updated_at = ?, error = ? "
+                "WHERE session_file = ?",
+                [(retry, self.max_attempts, PENDING, FAILED, now, error, session_file) for session_file in session_files],
+            )
+            conn.execute("COMMIT")
+
+    def prune_done(self, now: Optional[float] = None) -> int:
+        """done_retention_seconds以上前に完了したセッションの記録を削除し、削除した件数を返す。"""
+        if self.done_retention_seconds is None:
+            return 0
+        cutoff = (now if now is not None else time.time()) - self.done_retention_seconds
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute("DELETE FROM sessions WHERE state = ? AND updated_at < ?", (DONE, cutoff))
+            conn.execute("COMMIT")
+            return cursor.rowcount
+
+    def get_counts(self) -> Dict[str, int]:
+        """状態ごとのセッション数を返す。"""
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT state, COUNT(*) FROM sessions GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
@@ -0,0 +1,267 @@
+# /app/memory/episodic_memory.py
+# title: エピソード記憶
+# role: 記録された対話と自律思考を逐次埋め込み、近似最近傍(HNSW)索引に蓄積する。過去の類似したやり取りの検索と、質問のクラスタリングを提供する。
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import threading
+from collections import defaultdict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import faiss
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EmbedFunction = Callable[[List[str]], np.ndarray]
+
+# 埋め込みの対象とするレコードの種類
+EPISODE_TYPES = ("interaction", "autonomous_thought")
+
+
+def episode_text(record: Dict[str, Any]) -> Optional[str]:
+    """レコードから埋め込みに使うテキストを取り出す。対象外のレコードにはNoneを返す。"""
+    record_type = record.get("type")
+    if record_type == "interaction":
+        return record.get("query") or None
+    if record_type == "autonomous_thought":
+        text = f"{record.get('topic', '')}\n{record.get('synthesized_knowledge', '')}".strip()
+        return text or None
+    return None
+
+
+class EpisodicMemory:
+    """
+    過去の対話(質問)と自律思考のエピソードを埋め込みベクトルで検索できるようにする記憶。
+
+    add()はレコードをキューに入れるだけで戻り、埋め込みと索引への追加はバックグラウンドのスレッドがまとめて行うため、
+    記録する側は埋め込みモデルの計算を待たない。索引はコサイン類似度(正規化したベクトルの内積)のHNSWで、
+    ef_searchで検索の精度と速度を調整する。asearch()はsearch_timeout_seconds以内に終わらなければ空の結果を返すため、
+    応答の生成を遅らせない。索引は<index_path>に、各エピソードのレコードは<index_path>.meta.jsonlに保存する。
+    """
+    def __init__(
+        self,
+        embed_fn: EmbedFunction,
+        index_path: str = "memory/episodic_memory.faiss",
+        hnsw_m: int = 32,
+        ef_search: int = 64,
+        max_text_chars: int = 512,
+        max_queue_size: int = 1000,
+        batch_size: int = 32,
+        search_timeout_seconds: float = 0.2,
+    ):
+        self.embed_fn = embed_fn
+        self.index_path = index_path
+        self.meta_path = f"{index_path}.meta.jsonl"
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+        self.max_text_chars = max_text_chars
+        self.batch_size = batch_size
+        self.search_timeout_seconds = search_timeout_seconds
+        self._lock = threading.RLock()
+        self._index: Optional[faiss.Index] = None
+        self._records: List[Dict[str, Any]] = []
+        self._ids_by_type: Dict[str, List[int]] = defaultdict(list)
+        self._dropped = 0
+        self._load()
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=max_queue_size)
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="EpisodicMemory", daemon=True)
+        self._thread.start()
+
+    @property
+    def size(self) -> int:
+        with self._lock:
+            return len(self._records)
+
+    # --- 永続化 ---
+    def _load(self) -> None:
+        if not os.path.exists(self.index_path):
+            return
+        try:
+            index = faiss.read_index(self.index_path)
+            records: List[Dict[str, Any]] = []
+            if os.path.exists(self.meta_path):
+                with open(self.meta_path, "r", encoding="utf-8") as f:
+                    records = [json.loads(line) for line in f if line.strip()]
+        except (RuntimeError, IOError, ValueError) as e:
+            logger.error(f"エピソード記憶 {self.index_path} の読み込みに失敗しました。空の状態から始めます: {e}")
+            return
+        if len(records) != index.ntotal:
+            # 最後の保存以降に追記されたレコードは索引に含まれていないため捨てる
+            logger.warning(f"エピソード記憶のレコード数({len(records)})と索引の件数({index.ntotal})が一致しないため、索引に合わせます。")
+            records = records[:index.ntotal]
+            self._rewrite_meta(records)
+        self._index = index
+        faiss.downcast_index(index).hnsw.efSearch = self.ef_search
+        self._records = records
+        for i, record in enumerate(records):
+            self._ids_by_type[str(record.get("type"))].append(i)
+        logger.info(f"エピソード記憶を読み込みました (エピソード数: {len(records)})。")
+
+    def _rewrite_meta(self, records: List[Dict[str, Any]]) -> None:
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+        os.replace(tmp_path, self.meta_path)
+
+    def save(self) -> None:
+        """索引をファイルに保存する。レコードは追加時に追記されている。"""
+        with self._lock:
+            if self._index is None:
+                return
+            index_dir = os.path.dirname(self.index_path)
+            if index_dir:
+                os.makedirs(index_dir, exist_ok=True)
+            tmp_path = f"{self.index_path}.tmp"
+            faiss.write_index(self._index, tmp_path)
+            os.replace(tmp_path, self.index_path)
+
+    # --- 追加 ---
+    def add(self, record: Dict[str, Any]) -> bool:
+        """エピソードの対象となるレコードを埋め込み待ちのキューに入れる。キューが満杯の場合は破棄してFalseを返す。"""
+        if self._closed or episode_text(record) is None:
+            return False
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self._dropped += 1
+            return False
+        return True
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        vectors = np.asarray(self.embed_fn([text[:self.max_text_chars] for text in texts]), dtype="float32")
+        if vectors.ndim != 2 or len(vectors) != len(texts):
+            raise ValueError(f"埋め込みの形状が不正です: {vectors.shape}")
+        faiss.normalize_L2(vectors)
+        return vectors
+
+    def _add_batch(self, records: List[Dict[str, Any]]) -> None:
+        vectors = self._embed([episode_text(record) or "" for record in records])
+        with self._lock:
+            if self._index is None:
+                self._index = faiss.IndexHNSWFlat(vectors.shape[1], self.hnsw_m, faiss.METRIC_INNER_PRODUCT)
+                self._index.hnsw.efSearch = self.ef_search
+            start = len(self._records)
+            self._index.add(vectors)
+            self._records.extend(records)
+            for offset, record in enumerate(records):
+                self._ids_by_type[str(record.get("type"))].append(start + offset)
+            meta_dir = os.path.dirname(self.meta_path)
+            if meta_dir:
+                os.makedirs(meta_dir, exist_ok=True)
+            with open(self.meta_path, "a", encoding="utf-8") as f:
+                f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            batch = [item] if item is not None else []
+            stop = item is None
+            while len(batch) < self.batch_size and not stop:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                else:
+                    batch.append(item)
+            if batch:
+                try:
+                    self._add_batch(batch)
+                except Exception as e:
+                    logger.error(f"エピソードの埋め込みに失敗しました ({len(batch)}件): {e}", exc_info=True)
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                self._queue.task_done()
+                return
+
+    def flush(self) -> None:
+        """キューに入っている全レコードが索引に追加されるまで待つ。"""
+        if not self._closed:
+            self._queue.join()
+
+    def close(self) -> None:
+        """残っているレコードを索引に追加し、保存してからスレッドを停止する。"""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        self.save()
+
+    # --- 検索 ---
+    def search(self, text: str, k: int = 5, types: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """
+        テキストに類似したエピソードを類似度の高い順に最大k件返す。
+        各要素は{"record": 元のレコード, "score": コサイン類似度}。typesを指定した場合はその種類だけを返す。
+        """
+        if not text or k <= 0:
+            return []
+        with self._lock:
+            if self._index is None or self._index.ntotal == 0:
+                return []
+        query = self._embed([text])
+        wanted = set(types) if types is not None else None
+        with self._lock:
+            # 種類で絞り込む場合に備えて多めに取得する
+            fetch = min(self._index.ntotal, k if wanted is None else k * 4)
+            scores, ids = self._index.search(query, fetch)
+            results = []
+            for score, i in zip(scores[0], ids[0]):
+                if i < 0:
+                    continue
+                record = self._records[i]
+                if wanted is not None and record.get("type") not in wanted:
+                    continue
+                results.append({"record": record, "score": float(score)})
+                if len(results) >= k:
+                    break
+        return results
+
+    async def asearch(self, text: str, k: int = 5, types: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """search()を別スレッドで実行し、search_timeout_seconds以内に終わらなければ空の結果を返す。"""
+        try:
+            return await asyncio.wait_for(asyncio.to_thread(self.search, text, k, types), timeout=self.search_timeout_seconds)
+        except asyncio.TimeoutError:
+            logger.info(f"エピソード記憶の検索が時間予算({self.search_timeout_seconds}秒)内に終わらなかったため、結果を使いません。")
+            return []
+        except Exception as e:
+            logger.error(f"エピソード記憶の検索中にエラーが発生しました: {e}", exc_info=True)
+            return []
+
+    def cluster(self, record_type: str = "interaction", limit: int = 200, num_clusters: int = 5) -> List[Dict[str, Any]]:
+        """
+        指定した種類の最近のエピソード最大limit件を、保存済みのベクトルでk-meansにより最大num_clusters個に分ける。
+        各要素は{"representative": 重心に最も近いレコード, "size": 件数}で、件数の多い順に返す。
+        """
+        with self._lock:
+            ids = self._ids_by_type.get(record_type, [])[-limit:]
+            if not ids or self._index is None:
+                return []
+            vectors = np.vstack([self._index.reconstruct(i) for i in ids]).astype("float32")
+            records = [self._records[i] for i in ids]
+        k = min(num_clusters, len(ids))
+        if k <= 1:
+            return [{"representative": records[-1], "size": len(records)}]
+        kmeans = faiss.Kmeans(vectors.shape[1], k, niter=20, seed=1, min_points_per_centroid=1)
+        kmeans.train(vectors)
+        distances, assignments = kmeans.index.search(vectors, 1)
+        clusters = []
+        for c in range(k):
+            members = np.where(assignments[:, 0] == c)[0]
+            if len(members) == 0:
+                continue
+            representative = members[np.argmin(distances[members, 0])]
+            clusters.append({"representative": records[representative], "size": int(len(members))})
+        return sorted(clusters, key=lambda c: c["size"], reverse=True)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"episodes": len(self._records), "pending": self._queue.qsize(), "dropped": self._dropped}
@@ -0,0 +1,176 @@
+# /app/memory/log_index.py
+# title: 記憶ログの索引
+# role: JSONL形式の記憶ログを末尾からブロック単位で逆順に読む機能と、レコードの種類・トピックごとのバイトオフセットを保持するサイドカー索引を提供する。
+
+import json
+import logging
+import os
+from array import array
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 64 * 1024
+
+
+def iter_lines_reversed(f: BinaryIO, end: Optional[int] = None, block_size: int = DEFAULT_BLOCK_SIZE) -> Iterator[Tuple[int, bytes]]:
+    """
+    ファイルの末尾(またはend)から先頭に向かってブロック単位で読み、(行の開始オフセット, 行の内容)を新しい順に返す。
+    読み込む量は返した行の長さにほぼ比例し、ファイル全体のサイズには依存しない。
+    """
+    position = f.seek(0, os.SEEK_END) if end is None else end
+    remainder = b""
+    while position > 0:
+        read_size = min(block_size, position)
+        position -= read_size
+        f.seek(position)
+        block = f.read(read_size) + remainder
+        lines = block.split(b"\n")
+        # 先頭の断片は前のブロックの行の続きである可能性があるため、次のブロックと結合する
+        remainder = lines[0]
+        offset = position + len(block)
+        for line in reversed(lines[1:]):
+            offset -= len(line) + 1
+            if line.strip():
+                yield offset + 1, line
+    if remainder.strip():
+        yield 0, remainder
+
+
+def index_keys(record: Dict[str, Any]) -> List[str]:
+    """レコードを索引に登録する際のキー(種類、種類ごとのトピック、イベント種別)を返す。"""
+    record_type = record.get("type")
+    keys = [f"type:{record_type}"]
+    if record.get("topic") is not None:
+        keys.append(f"topic:{record_type}:{record['topic']}")
+    if record.get("event_type") is not None:
+        keys.append(f"event:{record['event_type']}")
+    return keys
+
+
+class LogOffsetIndex:
+    """
+    記憶ログのレコードの開始オフセットをキーごとに保持する索引。
+    索引はログと同じ場所のサイドカーファイル(<ログ>.idx)に追記形式で永続化される。
+    起動時にサイドカーを読み込み、ログが索引より先まで書かれていればその部分だけを走査して追いつき、
+    ログが索引より短い(置き換えや切り詰めがあった)場合は作り直す。
+    """
+    def __init__(self, log_file_path: str):
+        self.log_file_path = log_file_path
+        self.index_path = f"{log_file_path}.idx"
+        self._offsets: Dict[str, array] = {}
+        self.indexed_size = 0
+
+    def _add(self, offset: int, end: int, keys: List[str]) -> None:
+        for key in keys:
+            offsets = self._offsets.get(key)
+            if offsets is None:
+                offsets = self._offsets[key] = array("q")
+            offsets.append(offset)
+        self.indexed_size = end
+
+    def _reset(self) -> None:
+        self._offsets = {}
+        self.indexed_size = 0
+        if os.path.exists(self.index_path):
+            os.remove(self.index_path)
+
+    def clear(self) -> None:
+        """ログを空にした(封印して削除した)ときに、サイドカーごと索引を空にする。"""
+        self._reset()
+
+    def load(self) -> None:
+        """サイドカーを読み込み、ログの現在の内容と整合させる。"""
+        self._offsets = {}
+        self.indexed_size = 0
+        log_size = os.path.getsize(self.log_file_path) if os.path.exists(self.log_file_path) else 0
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, "rb") as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        offset, end, keys = json.loads(line)
+                        if end > log_size:
+                            raise ValueError("索引がログの末尾を超えています")
+                        self._add(offset, end, keys)
+            except (IOError, ValueError) as e:
+                logger.warning(f"記憶ログの索引 {self.index_path} を作り直します: {e}")
+                self._reset()
+        self.catch_up()
+
+    def catch_up(self) -> None:
+        """索引の末尾以降にログへ書かれたレコードを走査して索引に加える。"""
+        if not os.path.exists(self.log_file_path):
+            if self.indexed_size:
+                self._reset()
+            return
+        log_size = os.path.getsize(self.log_file_path)
+        if log_size < self.indexed_size:
+            logger.warning(f"記憶ログ {self.log_file_path} が索引より短いため、索引を作り直します。")
+            self._reset()
+        if log_size == self.indexed_size:
+            return
+        entries = []
+        with open(self.log_file_path, "rb") as f:
+            f.seek(self.indexed_size)
+            offset = self.indexed_size
+            for line in f:
+                end = offset + len(line)
+                if not line.endswith(b"\n"):
+                    # 書き込み途中の行は次回に回す
+                    break
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    record = None
+                keys = index_keys(record) if isinstance(record, dict) else []
+                self._add(offset, end, keys)
+                entries.append([offset, end, keys])
+                offset = end
+        self._append_entries(entries)
+
+    def _append_entries(self, entries: List[List[Any]]) -> None:
+        if not entries:
+            return
+        try:
+            with open(self.index_path, "ab") as f:
+                f.write(b"".join(json.dumps(entry, ensure_ascii=False).encode("utf-8") + b"\n" for entry in entries))
+        except IOError as e:
+            logger.error(f"記憶ログの索引 {self.index_path} の書き込みに失敗しました: {e}")
+
+    def append(self, offset: int, end: int, record: Dict[str, Any]) -> None:
+        """ログに書き込んだレコードを索引に加える。"""
+        if offset != self.indexed_size:
+            # 他の書き込み元がログに追記していた場合は、その部分を先に取り込む
+            self.catch_up()
+            return
+        keys = index_keys(record)
+        self._add(offset, end, keys)
+        self._append_entries([[offset, end, keys]])
+
+    def keys(self) -> List[str]:
+        """索引に登録されているキーの一覧を返す。"""
+        return list(self._offsets)
+
+    def count(self, key: str) -> int:
+        """キーに該当する索引済みのレコード数を返す。"""
+        offsets = self._offsets.get(key)
+        return len(offsets) if offsets else 0
+
+    def recent_offsets(self, key: str, limit: int) -> List[int]:
+        """キーに該当するレコードのオフセットを新しい順に最大limit件返す。"""
+        offsets = self._offsets.get(key)
+        if not offsets or limit <= 0:
+            return []
+        return list(reversed(offsets[-limit:]))
+
+
+def read_record_at(f: BinaryIO, offset: int) -> Optional[Dict[str, Any]]:
+    """オフセット位置の1行を読み、JSONとして解釈したレコードを返す。"""
+    f.seek(offset)
+    try:
+        record = json.loads(f.readline())
+    except json.JSONDecodeError:
+        return None
+    return record if isinstance(record, dict) else None
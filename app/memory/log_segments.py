@@ -0,0 +1,262 @@
+# /app/memory/log_segments.py
+# title: 記憶ログのセグメント管理
+# role: 記憶ログをサイズ・期間でローテーションして圧縮済みのセグメントに封印し、時間範囲と種類・索引キーごとの件数を持つマニフェストで管理する。種類ごとの保持期間に従って古いレコードを削除する。
+
+import gzip
+import io
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+from .log_index import index_keys
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 任意依存
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+_EXTENSIONS = {"zstd": ".jsonl.zst", "gzip": ".jsonl.gz", "none": ".jsonl"}
+
+
+def _parse_timestamp(value: Any) -> Optional[float]:
+    if not isinstance(value, str):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    # 記憶ログのタイムスタンプはタイムゾーンなしのUTCで記録されている
+    return (parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)).timestamp()
+
+
+def record_time(record: Dict[str, Any]) -> Optional[float]:
+    """レコードのtimestampをUNIX時刻で返す。"""
+    return _parse_timestamp(record.get("timestamp"))
+
+
+def iter_jsonl(f: Iterable[bytes]) -> Iterator[Dict[str, Any]]:
+    for line in f:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if isinstance(record, dict):
+            yield record
+
+
+class LogSegmentStore:
+    """
+    封印済みの記憶ログセグメントとそのマニフェストを管理する。
+
+    アクティブなログファイルが max_segment_bytes を超えるか、先頭レコードから max_segment_seconds が経過すると、
+    その内容を圧縮したセグメントとして segments ディレクトリに移し、マニフェスト(<ログ>.manifest.json)に
+    時間範囲・件数・種類ごとの件数と、索引キー(種類ごとのトピック、イベント種別)ごとの件数を記録する。
+    時間範囲や種類、索引キーを指定した検索では、条件に合うセグメントだけを読む。
+    retention_seconds は種類ごとの保持期間(秒)で、"default" は明示されていない種類に適用される。Noneは無期限。
+    """
+    def __init__(
+        self,
+        log_file_path: str,
+        max_segment_bytes: int = 8 * 1024 * 1024,
+        max_segment_seconds: Optional[float] = 24 * 3600,
+        compression: str = "zstd",
+        retention_seconds: Optional[Dict[str, Optional[float]]] = None,
+    ):
+        self.log_file_path = log_file_path
+        self.segment_dir = os.path.join(os.path.dirname(log_file_path) or ".", "segments")
+        self.manifest_path = f"{log_file_path}.manifest.json"
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segment_seconds = max_segment_seconds
+        if compression == "zstd" and zstandard is None:
+            logger.warning("zstandardがインストールされていないため、記憶ログのセグメントをgzipで圧縮します。")
+            compression = "gzip"
+        self.compression = compression
+        self.retention_seconds = retention_seconds or {}
+        self.segments: List[Dict[str, Any]] = self._load_manifest()
+
+    # --- マニフェスト ---
+    def _load_manifest(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.manifest_path):
+            return []
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                segments = json.load(f).get("segments", [])
+        except (IOError, ValueError) as e:
+            logger.error(f"記憶ログのマニフェスト {self.manifest_path} の読み込みに失敗しました: {e}")
+            return []
+        segments = [s for s in segments if os.path.exists(os.path.join(self.segment_dir, s["file"]))]
+        legacy = [s for s in segments if "keys" not in s]
+        if legacy:
+            # 索引キーごとの件数を持たない古いマニフェストは、起動時に一度だけセグメントを読んで補う
+            for segment in legacy:
+                segment["keys"] = self._count_keys(self.read_segment(segment))
+            self.segments = segments
+            self._save_manifest()
+        return segments
+
+    @staticmethod
+    def _record_keys(record: Dict[str, Any]) -> List[str]:
+        """マニフェストに件数を記録する索引キー。種類ごとの件数はtypesに別に記録するため除く。"""
+        return [key for key in index_keys(record) if not key.startswith("type:")]
+
+    @classmethod
+    def _count_keys(cls, records: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for record in records:
+            for key in cls._record_keys(record):
+                counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def _save_manifest(self) -> None:
+        tmp_path = f"{self.manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"segments": self.segments}, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.manifest_path)
+
+    # --- セグメントの入出力 ---
+    def _open_segment_writer(self, path: str) -> BinaryIO:
+        if self.compression == "zstd":
+            return zstandard.ZstdCompressor(level=3).stream_writer(open(path, "wb"), closefd=True)
+        if self.compression == "gzip":
+            return gzip.open(path, "wb")
+        return open(path, "wb")
+
+    def _open_segment_reader(self, segment: Dict[str, Any]) -> BinaryIO:
+        path = os.path.join(self.segment_dir, segment["file"])
+        if path.endswith(".zst"):
+            if zstandard is None:
+                raise IOError(f"zstd圧縮されたセグメントの読み込みにはzstandardが必要です: {path}")
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(open(path, "rb"), closefd=True))
+        if path.endswith(".gz"):
+            return gzip.open(path, "rb")
+        return open(path, "rb")
+
+    def _write_segment(self, records: Iterable[Dict[str, Any]], sequence: int) -> Optional[Dict[str, Any]]:
+        """レコードを新しいセグメントに書き出し、マニフェストのエントリを返す。レコードがなければNoneを返す。"""
+        os.makedirs(self.segment_dir, exist_ok=True)
+        file_name = f"{os.path.splitext(os.path.basename(self.log_file_path))[0]}.{sequence:06d}{_EXTENSIONS[self.compression]}"
+        path = os.path.join(self.segment_dir, file_name)
+        entry: Dict[str, Any] = {"file": file_name, "sequence": sequence, "count": 0, "start": None, "end": None, "types": {}, "keys": {}}
+        with self._open_segment_writer(f"{path}.tmp") as out:
+            for record in records:
+                out.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+                entry["count"] += 1
+                record_type = str(record.get("type"))
+                entry["types"][record_type] = entry["types"].get(record_type, 0) + 1
+                for key in self._record_keys(record):
+                    entry["keys"][key] = entry["keys"].get(key, 0) + 1
+                timestamp = record_time(record)
+                if timestamp is not None:
+                    entry["start"] = timestamp if entry["start"] is None else min(entry["start"], timestamp)
+                    entry["end"] = timestamp if entry["end"] is None else max(entry["end"], timestamp)
+        if not entry["count"]:
+            os.remove(f"{path}.tmp")
+            return None
+        os.replace(f"{path}.tmp", path)
+        entry["bytes"] = os.path.getsize(path)
+        return entry
+
+    def read_segment(self, segment: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+        with self._open_segment_reader(segment) as f:
+            yield from iter_jsonl(f)
+
+    # --- ローテーション ---
+    def should_rotate(self, active_size: int, active_start: Optional[float], now: Optional[float] = None) -> bool:
+        if active_size <= 0:
+            return False
+        if active_size >= self.max_segment_bytes:
+            return True
+        if self.max_segment_seconds and active_start is not None:
+            return (now if now is not None else time.time()) - active_start >= self.max_segment_seconds
+        return False
+
+    def seal(self, active_path: str) -> Optional[Dict[str, Any]]:
+        """
+        アクティブなログファイルの内容を圧縮セグメントとして封印し、マニフェストに登録する。
+        封印後のアクティブファイルの削除は呼び出し側が行う。
+        """
+        sequence = max((s["sequence"] for s in self.segments), default=0) + 1
+        with open(active_path, "rb") as f:
+            entry = self._write_segment(iter_jsonl(f), sequence)
+        if entry:
+            self.segments.append(entry)
+            self._save_manifest()
+            logger.info(f"記憶ログをセグメント {entry['file']} に封印しました (レコード数: {entry['count']})。")
+        return entry
+
+    # --- 検索 ---
+    def select(
+        self,
+        start: Optional[float] = None,
+        end: Optional[float] = None,
+        types: Optional[Iterable[str]] = None,
+        keys: Optional[Iterable[str]] = None,
+    ) -> List[Dict[str, Any]]:
+        """時間範囲と種類、索引キー(例: "topic:autonomous_thought:<トピック>")の条件に該当しうるセグメントを古い順に返す。"""
+        wanted = set(types) if types is not None else None
+        wanted_keys = set(keys) if keys is not None else None
+        selected = []
+        for segment in sorted(self.segments, key=lambda s: s["sequence"]):
+            if start is not None and segment["end"] is not None and segment["end"] < start:
+                continue
+            if end is not None and segment["start"] is not None and segment["start"] > end:
+                continue
+            if wanted is not None and not wanted.intersection(segment["types"]):
+                continue
+            if wanted_keys is not None and not wanted_keys.intersection(segment.get("keys", {})):
+                continue
+            selected.append(segment)
+        return selected
+
+    def key_count(self, key: str) -> int:
+        """封印済みのセグメント全体で索引キーに該当するレコード数を、セグメントを読まずにマニフェストから返す。"""
+        return sum(segment.get("keys", {}).get(key, 0) for segment in self.segments)
+
+    # --- 保持期間 ---
+    def _retention_for(self, record_type: str) -> Optional[float]:
+        return self.retention_seconds.get(record_type, self.retention_seconds.get("default"))
+
+    def _is_expired(self, record: Dict[str, Any], now: float) -> bool:
+        retention = self._retention_for(str(record.get("type")))
+        timestamp = record_time(record)
+        return retention is not None and timestamp is not None and now - timestamp > retention
+
+    def apply_retention(self, now: Optional[float] = None) -> int:
+        """
+        保持期間を過ぎたレコードを封印済みセグメントから削除し、削除したレコード数を返す。
+        全レコードが期限切れのセグメントはファイルごと削除し、一部だけが期限切れのセグメントは書き直す。
+        """
+        now = now if now is not None else time.time()
+        removed = 0
+        kept_segments: List[Dict[str, Any]] = []
+        for segment in self.segments:
+            retentions = [self._retention_for(t) for t in segment["types"]]
+            oldest_allowed = [None if r is None else now - r for r in retentions]
+            path = os.path.join(self.segment_dir, segment["file"])
+            if segment["end"] is not None and all(a is not None and segment["end"] < a for a in oldest_allowed):
+                os.remove(path)
+                removed += segment["count"]
+                continue
+            if segment["start"] is not None and any(a is not None and segment["start"] < a for a in oldest_allowed):
+                records = [r for r in self.read_segment(segment) if not self._is_expired(r, now)]
+                if len(records) < segment["count"]:
+                    removed += segment["count"] - len(records)
+                    rewritten = self._write_segment(records, segment["sequence"])
+                    if rewritten:
+                        kept_segments.append(rewritten)
+                    else:
+                        os.remove(path)
+                    continue
+            kept_segments.append(segment)
+        if removed:
+            self.segments = kept_segments
+            self._save_manifest()
+            logger.info(f"保持期間を過ぎた記憶ログのレコードを{removed}件削除しました。")
+        return removed
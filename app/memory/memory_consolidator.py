@@ -5,19 +5,48 @@
 import json
 import logging
 import os
-from datetime import datetime
-from typing import Dict, Any, List
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Any, Iterable, List, Optional
 
 from app.memory.working_memory import WorkingMemory
+from app.memory.consolidation_manifest import ConsolidationManifest
+from app.memory.episodic_memory import EpisodicMemory
+from app.memory.log_index import LogOffsetIndex, iter_lines_reversed, read_record_at
+from app.memory.log_segments import LogSegmentStore, iter_jsonl, record_time
+from app.memory.recent_records import ALL_RECORDS_KEY, RecentRecordBuffers
+from app.utils.log_writer import BufferedLogWriter, LogEntry
 
 logger = logging.getLogger(__name__)
 
 class MemoryConsolidator:
     """
     対話の履歴やイベントをJSONL形式でログファイルに記録するクラス。
+    レコードの種類・トピックごとのオフセット索引を併せて管理し、最近のレコードの取得をログ全体を読まずに行う。
+    segment_storeが指定されている場合、ログファイルはアクティブなセグメントとして扱われ、
+    上限に達すると圧縮済みのセグメントに封印される。検索は封印済みのセグメントにも及ぶ。
+    log_writerが指定されている場合、書き込みはバックグラウンドのライターでまとめて行われ、呼び出し元はファイルI/Oを待たない。
+    キューに残っているレコードは書き込まれるまで検索の対象にならない。
+    最近のレコードは種類・トピックごとのリングバッファにも保持され(起動時にログの末尾から復元)、
+    get_recent_insights/get_recent_eventsはバッファの容量以内の件数がバッファにそろっていればファイルを読まずに応答する。
+    episodic_memoryが指定されている場合、対話と自律思考のレコードは埋め込まれ、類似したエピソードの検索に使われる。
     """
-    def __init__(self, log_file_path: str):
+    def __init__(
+        self,
+        log_file_path: str,
+        segment_store: Optional[LogSegmentStore] = None,
+        log_writer: Optional[BufferedLogWriter] = None,
+        recent_buffer_size: int = 20,
+        recent_events_buffer_size: int = 100,
+        recent_max_keys: int = 1024,
+        session_manifest: Optional[ConsolidationManifest] = None,
+        episodic_memory: Optional[EpisodicMemory] = None,
+    ):
         self.log_file_path = log_file_path
+        self.segment_store = segment_store
+        self.log_writer = log_writer
+        self.session_manifest = session_manifest
+        self.episodic_memory = episodic_memory
         self.working_memory_log_dir = "memory/working_memory_sessions"
 
         log_dir = os.path.dirname(log_file_path)
@@ -26,21 +55,119 @@ class MemoryConsolidator:
         if not os.path.exists(self.working_memory_log_dir):
             os.makedirs(self.working_memory_log_dir)
 
+        self._log_lock = threading.Lock()
+        self._index = LogOffsetIndex(log_file_path)
+        self._index.load()
+        self._active_start: Optional[float] = self._read_active_start()
+        self._recent = RecentRecordBuffers(size=recent_buffer_size, all_records_size=recent_events_buffer_size, max_keys=recent_max_keys)
+        self._warm_start_recent()
+        if self.episodic_memory and self.episodic_memory.size == 0:
+            # 初回はログの末尾から復元した最近のレコードでエピソード記憶を埋める
+            for record in reversed(self._recent.recent(ALL_RECORDS_KEY, recent_events_buffer_size)):
+                self.episodic_memory.add(record)
+
         logger.info(f"MemoryConsolidator initialized. Log file: {self.log_file_path}")
         logger.info(f"Working memory log directory: {self.working_memory_log_dir}")
 
 
+    def _read_active_start(self) -> Optional[float]:
+        """アクティブなログファイルの先頭レコードの時刻を返す。"""
+        if not os.path.exists(self.log_file_path):
+            return None
+        with open(self.log_file_path, "rb") as f:
+            for record in iter_jsonl(f):
+                return record_time(record)
+        return None
+
+    def _warm_start_recent(self) -> None:
+        """
+        リングバッファをログから復元する。アクティブなログからは索引のキーごとの最新レコードと末尾のレコードを、
+        封印済みのセグメントからは最新の1つだけを読む。
+        """
+        records: List[Dict[str, Any]] = []
+        try:
+            if self.segment_store and self.segment_store.segments:
+                newest = max(self.segment_store.segments, key=lambda s: s["sequence"])
+                records.extend(self.segment_store.read_segment(newest))
+            if os.path.exists(self.log_file_path):
+                offsets = set()
+                for key in self._index.keys():
+                    offsets.update(self._index.recent_offsets(key, self._recent.size))
+                with open(self.log_file_path, "rb") as f:
+                    for count, (offset, _) in enumerate(iter_lines_reversed(f), start=1):
+                        offsets.add(offset)
+                        if count >= self._recent.all_records_size:
+                            break
+                    for offset in sorted(offsets):
+                        record = read_record_at(f, offset)
+                        if record:
+                            records.append(record)
+        except IOError as e:
+            logger.error(f"Failed to warm-start recent memory records from {self.log_file_path}: {e}")
+        self._recent.warm_start(records)
+
     def _log(self, data: Dict[str, Any]):
         """
-        指定されたデータをJSONLファイルに追記します。
+        指定されたデータをJSONLファイルに追記し、索引に登録します。
+        ログライターがある場合は書き込みキューに入れるだけで戻ります。
+        """
+        log_entry = (json.dumps(data, ensure_ascii=False) + "\n").encode("utf-8")
+        self._recent.add(data)
+        if self.episodic_memory:
+            self.episodic_memory.add(data)
+        if self.log_writer:
+            self.log_writer.submit(self._write_entries, log_entry, data)
+        else:
+            self._write_entries([(log_entry, data)], False)
+
+    def _write_entries(self, entries: List[LogEntry], fsync: bool) -> None:
+        """
+        レコードのバッチを一度の書き込みでアクティブなログに追記して索引に登録し、サイズの上限に達した場合は封印します。
         """
         try:
-            with open(self.log_file_path, "a", encoding="utf-8") as f:
-                log_entry = json.dumps(data, ensure_ascii=False)
-                f.write(log_entry + "\n")
+            with self._log_lock:
+                with open(self.log_file_path, "ab") as f:
+                    offset = f.seek(0, os.SEEK_END)
+                    f.write(b"".join(line for line, _ in entries))
+                    if fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                for line, data in entries:
+                    self._index.append(offset, offset + len(line), data)
+                    if offset == 0:
+                        self._active_start = record_time(data)
+                    offset += len(line)
+                if self.segment_store and self.segment_store.should_rotate(offset, None):
+                    self._rotate_locked()
         except IOError as e:
             logger.error(f"Failed to write to memory log file {self.log_file_path}: {e}")
 
+    def _rotate_locked(self) -> None:
+        """アクティブなログファイルをセグメントとして封印し、空のアクティブファイルから記録を再開する。"""
+        self.segment_store.seal(self.log_file_path)
+        os.remove(self.log_file_path)
+        # 封印したログの索引は使えないため、読み込み直して不整合として検出させずに明示的に空にする
+        self._index.clear()
+        self._active_start = None
+
+    def run_log_maintenance(self) -> Dict[str, int]:
+        """
+        期間の上限に達したアクティブなセグメントを封印し、保持期間を過ぎたレコードを封印済みのセグメントから削除します。
+        エピソード記憶がある場合は、その索引も保存します。
+        """
+        if self.episodic_memory:
+            self.episodic_memory.save()
+        if not self.segment_store:
+            return {"rotated": 0, "expired_records": 0}
+        rotated = 0
+        with self._log_lock:
+            active_size = os.path.getsize(self.log_file_path) if os.path.exists(self.log_file_path) else 0
+            if self.segment_store.should_rotate(active_size, self._active_start):
+                self._rotate_locked()
+                rotated = 1
+            expired = self.segment_store.apply_retention()
+        return {"rotated": rotated, "expired_records": expired}
+
     def log_event(self, event_type: str, metadata: Dict[str, Any]):
         """
         汎用的なイベントを記録します。
@@ -104,35 +231,62 @@ class MemoryConsolidator:
         try:
             with open(session_file_path, "w", encoding="utf-8") as f:
                 json.dump(session_contents, f, ensure_ascii=False, indent=4)
+            if self.session_manifest:
+                self.session_manifest.register(os.path.basename(session_file_path))
             logger.info(f"ワーキングメモリの内容がオフライン統合のために保存されました: {session_file_path}")
         except IOError as e:
             logger.error(f"ワーキングメモリの保存に失敗しました {session_file_path}: {e}")
 
+    def _sealed_records_newest_first(
+        self, types: Optional[Iterable[str]] = None, keys: Optional[Iterable[str]] = None
+    ) -> Iterable[Dict[str, Any]]:
+        """封印済みのセグメントのレコードを新しい順に返す。種類や索引キーを指定した場合は該当しうるセグメントだけを読む。"""
+        if not self.segment_store:
+            return
+        for segment in reversed(self.segment_store.select(types=types, keys=keys)):
+            yield from reversed(list(self.segment_store.read_segment(segment)))
+
+    def _stored_count(self, key: str) -> int:
+        """アクティブなログの索引と封印済みセグメントのマニフェストから、索引キーに該当する記録済みのレコード数を返す。"""
+        # 書き込み中のライターを待たないようロックは取らない。書き込み途中のレコードは先にバッファに入っているため、件数の比較には影響しない
+        count = self._index.count(key)
+        if self.segment_store:
+            count += self.segment_store.key_count(key)
+        return count
+
     def get_recent_insights(self, topic: str, limit: int = 5) -> List[Dict[str, Any]]:
         """
         指定されたトピックに関する最近の自律思考ログ（洞察）を取得します。
+        索引から該当レコードのオフセットを引くため、読み込むのは返すレコードの行だけです。
+        アクティブなセグメントで件数が足りない場合のみ、封印済みのセグメントを新しい順に読みます。
+        読む封印済みのセグメントはマニフェストのトピックごとの件数で絞り込むため、記録されたことのないトピックではセグメントを読みません。
+        limitがリングバッファの容量以内で、バッファにlimit件そろっているか、記録済みの該当レコードがすべてバッファにあれば、
+        ファイルを読まずにバッファから返します。
+        バッファの件数が足りない場合(キーがバッファから捨てられた、レコードが古いセグメントにしかない等)は索引とセグメントを読みます。
         """
-        # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↓修正開始◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
+        key = f"topic:autonomous_thought:{topic}"
+        if limit <= self._recent.size:
+            buffered = self._recent.recent(key, limit)
+            # 索引とマニフェストの件数からバッファが該当レコードをすべて持っていると分かる場合(記録されたことのないトピックを含む)もファイルを読まない
+            if len(buffered) >= limit or len(buffered) >= self._stored_count(key):
+                return buffered
         insights: List[Dict[str, Any]] = []
-        # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↑修正終わり◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
-        if not os.path.exists(self.log_file_path):
-            return insights
-
         try:
-            with open(self.log_file_path, "r", encoding="utf-8") as f:
-                # ファイル全体を読み込み、行のリストを作成
-                lines = f.readlines()
-                # 行を逆順に処理して最新のログからチェック
-                for line in reversed(lines):
+            if os.path.exists(self.log_file_path):
+                with self._log_lock:
+                    self._index.catch_up()
+                    offsets = self._index.recent_offsets(key, limit)
+                with open(self.log_file_path, "rb") as f:
+                    for offset in offsets:
+                        log_entry = read_record_at(f, offset)
+                        if log_entry and log_entry.get("type") == "autonomous_thought" and log_entry.get("topic") == topic:
+                            insights.append(log_entry)
+            if len(insights) < limit:
+                for log_entry in self._sealed_records_newest_first(types=["autonomous_thought"], keys=[key]):
                     if len(insights) >= limit:
                         break
-                    try:
-                        log_entry = json.loads(line)
-                        if log_entry.get("type") == "autonomous_thought" and log_entry.get("topic") == topic:
-                            insights.append(log_entry)
-                    except json.JSONDecodeError:
-                        continue
-            # 既に逆順で取得しているので、再度ソートする必要はない
+                    if log_entry.get("type") == "autonomous_thought" and log_entry.get("topic") == topic:
+                        insights.append(log_entry)
             return insights
         except IOError as e:
             logger.error(f"Failed to read from memory log file {self.log_file_path}: {e}")
@@ -141,22 +295,59 @@ class MemoryConsolidator:
     def get_recent_events(self, limit: int = 10) -> List[Dict[str, Any]]:
         """
         すべてのタイプの最近のイベントを取得します。（Value Evolution用）
+        ログを末尾からブロック単位で逆順に読むため、ログ全体のサイズに依存しません。
+        limitがリングバッファの容量以内で、バッファにlimit件そろっていれば、ファイルを読まずにバッファから返します。
         """
+        if limit <= self._recent.all_records_size:
+            buffered = self._recent.recent(ALL_RECORDS_KEY, limit)
+            if len(buffered) >= limit:
+                return buffered
         events: List[Dict[str, Any]] = []
-        if not os.path.exists(self.log_file_path):
-            return events
-
         try:
-            with open(self.log_file_path, "r", encoding="utf-8") as f:
-                lines = f.readlines()
-                for line in reversed(lines):
+            if os.path.exists(self.log_file_path):
+                with open(self.log_file_path, "rb") as f:
+                    for _, line in iter_lines_reversed(f):
+                        if len(events) >= limit:
+                            break
+                        try:
+                            events.append(json.loads(line))
+                        except json.JSONDecodeError:
+                            continue
+            if len(events) < limit:
+                for log_entry in self._sealed_records_newest_first():
                     if len(events) >= limit:
                         break
-                    try:
-                        events.append(json.loads(line))
-                    except json.JSONDecodeError:
-                        continue
+                    events.append(log_entry)
             return events
         except IOError as e:
             logger.error(f"Failed to read from memory log file {self.log_file_path}: {e}")
-            return []
\ No newline at end of file
+            return []
+
+    def query(self, start: Optional[datetime] = None, end: Optional[datetime] = None, types: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+        """
+        時間範囲(UTC)と種類を指定してレコードを古い順に取得します。
+        封印済みのセグメントはマニフェストの時間範囲と種類ごとの件数で絞り込んでから読みます。
+        """
+        start_ts = start.replace(tzinfo=timezone.utc).timestamp() if start else None
+        end_ts = end.replace(tzinfo=timezone.utc).timestamp() if end else None
+        wanted = set(types) if types is not None else None
+
+        def matches(record: Dict[str, Any]) -> bool:
+            if wanted is not None and record.get("type") not in wanted:
+                return False
+            timestamp = record_time(record)
+            if timestamp is None:
+                return start_ts is None and end_ts is None
+            return (start_ts is None or timestamp >= start_ts) and (end_ts is None or timestamp <= end_ts)
+
+        results: List[Dict[str, Any]] = []
+        try:
+            if self.segment_store:
+                for segment in self.segment_store.select(start_ts, end_ts, wanted):
+                    results.extend(r for r in self.segment_store.read_segment(segment) if matches(r))
+            if os.path.exists(self.log_file_path):
+                with open(self.log_file_path, "rb") as f:
+                    results.extend(r for r in iter_jsonl(f) if matches(r))
+        except IOError as e:
+            logger.error(f"Failed to read from memory log file {self.log_file_path}: {e}")
+        return results
@@ -0,0 +1,58 @@
+# /app/memory/recent_records.py
+# title: 最近の記憶レコードのリングバッファ
+# role: レコードの種類・トピックごとに最近のレコードを固定長のリングバッファで保持し、ファイルI/Oなしで最新N件を返す。
+
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Iterable, List
+
+from .log_index import index_keys
+
+ALL_RECORDS_KEY = "*"
+
+
+class RecentRecordBuffers:
+    """
+    索引と同じキー(種類、種類ごとのトピック、イベント種別)ごとに最近のレコードを保持するリングバッファの集合。
+    キーの数はmax_keysまでに制限し、超えた場合は最も長く更新されていないキーから捨てる。
+    全種類を通した最近のレコードはALL_RECORDS_KEYのバッファにall_records_size件まで保持する。
+    """
+    def __init__(self, size: int = 20, all_records_size: int = 100, max_keys: int = 1024):
+        self.size = size
+        self.all_records_size = all_records_size
+        self.max_keys = max_keys
+        self._buffers: "OrderedDict[str, Deque[Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def capacity(self, key: str) -> int:
+        return self.all_records_size if key == ALL_RECORDS_KEY else self.size
+
+    def _append_locked(self, key: str, record: Dict[str, Any]) -> None:
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = deque(maxlen=self.capacity(key))
+            if len(self._buffers) > self.max_keys:
+                self._buffers.popitem(last=False)
+        else:
+            self._buffers.move_to_end(key)
+        buffer.append(record)
+
+    def add(self, record: Dict[str, Any]) -> None:
+        """レコードを該当する全てのキーのバッファに追加する。"""
+        with self._lock:
+            self._append_locked(ALL_RECORDS_KEY, record)
+            for key in index_keys(record):
+                self._append_locked(key, record)
+
+    def warm_start(self, records_oldest_first: Iterable[Dict[str, Any]]) -> None:
+        """起動時に、ログから読み込んだレコードを古い順に投入する。"""
+        for record in records_oldest_first:
+            self.add(record)
+
+    def recent(self, key: str, limit: int) -> List[Dict[str, Any]]:
+        """キーに該当するレコードを新しい順に最大limit件返す。"""
+        with self._lock:
+            buffer = self._buffers.get(key)
+            if not buffer or limit <= 0:
+                return []
+            return list(reversed(buffer))[:limit]
@@ -0,0 +1,248 @@
+# /app/memory/session_store.py
+# title: セッションストア
+# role: session_idごとのワーキングメモリと対話履歴を保持する。履歴は直近の一定件数だけを残し、はみ出した分はローリング要約に畳み込む。長く使われていないセッションや上限を超えたセッションはディスクに退避する。
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from .working_memory import WorkingMemory
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SESSION_ID = "default"
+
+# リクエストを処理中のセッションID。APIからパイプラインの奥にある処理まで引数を通さずに伝えるために使う。
+# asyncio.create_taskで起動したバックグラウンド処理にも、起動時点の値が引き継がれる。
+current_session_id: ContextVar[Optional[str]] = ContextVar("current_session_id", default=None)
+
+# ローリング要約の関数。これまでの要約と、履歴の窓からはみ出した行を受け取り、新しい要約を返す
+Summarizer = Callable[[str, List[str]], str]
+
+
+class SessionState:
+    """1つのセッションのワーキングメモリと、直近の対話履歴の窓。ローリング要約はワーキングメモリのcontext_summaryに保持する。"""
+    def __init__(self, session_id: str, history_window: int):
+        self.session_id = session_id
+        self.working_memory = WorkingMemory(session_id=session_id)
+        self.history: Deque[str] = deque()
+        self.history_window = history_window
+        self.last_access = time.time()
+        # 処理中のため退避してはならない参照の数(SessionStore.pinnedで増減する)
+        self.pins = 0
+
+    @property
+    def summary(self) -> str:
+        return self.working_memory.context_summary
+
+    def context_lines(self) -> List[str]:
+        """プロンプトに渡す対話履歴(ローリング要約と直近の窓)を返す。"""
+        lines = [f"(これまでの対話の要約) {self.summary}"] if self.summary else []
+        lines.extend(self.history)
+        return lines
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "session_id": self.session_id,
+            "history": list(self.history),
+            "working_memory": self.working_memory.get_contents(),
+            "last_access": self.last_access,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], history_window: int) -> "SessionState":
+        state = cls(data["session_id"], history_window)
+        state.history.extend(data.get("history", [])[-history_window:])
+        contents = data.get("working_memory", {})
+        state.working_memory.prediction_errors = list(contents.get("prediction_errors", []))
+        state.working_memory.context_summary = contents.get("context_summary", "")
+        return state
+
+
+def truncating_summarizer(max_chars: int, max_line_chars: int = 200) -> Summarizer:
+    """
+    LLMを使わない既定の要約関数を返す。はみ出した行を短く切り詰めて要約の末尾に足し、
+    要約全体はmax_chars文字に収まるよう古い側から切り捨てる。
+    """
+    def summarize(summary: str, overflow: List[str]) -> str:
+        clipped = [line if len(line) <= max_line_chars else line[:max_line_chars] + "…" for line in overflow]
+        combined = "\n".join(part for part in [summary, *clipped] if part)
+        return combined[-max_chars:]
+    return summarize
+
+
+class SessionStore:
+    """
+    session_idをキーとするセッションの集合。
+
+    各セッションの対話履歴は直近history_window行だけを保持し、はみ出した行はsummarizerでローリング要約に畳み込むため、
+    プロンプトに渡す履歴の大きさはサーバーの稼働時間や総トラフィックによらず一定に保たれる。
+    メモリ上に置くセッションはmax_active_sessionsまでとし、超えた場合は最も長く使われていないセッションを、
+    またidle_timeout_seconds以上使われていないセッションを、storage_dirのJSONファイルに退避する。
+    退避したセッションは次に参照されたときに読み戻す。pinned()で処理中のセッションは退避の対象から外れる。
+    退避したファイルはspill_ttl_seconds以上読み戻されなければ削除する。
+    """
+    def __init__(
+        self,
+        storage_dir: str = "memory/sessions",
+        history_window: int = 20,
+        max_summary_chars: int = 2000,
+        max_active_sessions: int = 256,
+        idle_timeout_seconds: float = 1800,
+        spill_ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        summarizer: Optional[Summarizer] = None,
+    ):
+        self.storage_dir = storage_dir
+        self.history_window = history_window
+        self.max_active_sessions = max_active_sessions
+        self.idle_timeout_seconds = idle_timeout_seconds
+        self.spill_ttl_seconds = spill_ttl_seconds
+        self.summarizer = summarizer or truncating_summarizer(max_summary_chars)
+        self._sessions: "OrderedDict[str, SessionState]" = OrderedDict()
+        self._lock = threading.RLock()
+        self._last_sweep = time.time()
+        self._stats: Dict[str, int] = {"created": 0, "restored": 0, "spilled": 0, "expired": 0}
+
+    def _spill_path(self, session_id: str) -> str:
+        # session_idはクライアントから渡されるため、そのままファイル名には使わない
+        digest = hashlib.sha256(session_id.encode("utf-8")).hexdigest()[:32]
+        return os.path.join(self.storage_dir, f"{digest}.json")
+
+    def _spill_locked(self, session_id: str) -> None:
+        state = self._sessions.pop(session_id)
+        path = self._spill_path(session_id)
+        try:
+            os.makedirs(self.storage_dir, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            self._stats["spilled"] += 1
+        except (IOError, TypeError) as e:
+            logger.error(f"セッション {session_id} の退避に失敗しました: {e}")
+
+    def _restore(self, session_id: str) -> Optional[SessionState]:
+        path = self._spill_path(session_id)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (IOError, ValueError) as e:
+            logger.error(f"退避したセッション {session_id} の読み込みに失敗しました: {e}")
+            return None
+        if data.get("session_id") != session_id:
+            return None
+        os.remove(path)
+        self._stats["restored"] += 1
+        return SessionState.from_dict(data, self.history_window)
+
+    def get(self, session_id: Optional[str] = None) -> SessionState:
+        """セッションを返す。メモリ上になければ退避先から読み戻すか、新しく作る。"""
+        session_id = session_id or DEFAULT_SESSION_ID
+        now = time.time()
+        with self._lock:
+            state = self._sessions.get(session_id)
+            if state is None:
+                state = self._restore(session_id)
+                if state is None:
+                    state = SessionState(session_id, self.history_window)
+                    self._stats["created"] += 1
+                self._sessions[session_id] = state
+            else:
+                self._sessions.move_to_end(session_id)
+            state.last_access = now
+            while len(self._sessions) > self.max_active_sessions:
+                victim = next((sid for sid, s in self._sessions.items() if not s.pins), None)
+                if victim is None:
+                    break
+                self._spill_locked(victim)
+            if now - self._last_sweep >= min(self.idle_timeout_seconds, 60):
+                self._evict_idle_locked(now)
+        return state
+
+    @contextmanager
+    def pinned(self, session_id: Optional[str] = None) -> Iterator[SessionState]:
+        """
+        セッションを返し、withブロックの間は退避させない。
+        長い処理の途中でセッションが退避され、書き込みが読み戻されないワーキングメモリに失われることを防ぐ。
+        """
+        with self._lock:
+            state = self.get(session_id)
+            state.pins += 1
+        try:
+            yield state
+        finally:
+            with self._lock:
+                state.pins -= 1
+                state.last_access = time.time()
+
+    def record_turn(self, session_id: Optional[str], query: str, answer: str) -> None:
+        """対話の1往復を履歴に加え、窓からはみ出した行をローリング要約に畳み込む。"""
+        with self._lock:
+            state = self.get(session_id)
+            state.history.append(f"User: {query}")
+            state.history.append(f"AI: {answer}")
+            overflow = []
+            while len(state.history) > self.history_window:
+                overflow.append(state.history.popleft())
+            if overflow:
+                state.working_memory.context_summary = self.summarizer(state.summary, overflow)
+
+    def get_context(self, session_id: Optional[str] = None) -> List[str]:
+        """プロンプトに渡す対話履歴(ローリング要約と直近の窓)を返す。"""
+        with self._lock:
+            return self.get(session_id).context_lines()
+
+    def _evict_idle_locked(self, now: float) -> int:
+        self._last_sweep = now
+        idle = [
+            sid for sid, state in self._sessions.items()
+            if not state.pins and now - state.last_access >= self.idle_timeout_seconds
+        ]
+        for session_id in idle:
+            self._spill_locked(session_id)
+        self._purge_expired_spills_locked(now)
+        return len(idle)
+
+    def _purge_expired_spills_locked(self, now: float) -> int:
+        """spill_ttl_seconds以上読み戻されていない退避ファイルを削除する。"""
+        if self.spill_ttl_seconds is None or not os.path.isdir(self.storage_dir):
+            return 0
+        removed = 0
+        for name in os.listdir(self.storage_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.storage_dir, name)
+            try:
+                if now - os.path.getmtime(path) >= self.spill_ttl_seconds:
+                    os.remove(path)
+                    removed += 1
+            except OSError as e:
+                logger.warning(f"期限切れのセッションファイル {path} を削除できませんでした: {e}")
+        if removed:
+            self._stats["expired"] += removed
+            logger.info(f"期限切れの退避セッションを{removed}件削除しました。")
+        return removed
+
+    def evict_idle(self, now: Optional[float] = None) -> int:
+        """idle_timeout_seconds以上使われていないセッションを退避し、退避した数を返す。"""
+        with self._lock:
+            return self._evict_idle_locked(now if now is not None else time.time())
+
+    def close(self) -> None:
+        """メモリ上の全セッションを退避する。アプリケーションの終了時に呼び出す。"""
+        with self._lock:
+            for session_id in list(self._sessions):
+                self._spill_locked(session_id)
+
+    def get_stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "active": len(self._sessions)}
@@ -2,16 +2,16 @@
 # title: 海馬的ワーキングメモリ
 # role: 現在のセッションにおける新規性の高い情報（予測誤差）を保持する短期記憶領域。
 
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import uuid
 
 class WorkingMemory:
     """
     海馬のように、現在の対話の文脈で新規性が高い情報を一時的に保持するクラス。
-    セッションごとに一意のIDが割り振られます。
+    セッションごとに一意のIDが割り振られます。session_idを省略した場合は新しいIDを生成します。
     """
-    def __init__(self) -> None:
-        self.session_id: str = str(uuid.uuid4())
+    def __init__(self, session_id: Optional[str] = None) -> None:
+        self.session_id: str = session_id or str(uuid.uuid4())
         self.prediction_errors: List[Dict[str, Any]] = []
         self.context_summary: str = ""
 
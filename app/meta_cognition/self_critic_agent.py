@@ -34,3 +34,12 @@ class SelfCriticAgent(AIAgent):
             raise RuntimeError("SelfCriticAgent's chain is not initialized.")
         result: str = self._chain.invoke(input_data)
         return result
+
+    async def ainvoke(self, input_data: Dict[str, Any]) -> str:
+        if not isinstance(input_data, dict):
+            raise TypeError("SelfCriticAgent expects a dictionary as input.")
+
+        if self._chain is None:
+            raise RuntimeError("SelfCriticAgent's chain is not initialized.")
+        result: str = await self._chain.ainvoke(input_data)
+        return result
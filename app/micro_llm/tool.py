@@ -3,7 +3,7 @@
 # role: 動的に作成されたマイクロLLMをLangChainのツールとしてラップする。
 
 import logging
-from typing import Any
+from typing import Any, Optional
 from langchain_core.runnables import Runnable
 
 from app.tools.base import Tool
@@ -15,16 +15,18 @@ class MicroLLMTool(Tool):
     """
     ファインチューニングされたマイクロLLMをツールとして扱うためのクラス。
     """
-    def __init__(self, model_name: str, description: str, llm_provider: LLMProvider):
+    def __init__(self, model_name: str, description: str, llm_provider: LLMProvider, topic: Optional[str] = None):
         """
         Args:
             model_name (str): このツールが使用するマイクロLLMのモデル名。
             description (str): ツールの説明文。ToolUsingAgentがツール選択に利用する。
             llm_provider (LLMProvider): LLMの処理を実行するプロバイダー。
+            topic (Optional[str]): このマイクロLLMが専門とするトピック。
         """
         self.name = f"Specialist_{model_name.replace(':', '_').replace('/', '_')}" # ツール名として無効な文字を置換
         self.description = description
         self.model_name = model_name
+        self.topic = topic
         self.llm_provider = llm_provider
         self.llm_instance = self.llm_provider.get_llm_instance(model=self.model_name)
 
@@ -32,20 +32,24 @@ class OrchestrationDecision(BaseModel):
 class MasterAgentResponse(BaseModel):
     """
     MasterAgentからの最終的な応答の構造を定義するモデル。
+    feedback_idは、自己批判と潜在的な問題を遅延配信する場合に、後から取得するためのIDを表す。
     """
     final_answer: str
     self_criticism: str
     potential_problems: str
     retrieved_info: str
+    feedback_id: Optional[str] = None
 
 # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↓修正開始◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
 class ChatRequest(BaseModel):
     """
     /chatエンドポイントへのリクエストボディのモデル。
+    test_codeを指定すると、コード修正のパイプラインは修正候補をこのテスト(pytest形式)でサンドボックス上で検証する。
     """
     query: str
     user_id: Optional[str] = None
     session_id: Optional[str] = None
+    test_code: Optional[str] = None
 
 class ChatResponse(BaseModel):
     """
@@ -56,4 +60,16 @@ class ChatResponse(BaseModel):
     self_criticism: str
     potential_problems: str
     retrieved_info: str
+    feedback_id: Optional[str] = None
+    session_id: Optional[str] = None
+
+class FeedbackResponse(BaseModel):
+    """
+    遅延配信された自己批判と潜在的な問題を取得するエンドポイントのレスポンスボディのモデル。
+    statusは"pending"(生成中)、"ready"(生成済み)、"failed"(生成に失敗)のいずれか。
+    """
+    feedback_id: str
+    status: str
+    self_criticism: Optional[str] = None
+    potential_problems: Optional[str] = None
 # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↑修正終わり◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
\ No newline at end of file
@@ -5,7 +5,7 @@
 from __future__ import annotations
 import time
 import logging
-from typing import Dict, Any, TYPE_CHECKING
+from typing import Dict, Any, Optional, Tuple, TYPE_CHECKING
 import asyncio
 
 from app.pipelines.base import BasePipeline
@@ -19,14 +19,20 @@ if TYPE_CHECKING:
     from app.problem_discovery.problem_discovery_agent import ProblemDiscoveryAgent
     from app.memory.memory_consolidator import MemoryConsolidator
     from app.meta_intelligence.self_improvement.evolution import SelfEvolvingSystem
-    from app.analytics import AnalyticsCollector
+    from app.analytics import AnalyticsCollector, DeferredFeedbackStore
 
 
 logger = logging.getLogger(__name__)
 
+FEEDBACK_DELIVERY_MODES = ("inline", "deferred")
+
 class FullPipeline(BasePipeline):
     """
     計画、実行、評価、改善のサイクルを含む、完全な思考パイプライン。
+
+    最終回答の生成後の自己批判と潜在的な問題の発見は互いに独立しているため、並行して実行する。
+    feedback_deliveryが"deferred"の場合は両者を待たずに回答を返し、結果はバックグラウンドで生成して
+    アナリティクスのチャネルに配信するとともに、応答のfeedback_idでfeedback_storeから取得できるようにする。
     """
     def __init__(
         self,
@@ -38,7 +44,13 @@ class FullPipeline(BasePipeline):
         memory_consolidator: 'MemoryConsolidator',
         self_evolving_system: 'SelfEvolvingSystem',
         analytics_collector: 'AnalyticsCollector',
+        feedback_delivery: str = "inline",
+        feedback_store: Optional['DeferredFeedbackStore'] = None,
     ):
+        if feedback_delivery not in FEEDBACK_DELIVERY_MODES:
+            raise ValueError(f"Unknown feedback_delivery: {feedback_delivery}")
+        if feedback_delivery == "deferred" and feedback_store is None:
+            raise ValueError("feedback_store is required when feedback_delivery is 'deferred'.")
         self.master_agent = master_agent
         self.planning_agent = planning_agent
         self.cognitive_loop_agent = cognitive_loop_agent
@@ -47,11 +59,35 @@ class FullPipeline(BasePipeline):
         self.memory_consolidator = memory_consolidator
         self.self_evolving_system = self_evolving_system
         self.analytics_collector = analytics_collector
+        self.feedback_delivery = feedback_delivery
+        self.feedback_store = feedback_store
 
     def run(self, query: str, orchestration_decision: OrchestrationDecision) -> MasterAgentResponse:
         """同期版は非同期版を呼び出すラッパーとする。"""
         return asyncio.run(self.arun(query, orchestration_decision))
 
+    async def _review(self, query: str, plan: str, cognitive_loop_output: str, final_answer: str) -> Tuple[str, str]:
+        """自己批判と潜在的な問題の発見を並行して実行し、結果をアナリティクスに記録する。"""
+        self_criticism, potential_problems_list = await asyncio.gather(
+            self.meta_cognitive_engine.acritique_process_and_response(
+                query=query,
+                plan=plan,
+                cognitive_loop_output=cognitive_loop_output,
+                final_answer=final_answer
+            ),
+            self.problem_discovery_agent.ainvoke({
+                "query": query,
+                "plan": plan,
+                "cognitive_loop_output": cognitive_loop_output,
+            }),
+        )
+        logger.info(f"Self-Criticism:\n{self_criticism}")
+        potential_problems = "\n".join(potential_problems_list) if potential_problems_list else "特になし"
+        logger.info(f"Discovered Potential Problems: {potential_problems}")
+        await self.analytics_collector.log_event("self_criticism", self_criticism)
+        await self.analytics_collector.log_event("potential_problems", potential_problems)
+        return self_criticism, potential_problems
+
     async def arun(self, query: str, orchestration_decision: OrchestrationDecision) -> MasterAgentResponse:
         """
         完全な思考パイプラインを非同期で実行する。
@@ -103,33 +139,36 @@ class FullPipeline(BasePipeline):
             final_answer = await self.master_agent.generate_final_answer_async(master_agent_input, orchestration_decision)
             reasoning_trace["step_3_final_answer_generation"] = final_answer
         
-        self_criticism = self.meta_cognitive_engine.critique_process_and_response(
-            query=query,
-            plan=plan,
-            cognitive_loop_output=cognitive_loop_output,
-            final_answer=final_answer
-        )
-        reasoning_trace["step_4_self_criticism"] = self_criticism
-        logger.info(f"Self-Criticism:\n{self_criticism}")
-        await self.analytics_collector.log_event("self_criticism", self_criticism)
-
-        potential_problems_list = self.problem_discovery_agent.invoke({
-            "query": query,
-            "plan": plan,
-            "cognitive_loop_output": cognitive_loop_output,
-        })
-        potential_problems = "\n".join(potential_problems_list) if potential_problems_list else "特になし"
-        reasoning_trace["step_5_potential_problems"] = potential_problems
-        logger.info(f"Discovered Potential Problems: {potential_problems}")
-        await self.analytics_collector.log_event("potential_problems", potential_problems)
+        feedback_id: Optional[str] = None
+        if self.feedback_delivery == "deferred":
+            # 自己批判と問題発見の完了を待たずに回答を返す
+            feedback_id = self.feedback_store.create()
+            self_criticism = ""
+            potential_problems = ""
+        else:
+            self_criticism, potential_problems = await self._review(query, plan, cognitive_loop_output, final_answer)
+            reasoning_trace["step_4_self_criticism"] = self_criticism
+            reasoning_trace["step_5_potential_problems"] = potential_problems
 
         async def background_tasks():
+            self_criticism_for_trace = self_criticism
+            if feedback_id is not None:
+                try:
+                    self_criticism_for_trace, deferred_problems = await self._review(query, plan, cognitive_loop_output, final_answer)
+                except Exception as e:
+                    logger.error(f"遅延配信する自己批判・問題発見の生成に失敗しました: {e}", exc_info=True)
+                    self.feedback_store.fail(feedback_id, str(e))
+                else:
+                    self.feedback_store.complete(feedback_id, self_criticism_for_trace, deferred_problems)
+                    reasoning_trace["step_4_self_criticism"] = self_criticism_for_trace
+                    reasoning_trace["step_5_potential_problems"] = deferred_problems
+                    await self.analytics_collector.log_event("deferred_feedback", self.feedback_store.get(feedback_id))
             await self.master_agent.run_internal_maintenance_async(query, final_answer)
             trace_data = {
                 "query": query,
                 "reasoning_trace": reasoning_trace,
                 "final_answer": final_answer,
-                "self_criticism": self_criticism,
+                "self_criticism": self_criticism_for_trace,
             }
             await self.self_evolving_system.collect_execution_trace(trace_data)
             logger.info("Execution trace collected for potential self-evolution.")
@@ -143,4 +182,5 @@ class FullPipeline(BasePipeline):
             self_criticism=self_criticism,
             potential_problems=potential_problems,
             retrieved_info=cognitive_loop_output,
+            feedback_id=feedback_id,
         )
\ No newline at end of file
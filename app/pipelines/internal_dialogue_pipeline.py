@@ -2,6 +2,7 @@
 # title: 内省的対話パイプライン
 # role: 「心の社会」モデルに基づき、動的に生成された思考エージェント群による内省的な対話を通じて、問題を解決する。
 
+import asyncio
 import logging
 import time
 from typing import Any, Dict
@@ -32,13 +33,16 @@ class InternalDialoguePipeline(BasePipeline):
         self.integrated_information_agent = integrated_information_agent
 
     def run(self, query: str, orchestration_decision: OrchestrationDecision) -> MasterAgentResponse:
+        return asyncio.run(self.arun(query, orchestration_decision))
+
+    async def arun(self, query: str, orchestration_decision: OrchestrationDecision) -> MasterAgentResponse:
         """
         パイプラインを実行する。
         """
         start_time = time.time()
         logger.info("--- Internal Dialogue Pipeline START ---")
 
-        participants = self.dialogue_participant_agent.invoke({"query": query})
+        participants = await asyncio.to_thread(self.dialogue_participant_agent.invoke, {"query": query})
         if not participants:
             logger.error("対話参加者の生成に失敗しました。")
             return MasterAgentResponse(
@@ -49,14 +53,15 @@ class InternalDialoguePipeline(BasePipeline):
             )
 
         max_turns = settings.PIPELINE_SETTINGS["internal_dialogue"]["max_turns"]
-        dialogue_summary = self.consciousness_staging_area.run_dialogue(query, participants, max_turns=max_turns)
+        dialogue_summary = await self.consciousness_staging_area.arun_dialogue(query, participants, max_turns=max_turns)
 
         integration_input = {
             "query": query,
             "persona_outputs": dialogue_summary
         }
-        final_answer = self.integrated_information_agent.invoke(integration_input)
-        
+        final_answer = await asyncio.to_thread(self.integrated_information_agent.invoke, integration_input)
+
+        logger.info(f"対話の統計: {self.consciousness_staging_area.last_stats}")
         logger.info(f"--- Internal Dialogue Pipeline END ({(time.time() - start_time):.2f} s) ---")
         
         return MasterAgentResponse(
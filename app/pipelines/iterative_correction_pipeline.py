@@ -1,15 +1,17 @@
 # /app/pipelines/iterative_correction_pipeline.py
 # title: 反復的修正パイプライン
-# role: 「推測による修正」と「ステップバイステップ検証」を繰り返し、コードの品質を段階的に向上させる。
+# role: 「推測による修正」と「ステップバイステップ検証」を繰り返し、コードの品質を段階的に向上させる。サンドボックスでのテスト実行による並列検証にも対応する。
 
+import asyncio
 import logging
 import time
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from app.pipelines.base import BasePipeline
 from app.models import MasterAgentResponse, OrchestrationDecision
 from app.agents.speculative_correction_agent import SpeculativeCorrectionAgent
 from app.agents.step_by_step_verifier_agent import StepByStepVerifierAgent
+from app.sandbox.candidate_verifier import SandboxCandidateVerifier
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -17,19 +19,83 @@ logger = logging.getLogger(__name__)
 class IterativeCorrectionPipeline(BasePipeline):
     """
     推測的修正とステップバイステップ検証を繰り返すパイプライン。
+
+    modeが"parallel"の場合は、num_candidates個の修正候補を並行して生成し、サンドボックスで実際にテストを実行して
+    最初に合格した候補を採用する(残りの候補の生成と検証はキャンセルする)。"auto"の場合は、orchestration_decisionの
+    parametersにテストコード(test_code、APIではChatRequest.test_codeで指定する)があれば並列検証を、なければLLMによる逐次検証("serial")を使う。
     """
     def __init__(
         self,
         speculative_correction_agent: SpeculativeCorrectionAgent,
         step_by_step_verifier_agent: StepByStepVerifierAgent,
+        candidate_verifier: Optional[SandboxCandidateVerifier] = None,
+        mode: str = "serial",
+        num_candidates: int = 3,
     ):
+        if mode not in ("serial", "parallel", "auto"):
+            raise ValueError(f"Unknown iterative correction mode: {mode}")
         self.speculative_correction_agent = speculative_correction_agent
         self.step_by_step_verifier_agent = step_by_step_verifier_agent
+        self.candidate_verifier = candidate_verifier
+        self.mode = mode
+        self.num_candidates = num_candidates
 
     def run(self, query: str, orchestration_decision: OrchestrationDecision) -> MasterAgentResponse:
+        return asyncio.run(self.arun(query, orchestration_decision))
+
+    async def arun(self, query: str, orchestration_decision: OrchestrationDecision) -> MasterAgentResponse:
         """
         パイプラインを実行する。
         """
+        test_code: Optional[str] = orchestration_decision.parameters.get("test_code")
+        parallel = self.mode == "parallel" or (self.mode == "auto" and bool(test_code))
+        if parallel and self.candidate_verifier is None:
+            logger.warning("サンドボックスの検証器がないため、LLMによる逐次検証で修正します。")
+            parallel = False
+        if parallel:
+            return await self._run_parallel(query, test_code)
+        return await asyncio.to_thread(self._run_serial, query)
+
+    async def _run_parallel(self, query: str, test_code: Optional[str]) -> MasterAgentResponse:
+        """修正候補を並行して生成し、サンドボックスでの検証に最初に合格した候補を採用する。"""
+        assert self.candidate_verifier is not None
+        start_time = time.time()
+        logger.info(f"--- Iterative Correction Pipeline START (parallel, 候補数: {self.num_candidates}) ---")
+
+        correction_input = {"original_code": query, "current_code": query}
+        candidates = [self.speculative_correction_agent.ainvoke(correction_input) for _ in range(self.num_candidates)]
+        winner, results = await self.candidate_verifier.race(candidates, test_code)
+
+        correction_history = "".join(
+            f"--- Candidate {result.index + 1} ({'PASS' if result.passed else 'FAIL'}, exit code {result.exit_code}, {result.seconds:.2f} s) ---\n"
+            f"Proposed Fix:\n{result.code}\nSandbox Output:\n{result.output}\n\n"
+            for result in results
+        )
+        check = "テスト" if test_code else "構文の確認と実行"
+        if winner is not None:
+            final_answer = winner.code
+            self_criticism = f"{self.num_candidates}個の修正候補を並行して生成し、サンドボックスでの{check}に最初に合格した候補{winner.index + 1}を採用しました。"
+            potential_problems = (
+                "テストで検証されていない振る舞いには問題が残っている可能性があります。"
+                if test_code else "テストコードが与えられなかったため、実行時にエラーが出ないことだけを確認しています。"
+            )
+        else:
+            logger.warning("サンドボックスでの検証に合格した修正候補がありませんでした。")
+            final_answer = results[0].code if results else query
+            self_criticism = f"{self.num_candidates}個の修正候補を並行して生成しましたが、サンドボックスでの{check}に合格した候補はありませんでした。"
+            potential_problems = "提示したコードは検証に合格していません。サンドボックスの出力を確認し、人間が修正する必要があります。"
+
+        logger.info(f"--- Iterative Correction Pipeline END ({(time.time() - start_time):.2f} s) ---")
+
+        return MasterAgentResponse(
+            final_answer=final_answer,
+            self_criticism=self_criticism,
+            potential_problems=potential_problems,
+            retrieved_info=correction_history
+        )
+
+    def _run_serial(self, query: str) -> MasterAgentResponse:
+        """修正案の生成とLLMによる検証を、正しいと判断されるまで最大max_iterations回繰り返す。"""
         start_time = time.time()
         logger.info("--- Iterative Correction Pipeline START ---")
 
@@ -43,7 +109,7 @@ class IterativeCorrectionPipeline(BasePipeline):
 
             correction_input = {"original_code": original_code, "current_code": current_code}
             speculative_fix = self.speculative_correction_agent.invoke(correction_input)
-            
+
             verification_input = {"original_code": original_code, "proposed_fix": speculative_fix}
             verification_result = self.step_by_step_verifier_agent.invoke(verification_input)
 
@@ -59,15 +125,15 @@ class IterativeCorrectionPipeline(BasePipeline):
                 current_code = speculative_fix
         else:
             logger.warning("最大反復回数に達しました。")
-        
+
         final_answer = current_code
         retrieved_info = correction_history
 
         logger.info(f"--- Iterative Correction Pipeline END ({(time.time() - start_time):.2f} s) ---")
-        
+
         return MasterAgentResponse(
             final_answer=final_answer,
             self_criticism=f"{max_iterations}回の反復的修正と思考の検証を行いました。",
             potential_problems="検証エージェントが誤った判断をする可能性があります。最終的なコードは人間による確認が必要です。",
             retrieved_info=retrieved_info
-        )
\ No newline at end of file
+        )
@@ -2,15 +2,16 @@
 # title: 自己発見パイプライン
 # role: 問題の性質に応じて思考モジュールを動的に組み合わせ、解決戦略を自律的に構築する。
 
+import asyncio
 import logging
 import time
-from typing import Any, Dict, List
 
 from app.pipelines.base import BasePipeline
 from app.agents.planning_agent import PlanningAgent
 from app.agents.thinking_modules import DecomposeAgent, CritiqueAgent, SynthesizeAgent
 from app.agents.cognitive_loop_agent import CognitiveLoopAgent
 from app.models import MasterAgentResponse, OrchestrationDecision
+from app.reasoning.module_dag import ModuleDAGExecutor, build_module_dag, format_dag_report
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +26,7 @@ class SelfDiscoverPipeline(BasePipeline):
         critique_agent: CritiqueAgent,
         synthesize_agent: SynthesizeAgent,
         cognitive_loop_agent: CognitiveLoopAgent,
+        max_concurrency: int = 4,
     ):
         self.planning_agent = planning_agent
         self.thinking_modules = {
@@ -33,57 +35,37 @@ class SelfDiscoverPipeline(BasePipeline):
             "SYNTHESIZE": synthesize_agent,
             "RAG_SEARCH": cognitive_loop_agent,
         }
+        self.executor = ModuleDAGExecutor(self.thinking_modules, max_concurrency=max_concurrency)
 
     def run(self, query: str, orchestration_decision: OrchestrationDecision) -> MasterAgentResponse:
+        return asyncio.run(self.arun(query, orchestration_decision))
+
+    async def arun(self, query: str, orchestration_decision: OrchestrationDecision) -> MasterAgentResponse:
         """
         パイプラインを実行する。
+        選択されたモジュールの列を依存グラフに変換し、互いに依存しないモジュール(例: DECOMPOSEとRAG_SEARCH)は並行して実行する。
         """
         start_time = time.time()
         logger.info("--- Self-Discover Pipeline START ---")
 
-        strategy_sequence_str = self.planning_agent.select_thinking_modules(query)
+        strategy_sequence_str = await asyncio.to_thread(self.planning_agent.select_thinking_modules, query)
         strategy_sequence = [s.strip() for s in strategy_sequence_str.split(',')]
         logger.info(f"選択された思考戦略シーケンス: {strategy_sequence}")
 
-        execution_context: Dict[str, Any] = {"query": query}
-        execution_trace: List[str] = []
-
-        for module_name in strategy_sequence:
-            if module_name not in self.thinking_modules:
-                logger.warning(f"未知の思考モジュール '{module_name}' はスキップされました。")
-                continue
-
-            agent = self.thinking_modules[module_name]
-            
-            input_data: Dict[str, Any] | str
-            if module_name == "DECOMPOSE":
-                input_data = {"query": execution_context["query"]}
-            elif module_name == "CRITIQUE":
-                input_data = {"draft": execution_context.get("last_output", "")}
-            elif module_name == "SYNTHESIZE":
-                info_list = "\n---\n".join(execution_trace)
-                input_data = {"information_list": info_list}
-            elif module_name == "RAG_SEARCH":
-                 input_data = {"query": execution_context["query"], "plan": "関連情報の検索"}
-            else:
-                input_data = execution_context["query"]
+        nodes = build_module_dag(strategy_sequence, list(self.thinking_modules))
+        dag_start = time.monotonic()
+        await self.executor.run(query, nodes)
+        dag_report = format_dag_report(nodes, time.monotonic() - dag_start)
+        logger.info(dag_report)
 
-            logger.info(f"実行中モジュール: {module_name}, 入力: {input_data}")
-            output = agent.invoke(input_data)
-            
-            execution_context["last_output"] = output
-            trace_entry = f"【{module_name}の出力】\n{output}"
-            execution_trace.append(trace_entry)
-            logger.info(trace_entry)
-
-        final_answer = execution_context.get("last_output", "処理が完了しましたが、明確な最終出力はありません。")
-        retrieved_info = "\n\n".join(execution_trace)
+        final_answer = nodes[-1].output if nodes else "処理が完了しましたが、明確な最終出力はありません。"
+        retrieved_info = "\n\n".join([node.trace_entry for node in nodes] + [dag_report])
 
         logger.info(f"--- Self-Discover Pipeline END ({(time.time() - start_time):.2f} s) ---")
-        
+
         return MasterAgentResponse(
             final_answer=final_answer,
             self_criticism=f"自己発見パイプラインは、[{', '.join(strategy_sequence)}]という戦略で回答を導出しました。",
             potential_problems="選択された戦略が最適でない場合、非効率な思考プロセスになる可能性があります。",
             retrieved_info=retrieved_info
-        )
\ No newline at end of file
+        )
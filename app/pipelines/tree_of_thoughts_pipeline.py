@@ -4,20 +4,36 @@
 
 import logging
 import time
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 from app.pipelines.base import BasePipeline
 from app.models import MasterAgentResponse, OrchestrationDecision
 from app.agents.tree_of_thoughts_agent import TreeOfThoughtsAgent
+from app.reasoning.tot_search import SearchBudget, build_search_strategy
 
 logger = logging.getLogger(__name__)
 
 class TreeOfThoughtsPipeline(BasePipeline):
     """
     Tree of Thoughts探索を実行するためのパイプライン。
+    探索戦略(strategy: "beam", "best_first", "mcts")とその設定(strategy_options)、1回の探索の予算
+    (max_llm_calls: LLM呼び出し回数, max_seconds: 経過時間)を指定できる。
     """
-    def __init__(self, tree_of_thoughts_agent: TreeOfThoughtsAgent):
+    def __init__(
+        self,
+        tree_of_thoughts_agent: TreeOfThoughtsAgent,
+        strategy: str = "beam",
+        strategy_options: Optional[Dict[str, Any]] = None,
+        max_llm_calls: Optional[int] = None,
+        max_seconds: Optional[float] = None,
+    ):
         self.tree_of_thoughts_agent = tree_of_thoughts_agent
+        self.strategy = strategy
+        self.strategy_options = strategy_options or {}
+        self.max_llm_calls = max_llm_calls
+        self.max_seconds = max_seconds
+        # 設定の誤りは起動時に検出する
+        build_search_strategy(strategy, self.strategy_options)
 
     def run(self, query: str, orchestration_decision: OrchestrationDecision) -> MasterAgentResponse:
         import asyncio
@@ -30,15 +46,19 @@ class TreeOfThoughtsPipeline(BasePipeline):
         start_time = time.time()
         logger.info("--- Tree of Thoughts Pipeline START ---")
         
-        k = 3
-        T = 3
-        b = 2
+        strategy = build_search_strategy(self.strategy, self.strategy_options)
+        budget = SearchBudget(max_llm_calls=self.max_llm_calls, max_seconds=self.max_seconds)
+        outcome = await self.tree_of_thoughts_agent.asearch(query, strategy, budget)
+        best_thought = outcome.best
 
-        best_thought = self.tree_of_thoughts_agent.search(query, k, T, b)
-
-        if best_thought:
+        if best_thought and best_thought.parent is not None:
             final_answer = best_thought.state
-            retrieved_info = f"Tree of Thoughts探索により、{T}ステップの思考を経て結論に達しました。\n最良の思考経路の最終スコア: {best_thought.evaluation_score:.2f}"
+            retrieved_info = (
+                f"Tree of Thoughts探索({outcome.strategy})により、{best_thought.depth}ステップの思考を経て結論に達しました。\n"
+                f"最良の思考経路の最終スコア: {best_thought.evaluation_score:.2f}\n"
+                f"探索の統計: LLM呼び出し {outcome.llm_calls}回, 思考 {outcome.thoughts}個, 統合した重複 {outcome.merged_duplicates}個, "
+                f"終了理由 {outcome.stop_reason}, {outcome.elapsed_seconds:.2f}秒"
+            )
         else:
             final_answer = "複雑な思考の末、明確な結論には至りませんでした。"
             retrieved_info = "Tree of Thoughts探索を行いましたが、有効な解決策を見つけられませんでした。"
@@ -48,6 +68,6 @@ class TreeOfThoughtsPipeline(BasePipeline):
         return MasterAgentResponse(
             final_answer=final_answer,
             self_criticism="Tree of Thoughtsパイプラインは、複数の思考経路を評価・探索し、最も有望な結論を導き出しました。",
-            potential_problems="探索の幅(k, b)や深さ(T)が不適切な場合、計算コストが増大するか、最適解を見逃す可能性があります。",
+            potential_problems="探索の戦略や予算が不適切な場合、計算コストが増大するか、最適解を見逃す可能性があります。",
             retrieved_info=retrieved_info
         )
\ No newline at end of file
@@ -31,4 +31,13 @@ class ProblemDiscoveryAgent(AIAgent):
         if self._chain is None:
             raise RuntimeError("ProblemDiscoveryAgent's chain is not initialized.")
         result: List[str] = self._chain.invoke(input_data)
+        return result
+
+    async def ainvoke(self, input_data: Dict[str, Any]) -> List[str]:
+        if not isinstance(input_data, dict):
+            raise TypeError("ProblemDiscoveryAgent expects a dictionary as input.")
+
+        if self._chain is None:
+            raise RuntimeError("ProblemDiscoveryAgent's chain is not initialized.")
+        result: List[str] = await self._chain.ainvoke(input_data)
         return result
\ No newline at end of file
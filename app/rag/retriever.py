@@ -40,8 +40,12 @@ class Retriever:
         graph_summary = self.knowledge_graph.get_summary()
         graph_docs = []
         if query.lower() in graph_summary.lower():
-             graph_content = self.knowledge_graph.get_graph().to_string()
+             graph_content = self.knowledge_graph.get_graph_string()
              graph_docs.append(Document(page_content=graph_content, metadata={"source": "knowledge_graph"}))
+        # クエリで言及されたエンティティへのアクセスを記録し、保持ポリシーによる退避の対象から遠ざける
+        mentioned = self.knowledge_graph.find_mentioned_nodes(query)
+        if mentioned:
+            self.knowledge_graph.access_nodes(mentioned)
         
         # 3. 両方の結果を統合して返す
         return vector_docs + graph_docs
@@ -0,0 +1,167 @@
+# /app/reasoning/module_dag.py
+# title: 思考モジュールの依存グラフ
+# role: Self-Discoverで選ばれた思考モジュールの列を依存関係のグラフ(DAG)に変換し、依存しないモジュールを並行して実行する。実行したグラフとクリティカルパスを報告する。
+
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# モジュールが入力に使うもの
+#   "query": 元の要求だけ(他のモジュールに依存しない)
+#   "previous": 直前のモジュールの出力
+#   "all": それまでのすべてのモジュールの出力
+MODULE_DEPENDENCIES: Dict[str, str] = {
+    "DECOMPOSE": "query",
+    "RAG_SEARCH": "query",
+    "CRITIQUE": "previous",
+    "SYNTHESIZE": "all",
+}
+
+
+@dataclass
+class ModuleNode:
+    """グラフの1ノード。計画の中の1つのモジュールの実行を表す。"""
+    index: int
+    module_name: str
+    depends_on: List[int] = field(default_factory=list)
+    output: str = ""
+    ready_at: float = 0.0
+    finished_at: float = 0.0
+    cached: bool = False
+
+    @property
+    def duration(self) -> float:
+        return max(self.finished_at - self.ready_at, 0.0)
+
+    @property
+    def trace_entry(self) -> str:
+        return f"【{self.module_name}の出力】\n{self.output}"
+
+
+def build_module_dag(sequence: List[str], known_modules: List[str]) -> List[ModuleNode]:
+    """
+    モジュールの列から依存グラフを作る。未知のモジュールは除く。
+    ノードは列の順に並び、依存先は常に自分より前のノードになる(この順がそのままトポロジカル順になる)。
+    """
+    nodes: List[ModuleNode] = []
+    for module_name in sequence:
+        if module_name not in known_modules:
+            logger.warning(f"未知の思考モジュール '{module_name}' はスキップされました。")
+            continue
+        index = len(nodes)
+        dependency = MODULE_DEPENDENCIES.get(module_name, "query")
+        if dependency == "previous" and nodes:
+            depends_on = [index - 1]
+        elif dependency == "all":
+            depends_on = list(range(index))
+        else:
+            depends_on = []
+        nodes.append(ModuleNode(index=index, module_name=module_name, depends_on=depends_on))
+    return nodes
+
+
+def critical_path(nodes: List[ModuleNode]) -> List[ModuleNode]:
+    """実行時間の合計が最も長い依存の連鎖を返す。"""
+    if not nodes:
+        return []
+    longest: Dict[int, Tuple[float, Optional[int]]] = {}
+    for node in nodes:
+        best_total, best_prev = 0.0, None
+        for dep in node.depends_on:
+            if longest[dep][0] > best_total or best_prev is None:
+                best_total, best_prev = longest[dep][0], dep
+        longest[node.index] = (best_total + node.duration, best_prev)
+    end: Optional[int] = max(longest, key=lambda i: longest[i][0])
+    path: List[ModuleNode] = []
+    while end is not None:
+        path.append(nodes[end])
+        end = longest[end][1]
+    return list(reversed(path))
+
+
+def format_dag_report(nodes: List[ModuleNode], wall_seconds: float) -> str:
+    """実行したグラフとクリティカルパスを人が読める形にする。"""
+    lines = ["【実行DAG】"]
+    for node in nodes:
+        deps = ", ".join(f"#{dep} {nodes[dep].module_name}" for dep in node.depends_on) or "要求のみ"
+        cached = " (キャッシュ)" if node.cached else ""
+        lines.append(f"#{node.index} {node.module_name} ← {deps}: {node.duration:.2f}秒{cached}")
+    path = critical_path(nodes)
+    path_seconds = sum(node.duration for node in path)
+    lines.append(
+        f"クリティカルパス: {' → '.join(f'#{node.index} {node.module_name}' for node in path)} "
+        f"({path_seconds:.2f}秒 / 全体 {wall_seconds:.2f}秒)"
+    )
+    return "\n".join(lines)
+
+
+class ModuleDAGExecutor:
+    """
+    依存グラフを非同期に実行する。依存先がすべて終わったノードから、同時実行数max_concurrencyの範囲で並行して実行する。
+    同じモジュールに同じ入力を渡すノードは、1回のrun()の中では最初の実行結果を共有する。
+    """
+    def __init__(self, modules: Dict[str, Any], max_concurrency: int = 4):
+        self.modules = modules
+        self.max_concurrency = max_concurrency
+
+    @staticmethod
+    def _build_input(node: ModuleNode, nodes: List[ModuleNode], query: str) -> Dict[str, Any] | str:
+        if node.module_name == "DECOMPOSE":
+            return {"query": query}
+        if node.module_name == "CRITIQUE":
+            return {"draft": nodes[node.depends_on[-1]].output if node.depends_on else ""}
+        if node.module_name == "SYNTHESIZE":
+            return {"information_list": "\n---\n".join(nodes[dep].trace_entry for dep in node.depends_on)}
+        if node.module_name == "RAG_SEARCH":
+            return {"query": query, "plan": "関連情報の検索"}
+        return query
+
+    async def _invoke(self, agent: Any, input_data: Dict[str, Any] | str, semaphore: asyncio.Semaphore) -> str:
+        async with semaphore:
+            if hasattr(agent, "ainvoke"):
+                return await agent.ainvoke(input_data)
+            return await asyncio.to_thread(agent.invoke, input_data)
+
+    async def _run_node(
+        self,
+        node: ModuleNode,
+        nodes: List[ModuleNode],
+        dependencies: List["asyncio.Task[None]"],
+        query: str,
+        cache: Dict[str, "asyncio.Future[str]"],
+        semaphore: asyncio.Semaphore,
+    ) -> None:
+        if dependencies:
+            await asyncio.gather(*dependencies)
+        node.ready_at = time.monotonic()
+        input_data = self._build_input(node, nodes, query)
+        key = f"{node.module_name}:{json.dumps(input_data, ensure_ascii=False, sort_keys=True)}"
+        if key in cache:
+            node.cached = True
+        else:
+            cache[key] = asyncio.ensure_future(self._invoke(self.modules[node.module_name], input_data, semaphore))
+        logger.info(f"実行中モジュール: #{node.index} {node.module_name}{' (キャッシュ)' if node.cached else ''}, 入力: {input_data}")
+        node.output = await cache[key]
+        node.finished_at = time.monotonic()
+        logger.info(node.trace_entry)
+
+    async def run(self, query: str, nodes: List[ModuleNode]) -> List[ModuleNode]:
+        """すべてのノードを実行し、出力と実行時間を記録したノードを返す。"""
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        cache: Dict[str, "asyncio.Future[str]"] = {}
+        tasks: List["asyncio.Task[None]"] = []
+        for node in nodes:
+            dependencies = [tasks[dep] for dep in node.depends_on]
+            tasks.append(asyncio.ensure_future(self._run_node(node, nodes, dependencies, query, cache, semaphore)))
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+        return nodes
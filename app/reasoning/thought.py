@@ -3,19 +3,28 @@
 # role: Tree of Thoughtsにおける個々の思考ステップを表現するデータクラス。
 
 from __future__ import annotations
+from itertools import count
 from typing import List, Optional
-import uuid
+
+_thought_ids = count()
 
 class Thought:
     """
     思考の木における単一のノードを表すクラス。
+    探索で大量に生成されるため、__slots__で属性を固定し、IDには連番の整数を使ってノードあたりのメモリを抑える。
+    visitsとvalue_sumはMCTSの訪問回数と価値の累計に使う。
     """
+    __slots__ = ("id", "state", "parent", "children", "evaluation_score", "depth", "visits", "value_sum")
+
     def __init__(self, state: str, parent: Optional[Thought] = None, evaluation_score: float = 0.0):
-        self.id: str = str(uuid.uuid4())
+        self.id: int = next(_thought_ids)
         self.state: str = state  # 思考の内容（テキスト）
         self.parent: Optional[Thought] = parent
         self.children: List[Thought] = []
         self.evaluation_score: float = evaluation_score  # この思考の有望性を示すスコア
+        self.depth: int = parent.depth + 1 if parent is not None else 0
+        self.visits: int = 0
+        self.value_sum: float = 0.0
 
     def add_child(self, state: str, evaluation_score: float = 0.0) -> Thought:
         """
@@ -26,4 +35,4 @@ class Thought:
         return child_thought
 
     def __repr__(self) -> str:
-        return f"Thought(id={self.id}, state='{self.state[:30]}...', score={self.evaluation_score:.2f}, children={len(self.children)})"
\ No newline at end of file
+        return f"Thought(id={self.id}, state='{self.state[:30]}...', score={self.evaluation_score:.2f}, children={len(self.children)})"
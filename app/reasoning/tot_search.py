@@ -0,0 +1,269 @@
+# /app/reasoning/tot_search.py
+# title: Tree of Thoughtsの探索戦略
+# role: 思考の木の探索戦略(ビームサーチ、最良優先探索、MCTS)と、探索に使う計算予算、意味的に重複した思考をまとめる置換表を提供する。
+
+from __future__ import annotations
+import asyncio
+import heapq
+import inspect
+import logging
+import math
+import re
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+import numpy as np
+
+from app.reasoning.thought import Thought
+
+logger = logging.getLogger(__name__)
+
+# 思考のリストを受け取り、それぞれからn個の子を生成・評価して、新しく木に加わった子を返す関数
+Expander = Callable[[List[Thought], int], Awaitable[List[Thought]]]
+EmbedFunction = Callable[[List[str]], Any]
+
+
+class SearchBudget:
+    """
+    1回の探索で使える計算量。LLMの呼び出し回数(max_llm_calls)と経過時間(max_seconds)のどちらか一方でも使い切ると探索を打ち切る。
+    Noneの上限は制限しないことを表す。
+    """
+    def __init__(self, max_llm_calls: Optional[int] = None, max_seconds: Optional[float] = None):
+        self.max_llm_calls = max_llm_calls
+        self.max_seconds = max_seconds
+        self.llm_calls = 0
+        self.started = time.monotonic()
+
+    @property
+    def elapsed_seconds(self) -> float:
+        return time.monotonic() - self.started
+
+    def charge(self, llm_calls: int) -> None:
+        self.llm_calls += llm_calls
+
+    def remaining_calls(self) -> Optional[int]:
+        if self.max_llm_calls is None:
+            return None
+        return max(self.max_llm_calls - self.llm_calls, 0)
+
+    def remaining_seconds(self) -> Optional[float]:
+        if self.max_seconds is None:
+            return None
+        return max(self.max_seconds - self.elapsed_seconds, 0.0)
+
+    def exhausted(self) -> bool:
+        if self.max_llm_calls is not None and self.llm_calls >= self.max_llm_calls:
+            return True
+        return self.max_seconds is not None and self.elapsed_seconds >= self.max_seconds
+
+
+def _normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+class TranspositionTable:
+    """
+    探索中に生成された思考の表。表記ゆれ(空白・大文字小文字)だけが異なる思考は常に、
+    embed_fnを指定した場合は埋め込みのコサイン類似度がsimilarity_threshold以上の思考も、同じ思考とみなす。
+    """
+    def __init__(self, embed_fn: Optional[EmbedFunction] = None, similarity_threshold: float = 0.95):
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self._by_text: Dict[str, Thought] = {}
+        self._thoughts: List[Thought] = []
+        self._vectors: Optional[np.ndarray] = None
+        self.merged = 0
+
+    def __len__(self) -> int:
+        return len(self._thoughts)
+
+    def _embed(self, texts: List[str]) -> Optional[np.ndarray]:
+        if self.embed_fn is None or not texts:
+            return None
+        try:
+            vectors = np.asarray(self.embed_fn(texts), dtype="float32")
+        except Exception as e:
+            logger.warning(f"思考の埋め込みに失敗したため、表記の一致だけで重複を判定します: {e}")
+            return None
+        if vectors.ndim != 2 or len(vectors) != len(texts):
+            return None
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms == 0, 1, norms)
+
+    def add(self, thought: Thought) -> None:
+        """重複の判定をせずに思考を登録する(探索の根に使う)。"""
+        self.add_unique([thought], None)
+
+    def add_unique(self, thoughts: List[Thought], vectors: Optional[np.ndarray]) -> List[Thought]:
+        """重複していない思考だけを登録して返す。同じ呼び出しの中で互いに重複する思考は、先のものを残す。"""
+        unique: List[Thought] = []
+        for i, thought in enumerate(thoughts):
+            key = _normalize(thought.state)
+            duplicate = key in self._by_text
+            vector = vectors[i:i + 1] if vectors is not None else None
+            if not duplicate and vector is not None and self._vectors is not None and len(self._vectors):
+                duplicate = float(np.max(self._vectors @ vector[0])) >= self.similarity_threshold
+            if duplicate:
+                self.merged += 1
+                continue
+            self._by_text[key] = thought
+            self._thoughts.append(thought)
+            if vector is not None:
+                self._vectors = vector if self._vectors is None else np.vstack([self._vectors, vector])
+            unique.append(thought)
+        return unique
+
+    async def aadd_unique(self, thoughts: List[Thought]) -> List[Thought]:
+        """埋め込みの計算を別スレッドで行うadd_unique。"""
+        vectors = await asyncio.to_thread(self._embed, [thought.state for thought in thoughts]) if self.embed_fn else None
+        return self.add_unique(thoughts, vectors)
+
+
+class SearchStrategy:
+    """探索戦略の基底クラス。run()は根から木を育て、予算を使い切るか停止条件を満たすと戻る。"""
+    name = "base"
+
+    def __init__(self, branching: int = 3, max_depth: int = 3, score_threshold: Optional[float] = None):
+        self.branching = branching
+        self.max_depth = max_depth
+        self.score_threshold = score_threshold
+
+    def _good_enough(self, thoughts: List[Thought]) -> bool:
+        if self.score_threshold is None:
+            return False
+        return any(thought.evaluation_score >= self.score_threshold for thought in thoughts)
+
+    async def run(self, root: Thought, expand: Expander, budget: SearchBudget) -> str:
+        """探索を実行し、終了した理由を返す。"""
+        raise NotImplementedError
+
+
+class BeamSearch(SearchStrategy):
+    """各深さでスコアの高いbeam_width個の思考だけを残して展開する幅優先の探索。score_threshold以上の思考が現れた時点で止める。"""
+    name = "beam"
+
+    def __init__(self, branching: int = 3, max_depth: int = 3, beam_width: int = 2, score_threshold: Optional[float] = None):
+        super().__init__(branching, max_depth, score_threshold)
+        self.beam_width = beam_width
+
+    async def run(self, root: Thought, expand: Expander, budget: SearchBudget) -> str:
+        frontier = [root]
+        for step in range(self.max_depth):
+            if budget.exhausted():
+                return "budget"
+            logger.info(f"--- ToT探索(beam): ステップ {step + 1}/{self.max_depth} ---")
+            children = await expand(frontier, self.branching)
+            if not children and budget.exhausted():
+                return "budget"
+            if not children:
+                logger.warning("次の思考ステップを生成できませんでした。探索を終了します。")
+                return "exhausted"
+            if self._good_enough(children):
+                return "threshold"
+            children.sort(key=lambda t: t.evaluation_score, reverse=True)
+            frontier = children[:self.beam_width]
+            logger.info(f"ステップ {step + 1} の最良の思考 ({self.beam_width}個): {[t.state for t in frontier]}")
+        return "depth"
+
+
+class BestFirstSearch(SearchStrategy):
+    """その時点で最もスコアの高い未展開の思考を1つずつ展開する探索。展開の回数はmax_expansionsまで。"""
+    name = "best_first"
+
+    def __init__(self, branching: int = 3, max_depth: int = 3, max_expansions: int = 8, score_threshold: Optional[float] = None):
+        super().__init__(branching, max_depth, score_threshold)
+        self.max_expansions = max_expansions
+
+    async def run(self, root: Thought, expand: Expander, budget: SearchBudget) -> str:
+        queue = [(-root.evaluation_score, root.id, root)]
+        for _ in range(self.max_expansions):
+            if budget.exhausted():
+                return "budget"
+            while queue and queue[0][2].depth >= self.max_depth:
+                heapq.heappop(queue)
+            if not queue:
+                return "exhausted"
+            _, _, thought = heapq.heappop(queue)
+            children = await expand([thought], self.branching)
+            if self._good_enough(children):
+                return "threshold"
+            for child in children:
+                heapq.heappush(queue, (-child.evaluation_score, child.id, child))
+        return "expansions"
+
+
+class MCTSSearch(SearchStrategy):
+    """
+    UCTで選んだ葉を展開し、子の評価の最大値を価値として根まで逆伝播するモンテカルロ木探索。
+    評価の高い枝を深く掘りつつ、訪問の少ない枝もexplorationに応じて試す。
+    展開しても新しい子が得られなかった(生成した子がすべて既出の思考と重複した)葉は、最大深さに達した葉と同様に展開済みとして扱い、
+    以降の選択では展開できる葉が残っている枝を優先する。
+    """
+    name = "mcts"
+
+    def __init__(self, branching: int = 3, max_depth: int = 3, iterations: int = 12, exploration: float = 1.4, score_threshold: Optional[float] = None):
+        super().__init__(branching, max_depth, score_threshold)
+        self.iterations = iterations
+        self.exploration = exploration
+
+    def _uct(self, parent: Thought, child: Thought) -> float:
+        if child.visits == 0:
+            return math.inf
+        exploit = child.value_sum / child.visits
+        explore = self.exploration * math.sqrt(math.log(max(parent.visits, 1)) / child.visits)
+        return exploit + explore
+
+    async def run(self, root: Thought, expand: Expander, budget: SearchBudget) -> str:
+        exhausted: Set[int] = set()
+        for _ in range(self.iterations):
+            if budget.exhausted():
+                return "budget"
+            path = [root]
+            node = root
+            while node.children:
+                expandable = [child for child in node.children if self._has_expandable(child, exhausted)]
+                node = max(expandable or node.children, key=lambda child: self._uct(path[-1], child))
+                path.append(node)
+            value = node.evaluation_score
+            if self._is_expandable_leaf(node, exhausted):
+                children = await expand([node], self.branching)
+                for child in children:
+                    child.visits = 1
+                    child.value_sum = child.evaluation_score
+                if children:
+                    value = max(child.evaluation_score for child in children)
+                else:
+                    exhausted.add(node.id)
+                if self._good_enough(children):
+                    self._backpropagate(path, value)
+                    return "threshold"
+            elif not self._has_expandable(root, exhausted):
+                return "exhausted"
+            self._backpropagate(path, value)
+        return "iterations"
+
+    @staticmethod
+    def _backpropagate(path: List[Thought], value: float) -> None:
+        for thought in path:
+            thought.visits += 1
+            thought.value_sum += value
+
+    def _is_expandable_leaf(self, thought: Thought, exhausted: Set[int]) -> bool:
+        return not thought.children and thought.depth < self.max_depth and thought.id not in exhausted
+
+    def _has_expandable(self, thought: Thought, exhausted: Set[int]) -> bool:
+        if not thought.children:
+            return self._is_expandable_leaf(thought, exhausted)
+        return any(self._has_expandable(child, exhausted) for child in thought.children)
+
+
+SEARCH_STRATEGIES = {strategy.name: strategy for strategy in (BeamSearch, BestFirstSearch, MCTSSearch)}
+
+
+def build_search_strategy(name: str, options: Optional[Dict[str, Any]] = None) -> SearchStrategy:
+    """名前と設定から探索戦略を作る。設定のうち、その戦略が受け取らない項目は無視する。"""
+    strategy_class = SEARCH_STRATEGIES.get(name)
+    if strategy_class is None:
+        raise ValueError(f"Unknown Tree of Thoughts search strategy: {name}")
+    accepted = inspect.signature(strategy_class.__init__).parameters
+    return strategy_class(**{key: value for key, value in (options or {}).items() if key in accepted})
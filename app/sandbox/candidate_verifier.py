@@ -0,0 +1,123 @@
+# /app/sandbox/candidate_verifier.py
+# title: サンドボックスによる修正候補の検証
+# role: コードの修正候補をそれぞれ専用の作業ディレクトリに書き出し、使い捨てのサンドボックスコンテナでテストを実行して合否を判定する。
+
+import asyncio
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Awaitable, List, Optional, Tuple
+
+from app.sandbox.sandbox_manager import SandboxManager
+
+logger = logging.getLogger(__name__)
+
+_CODE_BLOCK = re.compile(r"```[^\n]*\n(.*?)```", re.DOTALL)
+
+
+def extract_code(text: str) -> str:
+    """LLMの出力からコードを取り出す。コードブロックがあれば最初のものを、なければ全体を返す。"""
+    match = _CODE_BLOCK.search(text)
+    return (match.group(1) if match else text).strip() + "\n"
+
+
+@dataclass
+class CandidateResult:
+    """1つの修正候補の検証結果。"""
+    index: int
+    code: str
+    passed: bool
+    exit_code: int
+    output: str
+    seconds: float
+
+
+class SandboxCandidateVerifier:
+    """
+    修正候補をsolution.pyとして、テストコードがあればtest_solution.pyとして候補ごとの作業ディレクトリに書き出し、
+    使い捨てのコンテナで検証コマンドを実行する。終了コードが0なら合格とする。
+    テストコードがある場合はtest_command、ない場合はsmoke_command(構文の確認と実行)を使う。
+    race()は複数の候補を生成され次第並行して検証し、最初に合格した候補が出た時点で残りの生成と検証をキャンセルする。
+    同時に実行するコンテナはmax_parallelまでで、検証がキャンセルされた場合は実行中のコンテナを停止する。
+    """
+    def __init__(
+        self,
+        sandbox_manager: SandboxManager,
+        work_dir: Optional[str] = None,
+        test_command: str = "python -m pytest -q -x test_solution.py",
+        smoke_command: str = "python -m py_compile solution.py && python solution.py",
+        timeout_seconds: float = 60,
+        max_parallel: int = 3,
+    ):
+        self.sandbox_manager = sandbox_manager
+        # 省略時はサンドボックスの共有ディレクトリの下に候補ごとの作業ディレクトリを作る
+        self.work_dir = work_dir or os.path.join(sandbox_manager.shared_dir_host_abs_path, "candidates")
+        self.test_command = test_command
+        self.smoke_command = smoke_command
+        self.timeout_seconds = timeout_seconds
+        self.max_parallel = max_parallel
+
+    def _prepare(self, directory: str, code: str, test_code: Optional[str]) -> str:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "solution.py"), "w", encoding="utf-8") as f:
+            f.write(code)
+        if test_code:
+            with open(os.path.join(directory, "test_solution.py"), "w", encoding="utf-8") as f:
+                f.write(test_code)
+            return self.test_command
+        return self.smoke_command
+
+    async def verify(self, index: int, code: str, test_code: Optional[str], semaphore: asyncio.Semaphore) -> CandidateResult:
+        """修正候補を検証する。キャンセルされた場合はコンテナを停止してからキャンセルを伝える。"""
+        name = f"luca5-candidate-{uuid.uuid4().hex[:12]}"
+        directory = os.path.join(self.work_dir, name)
+        async with semaphore:
+            start = time.monotonic()
+            command = self._prepare(directory, code, test_code)
+            run = asyncio.ensure_future(asyncio.to_thread(self.sandbox_manager.run_ephemeral, command, directory, name, self.timeout_seconds))
+            try:
+                exit_code, output = await asyncio.shield(run)
+            except asyncio.CancelledError:
+                logger.info(f"修正候補{index}の検証をキャンセルしました。コンテナ {name} を停止します。")
+                await asyncio.to_thread(self.sandbox_manager.kill_ephemeral, name)
+                # コンテナの削除まで終わらせてから作業ディレクトリを消す
+                await asyncio.gather(run, return_exceptions=True)
+                raise
+            finally:
+                shutil.rmtree(directory, ignore_errors=True)
+        result = CandidateResult(index=index, code=code, passed=exit_code == 0, exit_code=exit_code, output=output, seconds=time.monotonic() - start)
+        logger.info(f"修正候補{index}の検証: {'合格' if result.passed else '不合格'} (終了コード: {exit_code}, {result.seconds:.2f}秒)")
+        return result
+
+    async def race(self, candidates: List[Awaitable[str]], test_code: Optional[str] = None) -> Tuple[Optional[CandidateResult], List[CandidateResult]]:
+        """
+        LLMが生成する修正候補(の出力を返すawaitable)をそれぞれ生成され次第検証し、最初に合格した候補と、
+        それまでに検証が終わった候補の結果を返す。合格した候補がなければNoneと全候補の結果を返す。
+        """
+        semaphore = asyncio.Semaphore(self.max_parallel)
+
+        async def generate_and_verify(index: int, candidate: Awaitable[str]) -> CandidateResult:
+            code = extract_code(await candidate)
+            return await self.verify(index, code, test_code, semaphore)
+
+        tasks = [asyncio.ensure_future(generate_and_verify(i, candidate)) for i, candidate in enumerate(candidates)]
+        results: List[CandidateResult] = []
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    result = await next_done
+                except Exception as e:
+                    logger.error(f"修正候補の生成または検証に失敗しました: {e}", exc_info=True)
+                    continue
+                results.append(result)
+                if result.passed:
+                    return result, results
+            return None, results
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -5,12 +5,15 @@
 import docker
 from docker.models.containers import Container
 from docker.errors import ImageNotFound, BuildError, APIError, DockerException
+from requests.exceptions import ConnectionError as RequestsConnectionError, ReadTimeout
 import os
 from typing import Optional, Tuple
 import logging
 import json
 from datetime import datetime, timezone
 
+from app.utils.log_writer import BufferedLogWriter, FileAppendSink
+
 logger = logging.getLogger(__name__)
 
 class SandboxManager:
@@ -20,10 +23,11 @@ class SandboxManager:
     安全なコード実行環境を提供します。
     問題が発生した際には、自己修復（再構築）機能を持ちます。
     """
-    def __init__(self, image_name: str = "luca5-sandbox:latest", shared_dir_host_path: str = "sandbox/shared_dir") -> None:
+    def __init__(self, image_name: str = "luca5-sandbox:latest", shared_dir_host_path: str = "sandbox/shared_dir", log_writer: Optional[BufferedLogWriter] = None) -> None:
         """
         :param image_name: サンドボックスとして使用するDockerイメージ名
         :param shared_dir_host_path: ホストOS上の共有ディレクトリのパス
+        :param log_writer: 活動ログを書き込むバックグラウンドのライター（省略時は同期的に書き込む）
         """
         try:
             self.client = docker.from_env()
@@ -40,6 +44,8 @@ class SandboxManager:
         # ログディレクトリとログファイルパスを設定
         self.log_dir_host_path = os.path.join(self.shared_dir_host_abs_path, "logs")
         self.log_file_host_path = os.path.join(self.log_dir_host_path, "sandbox_activity.log")
+        self.log_writer = log_writer
+        self._log_sink = FileAppendSink(self.log_file_host_path)
         
         # ◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️↓修正開始◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️◾️
         # [DEBUG] 使用するログファイルの絶対パスをログに出力
@@ -164,6 +170,53 @@ class SandboxManager:
 
             return -1, error_message
 
+    def run_ephemeral(self, command: str, work_dir_host_path: str, name: str, timeout_seconds: float = 60) -> Tuple[int, str]:
+        """
+        使い捨てのコンテナでコマンドを1回だけ実行する。常駐のサンドボックスとは別のコンテナのため、複数のコマンドを並行して実行できる。
+        work_dir_host_pathだけを作業ディレクトリとしてマウントし、ネットワークは無効にする。
+        timeout_secondsを過ぎても終わらない場合はコンテナを停止し、終了コード-1を返す。コンテナは実行後に削除する。
+        """
+        work_dir_container_path = "/app/work"
+        try:
+            container = self.client.containers.run(
+                self.image_name,
+                command=["sh", "-c", command],
+                name=name,
+                detach=True,
+                network_disabled=True,
+                working_dir=work_dir_container_path,
+                volumes={os.path.abspath(work_dir_host_path): {'bind': work_dir_container_path, 'mode': 'rw'}},
+            )
+        except APIError as e:
+            message = f"使い捨てコンテナの起動に失敗しました: {e}"
+            self._log_activity(command, -1, message, is_error=True)
+            return -1, message
+        try:
+            try:
+                exit_code = int(container.wait(timeout=timeout_seconds).get("StatusCode", -1))
+                result = container.logs().decode('utf-8', errors='replace').strip()
+            except (ReadTimeout, RequestsConnectionError):
+                container.kill()
+                exit_code = -1
+                result = f"コマンドが{timeout_seconds}秒以内に終了しなかったため停止しました。"
+        except APIError as e:
+            # 実行中にkill_ephemeral()で停止された場合もここに来る
+            exit_code, result = -1, f"使い捨てコンテナでの実行中にエラーが発生しました: {e}"
+        finally:
+            try:
+                container.remove(force=True)
+            except APIError:
+                pass
+        self._log_activity(command, exit_code, result)
+        return exit_code, result
+
+    def kill_ephemeral(self, name: str) -> None:
+        """run_ephemeral()で実行中の使い捨てコンテナを停止する。すでに終了している場合は何もしない。"""
+        try:
+            self.client.containers.get(name).kill()
+        except (docker.errors.NotFound, APIError):
+            pass
+
     def stop_sandbox(self) -> None:
         """
         サンドボックスコンテナを停止し、削除します。
@@ -192,9 +245,12 @@ class SandboxManager:
             "output": output,
             "type": "error" if is_error or exit_code != 0 else "command"
         }
+        line = (json.dumps(log_entry, ensure_ascii=False) + "\n").encode("utf-8")
         try:
-            with open(self.log_file_host_path, "a", encoding="utf-8") as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
+            if self.log_writer:
+                self.log_writer.submit(self._log_sink, line)
+            else:
+                self._log_sink([(line, None)], False)
         except IOError as e:
             logger.error(f"Failed to write to log file '{self.log_file_host_path}': {e}")
 
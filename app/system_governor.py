@@ -21,6 +21,7 @@ from app.agents.knowledge_gap_analyzer import KnowledgeGapAnalyzerAgent
 from app.micro_llm.manager import MicroLLMManager
 from app.agents.performance_benchmark_agent import PerformanceBenchmarkAgent
 from app.meta_intelligence.cognitive_energy.manager import CognitiveEnergyManager
+from app.digital_homeostasis.integrity_monitor import IntegrityMonitor
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +44,7 @@ class SystemGovernor:
         micro_llm_manager: MicroLLMManager,
         performance_benchmark_agent: PerformanceBenchmarkAgent,
         energy_manager: CognitiveEnergyManager,
+        integrity_monitor: Optional[IntegrityMonitor] = None,
     ):
         self.evolutionary_controller = evolutionary_controller
         self.self_evolving_system = self_evolving_system
@@ -56,6 +58,7 @@ class SystemGovernor:
         self.micro_llm_manager = micro_llm_manager
         self.performance_benchmark_agent = performance_benchmark_agent
         self.energy_manager = energy_manager
+        self.integrity_monitor = integrity_monitor
 
         self._last_active_time: float = time.time()
         self._is_idle: bool = False
@@ -70,6 +73,10 @@ class SystemGovernor:
             "consolidation_cycle": 0,
             "autonomous_cycle": 0,
             "wisdom_synthesis": 0,
+            "graph_compaction": 0,
+            "graph_maintenance": 0,
+            "memory_log_maintenance": 0,
+            "integrity_check": 0,
             "simulation_cycle": 0,
             "emergent_discovery": 0,
             "value_evolution": 0,
@@ -107,6 +114,10 @@ class SystemGovernor:
                 # 3. 定期的なメンテナンス タスク
                 self._run_task_if_due("consolidation_cycle", settings.CONSOLIDATION_CYCLE_INTERVAL_SECONDS, self._run_consolidation_cycle, current_time)
                 self._run_task_if_due("wisdom_synthesis", settings.WISDOM_SYNTHESIS_INTERVAL_SECONDS, self._run_wisdom_synthesis, current_time)
+                self._run_task_if_due("graph_compaction", settings.GRAPH_COMPACTION_INTERVAL_SECONDS, self._run_graph_compaction, current_time)
+                self._run_task_if_due("graph_maintenance", settings.GRAPH_MAINTENANCE_INTERVAL_SECONDS, self._run_graph_maintenance, current_time)
+                self._run_task_if_due("memory_log_maintenance", settings.MEMORY_LOG_MAINTENANCE_INTERVAL_SECONDS, self._run_memory_log_maintenance, current_time)
+                self._run_task_if_due("integrity_check", settings.INTEGRITY_CHECK_INTERVAL_SECONDS, self._run_integrity_check, current_time)
 
             time.sleep(5)
         logger.info("System Governor monitor thread stopped.")
@@ -136,6 +147,20 @@ class SystemGovernor:
     def _run_wisdom_synthesis(self):
         self.consolidation_agent.synthesize_deep_wisdom()
 
+    def _run_graph_compaction(self):
+        self.consolidation_agent.run_graph_compaction()
+
+    def _run_graph_maintenance(self):
+        self.consolidation_agent.run_graph_maintenance()
+
+    def _run_memory_log_maintenance(self):
+        self.memory_consolidator.run_log_maintenance()
+
+    def _run_integrity_check(self):
+        """知識グラフのバージョンが変わったか、TTLを過ぎた場合に知的健全性ステータスを更新する。"""
+        if self.integrity_monitor:
+            asyncio.run(self.integrity_monitor.refresh_if_needed())
+
     def _run_knowledge_gap_analysis(self, topic: str):
         self.micro_llm_manager.run_creation_cycle(topic=topic)
         
@@ -66,7 +66,8 @@ class ToolBelt:
             tool_instance = MicroLLMTool(
                 model_name=model_name,
                 description=description,
-                llm_provider=llm_provider
+                llm_provider=llm_provider,
+                topic=topic
             )
             if tool_instance.name not in self._tool_map:
                 self._tools.append(tool_instance)
@@ -79,6 +80,12 @@ class ToolBelt:
         """
         return self._tool_map.get(tool_name)
 
+    def get_tools(self) -> List[Tool]:
+        """
+        登録されているすべてのツールを取得する。
+        """
+        return list(self._tools)
+
     def get_tool_descriptions(self) -> str:
         """
         すべてのツールの名前と説明をフォーマットされた文字列として取得する。
@@ -0,0 +1,181 @@
+# /app/utils/log_writer.py
+# title: Buffered Log Writer
+# role: 記憶ログやサンドボックス活動ログの書き込みをバックグラウンドスレッドにまとめ、有界キューとグループコミットで呼び出し元をファイルI/Oから切り離す。
+
+import atexit
+import logging
+import os
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# シンクはレコードのバッチ(行のバイト列と任意のペイロードの組)と、fsyncすべきかどうかを受け取って書き込む
+LogEntry = Tuple[bytes, Any]
+LogSink = Callable[[List[LogEntry], bool], None]
+
+_FSYNC_POLICIES = ("never", "batch", "interval")
+
+
+class FileAppendSink:
+    """バッチ内の全レコードを一度のopenで追記するシンク。"""
+    def __init__(self, path: str):
+        self.path = path
+
+    def __call__(self, entries: List[LogEntry], fsync: bool) -> None:
+        with open(self.path, "ab") as f:
+            f.write(b"".join(line for line, _ in entries))
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+
+class BufferedLogWriter:
+    """
+    複数のログのシンクで共有されるバックグラウンドのログライター。
+
+    submit()はレコードを有界キューに入れるだけで戻り、書き込みは専用スレッドが行う。専用スレッドはキューから
+    最大batch_size件をまとめて取り出し、シンクごとに一度の書き込みで処理する(グループコミット)。
+    キューが満杯の場合は最大block_timeout秒だけ待ち、それでも空かなければレコードを破棄する。
+    待たされた件数と破棄した件数はget_metrics()で参照できる。
+
+    fsyncポリシー: "never"はOSに任せる、"batch"はバッチごとにfsyncする、"interval"は最後のfsyncから
+    fsync_interval秒以上経過したバッチでfsyncする。
+    """
+    def __init__(
+        self,
+        max_queue_size: int = 10000,
+        batch_size: int = 256,
+        flush_interval: float = 0.2,
+        fsync_policy: str = "interval",
+        fsync_interval: float = 1.0,
+        block_timeout: float = 0.05,
+    ):
+        if fsync_policy not in _FSYNC_POLICIES:
+            raise ValueError(f"不明なfsyncポリシー '{fsync_policy}' です。{_FSYNC_POLICIES} のいずれかを指定してください。")
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.block_timeout = block_timeout
+        self._queue: "queue.Queue[Optional[Tuple[LogSink, LogEntry]]]" = queue.Queue(maxsize=max_queue_size)
+        self._metrics_lock = threading.Lock()
+        self._metrics: Dict[str, int] = {"submitted": 0, "written": 0, "blocked": 0, "dropped": 0, "batches": 0, "errors": 0}
+        self._last_fsync = time.monotonic()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="BufferedLogWriter", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._metrics_lock:
+            self._metrics[key] += amount
+
+    def submit(self, sink: LogSink, line: bytes, payload: Any = None) -> bool:
+        """
+        レコードを書き込みキューに入れる。受け付けた場合はTrue、キューが満杯で破棄した場合はFalseを返す。
+        """
+        if self._closed:
+            # 停止後のレコードは呼び出し元のスレッドでそのまま書き込む
+            sink([(line, payload)], self.fsync_policy != "never")
+            self._count("written")
+            return True
+        item = (sink, (line, payload))
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            self._count("blocked")
+            try:
+                self._queue.put(item, timeout=self.block_timeout)
+            except queue.Full:
+                self._count("dropped")
+                logger.warning("ログの書き込みキューが満杯のため、レコードを破棄しました。")
+                return False
+        self._count("submitted")
+        return True
+
+    def _drain_batch(self) -> Tuple[List[Tuple[LogSink, LogEntry]], bool]:
+        """キューから最大batch_size件を取り出す。停止要求を受け取った場合は2番目の値がTrueになる。"""
+        batch: List[Tuple[LogSink, LogEntry]] = []
+        try:
+            item = self._queue.get(timeout=self.flush_interval)
+        except queue.Empty:
+            return batch, False
+        stop = item is None
+        if item is not None:
+            batch.append(item)
+        while len(batch) < self.batch_size and not stop:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                stop = True
+            else:
+                batch.append(item)
+        return batch, stop
+
+    def _write_batch(self, batch: List[Tuple[LogSink, LogEntry]]) -> None:
+        now = time.monotonic()
+        fsync = self.fsync_policy == "batch" or (
+            self.fsync_policy == "interval" and now - self._last_fsync >= self.fsync_interval
+        )
+        # 同じインスタンスのバウンドメソッドは等価とみなされるため、シンク自体をキーにまとめる
+        by_sink: Dict[LogSink, List[LogEntry]] = {}
+        for sink, entry in batch:
+            by_sink.setdefault(sink, []).append(entry)
+        for sink, entries in by_sink.items():
+            try:
+                sink(entries, fsync)
+                self._count("written", len(entries))
+            except Exception as e:
+                self._count("errors", len(entries))
+                logger.error(f"ログのバッチ書き込みに失敗しました ({len(entries)}件): {e}", exc_info=True)
+        if fsync:
+            self._last_fsync = now
+        self._count("batches")
+
+    def _run(self) -> None:
+        while True:
+            batch, stop = self._drain_batch()
+            if batch:
+                self._write_batch(batch)
+                for _ in batch:
+                    self._queue.task_done()
+            if stop:
+                self._queue.task_done()
+                return
+
+    def flush(self) -> None:
+        """キューに入っている全レコードの書き込みが完了するまで待つ。"""
+        if not self._closed and self._thread.is_alive():
+            self._queue.join()
+
+    def close(self) -> None:
+        """残っているレコードを書き込んでからライターを停止する。"""
+        if self._closed:
+            return
+        # 以降のsubmitは呼び出し元で直接書き込ませ、キューに残ったレコードを専用スレッドに書き切らせる
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+        remaining: List[Tuple[LogSink, LogEntry]] = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None:
+                remaining.append(item)
+        if remaining:
+            self._write_batch(remaining)
+        logger.info(f"BufferedLogWriter stopped. metrics={self.get_metrics()}")
+
+    def get_metrics(self) -> Dict[str, int]:
+        """書き込み件数、待たされた件数、破棄した件数などの統計と、現在のキューの長さを返す。"""
+        with self._metrics_lock:
+            metrics = dict(self._metrics)
+        metrics["queue_depth"] = self._queue.qsize()
+        return metrics
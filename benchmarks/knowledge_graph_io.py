@@ -0,0 +1,123 @@
+# /benchmarks/knowledge_graph_io.py
+# title: 知識グラフ保存・ロードのベンチマーク
+# role: 旧形式(JSON + model_validate / インデント付きJSON保存)とバイナリスナップショットの処理時間とピークRSSを比較する。
+#
+# 使い方: python -m benchmarks.knowledge_graph_io --edges 10000 100000 1000000
+# 各計測は独立したサブプロセスで実行し、resource.getrusageのru_maxrssからインポート後のピークRSS増加量を求める。
+# valid(s)は遅延検証されたノード・エッジに全件アクセスした際の検証時間。
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List
+
+
+def _generate(path: str, num_edges: int) -> None:
+    """ノード数がエッジ数の半分の合成グラフを旧形式のJSONで書き出す。"""
+    num_nodes = max(num_edges // 2, 1)
+    timestamp = "2025-07-06T03:12:23.176313"
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('{"nodes":[')
+        for i in range(num_nodes):
+            if i:
+                f.write(",")
+            json.dump({
+                "id": f"entity_{i}", "label": f"Category{i % 50}",
+                "properties": {"説明": f"エンティティ{i}の説明文"},
+                "metadata": {"created_at": timestamp, "last_accessed": timestamp},
+            }, f, ensure_ascii=False)
+        f.write('],"edges":[')
+        for i in range(num_edges):
+            if i:
+                f.write(",")
+            json.dump({
+                "source": f"entity_{i % num_nodes}", "target": f"entity_{(i * 7 + 1) % num_nodes}",
+                "label": f"relation_{i % 20}", "properties": {}, "weight": 1.0,
+            }, f)
+        f.write("]}")
+
+
+def _measure(mode: str, source: str, destination: str) -> Dict[str, Any]:
+    """サブプロセス内で実行される計測本体。"""
+    from app.knowledge_graph.models import KnowledgeGraph
+    from app.knowledge_graph.serialization import load_knowledge_graph, save_knowledge_graph
+
+    # appパッケージのインポート自体が大きなメモリを使うため、インポート後のピークを基準値とする
+    baseline_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    if mode == "legacy_json":
+        with open(source, "r", encoding="utf-8") as f:
+            graph = KnowledgeGraph.model_validate(json.load(f))
+    else:
+        graph = load_knowledge_graph(source)
+    load_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    if mode == "legacy_json":
+        with open(destination, "w", encoding="utf-8") as f:
+            f.write(graph.model_dump_json(indent=4))
+    else:
+        save_knowledge_graph(graph, destination, compression="zstd")
+    save_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in graph.nodes:
+        pass
+    for _ in graph.edges:
+        pass
+    validate_seconds = time.perf_counter() - start
+
+    return {
+        "load_s": round(load_seconds, 3),
+        "save_s": round(save_seconds, 3),
+        "full_validation_s": round(validate_seconds, 3),
+        "rss_growth_mb": round((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline_rss) / 1024, 1),
+        "file_mb": round(os.path.getsize(destination) / 1024 / 1024, 2),
+    }
+
+
+def _run_in_subprocess(mode: str, source: str, destination: str) -> Dict[str, Any]:
+    output = subprocess.check_output(
+        [sys.executable, "-m", "benchmarks.knowledge_graph_io", "--measure", mode, source, destination],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="知識グラフの保存・ロード性能を計測する。")
+    parser.add_argument("--edges", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--measure", nargs=3, metavar=("MODE", "SOURCE", "DESTINATION"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        mode, source, destination = args.measure
+        print(json.dumps(_measure(mode, source, destination)))
+        return
+
+    rows: List[str] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_edges in args.edges:
+            json_path = os.path.join(tmp, f"kg_{num_edges}.json")
+            snapshot_path = os.path.join(tmp, f"kg_{num_edges}.kgs")
+            _generate(json_path, num_edges)
+            _run_in_subprocess("snapshot", json_path, snapshot_path)  # JSONからスナップショットへ変換
+            for mode, source in (("legacy_json", json_path), ("snapshot", snapshot_path)):
+                result = _run_in_subprocess(mode, source, os.path.join(tmp, f"out_{mode}_{num_edges}"))
+                rows.append(
+                    f"| {num_edges:>9,} | {mode:<11} | {result['load_s']:>7} | {result['save_s']:>7} | "
+                    f"{result['full_validation_s']:>8} | {result['rss_growth_mb']:>10} | {result['file_mb']:>7} |"
+                )
+
+    print("|     edges | format      | load(s) | save(s) | valid(s) | ΔRSS(MB)  | file(MB) |")
+    print("|-----------|-------------|---------|---------|----------|-----------|----------|")
+    print("\n".join(rows))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+# /benchmarks/knowledge_graph_memory.py
+# title: 知識グラフのメモリ使用量ベンチマーク
+# role: Pydanticモデルのリストで保持した知識グラフと、列指向ストア(ColumnarGraphStore)の保持メモリを比較する。
+#
+# 使い方: python -m benchmarks.knowledge_graph_memory --edges 10000 100000 1000000
+# 各計測は独立したサブプロセスで実行する。入力のJSONを読み込んでグラフを構築した後、入力データを解放してから
+# tracemallocで保持されているメモリ量を測り、グラフ自体が使うメモリを求める。
+
+import argparse
+import gc
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from benchmarks.knowledge_graph_io import _generate
+
+
+def _measure(mode: str, source: str) -> Dict[str, Any]:
+    """サブプロセス内で実行される計測本体。"""
+    from app.knowledge_graph.columnar import ColumnarGraphStore
+    from app.knowledge_graph.models import KnowledgeGraph
+
+    tracemalloc.start()
+    with open(source, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    gc.collect()
+    input_bytes = tracemalloc.get_traced_memory()[0]
+
+    start = time.perf_counter()
+    if mode == "pydantic":
+        graph: Any = KnowledgeGraph.model_validate(data)
+        num_edges = len(graph.edges)
+    else:
+        graph = ColumnarGraphStore.from_raw(data["nodes"], data["edges"])
+        num_edges = graph.num_edges
+    build_seconds = time.perf_counter() - start
+
+    # 入力データと構築済みグラフの両方を保持した状態から入力分を除くと、文字列を共有する列指向ストアが不当に有利になるため、
+    # 入力データを解放した後の保持量をグラフのメモリとする
+    del data
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    if mode == "pydantic":
+        for edge in graph.edges:
+            _ = edge.weight
+    else:
+        view = graph.to_knowledge_graph()
+        for edge in view.edges:
+            _ = edge.weight
+    view_seconds = time.perf_counter() - start
+
+    return {
+        "input_mb": round(input_bytes / 1024 / 1024, 1),
+        "graph_mb": round(retained / 1024 / 1024, 1),
+        "bytes_per_edge": round(retained / max(num_edges, 1)),
+        "build_s": round(build_seconds, 3),
+        "iterate_edges_s": round(view_seconds, 3),
+    }
+
+
+def _run_in_subprocess(mode: str, source: str) -> Dict[str, Any]:
+    output = subprocess.check_output(
+        [sys.executable, "-m", "benchmarks.knowledge_graph_memory", "--measure", mode, source],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    return json.loads(output.decode("utf-8").strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="知識グラフの保持メモリを比較する。")
+    parser.add_argument("--edges", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--measure", nargs=2, metavar=("MODE", "SOURCE"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        mode, source = args.measure
+        print(json.dumps(_measure(mode, source)))
+        return
+
+    rows: List[str] = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for num_edges in args.edges:
+            json_path = os.path.join(tmp, f"kg_{num_edges}.json")
+            _generate(json_path, num_edges)
+            for mode in ("pydantic", "columnar"):
+                result = _run_in_subprocess(mode, json_path)
+                rows.append(
+                    f"| {num_edges:>9,} | {mode:<8} | {result['graph_mb']:>8} | {result['bytes_per_edge']:>9} | "
+                    f"{result['build_s']:>8} | {result['iterate_edges_s']:>8} |"
+                )
+
+    print("|     edges | storage  | RAM(MB)  | B/edge    | build(s) | iter(s)  |")
+    print("|-----------|----------|----------|-----------|----------|----------|")
+    print("\n".join(rows))
+
+
+if __name__ == "__main__":
+    main()
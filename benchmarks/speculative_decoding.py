@@ -0,0 +1,85 @@
+# /benchmarks/speculative_decoding.py
+# title: 投機的デコーディングのベンチマーク
+# role: llama.cppバックエンドで、通常のデコード、プロンプト参照、ドラフトモデルによる投機的デコーディングの生成速度(tokens/s)を比較する。
+#
+# 使い方: python -m benchmarks.speculative_decoding --model /path/to/model.gguf [--draft-model /path/to/draft.gguf]
+# 各方式で同じプロンプトを温度0(貪欲法)で生成し、通常のデコードに対する速度比と、出力が通常のデコードと一致したかを表示する。
+# 各方式は独立したサブプロセスで実行し、モデルのロードやKVキャッシュが他の方式の計測に影響しないようにする。
+
+import argparse
+import json
+import subprocess
+import sys
+from typing import Any, Dict, List
+
+DEFAULT_PROMPTS = [
+    "次のPythonの関数を、型ヒントとdocstringを付けて書き直してください。\ndef add(a, b):\n    return a + b\n",
+    "日本の四季について、それぞれの特徴を箇条書きで説明してください。",
+    "以下の文章を要約してください。\n人工知能は、学習、推論、問題解決などの人間の知的な能力をコンピュータで実現しようとする技術である。"
+    "近年は大量のデータと計算資源を用いた深層学習により、画像認識や自然言語処理の性能が大きく向上した。",
+]
+
+
+def _measure(mode: str, model_path: str, draft_model_path: str, prompts: List[str], max_tokens: int, num_pred_tokens: int) -> Dict[str, Any]:
+    """サブプロセス内で実行される計測本体。"""
+    from langchain_community.llms import LlamaCpp
+    from app.llm_providers.speculative_decoding import attach_throughput_tracker, build_draft_model, decoding_mode
+
+    speculative_settings = {
+        "enabled": mode != "plain",
+        "draft_model_path": draft_model_path if mode == "draft_model" else "",
+        "num_pred_tokens": num_pred_tokens,
+        "draft_n_gpu_layers": -1,
+    }
+    draft_model = build_draft_model(speculative_settings)
+    llm = LlamaCpp(
+        model_path=model_path,
+        n_ctx=4096,
+        n_gpu_layers=-1,
+        temperature=0.0,
+        max_tokens=max_tokens,
+        verbose=False,
+        model_kwargs={"draft_model": draft_model} if draft_model is not None else {},
+    )
+    tracker = attach_throughput_tracker(llm, decoding_mode(speculative_settings))
+    # 初回の呼び出しに含まれる初期化の時間を計測から除く
+    llm.invoke("こんにちは", max_tokens=8)
+    tracker.calls, tracker.completion_tokens, tracker.seconds = 0, 0, 0.0
+    outputs = [llm.invoke(prompt) for prompt in prompts]
+    return {**tracker.get_stats(), "outputs": outputs}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="llama.cppの投機的デコーディングの生成速度を計測する。")
+    parser.add_argument("--model", required=True, help="本体のGGUFモデルのパス")
+    parser.add_argument("--draft-model", default="", help="ドラフトモデルのGGUFのパス(省略するとプロンプト参照だけを比較する)")
+    parser.add_argument("--max-tokens", type=int, default=256)
+    parser.add_argument("--num-pred-tokens", type=int, default=10)
+    parser.add_argument("--measure", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure:
+        result = _measure(args.measure, args.model, args.draft_model, DEFAULT_PROMPTS, args.max_tokens, args.num_pred_tokens)
+        print(json.dumps(result, ensure_ascii=False))
+        return
+
+    modes = ["plain", "prompt_lookup"] + (["draft_model"] if args.draft_model else [])
+    results: Dict[str, Dict[str, Any]] = {}
+    for mode in modes:
+        command = [
+            sys.executable, "-m", "benchmarks.speculative_decoding", "--measure", mode, "--model", args.model,
+            "--draft-model", args.draft_model, "--max-tokens", str(args.max_tokens), "--num-pred-tokens", str(args.num_pred_tokens),
+        ]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        results[mode] = json.loads(output.strip().splitlines()[-1])
+
+    baseline = results["plain"]
+    print(f"{'mode':<15}{'tokens':>10}{'seconds':>10}{'tokens/s':>12}{'speedup':>10}{'same output':>14}")
+    for mode, result in results.items():
+        speedup = result["tokens_per_second"] / baseline["tokens_per_second"] if baseline["tokens_per_second"] else 0.0
+        same = result["outputs"] == baseline["outputs"]
+        print(f"{mode:<15}{result['completion_tokens']:>10}{result['seconds']:>10.2f}{result['tokens_per_second']:>12.1f}{speedup:>9.2f}x{str(same):>14}")
+
+
+if __name__ == "__main__":
+    main()
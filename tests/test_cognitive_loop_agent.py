@@ -2,6 +2,9 @@
 # title: 認知ループエージェントユニットテスト
 # role: アプリケーションのCognitiveLoopAgent層のユニットテスト
 
+import asyncio
+import time
+
 import pytest
 from unittest.mock import MagicMock, AsyncMock, patch, create_autospec
 from langchain_core.prompts import ChatPromptTemplate
@@ -145,4 +148,87 @@ async def test_ainvoke_conceptual_operation_flow(mock_to_thread, mock_dependenci
         final_call_args = agent._chain.ainvoke.call_args[0][0]
         assert "Conceptual operation result" in final_call_args["final_retrieved_info"]
         # 通常の検索ループが呼ばれていないことを確認
-        mock_dependencies["retriever"].invoke.assert_not_called()
\ No newline at end of file
+        mock_dependencies["retriever"].invoke.assert_not_called()
+
+class _SyncTool:
+    def __init__(self, name, result, delay=0.0, topic=None, log=None):
+        self.name = name
+        self.result = result
+        self.delay = delay
+        self.topic = topic
+        self.log = log if log is not None else []
+
+    def use(self, query):
+        self.log.append(("start", self.name))
+        time.sleep(self.delay)
+        self.log.append(("end", self.name))
+        return self.result
+
+
+class _AsyncTool(_SyncTool):
+    async def use_async(self, query):
+        self.log.append(("start", self.name))
+        await asyncio.sleep(self.delay)
+        self.log.append(("end", self.name))
+        return self.result
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_fanout_retrieval_gathers_sources_in_parallel_with_deadlines(mock_dependencies):
+    """fanoutモードでRAGと外部ツールが並行して実行され、締め切りを過ぎた情報源を除いて一度だけ評価されることをテストする"""
+    agent = CognitiveLoopAgent(
+        **mock_dependencies,
+        retrieval_mode="fanout",
+        default_source_deadline_seconds=0.5,
+        source_deadlines={"WikipediaSearch": 0.1},
+    )
+    log = []
+    tools = {
+        "WebSearch": _AsyncTool("WebSearch", "web result", delay=0.2, log=log),
+        "WikipediaSearch": _SyncTool("WikipediaSearch", "wiki result", delay=1.0, log=log),
+        "Specialist_quantum": _SyncTool("Specialist_quantum", "expert result", delay=0.2, topic="量子", log=log),
+        "Specialist_biology": _SyncTool("Specialist_biology", "unrelated", topic="生物", log=log),
+    }
+    rag = _SyncTool("rag", [Document(page_content="rag context")], delay=0.2, log=log)
+    mock_dependencies["tool_belt"].get_tool.side_effect = tools.get
+    mock_dependencies["tool_belt"].get_tools.return_value = list(tools.values())
+    mock_dependencies["retriever"].invoke.side_effect = rag.use
+    mock_dependencies["retrieval_evaluator_agent"].invoke.return_value = {"relevance_score": 9, "completeness_score": 9}
+
+    result = await agent._retrieve("量子コンピュータの現状は？")
+
+    # すべての情報源が、どれかが終わるより前に開始されている
+    first_end = next(i for i, (kind, _) in enumerate(log) if kind == "end")
+    assert {name for kind, name in log[:first_end]} == {"rag", "WebSearch", "WikipediaSearch", "Specialist_quantum"}
+    assert "rag context" in result
+    assert "--- 外部ツール (WebSearch) からの情報 ---\nweb result" in result
+    assert "expert result" in result
+    assert "wiki result" not in result and "unrelated" not in result
+    mock_dependencies["retrieval_evaluator_agent"].invoke.assert_called_once_with(
+        {"query": "量子コンピュータの現状は？", "retrieved_info": result}
+    )
+    mock_dependencies["tool_using_agent"].invoke.assert_not_called()
+    mock_dependencies["query_refinement_agent"].invoke.assert_not_called()
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("anyio_backend", ["asyncio"])
+async def test_fanout_retrieval_refines_query_once_when_evidence_is_insufficient(mock_dependencies):
+    """fanoutモードで集めた情報が不十分と評価された場合、改善したクエリでRAG検索が1回だけやり直されることをテストする"""
+    agent = CognitiveLoopAgent(**mock_dependencies, retrieval_mode="fanout")
+    mock_dependencies["tool_belt"].get_tool.return_value = None
+    mock_dependencies["tool_belt"].get_tools.return_value = []
+    mock_dependencies["retriever"].invoke.side_effect = lambda query: [Document(page_content=f"context for {query}")]
+    mock_dependencies["retrieval_evaluator_agent"].invoke.return_value = {
+        "relevance_score": 3, "completeness_score": 2, "summary": "不足", "suggestions": "具体化する"
+    }
+    mock_dependencies["query_refinement_agent"].invoke.return_value = "改善したクエリ"
+
+    result = await agent._retrieve("元のクエリ")
+
+    assert result == "context for 元のクエリ\n\ncontext for 改善したクエリ"
+    mock_dependencies["query_refinement_agent"].invoke.assert_called_once_with(
+        {"query": "元のクエリ", "evaluation_summary": "不足", "suggestions": "具体化する"}
+    )
+    mock_dependencies["retrieval_evaluator_agent"].invoke.assert_called_once()
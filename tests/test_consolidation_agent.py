@@ -0,0 +1,147 @@
+# /tests/test_consolidation_agent.py
+# title: 記憶統合エージェントのテスト
+# role: ConsolidationAgentの記憶統合サイクルが、複数セッションをバッチにまとめて並行に統合し、知識グラフとナレッジベースへ一括で書き込むことを検証する。
+
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import MagicMock
+
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from app.agents.consolidation_agent import ConsolidationAgent
+from app.knowledge_graph.models import KnowledgeGraph, Node
+from app.memory.consolidation_manifest import ConsolidationManifest
+
+
+def _make_agent(tmp_path, llm, **kwargs):
+    session_dir = tmp_path / "sessions"
+    session_dir.mkdir()
+    memory_consolidator = MagicMock()
+    memory_consolidator.working_memory_log_dir = str(session_dir)
+    prompt_manager = MagicMock()
+    prompt_manager.get_prompt.return_value = PromptTemplate.from_template("{prediction_errors}")
+    knowledge_graph_agent = MagicMock()
+    knowledge_graph_agent.invoke.side_effect = lambda data: KnowledgeGraph(
+        nodes=[Node(id=data["text_chunk"][:8], label="Concept")], edges=[]
+    )
+    agent = ConsolidationAgent(
+        llm=RunnableLambda(llm),
+        output_parser=RunnableLambda(lambda text: text),
+        knowledge_base=MagicMock(),
+        knowledge_graph_agent=knowledge_graph_agent,
+        memory_consolidator=memory_consolidator,
+        persistent_knowledge_graph=MagicMock(),
+        prompt_manager=prompt_manager,
+        session_manifest=ConsolidationManifest(db_path=str(tmp_path / "manifest.sqlite3")),
+        **kwargs,
+    )
+    return agent, session_dir
+
+
+def _write_session(session_dir, session_id, errors):
+    with open(session_dir / f"{session_id}.json", "w", encoding="utf-8") as f:
+        json.dump({"session_id": session_id, "prediction_errors": errors, "context_summary": ""}, f, ensure_ascii=False)
+
+
+def test_consolidation_cycle_batches_sessions_and_writes_once(tmp_path):
+    """複数セッションの予測誤差が1回のLLM呼び出しにまとめられ、知識グラフの保存とドキュメント追加が1回ずつになることをテストする"""
+    prompts = []
+
+    def llm(prompt_value):
+        text = prompt_value.to_string()
+        prompts.append(text)
+        return f"事実: {len(json.loads(text))}件"
+
+    agent, session_dir = _make_agent(tmp_path, llm, max_batch_chars=10000)
+    for i in range(5):
+        _write_session(session_dir, f"s{i}", [{"summary": f"誤差{i}"}])
+    _write_session(session_dir, "empty", [])
+
+    agent.run_consolidation_cycle()
+
+    assert len(prompts) == 1
+    assert "誤差0" in prompts[0] and "誤差4" in prompts[0]
+    agent.persistent_knowledge_graph.merge.assert_called_once()
+    agent.persistent_knowledge_graph.save.assert_called_once()
+    agent.knowledge_base.add_documents.assert_called_once()
+    assert os.listdir(session_dir) == []
+    assert agent.session_manifest.get_counts() == {"done": 6}
+
+
+def test_consolidation_cycle_splits_batches_and_retries_failures(tmp_path):
+    """文字数の上限でバッチが分割され、失敗したバッチのセッションが次回に残されることをテストする"""
+    def llm(prompt_value):
+        text = prompt_value.to_string()
+        if "失敗" in text:
+            raise RuntimeError("LLM error")
+        return "事実"
+
+    agent, session_dir = _make_agent(tmp_path, llm, max_batch_chars=30, max_concurrency=2, max_sessions_per_cycle=3)
+    _write_session(session_dir, "a", [{"summary": "成功する誤差"}])
+    _write_session(session_dir, "b", [{"summary": "失敗する誤差"}])
+    _write_session(session_dir, "c", [{"summary": "成功する誤差"}])
+    _write_session(session_dir, "d", [{"summary": "次のサイクル"}])
+
+    agent.run_consolidation_cycle()
+
+    assert sorted(os.listdir(session_dir)) == ["b.json", "d.json"]
+    assert agent.persistent_knowledge_graph.merge.call_count == 2
+    agent.persistent_knowledge_graph.save.assert_called_once()
+    agent.knowledge_base.add_documents.assert_called_once()
+    assert agent.session_manifest.get_counts() == {"done": 2, "pending": 2}
+
+
+def test_manifest_claims_are_exclusive_and_failures_are_bounded(tmp_path):
+    """同時に取得したワーカーが同じセッションを受け取らず、失敗したセッションが試行回数の上限でfailedになることをテストする"""
+    legacy_log = tmp_path / "processed_sessions.log"
+    legacy_log.write_text("old.json\n", encoding="utf-8")
+    manifest = ConsolidationManifest(db_path=str(tmp_path / "manifest.sqlite3"), legacy_log_path=str(legacy_log), max_attempts=2)
+    for i in range(20):
+        manifest.register(f"s{i:02d}.json")
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        claims = list(executor.map(lambda worker: manifest.claim(5, f"worker-{worker}"), range(4)))
+
+    claimed = [session_file for claim in claims for session_file in claim]
+    assert sorted(claimed) == [f"s{i:02d}.json" for i in range(20)]
+    assert manifest.get_counts() == {"done": 1, "processing": 20}
+
+    manifest.mark_done(claimed[1:])
+    manifest.mark_failed(claimed[:1], "LLM error")
+    assert manifest.claim(10, "worker-0") == claimed[:1]
+    manifest.mark_failed(claimed[:1], "LLM error")
+    assert manifest.claim(10, "worker-0") == []
+    assert manifest.get_counts() == {"done": 20, "failed": 1}
+
+    # 統合済みのセッションが新しい内容で書き直された場合は、再び統合待ちになる
+    manifest.register(claimed[1])
+    assert manifest.claim(10, "worker-0") == [claimed[1]]
+
+
+def test_sessions_are_finished_once_merged_even_if_documents_fail(tmp_path):
+    """グラフのマージ後にナレッジベースへの追加が失敗しても、セッションが完了となり再マージされないことをテストする"""
+    agent, session_dir = _make_agent(tmp_path, lambda prompt_value: "事実")
+    agent.knowledge_base.add_documents.side_effect = RuntimeError("FAISS error")
+    _write_session(session_dir, "a", [{"summary": "誤差"}])
+
+    agent.run_consolidation_cycle()
+    agent.run_consolidation_cycle()
+
+    agent.persistent_knowledge_graph.merge.assert_called_once()
+    assert os.listdir(session_dir) == []
+    assert agent.session_manifest.get_counts() == {"done": 1}
+
+
+def test_failed_merge_leaves_sessions_for_retry(tmp_path):
+    """知識グラフのマージが失敗したセッションは完了にならず、次回以降に再試行されることをテストする"""
+    agent, session_dir = _make_agent(tmp_path, lambda prompt_value: "事実")
+    agent.persistent_knowledge_graph.merge.side_effect = RuntimeError("merge error")
+    _write_session(session_dir, "a", [{"summary": "誤差"}])
+
+    agent.run_consolidation_cycle()
+
+    assert os.listdir(session_dir) == ["a.json"]
+    agent.persistent_knowledge_graph.save.assert_not_called()
+    assert agent.session_manifest.get_counts() == {"pending": 1}
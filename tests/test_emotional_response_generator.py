@@ -0,0 +1,70 @@
+# /tests/test_emotional_response_generator.py
+# title: 感情応答生成エージェントのテスト
+# role: EmotionalResponseGeneratorが感情の強さに応じて、調整なし・定型文による調整・LLMによる書き換えを選び、省略による節約時間を報告することを検証する。
+
+import asyncio
+import time
+
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from app.affective_system.affective_state import AffectiveState, Emotion
+from app.affective_system.emotional_response_generator import EmotionalResponseGenerator
+
+
+def _make_generator(calls, **kwargs):
+    def llm(prompt_value):
+        calls.append(prompt_value.to_string())
+        time.sleep(0.01)
+        return "書き換えた回答"
+
+    return EmotionalResponseGenerator(
+        llm=RunnableLambda(llm),
+        output_parser=RunnableLambda(lambda text: text),
+        prompt_template=PromptTemplate.from_template("{final_answer}/{emotion}"),
+        **kwargs,
+    )
+
+
+def _input(answer, state):
+    return {"final_answer": answer, "affective_state": state, "emotion": state.emotion.value, "intensity": state.intensity, "reason": state.reason}
+
+
+def test_rewrite_is_reserved_for_strong_emotions():
+    """平静・弱い感情では書き換えず、中程度では定型文を添え、強い感情でのみLLMを呼び出すことをテストする"""
+    calls = []
+    generator = _make_generator(calls, min_intensity=0.3, rewrite_intensity=0.8)
+
+    calm = generator.generate(_input("回答", AffectiveState()))
+    weak = generator.generate(_input("回答", AffectiveState(emotion=Emotion.ANXIOUS, intensity=0.2)))
+    adjusted = generator.generate(_input("回答", AffectiveState(emotion=Emotion.EMPATHETIC, intensity=0.7)))
+    rewritten = generator.generate(_input("回答", AffectiveState(emotion=Emotion.FRUSTRATED, intensity=0.8)))
+
+    assert (calm.mode, calm.text) == ("skip", "回答")
+    assert (weak.mode, weak.text) == ("skip", "回答")
+    assert adjusted.mode == "adjust"
+    assert "回答" in adjusted.text and adjusted.text != "回答"
+    assert (rewritten.mode, rewritten.text) == ("rewrite", "書き換えた回答")
+    assert calls == ["回答/不満・苛立ち"]
+
+
+def test_skipped_rewrites_report_time_saved_from_observed_rewrites():
+    """書き換えを省略した際の節約時間が、実際の書き換えの所要時間から見積もられることをテストする"""
+    calls = []
+    generator = _make_generator(calls, fallback_chars_per_second=1e9)
+    answer = "あ" * 100
+
+    async def scenario():
+        before = await generator.agenerate(_input(answer, AffectiveState()))
+        rewritten = await generator.agenerate(_input(answer, AffectiveState(emotion=Emotion.FRUSTRATED, intensity=0.9)))
+        after = await generator.agenerate(_input(answer, AffectiveState()))
+        return before, rewritten, after
+
+    before, rewritten, after = asyncio.run(scenario())
+
+    assert before.estimated_seconds_saved < 0.001
+    assert rewritten.estimated_seconds_saved == 0.0
+    assert after.estimated_seconds_saved >= 0.005
+    stats = generator.get_stats()
+    assert (stats["skip"], stats["adjust"], stats["rewrite"]) == (2, 0, 1)
+    assert stats["estimated_seconds_saved"] >= after.estimated_seconds_saved
@@ -0,0 +1,78 @@
+# /tests/test_episodic_memory.py
+# title: エピソード記憶のテスト
+# role: EpisodicMemoryの逐次的な埋め込みと類似検索、永続化、質問のクラスタリング、検索の時間予算を検証する。
+
+import asyncio
+import time
+
+import numpy as np
+
+from app.memory.episodic_memory import EpisodicMemory
+from app.memory.memory_consolidator import MemoryConsolidator
+
+_VOCABULARY = ["天気", "雨", "晴れ", "料理", "レシピ", "カレー", "物理", "重力"]
+
+
+def _embed(texts):
+    """語彙の出現回数を並べた決定的な埋め込み。"""
+    return np.array([[text.count(word) + 0.01 * i for i, word in enumerate(_VOCABULARY)] for text in texts], dtype="float32")
+
+
+def test_logged_records_are_embedded_and_searchable(tmp_path, monkeypatch):
+    """記録された対話と自律思考が埋め込まれ、類似検索と永続化ができることをテストする"""
+    monkeypatch.chdir(tmp_path)
+    index_path = str(tmp_path / "episodic.faiss")
+    memory = EpisodicMemory(_embed, index_path=index_path)
+    consolidator = MemoryConsolidator(log_file_path=str(tmp_path / "memory" / "session_memory.jsonl"), episodic_memory=memory)
+    consolidator.log_interaction("明日の天気は雨ですか", "晴れの予報です")
+    consolidator.log_interaction("カレーのレシピを教えて", "材料は...")
+    consolidator.log_autonomous_thought("physics", "重力と物理の関係")
+    consolidator.log_event("ignored", {})
+    memory.flush()
+
+    assert memory.size == 3
+    assert memory.search("天気と雨", k=1)[0]["record"]["query"] == "明日の天気は雨ですか"
+    assert memory.search("重力", k=1, types=["autonomous_thought"])[0]["record"]["topic"] == "physics"
+    assert memory.search("重力", k=5, types=["missing"]) == []
+
+    memory.close()
+    reloaded = EpisodicMemory(_embed, index_path=index_path)
+    assert reloaded.size == 3
+    assert reloaded.search("レシピ", k=1)[0]["record"]["query"] == "カレーのレシピを教えて"
+    reloaded.close()
+
+
+def test_queries_are_clustered_by_embedding(tmp_path):
+    """質問が埋め込みでクラスタリングされ、件数の多い順に代表的な質問が返ることをテストする"""
+    memory = EpisodicMemory(_embed, index_path=str(tmp_path / "episodic.faiss"))
+    for i in range(6):
+        memory.add({"type": "interaction", "query": f"天気 雨 {i}"})
+    for i in range(3):
+        memory.add({"type": "interaction", "query": f"料理 カレー {i}"})
+    memory.flush()
+
+    clusters = memory.cluster("interaction", num_clusters=2)
+
+    assert [cluster["size"] for cluster in clusters] == [6, 3]
+    assert "天気" in clusters[0]["representative"]["query"]
+    assert "カレー" in clusters[1]["representative"]["query"]
+    memory.close()
+
+
+def test_async_search_respects_latency_budget(tmp_path):
+    """検索が時間予算を超えた場合に空の結果を返すことをテストする"""
+    slow = {"enabled": False}
+
+    def embed(texts):
+        if slow["enabled"]:
+            time.sleep(0.5)
+        return _embed(texts)
+
+    memory = EpisodicMemory(embed, index_path=str(tmp_path / "episodic.faiss"), search_timeout_seconds=0.05)
+    memory.add({"type": "interaction", "query": "天気"})
+    memory.flush()
+
+    assert len(asyncio.run(memory.asearch("天気", k=1))) == 1
+    slow["enabled"] = True
+    assert asyncio.run(memory.asearch("天気", k=1)) == []
+    memory.close()
@@ -28,6 +28,7 @@ from app.memory.memory_consolidator import MemoryConsolidator
 from app.meta_intelligence.self_improvement.evolution import SelfEvolvingSystem
 from app.analytics.collector import AnalyticsCollector
 from app.models import OrchestrationDecision, MasterAgentResponse
+from app.analytics.feedback_store import DeferredFeedbackStore
 
 
 # --- FullPipelineの依存関係のモックのためのダミークラス ---
@@ -154,5 +155,89 @@ class TestFullPipeline(unittest.IsolatedAsyncioTestCase):
         # 内部エージェントの検証は、各エージェントの単体テストや、FullPipelineの__init__が実際に呼び出されるような
         # より上位の統合テストで行われるべきです。
 
+
+class TestFullPipelineReview(unittest.IsolatedAsyncioTestCase):
+    """FullPipelineの自己批判・問題発見の実行方法のテスト"""
+
+    def _make_pipeline(self, **kwargs) -> FullPipeline:
+        self.started: List[str] = []
+        self.release = asyncio.Event()
+
+        async def slow_critique(**_):
+            self.started.append("critique")
+            await self.release.wait()
+            return "Critique"
+
+        async def slow_discovery(_):
+            self.started.append("problems")
+            await self.release.wait()
+            return ["Problem A"]
+
+        planning_agent = MagicMock(spec=PlanningAgent)
+        planning_agent.invoke.return_value = "Plan"
+        cognitive_loop_agent = MagicMock(spec=CognitiveLoopAgent)
+        cognitive_loop_agent.ainvoke = AsyncMock(return_value="Loop Output")
+        master_agent = MagicMock(spec=MasterAgent)
+        master_agent.generate_final_answer_async = AsyncMock(return_value="Final Answer")
+        master_agent.run_internal_maintenance_async = AsyncMock()
+        meta_cognitive_engine = MagicMock(spec=MetaCognitiveEngine)
+        meta_cognitive_engine.acritique_process_and_response = AsyncMock(side_effect=slow_critique)
+        problem_discovery_agent = MagicMock(spec=ProblemDiscoveryAgent)
+        problem_discovery_agent.ainvoke = AsyncMock(side_effect=slow_discovery)
+        self.self_evolving_system = MagicMock(spec=SelfEvolvingSystem)
+        self.self_evolving_system.collect_execution_trace = AsyncMock()
+        self.analytics_collector = MagicMock(spec=AnalyticsCollector)
+        self.analytics_collector.log_event = AsyncMock()
+        return FullPipeline(
+            master_agent=master_agent,
+            planning_agent=planning_agent,
+            cognitive_loop_agent=cognitive_loop_agent,
+            meta_cognitive_engine=meta_cognitive_engine,
+            problem_discovery_agent=problem_discovery_agent,
+            memory_consolidator=MagicMock(spec=MemoryConsolidator),
+            self_evolving_system=self.self_evolving_system,
+            analytics_collector=self.analytics_collector,
+            **kwargs,
+        )
+
+    def _decision(self) -> OrchestrationDecision:
+        return OrchestrationDecision(reasoning="test", chosen_mode="full", confidence_score=0.9)
+
+    async def test_critique_and_problem_discovery_run_concurrently(self):
+        """自己批判と問題発見が、互いの完了を待たずに両方とも開始されることを確認する。"""
+        pipeline = self._make_pipeline()
+        run = asyncio.create_task(pipeline.arun("質問", self._decision()))
+        for _ in range(20):
+            if len(self.started) == 2:
+                break
+            await asyncio.sleep(0)
+        self.assertCountEqual(self.started, ["critique", "problems"])
+        self.release.set()
+        response = await run
+
+        self.assertEqual(response.self_criticism, "Critique")
+        self.assertEqual(response.potential_problems, "Problem A")
+        self.assertIsNone(response.feedback_id)
+
+    async def test_deferred_mode_returns_before_feedback_is_ready(self):
+        """遅延配信モードでは回答を先に返し、フィードバックは後からストアに格納されることを確認する。"""
+        store = DeferredFeedbackStore()
+        pipeline = self._make_pipeline(feedback_delivery="deferred", feedback_store=store)
+
+        response = await pipeline.arun("質問", self._decision())
+
+        self.assertEqual(response.final_answer, "Final Answer")
+        self.assertEqual(store.get(response.feedback_id)["status"], "pending")
+        self.release.set()
+        for _ in range(20):
+            if self.self_evolving_system.collect_execution_trace.await_count:
+                break
+            await asyncio.sleep(0)
+        feedback = store.get(response.feedback_id)
+        self.assertEqual(feedback["status"], "ready")
+        self.assertEqual(feedback["self_criticism"], "Critique")
+        self.assertEqual(feedback["potential_problems"], "Problem A")
+        self.analytics_collector.log_event.assert_any_await("deferred_feedback", feedback)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,62 @@
+# /tests/test_integrity_monitor.py
+# title: 整合性モニターのテスト
+# role: IntegrityMonitorが応答生成の経路ではキャッシュを返し、整合性チェックのLLM呼び出しをバックグラウンドで行うことを検証する。
+
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+
+from langchain_core.runnables import RunnableLambda
+
+from app.digital_homeostasis.integrity_monitor import IntegrityMonitor
+
+
+def _make_monitor(llm_calls, result="問題なし"):
+    def llm(prompt_value):
+        llm_calls.append(prompt_value)
+        return result
+
+    knowledge_graph = MagicMock()
+    knowledge_graph.version = 1
+    knowledge_graph.get_graph_string.return_value = "Node(A)"
+    analytics_collector = MagicMock()
+    analytics_collector.log_event = AsyncMock()
+    return IntegrityMonitor(llm=RunnableLambda(llm), knowledge_graph=knowledge_graph, analytics_collector=analytics_collector, status_ttl_seconds=600)
+
+
+def test_health_status_is_served_from_cache_and_refreshed_in_background():
+    """ステータスの取得がLLMを待たずにキャッシュを返し、古くなった場合だけバックグラウンドで更新されることをテストする"""
+    llm_calls = []
+    monitor = _make_monitor(llm_calls, result="ノードAに矛盾があります")
+
+    async def scenario():
+        first = await monitor.get_health_status()
+        assert first == {"is_healthy": True, "inconsistencies": [], "last_checked": None}
+        assert llm_calls == []
+        await monitor._refresh_task
+
+        cached = await monitor.get_health_status()
+        assert cached["is_healthy"] is False
+        assert monitor._refresh_task.done()
+        assert len(llm_calls) == 1
+
+        # 知識グラフのバージョンが変わるとバックグラウンドで再チェックされる
+        monitor.knowledge_graph.version = 2
+        await monitor.get_health_status()
+        await monitor._refresh_task
+        assert len(llm_calls) == 2
+        assert await monitor.refresh_if_needed() is None
+
+    asyncio.run(scenario())
+    monitor.analytics_collector.log_event.assert_awaited_with("integrity_status", monitor._status)
+
+
+def test_health_status_expires_after_ttl():
+    """TTLを過ぎたステータスが古いとみなされることをテストする"""
+    llm_calls = []
+    monitor = _make_monitor(llm_calls)
+    asyncio.run(monitor.refresh_if_needed())
+    assert not monitor.needs_refresh()
+
+    monitor._status["last_checked"] -= 601
+
+    assert monitor.needs_refresh()
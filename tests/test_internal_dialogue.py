@@ -0,0 +1,99 @@
+# /tests/test_internal_dialogue.py
+# title: 内省的対話のテスト
+# role: ConsciousnessStagingAreaがラウンド内の発言を並行して生成すること、発言が収束したら調停者を呼ばずに終えること、
+#       プロンプトに渡す議論が要約により上限内に収まることを検証する。
+
+import asyncio
+
+import numpy as np
+from langchain_core.runnables import RunnableLambda
+
+from app.internal_dialogue.consciousness_staging_area import ConsciousnessStagingArea
+from app.internal_dialogue.mediator_agent import MediatorAgent
+
+PARTICIPANTS = [
+    {"name": "楽観主義者", "persona": "楽観的な視点を持つ"},
+    {"name": "現実主義者", "persona": "現実的な視点を持つ"},
+    {"name": "批評家", "persona": "批判的な視点を持つ"},
+]
+
+
+class _DialogueLLM:
+    def __init__(self, statement_chars=20):
+        self.statement_chars = statement_chars
+        self.turn_prompts = []
+        self.summary_calls = 0
+        self.active = 0
+        self.peak = 0
+
+    async def __call__(self, prompt_value):
+        text = prompt_value.to_string()
+        if "新しい要約" in text:
+            self.summary_calls += 1
+            return "要約"
+        self.turn_prompts.append(text)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return "意" * self.statement_chars
+
+
+def _make_area(llm, mediator_reply, **kwargs):
+    mediator_calls = []
+
+    async def mediate(prompt_value):
+        mediator_calls.append(prompt_value.to_string())
+        return mediator_reply
+
+    mediator = MediatorAgent(llm=RunnableLambda(lambda _: None, afunc=mediate))
+    area = ConsciousnessStagingArea(llm=RunnableLambda(lambda _: None, afunc=llm), mediator_agent=mediator, **kwargs)
+    return area, mediator_calls
+
+
+def test_participants_in_a_round_speak_concurrently():
+    """1つのラウンドの発言が並行して生成され、調停者が結論を促したら対話が終わることをテストする"""
+    llm = _DialogueLLM()
+    area, mediator_calls = _make_area(llm, "それでは意見を統合して結論を出してください。")
+
+    summary = area.run_dialogue("新規事業を始めるべきか", PARTICIPANTS, max_turns=3)
+
+    assert llm.peak == len(PARTICIPANTS)
+    assert len(mediator_calls) == 1
+    assert area.last_stats["rounds"] == 1
+    assert summary.count("@") == len(PARTICIPANTS) + 1
+
+
+def test_converged_round_skips_the_mediator():
+    """ラウンドの発言の埋め込みが一致していれば、調停者を呼ばずに対話を終えることをテストする"""
+    llm = _DialogueLLM()
+    area, mediator_calls = _make_area(
+        llm, "@批評家さん、どう思いますか？",
+        embed_fn=lambda texts: np.ones((len(texts), 4)), convergence_threshold=0.9,
+    )
+
+    area.run_dialogue("新規事業を始めるべきか", PARTICIPANTS, max_turns=3)
+
+    assert mediator_calls == []
+    assert area.last_stats["converged"] is True
+    assert area.last_stats["mediator_skipped"] == 1
+
+
+def test_old_turns_are_folded_into_a_bounded_summary():
+    """対話が長くなっても、古い発言が要約に畳み込まれてプロンプトの議論が上限内に収まることをテストする"""
+    llm = _DialogueLLM(statement_chars=100)
+    max_history_chars = 400
+    area, mediator_calls = _make_area(
+        llm, "全員、もう一度意見を述べてください。",
+        max_history_chars=max_history_chars, keep_recent_turns=2,
+    )
+
+    area.run_dialogue("新規事業を始めるべきか", PARTICIPANTS, max_turns=4)
+
+    assert len(mediator_calls) == 4
+    assert llm.summary_calls > 0
+    assert area.last_stats["summarized_turns"] > 0
+    assert len(area.dialogue_history) == 5 * len(PARTICIPANTS) + 4
+    for prompt in llm.turn_prompts:
+        history = prompt.split("これまでの議論:")[1].split("---")[0].strip()
+        assert len(history) <= max_history_chars
@@ -0,0 +1,131 @@
+# /tests/test_iterative_correction_pipeline.py
+# title: 反復的修正パイプラインのテスト
+# role: 並列モードで修正候補がサンドボックスで並行して検証され、最初に合格した候補が採用されて残りが停止されること、
+#       テストコードがない場合のautoモードがLLMによる逐次検証を使うこと、/chatで渡したテストコードが並列検証に使われることを検証する。
+
+import asyncio
+import os
+import threading
+from unittest.mock import AsyncMock, MagicMock
+
+from app.api import chat
+from app.engine.engine import MetaIntelligenceEngine
+from app.models import ChatRequest, OrchestrationDecision
+from app.pipelines.iterative_correction_pipeline import IterativeCorrectionPipeline
+from app.sandbox.candidate_verifier import SandboxCandidateVerifier, extract_code
+
+
+class _FakeSandboxManager:
+    """solution.pyに"GOOD"を含む候補を合格とし、"SLOW"を含む候補は停止されるまで終わらない使い捨てコンテナの代わり。"""
+    def __init__(self, shared_dir):
+        self.shared_dir_host_abs_path = shared_dir
+        self.commands = []
+        self.killed = []
+        self._stopped = {}
+        self._lock = threading.Lock()
+
+    def run_ephemeral(self, command, work_dir_host_path, name, timeout_seconds=60):
+        with open(os.path.join(work_dir_host_path, "solution.py"), encoding="utf-8") as f:
+            code = f.read()
+        with self._lock:
+            self.commands.append((command, os.path.exists(os.path.join(work_dir_host_path, "test_solution.py"))))
+            stopped = self._stopped.setdefault(name, threading.Event())
+        if "SLOW" in code:
+            if stopped.wait(timeout=5):
+                return 137, "killed"
+            return 1, "timeout"
+        return (0, "1 passed") if "GOOD" in code else (1, "1 failed")
+
+    def kill_ephemeral(self, name):
+        with self._lock:
+            self.killed.append(name)
+            self._stopped.setdefault(name, threading.Event()).set()
+
+
+def _pipeline(tmp_path, fixes, mode="parallel"):
+    manager = _FakeSandboxManager(str(tmp_path))
+    agent = MagicMock()
+    remaining = list(fixes)
+
+    async def generate(input_data):
+        return remaining.pop(0)
+
+    agent.ainvoke.side_effect = generate
+    verifier_agent = MagicMock()
+    verifier_agent.invoke.return_value = {"is_correct": True}
+    agent.invoke.return_value = "serial fix"
+    pipeline = IterativeCorrectionPipeline(
+        speculative_correction_agent=agent,
+        step_by_step_verifier_agent=verifier_agent,
+        candidate_verifier=SandboxCandidateVerifier(manager, max_parallel=3),
+        mode=mode,
+        num_candidates=len(fixes),
+    )
+    return pipeline, manager, agent, verifier_agent
+
+
+def _decision(**parameters):
+    return OrchestrationDecision(reasoning="テスト", chosen_mode="iterative_correction", confidence_score=1.0, parameters=parameters)
+
+
+def test_extract_code_prefers_fenced_block():
+    """LLMの出力にコードブロックがあれば、その中身だけを取り出すことをテストする"""
+    assert extract_code("修正案です。\n```python\nprint(1)\n```\n以上") == "print(1)\n"
+    assert extract_code("print(2)") == "print(2)\n"
+
+
+def test_parallel_mode_returns_first_passing_candidate_and_stops_the_rest(tmp_path):
+    """候補が並行して検証され、合格した候補が採用されて、検証中の残りの候補のコンテナが停止されることをテストする"""
+    fixes = ["```python\nSLOW = 1\n```", "```python\nBAD = 1\n```", "```python\nGOOD = 1\n```"]
+    pipeline, manager, _, verifier_agent = _pipeline(tmp_path, fixes)
+
+    response = pipeline.run("BUGGY = 1", _decision(test_code="def test_ok():\n    assert True\n"))
+
+    assert response.final_answer == "GOOD = 1\n"
+    assert "FAIL" in response.retrieved_info and "PASS" in response.retrieved_info
+    assert len(manager.killed) >= 1
+    assert all(has_tests for _, has_tests in manager.commands)
+    verifier_agent.invoke.assert_not_called()
+    # 候補ごとの作業ディレクトリは検証後に削除される
+    assert os.listdir(os.path.join(tmp_path, "candidates")) == []
+
+
+def test_parallel_mode_reports_when_no_candidate_passes(tmp_path):
+    """合格した候補がない場合、検証に合格していないことを報告することをテストする"""
+    pipeline, manager, _, _ = _pipeline(tmp_path, ["BAD = 1", "BAD = 2"])
+
+    response = pipeline.run("BUGGY = 1", _decision())
+
+    assert "合格した候補はありませんでした" in response.self_criticism
+    assert response.final_answer in ("BAD = 1\n", "BAD = 2\n")
+    assert not any(has_tests for _, has_tests in manager.commands)
+
+
+def test_auto_mode_without_tests_uses_serial_llm_verification(tmp_path):
+    """autoモードでテストコードがなければ、LLMによる逐次検証を使うことをテストする"""
+    pipeline, manager, agent, verifier_agent = _pipeline(tmp_path, ["GOOD = 1"], mode="auto")
+
+    response = pipeline.run("BUGGY = 1", _decision())
+
+    assert response.final_answer == "serial fix"
+    verifier_agent.invoke.assert_called_once()
+    agent.ainvoke.assert_not_called()
+    assert manager.commands == []
+
+
+def test_chat_request_test_code_reaches_the_parallel_sandbox_race(tmp_path):
+    """/chatのリクエストで渡したテストコードがエンジンを経てパイプラインに届き、autoモードで候補がテスト付きで並列検証されることをテストする"""
+    pipeline, manager, _, verifier_agent = _pipeline(tmp_path, ["BAD = 1", "GOOD = 1"], mode="auto")
+    arbiter = MagicMock()
+    arbiter.arbitrate.side_effect = lambda decision: decision
+    engine = MetaIntelligenceEngine(pipelines={"simple": MagicMock(), "iterative_correction": pipeline}, resource_arbiter=arbiter)
+    orchestration_agent = MagicMock()
+    orchestration_agent.arun = AsyncMock(return_value=_decision())
+    request = ChatRequest(query="BUGGY = 1", session_id="s1", test_code="def test_ok():\n    assert True\n")
+
+    response = asyncio.run(chat(request, engine=engine, orchestration_agent=orchestration_agent))
+
+    assert response.final_answer == "GOOD = 1\n"
+    assert response.session_id == "s1"
+    assert manager.commands and all(has_tests for _, has_tests in manager.commands)
+    verifier_agent.invoke.assert_not_called()
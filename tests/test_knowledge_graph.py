@@ -0,0 +1,472 @@
+# /tests/test_knowledge_graph.py
+# title: 知識グラフユニットテスト
+# role: PersistentKnowledgeGraph、エンティティ解決、スナップショット保存のユニットテスト
+
+import threading
+
+import numpy as np
+import pytest
+
+from app.exceptions import KnowledgeGraphError
+from app.knowledge_graph.models import Node, Edge, KnowledgeGraph, LazyModelList
+from app.knowledge_graph.persistent_knowledge_graph import PersistentKnowledgeGraph
+from app.knowledge_graph.entity_resolution import EntityResolver, normalize_entity_name
+from app.knowledge_graph.columnar import ColumnarGraphStore
+from app.knowledge_graph.retention import ColdStorageArchive, GraphRetentionPolicy
+from app.knowledge_graph.serialization import load_knowledge_graph, save_knowledge_graph
+
+
+def _fake_embed(texts):
+    """正規化キーの先頭文字で決まる簡易的な埋め込み（同じ先頭文字なら同一方向）"""
+    vectors = np.zeros((len(texts), 8), dtype="float32")
+    for i, text in enumerate(texts):
+        vectors[i, ord(normalize_entity_name(text)[0]) % 8] = 1.0
+    return vectors
+
+
+@pytest.fixture
+def storage_path(tmp_path):
+    return str(tmp_path / "knowledge_graph.kgs")
+
+
+def test_normalize_entity_name_handles_width_case_and_kana():
+    """全角/半角、大文字小文字、ひらがな/カタカナ、括弧書きの揺れが同じキーに正規化されることをテストする"""
+    assert normalize_entity_name("ＩＴＥＲ") == normalize_entity_name("iter")
+    assert normalize_entity_name("さんま") == normalize_entity_name("サンマ")
+    assert normalize_entity_name("サンマ (Pacific Saury)") == normalize_entity_name("サンマ")
+    assert normalize_entity_name("fusion_energy") == normalize_entity_name("Fusion Energy")
+
+
+def test_merge_resolves_normalized_duplicates_and_repoints_edges(storage_path):
+    """表記揺れのある新規ノードが既存ノードに統合され、エッジが付け替えられることをテストする"""
+    kg = PersistentKnowledgeGraph(storage_path=storage_path, entity_resolver=EntityResolver())
+    kg.merge(KnowledgeGraph(
+        nodes=[Node(id="サンマ", label="Fish"), Node(id="秋", label="Season")],
+        edges=[Edge(source="サンマ", target="秋", label="旬")],
+    ))
+    kg.merge(KnowledgeGraph(
+        nodes=[Node(id="さんま", label="Fish"), Node(id="秋", label="Season")],
+        edges=[Edge(source="さんま", target="秋", label="旬")],
+    ))
+
+    graph = kg.get_graph()
+    assert [n.id for n in graph.nodes] == ["サンマ", "秋"]
+    assert len(graph.edges) == 1
+    assert graph.edges[0].source == "サンマ"
+    assert graph.edges[0].weight == 2.0
+    assert graph.nodes[0].properties["aliases"] == ["さんま"]
+
+
+def test_compact_merges_embedding_duplicates(storage_path):
+    """コンパクションで埋め込みが近いノードが統合され、自己ループが除去されることをテストする"""
+    kg = PersistentKnowledgeGraph(storage_path=storage_path)
+    kg.merge(KnowledgeGraph(
+        nodes=[Node(id="cat", label="Animal"), Node(id="Cat_Feline", label="Animal"), Node(id="dog", label="Animal")],
+        edges=[
+            Edge(source="cat", target="dog", label="chases"),
+            Edge(source="Cat_Feline", target="dog", label="chases"),
+            Edge(source="cat", target="Cat_Feline", label="same_as"),
+        ],
+    ))
+    kg.entity_resolver = EntityResolver(embed_fn=_fake_embed, similarity_threshold=0.9)
+
+    removed = kg.compact()
+
+    graph = kg.get_graph()
+    assert removed == 1
+    assert sorted(n.id for n in graph.nodes) == ["cat", "dog"]
+    assert len(graph.edges) == 1
+    assert graph.edges[0].weight == 2.0
+
+
+def test_existing_nodes_are_embedded_on_first_merge(storage_path):
+    """起動時に読み込んだ既存ノードも、コンパクションを待たずに最初のマージから埋め込みで照合されることをテストする"""
+    kg = PersistentKnowledgeGraph(storage_path=storage_path)
+    kg.merge(KnowledgeGraph(nodes=[Node(id="cat", label="Animal")]))
+    kg.save()
+    calls = []
+    resolver = EntityResolver(embed_fn=lambda texts: calls.append(list(texts)) or _fake_embed(texts), similarity_threshold=0.9)
+    kg = PersistentKnowledgeGraph(storage_path=storage_path, entity_resolver=resolver)
+    assert calls == []
+
+    kg.merge(KnowledgeGraph(nodes=[Node(id="Cat_Feline", label="Animal")]))
+
+    assert [n.id for n in kg.get_graph().nodes] == ["cat"]
+    assert calls[0] == ["cat"]
+
+
+def test_failed_merge_leaves_no_stale_resolver_entries(storage_path, monkeypatch):
+    """公開前に失敗したマージの新規ノードが、エンティティ解決のインデックスに残らないことをテストする"""
+    kg = PersistentKnowledgeGraph(storage_path=storage_path, entity_resolver=EntityResolver())
+    monkeypatch.setattr(kg, "_publish", lambda nodes, edges: (_ for _ in ()).throw(RuntimeError("公開に失敗")))
+    with pytest.raises(RuntimeError):
+        kg.merge(KnowledgeGraph(nodes=[Node(id="サンマ", label="Fish")]))
+    monkeypatch.undo()
+
+    kg.merge(KnowledgeGraph(nodes=[Node(id="さんま", label="Fish")]))
+
+    assert [n.id for n in kg.get_graph().nodes] == ["さんま"]
+
+
+def test_compact_without_resolver_is_noop(storage_path):
+    """エンティティリゾルバーがない場合、コンパクションは何もしないことをテストする"""
+    kg = PersistentKnowledgeGraph(storage_path=storage_path)
+    kg.merge(KnowledgeGraph(nodes=[Node(id="a", label="X"), Node(id="A", label="X")]))
+    assert kg.compact() == 0
+    assert len(kg.get_graph().nodes) == 2
+
+
+def test_snapshot_round_trip_with_lazy_validation(tmp_path):
+    """スナップショットで保存・ロードした内容が一致し、ノードがアクセス時に検証されることをテストする"""
+    graph = KnowledgeGraph(
+        nodes=[Node(id="地球", label="Planet", properties={"半径": 6371}), Node(id="月", label="Satellite")],
+        edges=[Edge(source="月", target="地球", label="orbits", weight=0.5)],
+    )
+    path = str(tmp_path / "kg.kgs")
+    save_knowledge_graph(graph, path)
+
+    loaded = load_knowledge_graph(path)
+    assert isinstance(loaded.nodes, LazyModelList)
+    assert not any(isinstance(n, Node) for n in loaded.nodes.iter_raw())
+    assert loaded.nodes[0] == graph.nodes[0]
+    assert isinstance(list(loaded.nodes.iter_raw())[0], Node)
+    assert loaded.model_dump() == graph.model_dump()
+
+
+@pytest.mark.parametrize("compression", ["zstd", "none"])
+def test_truncated_snapshot_is_reported_instead_of_crashing(tmp_path, compression, caplog):
+    """途中で切れたスナップショットの読み込みがKnowledgeGraphErrorになり、起動時は空のグラフで続行することをテストする"""
+    graph = KnowledgeGraph(
+        nodes=[Node(id=f"node{i}", label="Thing", properties={"text": "x" * 40}) for i in range(20)],
+        edges=[Edge(source=f"node{i}", target=f"node{i + 1}", label="next") for i in range(19)],
+    )
+    path = tmp_path / "kg.kgs"
+    save_knowledge_graph(graph, str(path), compression=compression)
+    data = path.read_bytes()
+
+    for size in (5, 7, len(data) // 2, len(data) - 1):
+        path.write_bytes(data[:size])
+        with pytest.raises(KnowledgeGraphError):
+            load_knowledge_graph(str(path))
+
+    assert PersistentKnowledgeGraph(storage_path=str(path)).get_graph().nodes == []
+    assert "ロードに失敗しました" in caplog.text
+
+
+def test_legacy_json_is_converted_to_snapshot(tmp_path):
+    """スナップショットがない場合、旧形式のJSONから変換してロードされることをテストする"""
+    legacy_path = tmp_path / "kg.json"
+    legacy_path.write_text(KnowledgeGraph(nodes=[Node(id="a", label="X")]).model_dump_json(indent=4), encoding="utf-8")
+    snapshot_path = str(tmp_path / "kg.kgs")
+
+    kg = PersistentKnowledgeGraph(storage_path=snapshot_path, legacy_json_path=str(legacy_path))
+
+    assert [n.id for n in kg.get_graph().nodes] == ["a"]
+    assert [n.id for n in load_knowledge_graph(snapshot_path).nodes] == ["a"]
+
+
+def test_snapshot_is_not_mutated_by_later_writes(storage_path):
+    """取得済みのグラフスナップショットが、その後のマージやアクセス記録で変化しないことをテストする"""
+    kg = PersistentKnowledgeGraph(storage_path=storage_path)
+    kg.merge(KnowledgeGraph(
+        nodes=[Node(id="a", label="X"), Node(id="b", label="X")],
+        edges=[Edge(source="a", target="b", label="rel")],
+    ))
+    snapshot = kg.get_graph()
+    accessed_at = snapshot.nodes[0].metadata["last_accessed"]
+
+    kg.merge(KnowledgeGraph(nodes=[Node(id="c", label="Y")], edges=[Edge(source="a", target="b", label="rel")]))
+    kg.access_node("a")
+
+    assert [n.id for n in snapshot.nodes] == ["a", "b"]
+    assert snapshot.edges[0].weight == 1.0
+    assert snapshot.nodes[0].metadata["last_accessed"] == accessed_at
+    assert kg.get_graph().edges[0].weight == 2.0
+    assert len(kg.get_graph().nodes) == 3
+
+
+def test_concurrent_merges_and_reads_are_consistent(storage_path):
+    """複数スレッドからのマージと読み出し・保存が同時に行われても、更新が失われず読み出しが一貫していることをテストする"""
+    kg = PersistentKnowledgeGraph(storage_path=storage_path)
+    errors = []
+
+    def writer(worker: int):
+        for i in range(50):
+            kg.merge(KnowledgeGraph(
+                nodes=[Node(id=f"w{worker}_{i}", label="X"), Node(id="hub", label="Hub")],
+                edges=[Edge(source=f"w{worker}_{i}", target="hub", label="rel"), Edge(source="hub", target="hub", label="self")],
+            ))
+
+    def reader():
+        try:
+            for _ in range(100):
+                graph = kg.get_graph()
+                ids = {n.id for n in graph.nodes}
+                assert all(e.source in ids and e.target in ids for e in graph.edges)
+                kg.save()
+        except AssertionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(4)] + [threading.Thread(target=reader) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    graph = kg.get_graph()
+    assert not errors
+    assert len(graph.nodes) == 4 * 50 + 1
+    assert len(graph.edges) == 4 * 50 + 1
+    assert next(e for e in graph.edges if e.label == "self").weight == 200.0
+    kg.save()
+    assert len(load_knowledge_graph(storage_path).nodes) == len(graph.nodes)
+
+
+def test_retention_decays_weights_and_evicts_cold_nodes():
+    """重みが半減期で減衰し、上限を超えた場合は最終アクセスが古いノードとその接続エッジが退避されることをテストする"""
+    policy = GraphRetentionPolicy(max_nodes=3, max_edges=10, low_watermark=0.7, half_life_seconds=100, min_edge_weight=0.3)
+    graph = KnowledgeGraph(
+        nodes=[Node(id=f"n{i}", label="X", metadata={"last_accessed": f"2025-01-0{i + 1}T00:00:00"}) for i in range(4)],
+        edges=[
+            Edge(source="n0", target="n3", label="rel", weight=2.0),
+            Edge(source="n2", target="n3", label="rel", weight=4.0),
+            Edge(source="n1", target="n2", label="weak", weight=0.5),
+        ],
+    )
+
+    kept, evicted = policy.apply(graph, elapsed_seconds=100)
+
+    assert [n.id for n in kept.nodes] == ["n2", "n3"]
+    assert [(e.source, e.weight) for e in kept.edges] == [("n2", 2.0)]
+    assert sorted(n.id for n in evicted.nodes) == ["n0", "n1"]
+    assert sorted(e.label for e in evicted.edges) == ["rel", "weak"]
+    assert graph.edges[0].weight == 2.0
+
+
+def test_maintenance_archives_evicted_items_and_restores_them(storage_path, tmp_path):
+    """退避したノードとエッジがコールドストレージに保存され、復元できることをテストする"""
+    kg = PersistentKnowledgeGraph(
+        storage_path=storage_path,
+        retention_policy=GraphRetentionPolicy(max_nodes=2, low_watermark=1.0, half_life_seconds=0),
+        archive=ColdStorageArchive(str(tmp_path / "archive.kgs")),
+    )
+    kg.merge(KnowledgeGraph(
+        nodes=[
+            Node(id="old", label="X", metadata={"last_accessed": "2020-01-01T00:00:00"}),
+            Node(id="hot", label="X"),
+            Node(id="warm", label="X"),
+        ],
+        edges=[Edge(source="old", target="hot", label="rel")],
+    ))
+
+    assert kg.run_maintenance() == {"evicted_nodes": 1, "evicted_edges": 1}
+    assert sorted(n.id for n in kg.get_graph().nodes) == ["hot", "warm"]
+    assert kg.get_graph().edges == []
+
+    assert kg.restore_nodes(["old"]) == 1
+    graph = kg.get_graph()
+    assert sorted(n.id for n in graph.nodes) == ["hot", "old", "warm"]
+    assert [(e.source, e.target) for e in graph.edges] == [("old", "hot")]
+    assert next(n for n in graph.nodes if n.id == "old").metadata["last_accessed"] > "2020-01-01"
+    assert kg.archive.restore(["old"], set()).nodes == []
+
+
+def test_retention_keeps_lazy_rows_unvalidated_and_handles_missing_weights(tmp_path):
+    """保持ポリシーが遅延検証された要素を検証せずに扱い、重みのない旧形式の行を1.0として減衰させることをテストする"""
+    path = str(tmp_path / "kg.kgs")
+    save_knowledge_graph(KnowledgeGraph(
+        nodes=[Node(id=f"n{i}", label="X") for i in range(3)],
+        edges=[Edge(source="n0", target="n1", label="rel"), Edge(source="n1", target="n2", label="rel")],
+    ), path)
+    graph = load_knowledge_graph(path)
+    # 重みを持たない旧形式の行
+    legacy_row = list(graph.edges.raw_at(1))
+    legacy_row[3] = None
+    list.__setitem__(graph.edges, 1, legacy_row)
+
+    kept, evicted = GraphRetentionPolicy(half_life_seconds=100).apply(graph, elapsed_seconds=100)
+
+    assert isinstance(kept.nodes, LazyModelList)
+    assert not any(isinstance(n, Node) for n in kept.nodes.iter_raw())
+    assert not any(isinstance(e, Edge) for e in kept.edges.iter_raw())
+    assert [e.weight for e in kept.edges] == [0.5, 0.5]
+    assert evicted.nodes == [] and evicted.edges == []
+
+
+def test_archive_appends_segments_and_restores_on_new_mention(storage_path, tmp_path):
+    """退避ごとにアーカイブのセグメントが追加され、退避済みのエンティティが再び言及されるとエッジごと復元されることをテストする"""
+    archive_path = tmp_path / "archive" / "kg_archive.kgs"
+    kg = PersistentKnowledgeGraph(
+        storage_path=storage_path,
+        retention_policy=GraphRetentionPolicy(max_nodes=2, low_watermark=1.0, half_life_seconds=0),
+        archive=ColdStorageArchive(str(archive_path)),
+    )
+    for name in ("old", "older"):
+        kg.merge(KnowledgeGraph(
+            nodes=[Node(id=name, label="X", metadata={"last_accessed": "2020-01-01T00:00:00"}), Node(id="hot", label="X"), Node(id="warm", label="X")],
+            edges=[Edge(source=name, target="hot", label="rel")],
+        ))
+        kg.run_maintenance()
+
+    assert sorted(p.name for p in archive_path.parent.iterdir()) == ["kg_archive.kgs.000001", "kg_archive.kgs.000002"]
+    assert kg.archive.archived_node_ids(["old", "older", "hot"]) == ["old", "older"]
+
+    kg.merge(KnowledgeGraph(nodes=[Node(id="old", label="X")]))
+
+    graph = kg.get_graph()
+    assert "old" in {n.id for n in graph.nodes}
+    assert [(e.source, e.target) for e in graph.edges] == [("old", "hot")]
+    assert kg.archive.archived_node_ids(["old", "older"]) == ["older"]
+    assert sorted(p.name for p in archive_path.parent.iterdir()) == ["kg_archive.kgs.000002"]
+
+
+def test_retrieval_mentions_refresh_last_accessed(storage_path):
+    """クエリで言及されたノードのアクセスが、バージョンを変えずに保留され、メンテナンスで最終アクセス日時に反映されることをテストする"""
+    kg = PersistentKnowledgeGraph(storage_path=storage_path)
+    kg.merge(KnowledgeGraph(nodes=[
+        Node(id="地球", label="Planet", metadata={"last_accessed": "2020-01-01T00:00:00"}),
+        Node(id="月", label="Satellite", metadata={"last_accessed": "2020-01-01T00:00:00"}),
+        Node(id="火星", label="Planet", metadata={"last_accessed": "2020-01-01T00:00:00"}),
+        Node(id="Mars Base", label="Place", metadata={"last_accessed": "2020-01-01T00:00:00"}),
+    ]))
+    version = kg.version
+
+    mentioned = kg.find_mentioned_nodes("地球の大気と mars base について")
+    kg.access_nodes(mentioned)
+
+    assert mentioned == ["地球", "Mars Base"]
+    assert kg.version == version
+    assert kg.get_graph().nodes[0].metadata["last_accessed"] == "2020-01-01T00:00:00"
+
+    kg.run_maintenance()
+
+    assert kg.version == version + 1
+    accessed = {n.id: n.metadata["last_accessed"] for n in kg.get_graph().nodes}
+    assert accessed["地球"] > "2020-01-01T00:00:00"
+    assert accessed["火星"] == "2020-01-01T00:00:00"
+
+
+def test_version_and_cached_renderings_follow_writes(storage_path):
+    """書き込みごとにバージョンが増え、要約と文字列表現が差分更新後もto_stringと一致することをテストする"""
+    kg = PersistentKnowledgeGraph(storage_path=storage_path)
+    assert kg.get_summary() == "知識グラフは空です。"
+    assert kg.get_graph_string() == "知識グラフは空です。"
+    initial_version = kg.version
+
+    kg.merge(KnowledgeGraph(
+        nodes=[Node(id="a", label="Fish"), Node(id="b", label="Fish"), Node(id="c", label="Season")],
+        edges=[Edge(source="a", target="c", label="旬")],
+    ))
+    assert kg.version == initial_version + 1
+    assert kg.get_graph_string() == kg.get_graph().to_string()
+    assert kg.get_graph_string() is kg.get_graph_string()
+
+    kg.merge(KnowledgeGraph(nodes=[Node(id="d", label="Season")], edges=[Edge(source="a", target="c", label="旬", weight=0.5)]))
+    assert kg.version == initial_version + 2
+    assert kg.get_graph_string() == kg.get_graph().to_string()
+    assert "(信頼度: 1.50)" in kg.get_graph_string()
+    assert kg.get_summary() == (
+        "知識グラフには 4個のノードと 1個のエッジが含まれています。主なエンティティカテゴリ: ['Fish', 'Season']"
+    )
+
+
+def test_rendering_graph_string_does_not_block_writers(storage_path, monkeypatch):
+    """文字列表現の整形中も書き込みロックが保持されず、マージが先に完了することをテストする"""
+    from app.knowledge_graph import persistent_knowledge_graph as module
+
+    kg = PersistentKnowledgeGraph(storage_path=storage_path)
+    kg.merge(KnowledgeGraph(nodes=[Node(id="a", label="X")]))
+    formatting, release = threading.Event(), threading.Event()
+    original = module.format_node_line
+
+    def slow_format(node):
+        formatting.set()
+        release.wait(timeout=5)
+        return original(node)
+
+    monkeypatch.setattr(module, "format_node_line", slow_format)
+    results = []
+    reader = threading.Thread(target=lambda: results.append(kg.get_graph_string()))
+    reader.start()
+    assert formatting.wait(timeout=5)
+    monkeypatch.setattr(module, "format_node_line", original)
+
+    writer = threading.Thread(target=kg.merge, args=(KnowledgeGraph(nodes=[Node(id="b", label="X")]),))
+    writer.start()
+    writer.join(timeout=2)
+    merged_while_formatting = not writer.is_alive()
+    release.set()
+    reader.join()
+
+    assert merged_while_formatting
+    assert "a" in results[0] and "- ノード: b" not in results[0]
+    assert kg.get_graph_string() == kg.get_graph().to_string()
+
+
+def test_columnar_store_round_trips_and_materializes_views_lazily():
+    """列指向ストアがノード・エッジの内容を保ったまま変換でき、ビューの参照時にモデルを生成することをテストする"""
+    graph = KnowledgeGraph(
+        nodes=[
+            Node(id="地球", label="Planet", properties={"半径": 6371}, metadata={"created_at": "2025-07-06T03:12:23.176313", "source": "wiki"}),
+            Node(id="月", label="Satellite"),
+        ],
+        edges=[
+            Edge(source="月", target="地球", label="orbits", weight=0.5),
+            Edge(source="月", target="太陽", label="lit_by"),
+        ],
+    )
+    store = ColumnarGraphStore.from_graph(graph)
+    store.add_edge(Edge(source="月", target="地球", label="orbits", weight=0.25))
+
+    view = store.to_knowledge_graph()
+    assert not any(isinstance(item, Node) for item in view.nodes.iter_raw())
+    assert view.nodes.peek(0, "id") == "地球"
+    assert view.nodes[0] == graph.nodes[0]
+    assert view.nodes[1].metadata == graph.nodes[1].metadata
+    assert [(e.target, e.weight) for e in view.edges] == [("地球", 0.75), ("太陽", 1.0)]
+    assert [e.label for e in store.iter_edges_of("地球")] == ["orbits"]
+    assert store.label_counts() == {"Planet": 1, "Satellite": 1}
+
+    store.scale_weights(0.5)
+    assert store.edge_at(0).weight == 0.375
+
+
+def test_columnar_backed_graph_merges_saves_and_stays_unmaterialized(storage_path):
+    """列指向の保持を有効にしたグラフが、マージ・保存・メンテナンスで内容を保ち、読み込んだ要素をモデルとして保持しないことをテストする"""
+    kg = PersistentKnowledgeGraph(storage_path=storage_path)
+    kg.merge(KnowledgeGraph(
+        nodes=[Node(id="地球", label="Planet", properties={"半径": 6371}), Node(id="月", label="Satellite")],
+        edges=[Edge(source="月", target="地球", label="orbits", weight=0.5)],
+    ))
+    kg.save()
+    expected = kg.get_graph().to_string()
+
+    kg = PersistentKnowledgeGraph(
+        storage_path=storage_path,
+        entity_resolver=EntityResolver(),
+        retention_policy=GraphRetentionPolicy(half_life_seconds=0),
+        columnar=True,
+    )
+    assert kg.get_graph_string() == expected
+    assert all(isinstance(item, int) for item in kg.get_graph().nodes.iter_raw())
+
+    kg.merge(KnowledgeGraph(nodes=[Node(id="火星", label="Planet")], edges=[Edge(source="月", target="地球", label="orbits")]))
+    assert kg.get_graph().edges[0].weight == 1.5
+    assert kg.get_summary().startswith("知識グラフには 3個のノードと 1個のエッジ")
+
+    kg.run_maintenance()
+    assert all(isinstance(item, int) for item in kg.get_graph().nodes.iter_raw())
+    kg.save()
+    reloaded = load_knowledge_graph(storage_path)
+    assert [n.id for n in reloaded.nodes] == ["地球", "月", "火星"]
+    assert reloaded.nodes[0].properties == {"半径": 6371}
+    assert reloaded.edges[0].weight == 1.5
+
+
+def test_columnar_store_accepts_rows_without_weight():
+    """重みが欠けた(None)旧形式のエッジを、既定の重み1.0として読み込めることをテストする"""
+    store = ColumnarGraphStore.from_raw(
+        [{"id": "a", "label": "X"}, {"id": "b", "label": "X"}],
+        [{"source": "a", "target": "b", "label": "rel", "weight": None}],
+    )
+    assert store.edge_at(0).weight == 1.0
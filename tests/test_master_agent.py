@@ -5,6 +5,7 @@
 import unittest
 from unittest.mock import MagicMock, AsyncMock, patch
 import asyncio
+import tempfile
 
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
@@ -18,11 +19,11 @@ from app.agents.master_agent import MasterAgent
 from app.memory.memory_consolidator import MemoryConsolidator
 from app.digital_homeostasis.ethical_motivation_engine import EthicalMotivationEngine
 from app.cognitive_modeling.predictive_coding_engine import PredictiveCodingEngine
-from app.memory.working_memory import WorkingMemory
+from app.memory.session_store import SessionStore, current_session_id
 from app.value_evolution.value_evaluator import ValueEvaluator
 from app.affective_system.affective_engine import AffectiveEngine
 from app.affective_system.affective_state import AffectiveState, Emotion
-from app.affective_system.emotional_response_generator import EmotionalResponseGenerator
+from app.affective_system.emotional_response_generator import EmotionalResponseGenerator, EmotionalResponse
 from app.analytics.collector import AnalyticsCollector
 from app.agents.orchestration_agent import OrchestrationAgent
 from app.models import OrchestrationDecision
@@ -100,8 +101,9 @@ class TestMasterAgent(unittest.IsolatedAsyncioTestCase):
         self.mock_predictive_coding_engine = MagicMock(spec=PredictiveCodingEngine)
         self.mock_predictive_coding_engine.process_input = MagicMock(return_value=None)
         
-        self.mock_working_memory = MagicMock(spec=WorkingMemory)
-        self.mock_working_memory.add_prediction_error = MagicMock()
+        self.session_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.session_dir.cleanup)
+        self.session_store = SessionStore(storage_dir=self.session_dir.name, history_window=4)
         
         self.mock_value_evaluator = MagicMock(spec=ValueEvaluator)
         self.mock_value_evaluator.assess_and_update_values = AsyncMock()
@@ -117,7 +119,9 @@ class TestMasterAgent(unittest.IsolatedAsyncioTestCase):
         self.mock_affective_engine.assess_and_update_state = AsyncMock(return_value=mock_affective_state)
         
         self.mock_emotional_response_generator = MagicMock(spec=EmotionalResponseGenerator)
-        self.mock_emotional_response_generator.invoke.return_value = "Final answer with emotional tone."
+        self.mock_emotional_response_generator.agenerate = AsyncMock(return_value=EmotionalResponse(
+            text="Final answer with emotional tone.", mode="adjust", elapsed_seconds=0.0, estimated_seconds_saved=1.5
+        ))
         
         self.mock_analytics_collector = MagicMock(spec=AnalyticsCollector)
         self.mock_analytics_collector.log_event = AsyncMock()
@@ -131,7 +135,7 @@ class TestMasterAgent(unittest.IsolatedAsyncioTestCase):
             memory_consolidator=self.mock_memory_consolidator,
             ethical_motivation_engine=self.mock_ethical_motivation_engine,
             predictive_coding_engine=self.mock_predictive_coding_engine,
-            working_memory=self.mock_working_memory,
+            session_store=self.session_store,
             value_evaluator=self.mock_value_evaluator,
             orchestration_agent=self.mock_orchestration_agent,
             affective_engine=self.mock_affective_engine,
@@ -200,14 +204,17 @@ class TestMasterAgent(unittest.IsolatedAsyncioTestCase):
         }
         self.master_agent._chain.ainvoke.assert_called_once_with(expected_prompt_input)
         self.mock_affective_engine.assess_and_update_state.assert_called_once()
-        self.mock_emotional_response_generator.invoke.assert_called_once_with({
+        self.mock_emotional_response_generator.agenerate.assert_awaited_once_with({
             "final_answer": self.master_agent._chain.ainvoke.return_value,
             "affective_state": self.mock_affective_engine.assess_and_update_state.return_value,
             "emotion": self.mock_affective_engine.assess_and_update_state.return_value.emotion.value,
             "intensity": self.mock_affective_engine.assess_and_update_state.return_value.intensity,
             "reason": self.mock_affective_engine.assess_and_update_state.return_value.reason
         })
-        self.mock_analytics_collector.log_event.assert_awaited_with("affective_state", {"emotion": "neutral", "intensity": 0.5})
+        self.mock_analytics_collector.log_event.assert_any_await("affective_state", {"emotion": "neutral", "intensity": 0.5})
+        self.mock_analytics_collector.log_event.assert_awaited_with(
+            "emotional_response", {"mode": "adjust", "elapsed_seconds": 0.0, "estimated_seconds_saved": 1.5}
+        )
 
     async def test_generate_final_answer_async_bird_eye_view(self):
         query = "AIの未来の全体像について"
@@ -284,13 +291,10 @@ class TestMasterAgent(unittest.IsolatedAsyncioTestCase):
         
         self.mock_ethical_motivation_engine.assess_and_generate_motivation.assert_called_once_with(final_answer)
         self.mock_predictive_coding_engine.process_input.assert_called_once()
-        self.mock_working_memory.add_prediction_error.assert_not_called()
         self.mock_value_evaluator.assess_and_update_values.assert_called_once_with(final_answer)
         self.mock_memory_consolidator.log_interaction.assert_called_once_with(query, final_answer)
         self.mock_analytics_collector.log_event.assert_awaited_with("integrity_status", {'homeostatic_state': 'stable', 'drive_summary': 'Stable.'})
-        self.assertEqual(len(self.master_agent.dialogue_history), 2)
-        self.assertEqual(self.master_agent.dialogue_history[0], f"User: {query}")
-        self.assertEqual(self.master_agent.dialogue_history[1], f"AI: {final_answer}")
+        self.assertEqual(self.session_store.get_context(), [f"User: {query}", f"AI: {final_answer}"])
 
     async def test_run_internal_maintenance_async_with_prediction_error(self):
         query = "テストメンテナンス"
@@ -298,12 +302,33 @@ class TestMasterAgent(unittest.IsolatedAsyncioTestCase):
         prediction_error_data = {"error_type": "新規情報", "summary": "新しい概念", "key_info": ["概念A"]}
         self.mock_predictive_coding_engine.process_input.return_value = prediction_error_data
         
-        await self.master_agent.run_internal_maintenance_async(query, final_answer)
+        await self.master_agent.run_internal_maintenance_async(query, final_answer, session_id="session-a")
         
-        self.mock_predictive_coding_engine.process_input.assert_called_once()
-        self.mock_working_memory.add_prediction_error.assert_called_once_with(prediction_error_data)
+        self.mock_predictive_coding_engine.process_input.assert_called_once_with(
+            query, [], working_memory=self.session_store.get("session-a").working_memory
+        )
         self.mock_memory_consolidator.log_interaction.assert_called_once_with(query, final_answer)
 
+    async def test_run_internal_maintenance_async_keeps_history_per_session(self):
+        """対話履歴がセッションごとに分かれ、リクエスト中に設定されたセッションが使われることをテストする"""
+        self.mock_predictive_coding_engine.process_input.return_value = {}
+
+        token = current_session_id.set("session-a")
+        try:
+            await self.master_agent.run_internal_maintenance_async("Aの質問", "Aへの回答")
+        finally:
+            current_session_id.reset(token)
+        await self.master_agent.run_internal_maintenance_async("Bの質問", "Bへの回答", session_id="session-b")
+        await self.master_agent.run_internal_maintenance_async("Bの次の質問", "Bへの次の回答", session_id="session-b")
+
+        self.assertEqual(self.session_store.get_context("session-a"), ["User: Aの質問", "AI: Aへの回答"])
+        self.assertEqual(
+            self.session_store.get_context("session-b"),
+            ["User: Bの質問", "AI: Bへの回答", "User: Bの次の質問", "AI: Bへの次の回答"],
+        )
+        _, history = self.mock_predictive_coding_engine.process_input.call_args.args
+        self.assertEqual(history, ["User: Bの質問", "AI: Bへの回答"])
+
     async def test_generate_final_answer_async_with_recent_insights(self):
         query = "AIの能力について"
         plan = "能力分析"
@@ -346,5 +371,21 @@ class TestMasterAgent(unittest.IsolatedAsyncioTestCase):
         self.mock_memory_consolidator.get_recent_insights.assert_any_call("autonomous_thought", limit=1)
         self.mock_memory_consolidator.get_recent_insights.assert_any_call("self_improvement_applied_decision", limit=1)
 
+    async def test_generate_final_answer_async_uses_relevant_autonomous_thoughts(self):
+        """エピソード記憶がある場合、質問に類似した自律思考がプロンプトに使われることをテストする"""
+        self.master_agent.episodic_memory = MagicMock()
+        self.master_agent.episodic_memory.asearch = AsyncMock(return_value=[
+            {"record": {"type": "autonomous_thought", "synthesized_knowledge": "質問に関連する洞察。"}, "score": 0.9}
+        ])
+        orchestration_decision = OrchestrationDecision(chosen_mode="full", reasoning="test", confidence_score=0.9, parameters={})
+
+        await self.master_agent.generate_final_answer_async({"query": "関連する質問"}, orchestration_decision)
+
+        self.master_agent.episodic_memory.asearch.assert_awaited_once_with("関連する質問", k=1, types=["autonomous_thought"])
+        prompt_input = self.master_agent._chain.ainvoke.call_args.args[0]
+        self.assertEqual(prompt_input["recent_autonomous_thoughts"], "質問に関連する洞察。")
+        self.mock_memory_consolidator.get_recent_insights.assert_any_call("physical_simulation_insight", limit=1)
+        self.assertNotIn(unittest.mock.call("autonomous_thought", limit=1), self.mock_memory_consolidator.get_recent_insights.call_args_list)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,231 @@
+# /tests/test_memory_consolidator.py
+# title: 記憶統合エンジンユニットテスト
+# role: MemoryConsolidatorのログ記録と、索引・逆順読み込みによる最近のレコード取得のユニットテスト
+
+import io
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.memory.log_index import LogOffsetIndex, iter_lines_reversed
+from app.memory.log_segments import LogSegmentStore
+from app.memory.memory_consolidator import MemoryConsolidator
+from app.utils.log_writer import BufferedLogWriter
+
+
+@pytest.fixture
+def consolidator(tmp_path, monkeypatch):
+    # ワーキングメモリの保存先はカレントディレクトリからの相対パスのため、一時ディレクトリに移動する
+    monkeypatch.chdir(tmp_path)
+    return MemoryConsolidator(log_file_path=str(tmp_path / "memory" / "session_memory.jsonl"))
+
+
+def test_iter_lines_reversed_handles_lines_spanning_blocks():
+    """ブロック境界をまたぐ行も含め、全行を新しい順に正しいオフセットで返すことをテストする"""
+    lines = [f"line-{i}-" + "x" * (i * 7) for i in range(30)]
+    data = ("\n".join(lines) + "\n").encode("utf-8")
+
+    result = list(iter_lines_reversed(io.BytesIO(data), block_size=16))
+
+    assert [line.decode("utf-8") for _, line in result] == list(reversed(lines))
+    assert all(data[offset:].startswith(line) for offset, line in result)
+
+
+def test_recent_insights_are_read_via_index(consolidator):
+    """トピックごとの最近の洞察が新しい順に取得され、索引がサイドカーに永続化されることをテストする"""
+    for i in range(5):
+        consolidator.log_autonomous_thought("physical_simulation_insight", f"物理-{i}")
+        consolidator.log_autonomous_thought("autonomous_thought", f"自律-{i}")
+        consolidator.log_interaction(f"質問-{i}", "回答")
+
+    insights = consolidator.get_recent_insights("physical_simulation_insight", limit=2)
+    assert [log["synthesized_knowledge"] for log in insights] == ["物理-4", "物理-3"]
+    assert consolidator.get_recent_insights("unknown_topic") == []
+
+    events = consolidator.get_recent_events(limit=3)
+    assert [e["type"] for e in events] == ["interaction", "autonomous_thought", "autonomous_thought"]
+
+    reloaded = LogOffsetIndex(consolidator.log_file_path)
+    reloaded.load()
+    assert len(reloaded.recent_offsets("type:interaction", 10)) == 5
+
+
+def test_index_catches_up_with_records_written_elsewhere(consolidator):
+    """索引に登録されていない追記(旧バージョンや他プロセスによる書き込み)も索引経由の取得対象になることをテストする"""
+    consolidator.log_autonomous_thought("topic", "索引あり")
+    with open(consolidator.log_file_path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"type": "autonomous_thought", "topic": "topic", "synthesized_knowledge": "外部"}, ensure_ascii=False) + "\n")
+
+    # リングバッファの容量を超える件数を要求し、索引経由の経路を通す
+    insights = consolidator.get_recent_insights("topic", limit=100)
+
+    assert [log["synthesized_knowledge"] for log in insights] == ["外部", "索引あり"]
+
+
+def test_recent_records_are_served_from_warm_started_ring_buffers(tmp_path, monkeypatch):
+    """最近のレコードが書き込み時にリングバッファへ反映され、再起動時にはログの末尾から復元されることをテストする"""
+    monkeypatch.chdir(tmp_path)
+    log_file_path = str(tmp_path / "memory" / "session_memory.jsonl")
+    consolidator = MemoryConsolidator(log_file_path=log_file_path, recent_buffer_size=3)
+    for i in range(5):
+        consolidator.log_autonomous_thought("physical_simulation_insight", f"物理-{i}")
+    for i in range(10):
+        consolidator.log_interaction(f"質問-{i}", "回答")
+    assert [log["synthesized_knowledge"] for log in consolidator.get_recent_insights("physical_simulation_insight", limit=2)] == ["物理-4", "物理-3"]
+
+    restarted = MemoryConsolidator(log_file_path=log_file_path, recent_buffer_size=3)
+    os.remove(log_file_path)
+
+    assert [log["synthesized_knowledge"] for log in restarted.get_recent_insights("physical_simulation_insight", limit=3)] == ["物理-4", "物理-3", "物理-2"]
+    assert [e["query"] for e in restarted.get_recent_events(limit=2)] == ["質問-9", "質問-8"]
+    assert restarted.get_recent_insights("unknown_topic", limit=1) == []
+
+
+def test_recent_insights_fall_back_to_index_when_key_was_evicted(tmp_path, monkeypatch):
+    """キーがリングバッファから捨てられた場合や、バッファの件数が足りない場合に索引から取得することをテストする"""
+    monkeypatch.chdir(tmp_path)
+    consolidator = MemoryConsolidator(log_file_path=str(tmp_path / "memory" / "session_memory.jsonl"), recent_buffer_size=3, recent_max_keys=4)
+    consolidator.log_autonomous_thought("古いトピック", "洞察-0")
+    consolidator.log_autonomous_thought("古いトピック", "洞察-1")
+    for i in range(5):
+        consolidator.log_event(f"event-{i}", {})
+
+    assert consolidator._recent.recent("topic:autonomous_thought:古いトピック", 2) == []
+    insights = consolidator.get_recent_insights("古いトピック", limit=2)
+    assert [log["synthesized_knowledge"] for log in insights] == ["洞察-1", "洞察-0"]
+
+
+def _segmented_consolidator(tmp_path, **kwargs):
+    log_file_path = str(tmp_path / "memory" / "session_memory.jsonl")
+    return MemoryConsolidator(log_file_path=log_file_path, segment_store=LogSegmentStore(log_file_path, **kwargs))
+
+
+def test_log_rotates_into_compressed_segments_and_queries_span_them(tmp_path, monkeypatch, caplog):
+    """サイズ上限でセグメントが封印され、最近のレコード取得と種類・時間範囲の検索が封印済みセグメントにも及ぶことをテストする"""
+    monkeypatch.chdir(tmp_path)
+    consolidator = _segmented_consolidator(tmp_path, max_segment_bytes=400, max_segment_seconds=None)
+    for i in range(10):
+        consolidator.log_autonomous_thought("topic", f"洞察-{i}")
+        consolidator.log_event("tick", {"i": i})
+
+    segments = consolidator.segment_store.segments
+    assert len(segments) >= 2
+    # 封印時に古い索引を不整合として作り直す警告が出ない
+    assert not [r for r in caplog.records if r.levelname == "WARNING" and "索引" in r.getMessage()]
+    assert all(s["file"].endswith(".jsonl.zst") for s in segments)
+    assert len(consolidator.query()) == 20
+
+    insights = consolidator.get_recent_insights("topic", limit=10)
+    assert [log["synthesized_knowledge"] for log in insights] == [f"洞察-{i}" for i in reversed(range(10))]
+    assert len(consolidator.get_recent_events(limit=20)) == 20
+
+    events = consolidator.query(types=["event"])
+    assert [e["metadata"]["i"] for e in events] == list(range(10))
+    assert consolidator.query(start=datetime(2100, 1, 1)) == []
+
+
+def test_recent_insights_reach_older_segments_after_restart(tmp_path, monkeypatch):
+    """再起動後、最新のセグメントとアクティブなログにない洞察も、古いセグメントから取得されることをテストする"""
+    monkeypatch.chdir(tmp_path)
+    consolidator = _segmented_consolidator(tmp_path, max_segment_bytes=400, max_segment_seconds=None)
+    consolidator.log_autonomous_thought("古いトピック", "最初の洞察")
+    for i in range(10):
+        consolidator.log_event("tick", {"i": i})
+    assert len(consolidator.segment_store.segments) >= 2
+
+    restarted = _segmented_consolidator(tmp_path, max_segment_bytes=400, max_segment_seconds=None)
+
+    insights = restarted.get_recent_insights("古いトピック", limit=1)
+    assert [log["synthesized_knowledge"] for log in insights] == ["最初の洞察"]
+
+
+def test_recent_insights_for_unknown_topic_do_not_read_segments(tmp_path, monkeypatch):
+    """記録されたことのないトピックや、古いセグメントにしかないトピックの繰り返しの取得で、該当しないセグメントを読まないことをテストする"""
+    monkeypatch.chdir(tmp_path)
+    consolidator = _segmented_consolidator(tmp_path, max_segment_bytes=400, max_segment_seconds=None)
+    consolidator.log_autonomous_thought("古いトピック", "最初の洞察")
+    for i in range(20):
+        consolidator.log_event("tick", {"i": i})
+    assert len(consolidator.segment_store.segments) >= 3
+    # マニフェストに索引キーごとの件数がない古い形式でも、起動時に補われる
+    manifest_path = consolidator.segment_store.manifest_path
+    with open(manifest_path, encoding="utf-8") as f:
+        manifest = json.load(f)
+    for segment in manifest["segments"]:
+        del segment["keys"]
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+
+    restarted = _segmented_consolidator(tmp_path, max_segment_bytes=400, max_segment_seconds=None)
+    reads = []
+    original_read_segment = restarted.segment_store.read_segment
+    monkeypatch.setattr(restarted.segment_store, "read_segment", lambda segment: reads.append(segment["file"]) or original_read_segment(segment))
+
+    for _ in range(5):
+        assert restarted.get_recent_insights("未知のトピック", limit=1) == []
+    assert reads == []
+
+    insights = restarted.get_recent_insights("古いトピック", limit=1)
+    assert [log["synthesized_knowledge"] for log in insights] == ["最初の洞察"]
+    assert reads == [restarted.segment_store.segments[0]["file"]]
+
+
+def test_retention_removes_expired_records_per_type(tmp_path, monkeypatch):
+    """種類ごとの保持期間を過ぎたレコードだけが封印済みセグメントから削除されることをテストする"""
+    monkeypatch.chdir(tmp_path)
+    consolidator = _segmented_consolidator(
+        tmp_path, max_segment_bytes=10 ** 9, max_segment_seconds=0.0001, retention_seconds={"event": 60, "default": None}
+    )
+    old = (datetime.utcnow() - timedelta(hours=1)).isoformat()
+    consolidator._log({"timestamp": old, "type": "event", "event_type": "old"})
+    consolidator._log({"timestamp": old, "type": "interaction", "query": "古い質問"})
+    consolidator._log({"timestamp": datetime.utcnow().isoformat(), "type": "event", "event_type": "new"})
+
+    stats = consolidator.run_log_maintenance()
+
+    assert stats == {"rotated": 1, "expired_records": 1}
+    remaining = consolidator.query()
+    assert [r.get("event_type") or r.get("query") for r in remaining] == ["古い質問", "new"]
+    assert consolidator.segment_store.segments[0]["types"] == {"interaction": 1, "event": 1}
+
+
+def test_buffered_writer_group_commits_memory_log(tmp_path, monkeypatch):
+    """バックグラウンドのライター経由の書き込みがまとめて行われ、flush後に索引経由で取得できることをテストする"""
+    monkeypatch.chdir(tmp_path)
+    writer = BufferedLogWriter(batch_size=64, flush_interval=0.05)
+    consolidator = MemoryConsolidator(log_file_path=str(tmp_path / "memory" / "session_memory.jsonl"), log_writer=writer)
+    try:
+        for i in range(100):
+            consolidator.log_autonomous_thought("topic", f"洞察-{i}")
+        writer.flush()
+
+        assert [log["synthesized_knowledge"] for log in consolidator.get_recent_insights("topic", limit=2)] == ["洞察-99", "洞察-98"]
+        metrics = writer.get_metrics()
+        assert metrics["written"] == 100
+        assert metrics["batches"] < 100
+        assert metrics["dropped"] == 0
+    finally:
+        writer.close()
+
+
+def test_buffered_writer_drops_when_queue_is_full_and_flushes_on_close(tmp_path):
+    """キューが満杯の場合に破棄数が記録され、停止時に残りのレコードが書き込まれることをテストする"""
+    release = threading.Event()
+    written = []
+
+    def slow_sink(entries, fsync):
+        release.wait()
+        written.extend(line for line, _ in entries)
+
+    writer = BufferedLogWriter(max_queue_size=2, batch_size=1, flush_interval=0.01, block_timeout=0.01)
+    accepted = [writer.submit(slow_sink, f"{i}\n".encode()) for i in range(6)]
+    release.set()
+    writer.close()
+
+    metrics = writer.get_metrics()
+    assert metrics["dropped"] == accepted.count(False) > 0
+    assert metrics["blocked"] >= metrics["dropped"]
+    assert len(written) == accepted.count(True)
@@ -0,0 +1,107 @@
+# /tests/test_novelty_gate.py
+# title: 新規性ゲートのテスト
+# role: NoveltyGateが文脈や既知のエンティティとの類似度から新規性を判定して統計を記録すること、
+#       新規性の低い入力ではPredictiveCodingEngineがLLMを呼ばないことを検証する。
+
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+
+import numpy as np
+
+from app.cognitive_modeling.novelty_gate import NoveltyGate
+from app.cognitive_modeling.predictive_coding_engine import PredictiveCodingEngine
+from app.config import settings
+from app.knowledge_graph.models import KnowledgeGraph, Node
+
+# テキストの先頭の語ごとに固定の方向を割り当てる埋め込み
+_AXES = {"天気": 0, "料理": 1, "宇宙": 2, "地球": 3}
+
+
+class _Embedder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        vectors = np.zeros((len(texts), len(_AXES) + 1), dtype="float32")
+        for i, text in enumerate(texts):
+            axis = next((axis for word, axis in _AXES.items() if word in text), len(_AXES))
+            vectors[i, axis] = 1.0
+        return vectors
+
+
+def _graph(*node_ids, version=1):
+    graph = KnowledgeGraph(nodes=[Node(id=node_id, label="Thing") for node_id in node_ids], edges=[])
+    return SimpleNamespace(graph=graph, version=version)
+
+
+def test_gate_skips_inputs_similar_to_context_and_counts_hit_rate():
+    """文脈と似た入力は省略、新しい話題は通過とし、省略率を記録することをテストする"""
+    gate = NoveltyGate(_Embedder(), threshold=0.15)
+    context = ["User: 今日の天気は？", "AI: 晴れです。"]
+
+    assert gate.should_process("明日の天気は？", context) is False
+    assert gate.should_process("料理のレシピを教えて", context) is True
+
+    stats = gate.get_stats()
+    assert stats["checked"] == 2
+    assert stats["skipped"] == 1
+    assert stats["hit_rate"] == 0.5
+    assert gate.should_process("何でも", []) is True
+
+
+def test_entity_embeddings_are_refreshed_only_for_new_nodes():
+    """既知のエンティティとの類似度が使われ、グラフの更新時には新しいノードだけを埋め込むことをテストする"""
+    embedder = _Embedder()
+    graph = _graph("地球")
+    gate = NoveltyGate(embedder, knowledge_graph=graph, threshold=0.15, entity_threshold=0.9)
+
+    assert gate.should_process("地球について", []) is False
+    assert gate.should_process("宇宙について", []) is True
+    assert ["地球 (Thing)"] in embedder.calls
+
+    graph.graph = KnowledgeGraph(nodes=graph.graph.nodes + [Node(id="宇宙", label="Thing")], edges=[])
+    graph.version = 2
+    embedder.calls.clear()
+    assert gate.should_process("宇宙について", []) is False
+    assert ["宇宙 (Thing)"] in embedder.calls
+    assert ["地球 (Thing)"] not in embedder.calls
+
+
+def test_entity_matches_skip_with_the_configured_settings():
+    """設定の閾値で、entity_thresholdを超えて既知のエンティティに似た入力は省略され、それ未満なら処理されることをテストする"""
+    gate_settings = settings.NOVELTY_GATE_SETTINGS
+    entity_threshold = gate_settings["entity_threshold"]
+
+    def embed(texts):
+        # 「地球 (Thing)」を軸にして、入力ごとに決めた類似度になるベクトルを返す
+        similarities = {"地球 (Thing)": 1.0, "近い話題": entity_threshold + 0.02, "遠い話題": entity_threshold - 0.05}
+        return [[similarities[text], (1 - similarities[text] ** 2) ** 0.5] for text in texts]
+
+    gate = NoveltyGate(
+        embed, knowledge_graph=_graph("地球"), threshold=gate_settings["threshold"], entity_threshold=entity_threshold
+    )
+
+    assert gate.should_process("近い話題", []) is False
+    assert gate.should_process("遠い話題", []) is True
+    assert gate.score("遠い話題", []) < 1.0
+
+
+def test_engine_skips_llm_calls_when_gate_rejects_input():
+    """新規性が低い入力ではワールドモデルのLLM呼び出しを行わず、新規情報なしを返すことをテストする"""
+    world_model_agent = MagicMock()
+    working_memory = MagicMock()
+    gate = NoveltyGate(_Embedder(), threshold=0.15)
+    engine = PredictiveCodingEngine(world_model_agent, working_memory, MagicMock(), MagicMock(), novelty_gate=gate)
+
+    result = engine.process_input("明日の天気は？", ["User: 今日の天気は？"])
+
+    assert result["error_type"] == "新規情報なし"
+    assert result["novelty_score"] < 0.15
+    world_model_agent.predict_next_state.assert_not_called()
+    world_model_agent.calculate_prediction_error.assert_not_called()
+    working_memory.add_prediction_error.assert_not_called()
+
+    world_model_agent.calculate_prediction_error.return_value = {"error_type": "トピックの急な変更", "summary": "料理", "key_info": ["料理"]}
+    engine.process_input("料理のレシピを教えて", ["User: 今日の天気は？"])
+    world_model_agent.update_model.assert_called_once()
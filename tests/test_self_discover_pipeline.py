@@ -0,0 +1,92 @@
+# /tests/test_self_discover_pipeline.py
+# title: 自己発見パイプラインのテスト
+# role: 思考モジュールの列が依存グラフとして実行され、依存しないモジュールが並行して動くこと、同じ入力のモジュールの出力が
+#       再利用されること、実行したグラフとクリティカルパスがトレースに含まれることを検証する。
+
+import asyncio
+import time
+from unittest.mock import MagicMock
+
+from app.models import OrchestrationDecision
+from app.pipelines.self_discover_pipeline import SelfDiscoverPipeline
+from app.reasoning.module_dag import build_module_dag, critical_path
+
+
+class _SlowModule:
+    def __init__(self, name, seconds, log):
+        self.name = name
+        self.seconds = seconds
+        self.log = log
+        self.inputs = []
+
+    async def ainvoke(self, input_data):
+        self.inputs.append(input_data)
+        self.log.append(("start", self.name, time.monotonic()))
+        await asyncio.sleep(self.seconds)
+        self.log.append(("end", self.name, time.monotonic()))
+        return f"{self.name}の結果"
+
+
+def _make_pipeline(sequence, log):
+    planning_agent = MagicMock()
+    planning_agent.select_thinking_modules.return_value = sequence
+    modules = {name: _SlowModule(name, 0.05, log) for name in ("DECOMPOSE", "CRITIQUE", "SYNTHESIZE", "RAG_SEARCH")}
+    pipeline = SelfDiscoverPipeline(
+        planning_agent=planning_agent,
+        decompose_agent=modules["DECOMPOSE"],
+        critique_agent=modules["CRITIQUE"],
+        synthesize_agent=modules["SYNTHESIZE"],
+        cognitive_loop_agent=modules["RAG_SEARCH"],
+    )
+    return pipeline, modules
+
+
+def _decision():
+    return OrchestrationDecision(reasoning="テスト", chosen_mode="self_discover", confidence_score=1.0)
+
+
+def test_build_module_dag_links_modules_by_their_inputs():
+    """要求だけを使うモジュールは独立し、CRITIQUEは直前、SYNTHESIZEはそれまでのすべてに依存することをテストする"""
+    nodes = build_module_dag(["DECOMPOSE", "RAG_SEARCH", "UNKNOWN", "CRITIQUE", "SYNTHESIZE"], ["DECOMPOSE", "RAG_SEARCH", "CRITIQUE", "SYNTHESIZE"])
+
+    assert [node.module_name for node in nodes] == ["DECOMPOSE", "RAG_SEARCH", "CRITIQUE", "SYNTHESIZE"]
+    assert [node.depends_on for node in nodes] == [[], [], [1], [0, 1, 2]]
+
+
+def test_independent_modules_run_in_parallel_and_report_critical_path():
+    """DECOMPOSEとRAG_SEARCHが並行して実行され、SYNTHESIZEが両方の出力を受け取り、トレースにDAGが含まれることをテストする"""
+    log = []
+    pipeline, modules = _make_pipeline("DECOMPOSE, RAG_SEARCH, SYNTHESIZE", log)
+
+    response = pipeline.run("新しい製品の戦略を立てて", _decision())
+
+    starts = {name: t for kind, name, t in log if kind == "start"}
+    ends = {name: t for kind, name, t in log if kind == "end"}
+    assert starts["RAG_SEARCH"] < ends["DECOMPOSE"]
+    assert starts["SYNTHESIZE"] >= max(ends["DECOMPOSE"], ends["RAG_SEARCH"])
+    information = modules["SYNTHESIZE"].inputs[0]["information_list"]
+    assert "DECOMPOSEの結果" in information and "RAG_SEARCHの結果" in information
+    assert response.final_answer == "SYNTHESIZEの結果"
+    assert "【実行DAG】" in response.retrieved_info
+    assert "クリティカルパス:" in response.retrieved_info
+
+
+def test_repeated_module_with_same_input_reuses_output():
+    """同じ入力で繰り返し選ばれたモジュールは1回だけ実行されることをテストする"""
+    log = []
+    pipeline, modules = _make_pipeline("DECOMPOSE, RAG_SEARCH, DECOMPOSE", log)
+
+    response = pipeline.run("新しい製品の戦略を立てて", _decision())
+
+    assert len(modules["DECOMPOSE"].inputs) == 1
+    assert "(キャッシュ)" in response.retrieved_info
+    assert response.final_answer == "DECOMPOSEの結果"
+
+
+def test_critical_path_follows_the_slowest_dependency_chain():
+    """クリティカルパスが実行時間の合計の最も長い依存の連鎖になることをテストする"""
+    nodes = build_module_dag(["DECOMPOSE", "RAG_SEARCH", "CRITIQUE", "SYNTHESIZE"], ["DECOMPOSE", "RAG_SEARCH", "CRITIQUE", "SYNTHESIZE"])
+    for node, seconds in zip(nodes, [3.0, 1.0, 1.0, 1.0]):
+        node.finished_at = node.ready_at + seconds
+
+    assert [node.module_name for node in critical_path(nodes)] == ["DECOMPOSE", "SYNTHESIZE"]
@@ -0,0 +1,77 @@
+# /tests/test_session_store.py
+# title: セッションストアのテスト
+# role: SessionStoreの履歴の窓とローリング要約、使われていないセッションの退避と読み戻しを検証する。
+
+import os
+
+from app.memory.session_store import SessionStore
+
+
+def test_history_is_bounded_and_overflow_is_folded_into_summary(tmp_path):
+    """履歴が窓の大きさに制限され、はみ出した行がローリング要約に畳み込まれることをテストする"""
+    store = SessionStore(storage_dir=str(tmp_path), history_window=4, max_summary_chars=60)
+    for i in range(50):
+        store.record_turn("s1", f"質問{i}", f"回答{i}")
+
+    context = store.get_context("s1")
+
+    assert context[1:] == ["User: 質問48", "AI: 回答48", "User: 質問49", "AI: 回答49"]
+    assert context[0].startswith("(これまでの対話の要約)")
+    assert "回答47" in context[0] and "質問0" not in context[0]
+    assert len(store.get("s1").summary) <= 60
+    assert store.get_context("s2") == []
+
+
+def test_sessions_are_spilled_and_restored(tmp_path):
+    """上限を超えたセッションと使われていないセッションがディスクに退避され、参照時に読み戻されることをテストする"""
+    store = SessionStore(storage_dir=str(tmp_path), history_window=10, max_active_sessions=2, idle_timeout_seconds=1800)
+    store.record_turn("s1", "最初の質問", "最初の回答")
+    store.get("s1").working_memory.add_prediction_error({"summary": "新しい概念"})
+    store.record_turn("s2", "質問", "回答")
+    store.record_turn("s3", "質問", "回答")
+
+    assert store.get_stats()["active"] == 2
+    assert len(os.listdir(tmp_path)) == 1
+
+    restored = store.get("s1")
+
+    assert restored.context_lines() == ["User: 最初の質問", "AI: 最初の回答"]
+    assert restored.working_memory.session_id == "s1"
+    assert restored.working_memory.prediction_errors == [{"summary": "新しい概念"}]
+
+    stats = store.get_stats()
+    assert store.evict_idle(now=restored.last_access + 3600) == stats["active"]
+    assert store.get_stats()["active"] == 0
+    assert store.get_context("s3") == ["User: 質問", "AI: 回答"]
+
+
+def test_pinned_session_is_not_spilled_while_in_use(tmp_path):
+    """pinnedで使用中のセッションは上限超過でも退避されず、書き込んだ予測誤差が失われないことをテストする"""
+    store = SessionStore(storage_dir=str(tmp_path), history_window=10, max_active_sessions=1, idle_timeout_seconds=1800)
+
+    with store.pinned("s1") as session:
+        store.record_turn("s2", "質問", "回答")
+        store.evict_idle(now=session.last_access + 3600)
+        session.working_memory.add_prediction_error({"summary": "処理中の誤差"})
+
+    assert store.get("s1") is session
+    assert store.get("s1").working_memory.prediction_errors == [{"summary": "処理中の誤差"}]
+
+
+def test_expired_spill_files_are_deleted(tmp_path):
+    """spill_ttl_seconds以上読み戻されていない退避ファイルが削除され、新しいものは残ることをテストする"""
+    store = SessionStore(storage_dir=str(tmp_path), max_active_sessions=10, idle_timeout_seconds=1800, spill_ttl_seconds=3600)
+    store.record_turn("old", "質問", "回答")
+    store.record_turn("new", "質問", "回答")
+    store.close()
+    old_path = store._spill_path("old")
+    stale = os.path.getmtime(old_path) - 7200
+    os.utime(old_path, (stale, stale))
+
+    store.evict_idle()
+
+    assert not os.path.exists(old_path)
+    assert os.path.exists(store._spill_path("new"))
+    assert store.get_stats()["expired"] == 1
+    assert store.get_context("old") == []
+    assert store.get_context("new") == ["User: 質問", "AI: 回答"]
@@ -0,0 +1,105 @@
+# /tests/test_speculative_decoding.py
+# title: 投機的デコーディングのテスト
+# role: 設定からデコード方式が決まること、ドラフトモデルが貪欲法で提案トークンを返すこと、生成速度の計測がLLMの呼び出しごとに記録されることを検証する。
+
+import numpy as np
+from langchain_core.language_models.fake import FakeListLLM
+
+from app.llm_providers import speculative_decoding
+from app.llm_providers.speculative_decoding import (
+    DecodingThroughputTracker,
+    GGUFDraftModel,
+    build_draft_model,
+    decoding_mode,
+    find_throughput_tracker,
+)
+
+
+class _FakeLlama:
+    def __init__(self, continuation, eos=0, context=64):
+        self.continuation = continuation
+        self.eos = eos
+        self.context = context
+        self.generate_calls = []
+
+    def n_ctx(self):
+        return self.context
+
+    def token_eos(self):
+        return self.eos
+
+    def generate(self, tokens, top_k, temp):
+        self.generate_calls.append((list(tokens), top_k, temp))
+        yield from self.continuation
+
+
+def test_decoding_mode_follows_settings():
+    """無効ならplain、ドラフトモデルのパスがあればdraft_model、なければprompt_lookupになることをテストする"""
+    assert decoding_mode(None) == "plain"
+    assert decoding_mode({"enabled": False, "draft_model_path": "draft.gguf"}) == "plain"
+    assert decoding_mode({"enabled": True, "draft_model_path": ""}) == "prompt_lookup"
+    assert decoding_mode({"enabled": True, "draft_model_path": "draft.gguf"}) == "draft_model"
+    assert build_draft_model({"enabled": False}) is None
+
+
+def test_draft_model_proposes_greedy_tokens_until_limit_or_eos():
+    """ドラフトモデルが貪欲法で最大num_pred_tokens個、EOSの手前までのトークンを提案することをテストする"""
+    llama = _FakeLlama([5, 6, 7, 8, 9])
+    draft = GGUFDraftModel(llama, num_pred_tokens=3)
+    proposal = draft(np.array([1, 2, 3], dtype=np.intc))
+    assert proposal.tolist() == [5, 6, 7]
+    assert llama.generate_calls == [([1, 2, 3], 1, 0.0)]
+
+    assert GGUFDraftModel(_FakeLlama([5, 0, 7]), num_pred_tokens=3)(np.array([1], dtype=np.intc)).tolist() == [5]
+    # コンテキストに収まらない場合は提案しない
+    assert GGUFDraftModel(_FakeLlama([5, 6]), num_pred_tokens=3)(np.arange(63, dtype=np.intc)).tolist() == []
+
+
+def test_draft_model_is_loaded_once_per_main_model(monkeypatch):
+    """ドラフトモデルのGGUFが本体のモデルごとに1回だけロードされ、指定がなければ本体のコンテキスト長に合わせることをテストする"""
+    loads = []
+
+    def fake_llama(**kwargs):
+        loads.append(kwargs)
+        return _FakeLlama([5], context=kwargs["n_ctx"])
+
+    monkeypatch.setattr(speculative_decoding, "Llama", fake_llama)
+    monkeypatch.setattr(speculative_decoding, "LlamaPromptLookupDecoding", object)
+    monkeypatch.setattr(speculative_decoding, "_draft_models", {})
+    settings = {"enabled": True, "draft_model_path": "draft.gguf", "draft_n_ctx": None, "draft_n_gpu_layers": 0}
+
+    first = build_draft_model(settings, n_ctx=32768, main_model_path="main.gguf")
+    second = build_draft_model(settings, n_ctx=32768, main_model_path="main.gguf")
+
+    assert first is second
+    assert len(loads) == 1
+    assert loads[0]["n_ctx"] == 32768
+    assert first(np.arange(4000, dtype=np.intc)).tolist() == [5]
+
+
+def test_draft_model_logs_once_when_input_exceeds_its_context(caplog):
+    """入力がドラフトモデルのコンテキスト長を超えて提案できない場合に、一度だけ警告を記録することをテストする"""
+    draft = GGUFDraftModel(_FakeLlama([5, 6]), num_pred_tokens=3)
+
+    with caplog.at_level("WARNING"):
+        draft(np.arange(63, dtype=np.intc))
+        draft(np.arange(63, dtype=np.intc))
+
+    assert len([record for record in caplog.records if "コンテキスト長" in record.getMessage()]) == 1
+
+
+def test_throughput_tracker_records_each_call():
+    """コールバックが呼び出しごとの生成トークン数と所要時間を累計し、tokens/sを求めることをテストする"""
+    tracker = DecodingThroughputTracker(mode="prompt_lookup", count_tokens=len)
+    llm = FakeListLLM(responses=["こんにちは", "さようなら!"], callbacks=[tracker])
+
+    llm.invoke("a")
+    llm.invoke("b")
+
+    stats = tracker.get_stats()
+    assert stats["mode"] == "prompt_lookup"
+    assert stats["calls"] == 2
+    assert stats["completion_tokens"] == len("こんにちは") + len("さようなら!")
+    assert stats["seconds"] > 0
+    assert stats["tokens_per_second"] == stats["completion_tokens"] / stats["seconds"]
+    assert find_throughput_tracker(llm) is tracker
@@ -0,0 +1,250 @@
+# /tests/test_tree_of_thoughts.py
+# title: Tree of Thoughtsエージェントのテスト
+# role: TreeOfThoughtsAgentが思考の生成と評価を同時実行数の上限内で並行して行い、候補をまとめて評価すること、探索戦略が予算と停止条件を守り、重複した思考を統合することを検証する。
+
+import asyncio
+import re
+
+from langchain_core.prompts import PromptTemplate
+from langchain_core.runnables import RunnableLambda
+
+from app.agents.thought_evaluator_agent import ThoughtEvaluatorAgent
+from app.agents.tree_of_thoughts_agent import TreeOfThoughtsAgent
+from app.reasoning.tot_search import BeamSearch, SearchBudget, build_search_strategy
+
+
+class _ConcurrencyProbe:
+    def __init__(self):
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+
+    async def run(self, result):
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        await asyncio.sleep(0.01)
+        self.active -= 1
+        return result
+
+
+def _make_agent(probe, evaluator_llm, listwise=True, **kwargs):
+    async def generate(prompt_value):
+        return await probe.run(f"思考{probe.calls}")
+
+    evaluator = ThoughtEvaluatorAgent(
+        llm=RunnableLambda(lambda _: None, afunc=evaluator_llm),
+        output_parser=RunnableLambda(lambda result: result),
+        prompt_template=PromptTemplate.from_template("{query}|{thought_path}"),
+        listwise_prompt_template=PromptTemplate.from_template("{query}|{candidates}") if listwise else None,
+    )
+    return TreeOfThoughtsAgent(
+        llm=RunnableLambda(lambda _: None, afunc=generate),
+        thought_evaluator=evaluator,
+        prompt_template=PromptTemplate.from_template("{query}{context}"),
+        **kwargs,
+    )
+
+
+def _score(text):
+    # 思考の番号が大きいほど高いスコアにする
+    return int(re.findall(r"思考(\d+)", text)[-1]) / 100
+
+
+def test_search_expands_concurrently_and_scores_candidates_in_batches():
+    """生成が上限まで並行して行われ、候補がバッチごとに1回の呼び出しで評価されることをテストする"""
+    probe = _ConcurrencyProbe()
+    evaluator_calls = []
+
+    async def evaluate(prompt_value):
+        text = prompt_value.to_string()
+        evaluator_calls.append(text)
+        candidates = re.split(r"候補\d+:\n", text)[1:]
+        return {"evaluations": [{"index": i, "score": _score(c)} for i, c in enumerate(candidates, start=1)]}
+
+    agent = _make_agent(probe, evaluate, max_concurrency=2, evaluation_batch_size=3)
+    outcome = asyncio.run(agent.asearch("問題", BeamSearch(branching=3, max_depth=2, beam_width=2)))
+
+    assert probe.calls == 3 + 2 * 3
+    assert probe.peak == 2
+    assert len(evaluator_calls) == 1 + 2
+    assert outcome.best.state == "思考8"
+    assert outcome.best.evaluation_score == 0.08
+    assert outcome.llm_calls == 9 + 3
+
+
+def test_batch_evaluation_falls_back_to_pointwise_when_listwise_result_is_incomplete():
+    """一括評価の結果が候補の数と合わない場合に、候補ごとの評価に切り替えることをテストする"""
+    evaluator_inputs = []
+
+    async def evaluate(prompt_value):
+        text = prompt_value.to_string()
+        evaluator_inputs.append(text)
+        if "候補" in text:
+            return {"evaluations": [{"index": 1, "score": 0.9}]}
+        return {"score": _score(text)}
+
+    agent = _make_agent(_ConcurrencyProbe(), evaluate)
+    scores = asyncio.run(agent.thought_evaluator.aevaluate_batch("問題", ["思考1", "思考2"]))
+
+    assert scores == [0.01, 0.02]
+    assert len(evaluator_inputs) == 3
+
+
+def test_pointwise_fallback_respects_the_concurrency_limit():
+    """一括評価が失敗して候補ごとの評価に切り替わっても、同時に実行する評価の呼び出しがmax_concurrencyを超えないことをテストする"""
+    probe = _ConcurrencyProbe()
+
+    async def evaluate(prompt_value):
+        text = prompt_value.to_string()
+        if "候補" in text:
+            return {"evaluations": []}
+        return await probe.run({"score": _score(text)})
+
+    agent = _make_agent(_ConcurrencyProbe(), evaluate, max_concurrency=2, evaluation_batch_size=4)
+    asyncio.run(agent.asearch("問題", BeamSearch(branching=4, max_depth=1, beam_width=1)))
+
+    assert probe.calls == 4
+    assert probe.peak == 2
+
+
+def test_fallback_evaluations_are_charged_against_the_budget():
+    """候補ごとの評価に切り替えたバッチが、一括評価の1回と候補の数の合計として予算に計上されることをテストする"""
+    async def evaluate(prompt_value):
+        text = prompt_value.to_string()
+        if "候補" in text:
+            return {"evaluations": []}
+        return {"score": _score(text)}
+
+    probe = _ConcurrencyProbe()
+    agent = _make_agent(probe, evaluate, evaluation_batch_size=3)
+    outcome = asyncio.run(agent.asearch("問題", BeamSearch(branching=3, max_depth=1, beam_width=1)))
+
+    assert probe.calls == 3
+    assert outcome.llm_calls == 3 + (1 + 3)
+
+
+def test_time_budget_interrupts_a_slow_expansion():
+    """展開の途中で時間の予算を使い切った場合、生成の完了を待たずに探索を打ち切ることをテストする"""
+    class _SlowProbe(_ConcurrencyProbe):
+        async def run(self, result):
+            await asyncio.sleep(5)
+            return result
+
+    agent = _make_agent(_SlowProbe(), _listwise_by_number)
+
+    outcome = asyncio.run(agent.asearch("問題", BeamSearch(branching=2, max_depth=3), SearchBudget(max_seconds=0.1)))
+
+    assert outcome.stop_reason == "budget"
+    assert outcome.elapsed_seconds < 2
+    assert outcome.thoughts == 1
+
+
+def test_calls_made_before_a_time_budget_interrupt_are_charged():
+    """時間の予算で展開が打ち切られても、それまでに終わった生成と取り消された評価の呼び出しが予算に計上されることをテストする"""
+    async def slow_evaluate(prompt_value):
+        await asyncio.sleep(5)
+        return {"evaluations": []}
+
+    probe = _ConcurrencyProbe()
+    agent = _make_agent(probe, slow_evaluate, evaluation_batch_size=4)
+
+    outcome = asyncio.run(agent.asearch("問題", BeamSearch(branching=2, max_depth=3), SearchBudget(max_seconds=0.3)))
+
+    assert outcome.stop_reason == "budget"
+    assert probe.calls == 2
+    assert outcome.llm_calls == 2 + 1
+
+
+def test_mcts_stops_when_every_expansion_is_merged_as_a_duplicate():
+    """展開した子がすべて既出の思考と重複した葉を展開済みとして扱い、同じ葉を繰り返し展開しないことをテストする"""
+    class _SameThoughtProbe(_ConcurrencyProbe):
+        async def run(self, result):
+            return await super().run("同じ思考")
+
+    async def evaluate(prompt_value):
+        return {"score": 0.5}
+
+    probe = _SameThoughtProbe()
+    agent = _make_agent(probe, evaluate, listwise=False)
+    strategy = build_search_strategy("mcts", {"branching": 2, "max_depth": 3, "iterations": 12})
+
+    outcome = asyncio.run(agent.asearch("問題", strategy))
+
+    assert outcome.stop_reason == "exhausted"
+    assert probe.calls == 2 + 2
+    assert outcome.thoughts == 2
+
+
+def test_best_thought_excludes_the_root_when_every_child_scores_zero_or_less():
+    """生成された思考の評価がすべて0以下でも、評価されていない根ではなく生成された思考を最良として返すことをテストする"""
+    async def evaluate(prompt_value):
+        return {"evaluations": [{"index": 1, "score": -0.5}, {"index": 2, "score": 0.0}]}
+
+    agent = _make_agent(_ConcurrencyProbe(), evaluate)
+
+    outcome = asyncio.run(agent.asearch("問題", BeamSearch(branching=2, max_depth=1, beam_width=1)))
+
+    assert outcome.best is not None
+    assert outcome.best.parent is not None
+    assert outcome.best.evaluation_score == 0.0
+
+
+async def _listwise_by_number(prompt_value):
+    candidates = re.split(r"候補\d+:\n", prompt_value.to_string())[1:]
+    return {"evaluations": [{"index": i, "score": _score(c)} for i, c in enumerate(candidates, start=1)]}
+
+
+def test_beam_search_stops_early_when_a_thought_reaches_the_threshold():
+    """閾値以上の評価の思考が得られた時点で、残りの深さを探索せずに終了することをテストする"""
+    probe = _ConcurrencyProbe()
+    agent = _make_agent(probe, _listwise_by_number)
+    strategy = build_search_strategy("beam", {"branching": 3, "max_depth": 3, "beam_width": 2, "score_threshold": 0.02, "iterations": 5})
+
+    outcome = asyncio.run(agent.asearch("問題", strategy))
+
+    assert outcome.stop_reason == "threshold"
+    assert probe.calls == 3
+    assert outcome.best.depth == 1
+
+
+def test_budgeted_strategies_respect_the_llm_call_limit():
+    """最良優先探索とMCTSが、LLM呼び出し回数の予算を超えずに探索を打ち切ることをテストする"""
+    for name in ("best_first", "mcts"):
+        probe = _ConcurrencyProbe()
+        agent = _make_agent(probe, _listwise_by_number, evaluation_batch_size=4)
+        strategy = build_search_strategy(name, {"branching": 3, "max_depth": 5, "max_expansions": 50, "iterations": 50})
+
+        outcome = asyncio.run(agent.asearch("問題", strategy, SearchBudget(max_llm_calls=10)))
+
+        assert outcome.stop_reason == "budget", name
+        assert outcome.llm_calls <= 10, name
+        assert outcome.best.depth >= 2, name
+
+
+def test_duplicate_thoughts_are_merged_by_the_transposition_table():
+    """表記や埋め込みが重複する思考が評価されずに統合されることをテストする"""
+    texts = iter(["同じ考え", "  同じ考え ", "似た考え", "別の考え"])
+
+    async def generate(prompt_value):
+        return next(texts)
+
+    def embed(batch):
+        # 「似た考え」は「同じ考え」とほぼ同じ向きのベクトルにする
+        table = {"同じ考え": [1.0, 0.0], "  同じ考え ": [1.0, 0.0], "似た考え": [0.99, 0.01], "別の考え": [0.0, 1.0]}
+        return [table[text] for text in batch]
+
+    evaluated = []
+
+    async def evaluate(prompt_value):
+        text = prompt_value.to_string()
+        evaluated.append(text)
+        return {"score": 0.5}
+
+    agent = _make_agent(_ConcurrencyProbe(), evaluate, listwise=False, max_concurrency=1, embed_fn=embed)
+    agent._chain = RunnableLambda(lambda _: None, afunc=generate)
+    outcome = asyncio.run(agent.asearch("問題", BeamSearch(branching=4, max_depth=1)))
+
+    assert outcome.merged_duplicates == 2
+    assert outcome.thoughts == 1 + 2
+    assert len(evaluated) == 2